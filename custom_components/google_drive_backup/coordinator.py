@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import asyncio
+import copy
 import json
 import logging
 from typing import Any, Callable
@@ -20,6 +21,48 @@ RECONNECT_DELAY = 60  # seconds
 PING_INTERVAL = 30  # seconds
 PING_TIMEOUT = 10  # seconds
 
+# Must match the add-on's integration WebSocket protocol version
+PROTOCOL_VERSION = 2
+
+
+def apply_patch(doc: Any, patch: list[dict[str, Any]]) -> Any:
+    """Return a patched copy of doc, raising ValueError if the JSON patch doesn't fit it."""
+    doc = copy.deepcopy(doc)
+    for op in patch:
+        path = op.get("path", "")
+        if path == "":
+            if op.get("op") != "replace":
+                raise ValueError("Only 'replace' can target the document root")
+            doc = copy.deepcopy(op.get("value"))
+            continue
+        parts = [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+        try:
+            parent = doc
+            for part in parts[:-1]:
+                parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+            if isinstance(parent, list):
+                key = len(parent) if parts[-1] == "-" else int(parts[-1])
+            else:
+                key = parts[-1]
+            if op.get("op") == "add":
+                if isinstance(parent, list):
+                    if key > len(parent):
+                        raise ValueError(f"Patch path doesn't exist: {path}")
+                    parent.insert(key, copy.deepcopy(op.get("value")))
+                else:
+                    parent[key] = copy.deepcopy(op.get("value"))
+            elif op.get("op") == "replace":
+                if key not in (range(len(parent)) if isinstance(parent, list) else parent):
+                    raise ValueError(f"Patch path doesn't exist: {path}")
+                parent[key] = copy.deepcopy(op.get("value"))
+            elif op.get("op") == "remove":
+                del parent[key]
+            else:
+                raise ValueError(f"Unsupported patch operation: {op.get('op')}")
+        except (KeyError, IndexError, TypeError) as err:
+            raise ValueError(f"Patch path doesn't exist: {path}") from err
+    return doc
+
 
 class GoogleDriveBackupCoordinator:
     """Manage WebSocket connection to Google Drive Backup addon."""
@@ -37,6 +80,7 @@ class GoogleDriveBackupCoordinator:
 
         # State storage
         self._backup_state: dict[str, Any] = {"state": "unknown", "attributes": {}}
+        self._backup_state_seq: int | None = None
         self._backup_stale = False
         self._connected = False
 
@@ -134,8 +178,12 @@ class GoogleDriveBackupCoordinator:
                 self._ws = ws
                 self._connected = True
                 self._ever_connected = True
+                self._backup_state_seq = None
                 self._notify_availability_changed()
                 _LOGGER.info("Successfully connected to Google Drive Backup addon WebSocket")
+
+                # Ask for state patches instead of a full snapshot on every update
+                await ws.send_str(json.dumps({"type": "hello", "protocol": PROTOCOL_VERSION}))
                 
                 async for msg in ws:
                     if msg.type == aiohttp.WSMsgType.TEXT:
@@ -178,11 +226,31 @@ class GoogleDriveBackupCoordinator:
                     "state": message.get("state", "unknown"),
                     "attributes": message.get("attributes", {})
                 }
+                self._backup_state_seq = message.get("seq")
                 dispatcher.async_dispatcher_send(
                     self.hass, f"{DOMAIN}_update_backup"
                 )
                 _LOGGER.debug("Updated backup state: %s", self._backup_state["state"])
-            
+
+            elif msg_type == "backup_state_patch":
+                if self._backup_state_seq is None or message.get("base_seq") != self._backup_state_seq:
+                    _LOGGER.debug(
+                        "Missed a backup state update (have %s, patch is against %s), requesting a resync",
+                        self._backup_state_seq, message.get("base_seq"))
+                    await self._request_resync()
+                    return
+                try:
+                    self._backup_state = apply_patch(self._backup_state, message.get("patch", []))
+                except ValueError as err:
+                    _LOGGER.debug("Unable to apply backup state patch (%s), requesting a resync", err)
+                    await self._request_resync()
+                    return
+                self._backup_state_seq = message.get("seq")
+                dispatcher.async_dispatcher_send(
+                    self.hass, f"{DOMAIN}_update_backup"
+                )
+                _LOGGER.debug("Patched backup state: %s", self._backup_state["state"])
+
             elif msg_type == "backup_stale":
                 self._backup_stale = message.get("is_stale", False)
                 dispatcher.async_dispatcher_send(
@@ -198,6 +266,12 @@ class GoogleDriveBackupCoordinator:
         except Exception as err:
             _LOGGER.error("Error handling message: %s", err, exc_info=True)
 
+    async def _request_resync(self) -> None:
+        """Ask the addon for a full state snapshot."""
+        self._backup_state_seq = None
+        if self._ws and not self._ws.closed:
+            await self._ws.send_str(json.dumps({"type": "resync"}))
+
     def _notify_availability_changed(self) -> None:
         """Notify all sensors about availability change."""
         dispatcher.async_dispatcher_send(
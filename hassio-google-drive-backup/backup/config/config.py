@@ -7,7 +7,7 @@ from yarl import URL
 
 from .settings import _LOOKUP, Setting, _VALIDATORS
 from ..logger import getLogger
-from backup.file import JsonFileSaver
+from backup.file import JsonFileSaver, AsyncStorage
 
 logger = getLogger(__name__)
 
@@ -45,7 +45,8 @@ NON_UI_SETTING = {
     Setting.CACHE_WARMUP_ERROR_TIMEOUT_SECONDS,
     Setting.WATCH_BACKUP_DIRECTORY,
     Setting.TRACE_REQUESTS,
-    Setting.MAX_BACKOFF_SECONDS
+    Setting.MAX_BACKOFF_SECONDS,
+    Setting.LOOP_STALL_THRESHOLD_SECONDS
 }
 
 UPGRADE_OPTIONS = {
@@ -131,12 +132,12 @@ class Config():
         self._legacy_ignored_behavior = False
         self._subscriptions = []
         self._clientIdentifier = None
+        self._storage: Optional[AsyncStorage] = None
+        # Goes up whenever the config changes, for anything that caches values derived from it
+        self._version = 0
         self.retained = self._loadRetained()
         self._gen_config_cache = self.getGenerationalConfig()
 
-        # Tracks when hosts have been seen to be offline to retry on different hosts.
-        self._commFailure = {}
-
     def getConfigFor(self, options):
         new_config = Config()
         new_config.overrides = self.overrides.copy()
@@ -197,6 +198,7 @@ class Config():
         self._config_was_upgraded = upgraded
         self.config = validated
         self._gen_config_cache = self.getGenerationalConfig()
+        self._version += 1
         for sub in self._subscriptions:
             sub()
 
@@ -209,16 +211,34 @@ class Config():
     def subscribe(self, func):
         self._subscriptions.append(func)
 
-    def clientIdentifier(self) -> str:
+    def useStorage(self, storage: AsyncStorage):
+        """Saves changes to the files kept alongside the config through storage, rather than waiting on the disk"""
+        self._storage = storage
+
+    def _save(self, path: str, data: Dict[str, Any], description: str):
+        if self._storage is None:
+            JsonFileSaver.write(path, data)
+        else:
+            self._storage.writeInBackground(self._storage.writeJson(path, data), description)
+
+    async def clientIdentifier(self) -> str:
         if self._clientIdentifier is None:
+            path = self.get(Setting.ID_FILE_PATH)
             try:
-                if JsonFileSaver.exists(self.get(Setting.ID_FILE_PATH)):
-                    self._clientIdentifier = JsonFileSaver.read(self.get(Setting.ID_FILE_PATH))['id']
+                if self._storage is None:
+                    data = JsonFileSaver.read(path) if JsonFileSaver.exists(path) else None
                 else:
-                    self._clientIdentifier = str(uuid.uuid4())
-                    JsonFileSaver.write(self.get(Setting.ID_FILE_PATH), {'id': self._clientIdentifier})
+                    data = await self._storage.readJson(path) if await self._storage.exists(path) else None
+                # Another caller could have loaded it while the file was being read
+                if self._clientIdentifier is None:
+                    if data is not None:
+                        self._clientIdentifier = data['id']
+                    else:
+                        self._clientIdentifier = str(uuid.uuid4())
+                        self._save(path, {'id': self._clientIdentifier}, "the client identifier")
             except Exception:
-                self._clientIdentifier = str(uuid.uuid4())
+                if self._clientIdentifier is None:
+                    self._clientIdentifier = str(uuid.uuid4())
         return self._clientIdentifier
 
     def getGenerationalConfig(self) -> Optional[Dict[str, Any]]:
@@ -258,18 +278,22 @@ class Config():
     def setRetained(self, slug, retain):
         if retain and slug not in self.retained:
             self.retained.append(slug)
-            JsonFileSaver.write(self.get(Setting.RETAINED_FILE_PATH), {'retained': self.retained})
+            self._save(self.get(Setting.RETAINED_FILE_PATH), {'retained': self.retained}, "the list of retained backups")
         elif not retain and slug in self.retained:
             self.retained.remove(slug)
-            JsonFileSaver.write(self.get(Setting.RETAINED_FILE_PATH), {'retained': self.retained})
+            self._save(self.get(Setting.RETAINED_FILE_PATH), {'retained': self.retained}, "the list of retained backups")
 
     def isExplicit(self, setting):
         return setting in self.config or setting.value in self.config
 
     def override(self, setting: Setting, value):
         self.overrides[setting] = value
+        self._version += 1
         return self
 
+    def version(self) -> int:
+        return self._version
+
     def get(self, setting: Setting) -> Any:
         if setting in self.overrides:
             return self.overrides[setting]
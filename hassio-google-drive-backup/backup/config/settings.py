@@ -54,6 +54,7 @@ class Setting(Enum):
 
     STOP_ADDONS = "stop_addons"
     DISABLE_WATCHDOG_WHEN_STOPPING = "disable_watchdog_when_stopping"
+    STOP_ADDON_DEPENDENCIES = "stop_addon_dependencies"
 
     # UI Server Options
     USE_SSL = "use_ssl"
@@ -88,6 +89,7 @@ class Setting(Enum):
     DEFAULT_DRIVE_CLIENT_SECRET = "default_drive_client_secret"
     DRIVE_PICKER_API_KEY = "drive_picker_api_key"
     MAXIMUM_UPLOAD_CHUNK_BYTES = "maximum_upload_chunk_bytes"
+    UPLOAD_CHUNK_CONTROLLER = "upload_chunk_controller"
 
     # Files and folders
     FOLDER_FILE_PATH = "folder_file_path"
@@ -135,6 +137,7 @@ class Setting(Enum):
     CACHE_WARMUP_MAX_SECONDS = "cache_warmup_max_seconds"
     CACHE_WARMUP_ERROR_TIMEOUT_SECONDS = "cache_warmup_error_timeout"
     MAX_BACKOFF_SECONDS = "max_backoff_seconds"
+    LOOP_STALL_THRESHOLD_SECONDS = "loop_stall_threshold_seconds"
 
     # Old, deprecated settings
     DEPRECTAED_MAX_BACKUPS_IN_HA = "max_snapshots_in_hassio"
@@ -214,6 +217,7 @@ _DEFAULTS = {
 
     Setting.STOP_ADDONS: "",
     Setting.DISABLE_WATCHDOG_WHEN_STOPPING: False,
+    Setting.STOP_ADDON_DEPENDENCIES: "",
 
     # UI Server settings
     Setting.USE_SSL: False,
@@ -245,6 +249,7 @@ _DEFAULTS = {
     Setting.GOOGLE_DRIVE_TIMEOUT_SECONDS: 180,
     Setting.GOOGLE_DRIVE_PAGE_SIZE: 100,
     Setting.MAXIMUM_UPLOAD_CHUNK_BYTES: 10 * 1024 * 1024,
+    Setting.UPLOAD_CHUNK_CONTROLLER: "adaptive",
 
     # Remote endpoints
     Setting.AUTHORIZATION_HOST: "https://habackup.io",
@@ -295,6 +300,7 @@ _DEFAULTS = {
     Setting.CACHE_WARMUP_MAX_SECONDS: 15 * 60,  # 30 minutes
     Setting.CACHE_WARMUP_ERROR_TIMEOUT_SECONDS: 24 * 60 * 60,  # 1 day
     Setting.MAX_BACKOFF_SECONDS: 60 * 60 * 2,  # 2 hours
+    Setting.LOOP_STALL_THRESHOLD_SECONDS: 1,
 
     Setting.UPLOAD_LIMIT_BYTES_PER_SECOND: 0,
 }
@@ -355,6 +361,7 @@ _CONFIG = {
 
     Setting.STOP_ADDONS: "str?",
     Setting.DISABLE_WATCHDOG_WHEN_STOPPING: "bool?",
+    Setting.STOP_ADDON_DEPENDENCIES: "str?",
 
     # UI Server settings
     Setting.USE_SSL: "bool?",
@@ -386,6 +393,7 @@ _CONFIG = {
     Setting.GOOGLE_DRIVE_TIMEOUT_SECONDS: "float(1,)?",
     Setting.GOOGLE_DRIVE_PAGE_SIZE: "int(1,)?",
     Setting.MAXIMUM_UPLOAD_CHUNK_BYTES: f"float({1024 * 256},)?",
+    Setting.UPLOAD_CHUNK_CONTROLLER: "list(adaptive|target_time)?",
 
     # Remote endpoints
     Setting.AUTHORIZATION_HOST: "url?",
@@ -436,6 +444,7 @@ _CONFIG = {
     Setting.CACHE_WARMUP_MAX_SECONDS: "float(0,)",
     Setting.CACHE_WARMUP_ERROR_TIMEOUT_SECONDS: "float(0,)",
     Setting.MAX_BACKOFF_SECONDS: "int(3600,)?",
+    Setting.LOOP_STALL_THRESHOLD_SECONDS: "float(0,)?",
 
     Setting.UPLOAD_LIMIT_BYTES_PER_SECOND: "float(0,)?",
 }
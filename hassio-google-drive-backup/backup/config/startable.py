@@ -1,3 +1,5 @@
+from typing import List
+
 from ..logger import getLogger
 
 logger = getLogger(__name__)
@@ -9,3 +11,7 @@ class Startable():
 
     async def stop(self):
         pass
+
+    def dependsOn(self) -> List[type]:
+        """The kinds of startables that have to finish starting before this one can start"""
+        return []
@@ -31,6 +31,7 @@ ERROR_BACKUP_FOLDER_MISSING = "backup_folder_missing"
 CHOOSE_BACKUP_FOLDER = "choose_backup_folder"
 ERROR_BACKUP_FOLDER_INACCESSIBLE = "backup_folder_inaccessible"
 ERROR_LOW_SPACE = "low_space"
+ERROR_BACKUP_DECRYPT = "backup_decrypt_failed"
 LOG_IN_TO_DRIVE = "log_in_to_drive"
 SUPERVISOR_PERMISSION = "supervisor_permission"
 
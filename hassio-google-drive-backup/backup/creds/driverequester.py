@@ -4,7 +4,9 @@ from backup.exceptions import GoogleUnexpectedError, GoogleInternalError, Google
 from backup.util import Resolver
 from backup.logger import getLogger
 from backup.config import Config, Setting
+from backup.time import Time
 from injector import singleton, inject
+from email.utils import parsedate_to_datetime
 from dns.exception import DNSException
 
 RATE_LIMIT_EXCEEDED = [403]
@@ -19,8 +21,9 @@ logger = getLogger(__name__)
 @singleton
 class DriveRequester():
     @inject
-    def __init__(self, config: Config, session: ClientSession, resolver: Resolver):
+    def __init__(self, config: Config, session: ClientSession, resolver: Resolver, time: Time):
         self.session = session
+        self.time = time
         self.resolver = resolver
         self.config = config
         self.all_resposnes: list[ClientResponse] = []
@@ -44,7 +47,7 @@ class DriveRequester():
                 raise GoogleInternalError()
             elif response.status in RATE_LIMIT_EXCEEDED or response.status in TOO_MANY_REQUESTS:
                 response.release()
-                raise GoogleRateLimitError()
+                raise GoogleRateLimitError(self.retryAfter(response))
             elif response.status in REQUEST_TIMEOUT:
                 response.release()
                 raise GoogleTimeoutError()
@@ -83,6 +86,20 @@ class DriveRequester():
             self.resolver.toggle()
             raise GoogleDnsFailure()
 
+    def retryAfter(self, response: ClientResponse):
+        """Seconds to wait before retrying, from a response's Retry-After header (which can also be a date)"""
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - self.time.now()).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
     def buildTimeout(self):
         return ClientTimeout(
             sock_connect=self.config.get(
@@ -7,7 +7,9 @@ from yarl import URL
 from ..time import Time
 from ..logger import getLogger
 from .driverequester import DriveRequester
+from .tokenservers import TokenServers
 from datetime import timedelta
+from typing import Dict, Tuple
 from injector import singleton, inject
 
 
@@ -38,6 +40,7 @@ class Exchanger():
                  session: ClientSession,
                  config: Config,
                  drive: DriveRequester,
+                 token_servers: TokenServers,
                  client_id: str,
                  client_secret: str,
                  redirect: URL):
@@ -45,6 +48,7 @@ class Exchanger():
         self.config = config
         self.session = session
         self.drive = drive
+        self.token_servers = token_servers
         self._client_id = client_id
         self._client_secret = client_secret
         self._redirect = redirect
@@ -103,55 +107,96 @@ class Exchanger():
             KEY_CLIENT_ID: creds.id,
             KEY_REFRESH_TOKEN: creds.refresh_token,
         }
-        token_paths = self.config.getTokenServers("/drive/refresh")
-        last_error = None
-        for url in token_paths:
-            try:
-                headers = {
-                    'addon_version': VERSION,
-                    'client': self.config.clientIdentifier()
-                }
-                async with self.session.post(str(url), headers=headers, json=data, timeout=ClientTimeout(total=self.config.get(Setting.EXCHANGER_TIMEOUT_SECONDS))) as resp:
-                    if resp.status < 400:
-                        return Creds.load(self.time, await resp.json(), original_expiration=creds.original_expiration)
-                    elif resp.status == 503:
-                        json = {}
-                        try:
-                            json = await resp.json()
-                        except BaseException:
-                            pass
-                        if "error" in json:
-                            if "invalid_grant" in json["error"]:
-                                raise GoogleCredentialsExpired()
-                            else:
-                                # Record the error, but still try other hosts
-                                last_error = CredRefreshGoogleError(json["error"])
+        timeout = self.config.get(Setting.EXCHANGER_TIMEOUT_SECONDS)
+        servers = self.token_servers.rank(self.config.getTokenServers("/drive/refresh"))
+
+        # Servers are asked best first.  If one hasn't answered by the time it usually would have, the next one gets
+        # asked too and whichever answers first wins.  One that fails outright gets skipped right away.
+        attempts: Dict[asyncio.Task, Tuple[int, URL, float]] = {}
+        errors: Dict[int, Exception] = {}
+        next_server = 0
+        try:
+            while next_server < len(servers) or len(attempts) > 0:
+                if len(attempts) == 0:
+                    self._startRefresh(attempts, next_server, servers[next_server], data, creds)
+                    next_server += 1
+                hedge = None
+                if next_server < len(servers):
+                    hedge = self.token_servers.hedgeDelay(servers[next_server - 1], timeout)
+                done, _ = await asyncio.wait(attempts.keys(), timeout=hedge, return_when=asyncio.FIRST_COMPLETED)
+                if len(done) == 0:
+                    logger.info("{0} is slow to respond, also trying {1}".format(servers[next_server - 1].host, servers[next_server].host))
+                    self._startRefresh(attempts, next_server, servers[next_server], data, creds)
+                    next_server += 1
+                    continue
+                for task in done:
+                    index, url, started = attempts.pop(task)
+                    try:
+                        refreshed = task.result()
+                    except (CredRefreshGoogleError, CredRefreshMyError) as e:
+                        self.token_servers.recordFailure(url)
+                        errors[index] = e
+                        continue
+                    except GoogleCredentialsExpired:
+                        self.token_servers.recordLatency(url, self.time.monotonic() - started)
+                        raise
+                    self.token_servers.recordLatency(url, self.time.monotonic() - started)
+                    for slower_index, slower_url, slower_started in attempts.values():
+                        self.token_servers.recordSlow(slower_url, self.time.monotonic() - slower_started)
+                    return refreshed
+        finally:
+            for task in attempts.keys():
+                task.cancel()
+        logger.error("Unable to refresh credentials with Google Drive")
+        if len(errors) == 0:
+            raise Exception("No token servers are configured")
+        # Report what went wrong with the last server in line
+        raise errors[max(errors.keys())]
+
+    def _startRefresh(self, attempts: Dict[asyncio.Task, Tuple[int, URL, float]], index: int, url: URL, data, creds: Creds):
+        task = asyncio.create_task(self._refreshFrom(url, data, creds), name="Refresh credentials from {0}".format(url.host))
+        attempts[task] = (index, url, self.time.monotonic())
+
+    async def _refreshFrom(self, url: URL, data, creds: Creds) -> Creds:
+        try:
+            headers = {
+                'addon_version': VERSION,
+                'client': await self.config.clientIdentifier()
+            }
+            async with self.session.post(str(url), headers=headers, json=data, timeout=ClientTimeout(total=self.config.get(Setting.EXCHANGER_TIMEOUT_SECONDS))) as resp:
+                if resp.status < 400:
+                    return Creds.load(self.time, await resp.json(), original_expiration=creds.original_expiration)
+                elif resp.status == 503:
+                    json = {}
+                    try:
+                        json = await resp.json()
+                    except BaseException:
+                        pass
+                    if "error" in json:
+                        if "invalid_grant" in json["error"]:
+                            raise GoogleCredentialsExpired()
                         else:
-                            last_error = CredRefreshMyError("HTTP 503 from " + url.host)
-                    elif resp.status == 401:
-                        raise GoogleCredentialsExpired()
+                            # Record the error, but still try other hosts
+                            raise CredRefreshGoogleError(json["error"])
                     else:
-                        try:
-                            extra = (await resp.json())["error"]
-                        except BaseException:
-                            extra = ""
-
-                        # this is likely due to misconfiguration
-                        logger.warning("Got {0}:{1} from {2}, trying alternate server(s)...".format(resp.status, extra, url.host))
-                        last_error = CredRefreshMyError("HTTP {} {}".format(resp.status, extra))
-            except ClientConnectorError:
-                logger.warning("Unable to reach " + str(url.host) + ", trying alternate server(s)...")
-                last_error = "Couldn't communicate with " + url.host
-            except asyncio.exceptions.TimeoutError:
-                logger.warning("Timed out communicating with " + str(url.host) + ", trying alternate server(s)...")
-                last_error = "Timed out communicating with " + url.host
-        logger.error("Unable to refresh credentials with Google Drive")
-        if isinstance(last_error, str):
-            raise CredRefreshMyError(last_error)
-        elif isinstance(last_error, Exception):
-            raise last_error
-        else:
-            raise Exception("Unexpected error type: " + str(last_error))
+                        raise CredRefreshMyError("HTTP 503 from " + url.host)
+                elif resp.status == 401:
+                    raise GoogleCredentialsExpired()
+                else:
+                    try:
+                        extra = (await resp.json())["error"]
+                    except BaseException:
+                        extra = ""
+
+                    # this is likely due to misconfiguration
+                    logger.warning("Got {0}:{1} from {2}, trying alternate server(s)...".format(resp.status, extra, url.host))
+                    raise CredRefreshMyError("HTTP {} {}".format(resp.status, extra))
+        except ClientConnectorError:
+            logger.warning("Unable to reach " + str(url.host) + ", trying alternate server(s)...")
+            raise CredRefreshMyError("Couldn't communicate with " + url.host)
+        except asyncio.exceptions.TimeoutError:
+            logger.warning("Timed out communicating with " + str(url.host) + ", trying alternate server(s)...")
+            raise CredRefreshMyError("Timed out communicating with " + url.host)
 
     def refreshCredentials(self, refresh_token):
         return Creds(self.time, id=self._client_id, expiration=None, access_token=None, refresh_token=refresh_token, secret=self._client_secret)
@@ -0,0 +1,99 @@
+import math
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional
+
+from injector import inject, singleton
+from yarl import URL
+
+from ..time import Time
+
+# How many recent response times are remembered for each token server
+LATENCY_SAMPLES = 20
+
+# A request gets hedged to the next token server once it's taken longer than this percentile of the first server's
+# recent response times...
+HEDGE_PERCENTILE = 95
+
+# ...but never sooner than this, so a fast server with a bit of jitter doesn't get hedged on every request...
+MIN_HEDGE_SECONDS = 0.5
+
+# ...and after this long when nothing is known yet about how quickly the server responds
+DEFAULT_HEDGE_SECONDS = 3
+
+# A token server that failed is tried after the others for this long
+FAILURE_MEMORY = timedelta(minutes=10)
+
+
+class ServerHealth():
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.failures = 0
+        self.last_failure: Optional[datetime] = None
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if len(self.latencies) == 0:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * percent / 100) - 1)]
+
+    def isFailing(self, now: datetime) -> bool:
+        return self.failures > 0 and self.last_failure is not None and now - self.last_failure < FAILURE_MEMORY
+
+
+@singleton
+class TokenServers():
+    """
+    Keeps track of how quickly and reliably each token server has responded, to decide which to ask for a refreshed
+    token first and how long to wait on it before also asking the next one.
+    """
+    @inject
+    def __init__(self, time: Time):
+        self._time = time
+        self._health: Dict[str, ServerHealth] = {}
+
+    def rank(self, servers: List[URL]) -> List[URL]:
+        """
+        Orders token servers best first.  Servers that have failed recently go last, and servers that have answered
+        before go ahead of ones that haven't, fastest first.  Ties keep the configured order.
+        """
+        now = self._time.now()
+
+        def score(server: URL):
+            health = self._health.get(self._key(server))
+            if health is None:
+                return (False, math.inf)
+            median = health.percentile(50)
+            return (health.isFailing(now), math.inf if median is None else median)
+        return sorted(servers, key=score)
+
+    def hedgeDelay(self, server: URL, timeout: float) -> float:
+        """How long to wait for a server to answer before asking the next one too"""
+        health = self._health.get(self._key(server))
+        deadline = None if health is None else health.percentile(HEDGE_PERCENTILE)
+        if deadline is None:
+            deadline = DEFAULT_HEDGE_SECONDS
+        return min(timeout, max(MIN_HEDGE_SECONDS, deadline))
+
+    def recordLatency(self, server: URL, seconds: float):
+        health = self._getHealth(server)
+        health.latencies.append(seconds)
+        health.failures = 0
+
+    def recordSlow(self, server: URL, seconds: float):
+        """Records that a server was still working on a request after this long, when another answered it first"""
+        self._getHealth(server).latencies.append(seconds)
+
+    def recordFailure(self, server: URL):
+        health = self._getHealth(server)
+        health.failures += 1
+        health.last_failure = self._time.now()
+
+    def _getHealth(self, server: URL) -> ServerHealth:
+        key = self._key(server)
+        if key not in self._health:
+            self._health[key] = ServerHealth()
+        return self._health[key]
+
+    def _key(self, server: URL) -> str:
+        return str(server.origin())
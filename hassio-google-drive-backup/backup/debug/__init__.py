@@ -1,2 +1,3 @@
 # flake8: noqa
-from .debug_server import DebugServer
\ No newline at end of file
+from .debug_server import DebugServer
+from .loopmonitor import LoopMonitor
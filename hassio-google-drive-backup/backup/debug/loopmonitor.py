@@ -0,0 +1,154 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from injector import inject, singleton
+
+from backup.config import Config, Setting, Startable
+from backup.time import Time
+from backup.logger import getLogger
+
+logger = getLogger(__name__)
+
+# How often the event loop is checked for how late it is to run something that's due
+HEARTBEAT_SECONDS = 0.25
+
+# Upper bounds (in milliseconds) of the buckets lag is counted in.  The last catches everything slower.
+LAG_BUCKETS_MS = [1, 5, 10, 50, 100, 250, 500, 1000, 5000]
+
+# How many recent lag measurements are kept to work out percentiles from (5 minutes worth)
+LAG_SAMPLES = 1200
+
+# How many stalls are remembered for the debug page
+STALL_HISTORY = 10
+
+
+class Stall():
+    def __init__(self, stack: List[str], when):
+        self.stack = stack
+        self.when = when
+        self.lag: Optional[float] = None
+
+    def serialize(self, time: Time) -> Dict[str, Any]:
+        return {
+            'when': time.asRfc3339String(self.when),
+            'lag_ms': None if self.lag is None else round(self.lag * 1000),
+            'stack': self.stack
+        }
+
+
+@singleton
+class LoopMonitor(Startable):
+    """
+    Measures how late the event loop is to run things that are due, which is how long something running on it held
+    it up without awaiting.  Any of that over a few milliseconds means something is doing blocking work where it
+    shouldn't, and the UI, syncing and uploads all stall while it does.
+
+    A heartbeat on the loop records how late it wakes up each time.  A watchdog thread watches that heartbeat and when
+    it's gone quiet for longer than the configured threshold, grabs the stack of whatever the loop is running right
+    then, which is logged once the loop gets going again.  Unlike asyncio's debug mode this costs next to nothing, so
+    it's always on.
+    """
+    @inject
+    def __init__(self, config: Config, time: Time):
+        self._config = config
+        self._time = time
+        self._interval = HEARTBEAT_SECONDS
+        self._buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self._samples: Deque[float] = deque(maxlen=LAG_SAMPLES)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._stalls: Deque[Stall] = deque(maxlen=STALL_HISTORY)
+        # The watchdog thread adds stalls while the loop reads them for the debug page
+        self._stalls_lock = threading.Lock()
+        self._stall: Optional[Stall] = None
+        self._last_beat = 0.0
+        self._loop_thread: Optional[int] = None
+        self._task = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    async def start(self):
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="Event loop monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="Event loop watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait([self._task])
+        if self._watchdog is not None:
+            self._watchdog.join()
+
+    def stats(self) -> Dict[str, Any]:
+        recent = sorted(self._samples)
+        with self._stalls_lock:
+            stalls = list(self._stalls)
+        return {
+            'interval_ms': round(self._interval * 1000),
+            'samples': self._count,
+            'mean_ms': 0 if self._count == 0 else round(self._total / self._count * 1000, 2),
+            'max_ms': round(self._max * 1000, 2),
+            'p50_ms': self._percentile(recent, 50),
+            'p95_ms': self._percentile(recent, 95),
+            'p99_ms': self._percentile(recent, 99),
+            'histogram': [{'le_ms': bound, 'count': count} for bound, count in zip(LAG_BUCKETS_MS + [None], self._buckets)],
+            'stalls': [stall.serialize(self._time) for stall in reversed(stalls)]
+        }
+
+    def record(self, lag: float):
+        self._count += 1
+        self._total += lag
+        self._max = max(self._max, lag)
+        self._samples.append(lag)
+        lag_ms = lag * 1000
+        for index, bound in enumerate(LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                self._buckets[index] += 1
+                return
+        self._buckets[-1] += 1
+
+    async def _heartbeat(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self._interval)
+            self._last_beat = time.perf_counter()
+            lag = max(0.0, self._last_beat - before - self._interval)
+            self.record(lag)
+            stall = self._stall
+            if stall is not None:
+                self._stall = None
+                stall.lag = lag
+                logger.warning("The event loop was blocked for {0:.2f} seconds by:\n{1}".format(lag, "".join(stall.stack)))
+
+    def _watch(self):
+        while not self._stopping.is_set():
+            threshold = self._config.get(Setting.LOOP_STALL_THRESHOLD_SECONDS)
+            if not threshold or threshold <= 0:
+                self._stopping.wait(1)
+                continue
+            self._stopping.wait(max(0.05, threshold / 4))
+            last_beat = self._last_beat
+            if self._stall is not None or time.perf_counter() - last_beat < self._interval + threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None or self._last_beat != last_beat:
+                continue
+            stall = Stall(traceback.format_stack(frame), self._time.now())
+            with self._stalls_lock:
+                self._stalls.append(stall)
+            self._stall = stall
+
+    def _percentile(self, ordered: List[float], percent: float) -> float:
+        if len(ordered) == 0:
+            return 0
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] * 1000, 2)
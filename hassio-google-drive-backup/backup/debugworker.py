@@ -1,6 +1,5 @@
 import asyncio
 import socket
-import aioping
 from datetime import datetime, timedelta
 
 from aiohttp import ClientSession, ClientTimeout
@@ -60,7 +59,7 @@ class DebugWorker(Worker):
     # servers are available.
     async def updateHealthCheck(self):
         headers = {
-            'client': self.config.clientIdentifier(),
+            'client': await self.config.clientIdentifier(),
             'addon_version': VERSION
         }
         self._last_server_check = self.time.now()
@@ -95,7 +94,7 @@ class DebugWorker(Worker):
                 package = self.buildClearReport()
             logger.info("Sending error report (see settings to disable)")
             headers = {
-                'client': self.config.clientIdentifier(),
+                'client': await self.config.clientIdentifier(),
                 'addon_version': VERSION
             }
             url = URL(self.config.get(Setting.AUTHORIZATION_HOST)).with_path("/logerror")
@@ -141,7 +140,7 @@ class DebugWorker(Worker):
         report['debug'] = self._info.debug
         report['version'] = VERSION
         report['error'] = error
-        report['client'] = self.config.clientIdentifier()
+        report['client'] = await self.config.clientIdentifier()
 
         if self.ha_source.isInitialized() and self.ha_source.host_info and self.ha_source.super_info and self.ha_source.ha_info:
             report["super_version"] = self.ha_source.host_info.get('supervisor', "None")
@@ -187,6 +186,8 @@ class DebugWorker(Worker):
             return date.isoformat()
 
     async def getPingInfo(self):
+        # Pinging is only done for error reports, so aioping isn't loaded until then
+        import aioping
         who = self.config.get(Setting.DRIVE_HOST_NAME)
         ips = await self.resolve(who)
         results = {who: {}}
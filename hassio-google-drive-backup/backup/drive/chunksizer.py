@@ -0,0 +1,143 @@
+import math
+from typing import Any, Dict, Optional
+
+from ..config import Config, Setting
+from ..logger import getLogger
+from ..time import Time
+from ..util import DataCache, RateEstimator
+
+logger = getLogger(__name__)
+
+BASE_CHUNK_SIZE = 256 * 1024  # Google's api requires uploading chunks in multiples of 256kb
+
+# During upload, chunks get sized to complete upload after 10s so we can give status updates on progress.
+CHUNK_UPLOAD_TARGET_SECONDS = 10
+
+CONTROLLER_ADAPTIVE = "adaptive"
+CONTROLLER_TARGET_TIME = "target_time"
+
+# How long it takes for a chunk's influence on the throughput estimate to fall by half.  A chunk that takes the target
+# time to upload moves the estimate about a third of the way toward its own speed.
+THROUGHPUT_HALF_LIFE_SECONDS = 2 * CHUNK_UPLOAD_TARGET_SECONDS
+
+# How much weight a new measurement gets in the smoothed round trip time estimate.
+RTT_SMOOTHING = 0.125
+
+# How much the chunk size gets cut by when a chunk fails to upload.
+FAILURE_DECREASE = 0.5
+
+
+class ChunkSizer():
+    """
+    Decides how big each chunk of a resumable upload to Google Drive should be.  Sizes are in multiples of
+    BASE_CHUNK_SIZE, which is the granularity Drive requires.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+
+    def maximum(self) -> int:
+        return max(1, math.floor(self.config.get(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES) / BASE_CHUNK_SIZE))
+
+    def start(self) -> int:
+        """The size of the first chunk sent for a new or resumed upload"""
+        return 1
+
+    def success(self, last_chunk_size: int, last_chunk_seconds: float) -> int:
+        """Called after a chunk uploads, returns the size of the next chunk"""
+        raise NotImplementedError()
+
+    def failure(self) -> None:
+        """Called when a chunk fails to upload because of a network or server problem"""
+        pass
+
+    def latency(self, seconds: float) -> None:
+        """Called with the duration of an upload request that didn't send any data, ie a round trip"""
+        pass
+
+    def _clamp(self, size) -> int:
+        return min(max(1, math.floor(size)), self.maximum())
+
+
+class TargetTimeChunkSizer(ChunkSizer):
+    """Sizes each chunk so it would take CHUNK_UPLOAD_TARGET_SECONDS to send at the speed of the previous chunk"""
+
+    def success(self, last_chunk_size: int, last_chunk_seconds: float) -> int:
+        if last_chunk_seconds <= 0:
+            return self.maximum()
+        return self._clamp(CHUNK_UPLOAD_TARGET_SECONDS * last_chunk_size / last_chunk_seconds)
+
+
+class AdaptiveChunkSizer(ChunkSizer):
+    """
+    Sizes chunks from smoothed estimates of throughput and round trip time, so a single slow or fast chunk doesn't
+    make the size swing around, and the fixed cost of each request is accounted for on high latency links.  Like TCP's
+    congestion control, the size grows quickly until a chunk fails, gets cut in half when one does, and afterward only
+    grows by one step per chunk.  The last good size is remembered in the data cache so resumed uploads, and uploads
+    after a restart, pick up where the last one left off instead of starting over from the smallest size.
+    """
+
+    def __init__(self, config: Config, time: Time, data_cache: Optional[DataCache] = None):
+        super().__init__(config)
+        self._data_cache = data_cache
+        state: Dict[str, Any] = data_cache.uploadChunking() if data_cache else {}
+        self._size: int = state.get("size", 1)
+        self._ceiling: Optional[int] = state.get("ceiling")
+        self._rtt: Optional[float] = state.get("rtt")
+        self.throughput = RateEstimator(time, half_life_seconds=THROUGHPUT_HALF_LIFE_SECONDS)
+        self.throughput.seed(state.get("throughput"))
+
+    def start(self) -> int:
+        return self._clamp(self._size)
+
+    def success(self, last_chunk_size: int, last_chunk_seconds: float) -> int:
+        if last_chunk_seconds <= 0:
+            # Too fast to measure
+            self._size = self.maximum()
+            self._save()
+            return self._size
+
+        rtt = self._rtt or 0
+        # Some of the time a chunk takes is the fixed cost of making a request, which says nothing about throughput.
+        transfer_seconds = max(last_chunk_seconds - rtt, last_chunk_seconds / 2)
+        self.throughput.record(last_chunk_size * BASE_CHUNK_SIZE, transfer_seconds)
+
+        budget = max(CHUNK_UPLOAD_TARGET_SECONDS - rtt, CHUNK_UPLOAD_TARGET_SECONDS / 2)
+        desired = math.floor(self.throughput.instant() * budget / BASE_CHUNK_SIZE)
+        size = self._size
+        if desired > size:
+            if self._ceiling is None or size < self._ceiling:
+                size = min(desired, size * 2)
+            else:
+                size = size + 1
+        else:
+            size = desired
+        self._size = self._clamp(size)
+        self._save()
+        return self._size
+
+    def failure(self) -> None:
+        self._ceiling = self._clamp(self._size * FAILURE_DECREASE)
+        self._size = self._ceiling
+        self.throughput.scale(FAILURE_DECREASE)
+        logger.debug("Reducing the upload chunk size to {0} after a failed upload".format(self._size * BASE_CHUNK_SIZE))
+        self._save()
+
+    def latency(self, seconds: float) -> None:
+        if seconds > 0:
+            self._rtt = self._smooth(self._rtt, seconds, RTT_SMOOTHING)
+
+    def _smooth(self, current: Optional[float], sample: float, weight: float) -> float:
+        if current is None:
+            return sample
+        return current + (sample - current) * weight
+
+    def _save(self):
+        if self._data_cache is None:
+            return
+        self._data_cache.setUploadChunking({
+            "size": self._size,
+            "ceiling": self._ceiling,
+            "throughput": self.throughput.instant(),
+            "rtt": self._rtt
+        })
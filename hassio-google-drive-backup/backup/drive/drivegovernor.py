@@ -0,0 +1,99 @@
+import random
+from asyncio import Condition
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+from injector import inject, singleton
+
+from ..time import Time
+from ..util import TokenBucket
+from ..logger import getLogger
+
+logger = getLogger(__name__)
+
+# How many requests can be made to Drive at once, when Drive isn't complaining about it
+MAX_CONCURRENT_REQUESTS = 8
+
+# How many requests a second get made to Drive when it isn't complaining, and how many can be made in a burst
+MAX_REQUESTS_PER_SECOND = 10.0
+MIN_REQUESTS_PER_SECOND = 0.5
+REQUEST_BURST = 20
+
+# How quickly the request rate recovers after being rate limited, per successful request
+REQUEST_RATE_RECOVERY = 0.25
+
+
+@singleton
+class DriveGovernor():
+    """
+    Paces every request the addon makes to Google Drive, so that syncing, uploading and requests from the UI all
+    slow down together when Drive says too many requests are being made, instead of each retrying on its own.
+
+    Requests are limited both in how many can be running at once and in how many get made per second.  Being rate
+    limited halves both limits and pauses every request until the retry delay has passed, while each request that
+    succeeds grows them back a little.
+    """
+    @inject
+    def __init__(self, time: Time):
+        self._time = time
+        self._bucket = TokenBucket(time, REQUEST_BURST, MAX_REQUESTS_PER_SECOND)
+        self._limit = float(MAX_CONCURRENT_REQUESTS)
+        self._running = 0
+        self._slots = Condition()
+        self._paused_until: Optional[datetime] = None
+        self._random = random.Random()
+
+    def concurrency(self) -> int:
+        return int(self._limit)
+
+    def rate(self) -> float:
+        return self._bucket.fill_rate
+
+    def pausedUntil(self) -> Optional[datetime]:
+        return self._paused_until
+
+    @asynccontextmanager
+    async def request(self):
+        """Waits for a turn to make a request to Drive, which lasts until the context exits"""
+        await self._waitForPause()
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._running < int(self._limit))
+            self._running += 1
+        try:
+            await self._bucket.consumeWithWait(1, 1)
+            yield
+        finally:
+            async with self._slots:
+                self._running -= 1
+                self._slots.notify_all()
+
+    def succeeded(self):
+        self._limit = min(MAX_CONCURRENT_REQUESTS, self._limit + 1 / self._limit)
+        self._bucket.fill_rate = min(MAX_REQUESTS_PER_SECOND, self._bucket.fill_rate + REQUEST_RATE_RECOVERY)
+
+    def rateLimited(self, backoff_seconds: float, retry_after: Optional[float] = None) -> float:
+        """
+        Slows down every request to Drive after it said too many were being made, and returns how long to wait
+        before trying again.  Drive's Retry-After header is used if it sent one.
+        """
+        self._limit = max(1.0, self._limit / 2)
+        self._bucket.fill_rate = max(MIN_REQUESTS_PER_SECOND, self._bucket.fill_rate / 2)
+        delay = retry_after if retry_after is not None else self.jitter(backoff_seconds)
+        resume = self._time.now() + timedelta(seconds=delay)
+        if self._paused_until is None or resume > self._paused_until:
+            self._paused_until = resume
+        logger.debug("Slowed requests to Google Drive to {0} at once and {1:.2f} per second".format(self.concurrency(), self.rate()))
+        return delay
+
+    def jitter(self, backoff_seconds: float) -> float:
+        """A random wait of up to backoff_seconds, so requests that failed together don't all retry together"""
+        return self._random.uniform(0, backoff_seconds)
+
+    async def _waitForPause(self):
+        while self._paused_until is not None:
+            remaining = (self._paused_until - self._time.now()).total_seconds()
+            if remaining <= 0:
+                self._paused_until = None
+                break
+            await self._time.sleepAsync(remaining)
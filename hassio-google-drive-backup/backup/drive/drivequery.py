@@ -0,0 +1,92 @@
+import math
+from typing import Dict, List, Optional
+
+from injector import inject, singleton
+
+from ..config import Config, Setting
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Drive only compresses responses for clients that say "gzip" in their user agent, in addition to sending the usual
+# Accept-Encoding header (which aiohttp does already).
+GZIP_USER_AGENT = "hassio-google-drive-backup (gzip)"
+
+# The most results Drive will return in one page of a file listing
+MAX_PAGE_SIZE = 1000
+
+# How much bigger than the last listing to make the next page, so a few new files don't spill onto a second page
+PAGE_SIZE_HEADROOM = 1.25
+
+PURPOSE_BACKUPS = "backups"
+PURPOSE_FOLDERS = "folders"
+
+# Only what's needed to build a DriveBackup and decide whether it can be deleted directly
+BACKUP_FIELDS = "id,name,appProperties,size,capabilities(canDelete,canTrash),driveId"
+
+# Only what FolderFinder needs to pick the most recent usable folder
+FOLDER_FIELDS = "id,name,mimeType,modifiedTime,capabilities(canAddChildren,canListChildren,canDeleteChildren,canRemoveChildren,canTrashChildren),driveId"
+
+
+class DriveQuery():
+    """
+    A file listing in Google Drive, built for one purpose.  Each purpose asks only for the fields it uses and has
+    Drive filter out anything it would otherwise throw away, which keeps listing large folders cheap.
+    """
+
+    def __init__(self, purpose: str, conditions: List[str], fields: str, drive_id: Optional[str] = None):
+        self.purpose = purpose
+        self.conditions = conditions
+        self.fields = fields
+        self.drive_id = drive_id
+
+    @classmethod
+    def backupsIn(cls, parent: str, drive_id: Optional[str] = None) -> 'DriveQuery':
+        # Drive can only match appProperties with a specific value, so checking that a file has the properties a
+        # backup needs still happens after it's listed.
+        return DriveQuery(PURPOSE_BACKUPS, ["'{0}' in parents".format(parent), "trashed = false"], BACKUP_FIELDS, drive_id=drive_id)
+
+    @classmethod
+    def folders(cls) -> 'DriveQuery':
+        return DriveQuery(PURPOSE_FOLDERS, ["mimeType = '{0}'".format(FOLDER_MIME_TYPE), "trashed = false"], FOLDER_FIELDS)
+
+    def q(self) -> str:
+        return " and ".join(self.conditions)
+
+    def params(self, page_size: int, page_token: Optional[str] = None) -> Dict[str, str]:
+        params = {
+            "q": self.q(),
+            "fields": "nextPageToken,files({0})".format(self.fields),
+            "pageSize": str(page_size),
+            "supportsAllDrives": "true",
+            "includeItemsFromAllDrives": "true",
+        }
+        if self.drive_id:
+            # Searching only the shared drive the folder is in is much quicker than searching every drive
+            params["corpora"] = "drive"
+            params["driveId"] = self.drive_id
+        else:
+            params["corpora"] = "allDrives"
+        if page_token:
+            params["pageToken"] = page_token
+        return params
+
+
+@singleton
+class QueryPlanner():
+    """Picks how big a page of results to ask for, based on how many results the same kind of listing had last time"""
+    @inject
+    def __init__(self, config: Config):
+        self._config = config
+        self._last_counts: Dict[str, int] = {}
+
+    def pageSize(self, query: DriveQuery) -> int:
+        configured = self._config.get(Setting.GOOGLE_DRIVE_PAGE_SIZE)
+        if self._config.isExplicit(Setting.GOOGLE_DRIVE_PAGE_SIZE):
+            return configured
+        last_count = self._last_counts.get(query.purpose)
+        if last_count is None:
+            return configured
+        return max(configured, min(MAX_PAGE_SIZE, math.ceil(last_count * PAGE_SIZE_HEADROOM)))
+
+    def observe(self, query: DriveQuery, count: int):
+        self._last_counts[query.purpose] = count
@@ -1,5 +1,6 @@
 import io
 import math
+from asyncio import Task, create_task, shield
 import re
 from typing import Any, Dict, Optional, Union
 from urllib.parse import urlencode
@@ -9,18 +10,22 @@ from aiohttp import ClientSession, ClientTimeout, ClientResponse
 from aiohttp.client_exceptions import ClientResponseError, ServerTimeoutError
 from injector import inject, singleton
 
-from ..util import AsyncHttpGetter
+from ..util import AsyncHttpGetter, DataCache, RateEstimator
 from ..config import Config, Setting
 from ..exceptions import (GoogleCredentialsExpired,
                           GoogleSessionError, LogicError,
-                          ProtocolError, ensureKey, KnownTransient, GoogleTimeoutError, GoogleUnexpectedError)
+                          ProtocolError, ensureKey, KnownTransient, GoogleTimeoutError, GoogleUnexpectedError, GoogleRateLimitError)
 from backup.util import Backoff, TokenBucket
-from backup.file import JsonFileSaver
+from backup.file import JsonFileSaver, AsyncStorage
 from ..time import Time
 from ..logger import getLogger
 from backup.creds import Creds, Exchanger, DriveRequester
 from datetime import timezone
 from ..config.byteformatter import ByteFormatter
+from .drivequery import DriveQuery, QueryPlanner, GZIP_USER_AGENT
+from .drivegovernor import DriveGovernor
+from .chunksizer import (ChunkSizer, AdaptiveChunkSizer, TargetTimeChunkSizer, BASE_CHUNK_SIZE,
+                         CONTROLLER_ADAPTIVE, CONTROLLER_TARGET_TIME)
 
 logger = getLogger(__name__)
 
@@ -32,7 +37,6 @@ DRIVE_SERVICE = "drive"
 
 SELECT_FIELDS = "id,name,appProperties,size,trashed,mimeType,modifiedTime,capabilities,parents,driveId"
 THUMBNAIL_MIME_TYPE = "image/png"
-QUERY_FIELDS = "nextPageToken,files(" + SELECT_FIELDS + ")"
 CREATE_FIELDS = SELECT_FIELDS
 URL_FILES = "/drive/v3/files/"
 URL_ABOUT = "/drive/v3/about"
@@ -41,11 +45,6 @@ PAGE_SIZE = 100
 CHUNK_SIZE = 5 * 262144
 RANGE_RE = re.compile("^bytes=0-\\d+$")
 
-BASE_CHUNK_SIZE = 256 * 1024  # Google's api requires uploading chunks in multiples of 256kb
-
-# During upload, chunks get sized to complete upload after 10s so we can give status updates on progress.
-CHUNK_UPLOAD_TARGET_SECONDS = 10
-
 # don't attempt to resume a session with than this many times consistant failures, just in case something is broken on Google's
 # end so we don't retry the same broken session forever.  Because the addon eventually backs off to doing 1 attempt/hour, this will
 # cause uploads to fail and start over after about 4 days.  This gets reset every time a chunk successfully uploads.
@@ -75,13 +74,15 @@ OOB_CRED_CUTOFF = datetime(2022, 3, 16, tzinfo=timezone.utc)
 @singleton
 class DriveRequests():
     @inject
-    def __init__(self, config: Config, time: Time, drive: DriveRequester, session: ClientSession, exchanger: Exchanger, byte_formatter: ByteFormatter):
+    def __init__(self, config: Config, time: Time, drive: DriveRequester, session: ClientSession, exchanger: Exchanger, byte_formatter: ByteFormatter, data_cache: DataCache, planner: QueryPlanner, governor: DriveGovernor, storage: AsyncStorage):
         self.session = session
+        self._storage = storage
         self.config = config
         self.time = time
         self.drive = drive
         self.creds: Optional[Creds] = None
         self.exchanger: Exchanger = exchanger
+        self._refreshing: Optional[Task] = None
 
         # Between attempts to upload, we keep track of the info needed to resume a resumable upload.
         self.last_attempt_metadata = None
@@ -89,12 +90,18 @@ class DriveRequests():
         self.last_attempt_count = 0
         self.last_attempt_start_time = None
         self.bytes_formatter = byte_formatter
+        self.planner = planner
+        self.governor = governor
+        self.chunk_sizers: Dict[str, ChunkSizer] = {
+            CONTROLLER_ADAPTIVE: AdaptiveChunkSizer(config, time, data_cache),
+            CONTROLLER_TARGET_TIME: TargetTimeChunkSizer(config)
+        }
         self.tryLoadCredentials()
 
     async def _getHeaders(self):
         return {
             "Authorization": "Bearer " + await self.getToken(),
-            "Client-Identifier": self.config.clientIdentifier()
+            "Client-Identifier": await self.config.clientIdentifier()
         }
 
     @property
@@ -114,9 +121,9 @@ class DriveRequests():
     def isCustomCreds(self):
         return self.creds is not None and self.creds.id != self.config.get(Setting.DEFAULT_DRIVE_CLIENT_ID)
 
-    def _getAuthHeaders(self):
+    async def _getAuthHeaders(self):
         return {
-            "Client-Identifier": self.config.clientIdentifier()
+            "Client-Identifier": await self.config.clientIdentifier()
         }
 
     def enabled(self):
@@ -128,6 +135,7 @@ class DriveRequests():
                 "Attempt to use Google Drive before credentials are configured")
 
     def tryLoadCredentials(self):
+        # Only happens while starting up (and in tests), so it reads the file directly
         path = self.config.get(Setting.CREDENTIALS_FILE_PATH)
         if JsonFileSaver.exists(path):
             try:
@@ -135,24 +143,35 @@ class DriveRequests():
             except Exception:
                 pass
 
-    def saveCredentials(self, creds: Creds):
+    async def saveCredentials(self, creds: Creds):
         path = self.config.get(Setting.CREDENTIALS_FILE_PATH)
         if not creds:
-            if JsonFileSaver.exists(path):
-                JsonFileSaver.delete(path)
+            if await self._storage.exists(path):
+                await self._storage.delete(path)
                 self.creds = None
             return
-        JsonFileSaver.write(path, creds.serialize())
-        self.tryLoadCredentials()
+        data = creds.serialize()
+        await self._storage.writeJson(path, data)
+        self.creds = Creds.load(self.time, data)
 
     async def getToken(self, refresh=False):
         if self.creds and not self.creds.is_expired and not refresh:
             return self.creds.access_token
 
-        # refresh the credentials
+        # Only the newest token Google hands out is any good, so everyone who needs one right now shares a refresh
+        # instead of each getting one that invalidates the rest.
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = create_task(self._refresh(), name="Refresh Google Drive credentials")
+        return await shield(self._refreshing)
+
+    async def _refresh(self):
         logger.debug("Requesting refreshed Google Drive credentials")
-        self.creds = await self.exchanger.refresh(self.creds)
-        return self.creds.access_token
+        creds = self.creds
+        refreshed = await self.exchanger.refresh(creds)
+        if self.creds is creds:
+            # Don't clobber credentials that were saved (eg by the user re-authorizing) while the refresh was in flight
+            self.creds = refreshed
+        return refreshed.access_token
 
     async def refreshToken(self):
         await self.getToken(refresh=True)
@@ -178,28 +197,21 @@ class DriveRequests():
                               time=self.time)
         return ret
 
-    async def query(self, query):
-        # SOMEDAY: Add a test for page size, test server support is needed too for continuation tokens
+    async def query(self, query: DriveQuery):
         continuation = None
+        count = 0
+        page_size = self.planner.pageSize(query)
         while True:
-            q = {
-                "q": query,
-                "fields": QUERY_FIELDS,
-                "pageSize": self.config.get(Setting.GOOGLE_DRIVE_PAGE_SIZE),
-                "supportsAllDrives": "true",
-                "includeItemsFromAllDrives": "true",
-                "corpora": "allDrives"
-            }
-            if continuation:
-                q["pageToken"] = continuation
-            async with await self.retryRequest("GET", URL_FILES + "?" + urlencode(q)) as response:
+            async with await self.retryRequest("GET", URL_FILES + "?" + urlencode(query.params(page_size, continuation)), headers={'User-Agent': GZIP_USER_AGENT}) as response:
                 data = await response.json()
-                for item in data['files']:
-                    yield item
-                if "nextPageToken" not in data or len(data['nextPageToken']) <= 0:
-                    break
-                else:
-                    continuation = data['nextPageToken']
+            for item in data['files']:
+                count += 1
+                yield item
+            if "nextPageToken" not in data or len(data['nextPageToken']) <= 0:
+                break
+            else:
+                continuation = data['nextPageToken']
+        self.planner.observe(query, count)
 
     async def update(self, id, update_metadata):
         async with await self.retryRequest("PATCH", URL_FILES + id + "/?supportsAllDrives=true", json=update_metadata):
@@ -218,6 +230,7 @@ class DriveRequests():
         # Upload logic is complicated. See https://developers.google.com/drive/api/v3/manage-uploads#resumable
         total_size = stream.size()
         location = None
+        sizer = self.chunkSizer()
 
         limiter: Union[TokenBucket, None] = None
         if self.config.get(Setting.UPLOAD_LIMIT_BYTES_PER_SECOND) > 0:
@@ -235,7 +248,9 @@ class DriveRequests():
                 "Content-Range": "bytes */{0}".format(total_size)
             }
             try:
+                startTime = self.time.now()
                 async with await self.retryRequest("PUT", self.last_attempt_location, headers=headers, patch_url=False) as initial:
+                    sizer.latency((self.time.now() - startTime).total_seconds())
                     if initial.status == 308:
                         # We can resume the upload, check where it left off
                         if 'Range' in initial.headers:
@@ -274,7 +289,9 @@ class DriveRequests():
                 "X-Upload-Content-Type": mime_type,
                 "X-Upload-Content-Length": str(total_size),
             }
+            startTime = self.time.now()
             async with await self.retryRequest("POST", URL_START_UPLOAD, headers=headers, json=metadata) as initial:
+                sizer.latency((self.time.now() - startTime).total_seconds())
                 # Google returns a url in the header "Location", which is where subsequent requests to upload
                 # the backup's bytes should be sent.  Logic below handles uploading the file bytes in chunks.
                 location = ensureKey(
@@ -289,9 +306,11 @@ class DriveRequests():
         self.last_attempt_metadata = metadata
         self.last_attempt_start_time = self.time.now()
 
-        # Always start with the minimum chunk size and work up from there in case the last attempt
-        # failed due to connectivity errors or ... whatever.
-        current_chunk_size = 1
+        # Start from wherever the chunk sizer left off, it knows whether the last attempt failed due to connectivity
+        # errors or ... whatever.
+        current_chunk_size = sizer.start()
+        rate = RateEstimator(self.time)
+        rate.start()
         while True:
             start = stream.position()
 
@@ -315,15 +334,19 @@ class DriveRequests():
             try:
                 async with await self.retryRequest("PUT", location, headers=headers, data=data, patch_url=False) as partial:
                     # Base the next chunk size on how long it took to send the last chunk.
-                    current_chunk_size = self._getNextChunkSize(
+                    current_chunk_size = sizer.success(
                         current_chunk_size, (self.time.now() - startTime).total_seconds())
 
+                    rate.record(chunk_size)
+
                     # any time a chunk gets uploaded, reset the retry counter.  This lets very flaky connections
                     # complete eventually after enough retrying.
                     self.last_attempt_count = 1
                     yield float(start + chunk_size) / float(total_size)
                     if partial.status == 200 or partial.status == 201:
                         # Upload completed, return the object json
+                        if rate.overall():
+                            logger.debug("Uploaded to Google Drive at {0}/s".format(self.bytes_formatter.format(rate.overall())))
                         self.last_attempt_location = None
                         self.last_attempt_metadata = None
                         yield await self.get((await partial.json())['id'])
@@ -345,24 +368,19 @@ class DriveRequests():
                     # always means the upload session is no good anymore (AFAIK)
                     self.last_attempt_location = None
                     self.last_attempt_metadata = None
+                else:
+                    sizer.failure()
 
                 if e.status == 404:
                     raise GoogleSessionError()
                 else:
                     raise e
+            except (KnownTransient, GoogleTimeoutError):
+                sizer.failure()
+                raise
 
-    def _getNextChunkSize(self, last_chunk_size, last_chunk_seconds):
-        max = math.floor(self.config.get(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES) / BASE_CHUNK_SIZE)
-        if max < 1:
-            max = 1
-        if last_chunk_seconds <= 0:
-            return max
-        next_chunk = math.floor(CHUNK_UPLOAD_TARGET_SECONDS * last_chunk_size / last_chunk_seconds)
-        if next_chunk >= max:
-            return max
-        if next_chunk < 1:
-            return 1
-        return next_chunk
+    def chunkSizer(self) -> ChunkSizer:
+        return self.chunk_sizers.get(self.config.get(Setting.UPLOAD_CHUNK_CONTROLLER), self.chunk_sizers[CONTROLLER_ADAPTIVE])
 
     async def createFolder(self, metadata):
         async with await self.retryRequest("POST", URL_FILES + "?supportsAllDrives=true", json=metadata) as resp:
@@ -374,6 +392,7 @@ class DriveRequests():
             url = self.config.get(Setting.DRIVE_URL) + url
         while True:
             headers_to_use = await self._getHeaders()
+            used_creds = self.creds
             if headers:
                 headers_to_use.update(headers)
             if self.config.get(Setting.TRACE_REQUESTS):
@@ -385,14 +404,25 @@ class DriveRequests():
                     # aiohttp complains if you pass it a large byte object
                     data_to_use = io.BytesIO(data_to_use.getbuffer())
                     data_to_use.seek(0)
-                return await self.drive.request(method, url, headers=headers_to_use, json=json, data=data_to_use)
+                async with self.governor.request():
+                    response = await self.drive.request(method, url, headers=headers_to_use, json=json, data=data_to_use)
+                self.governor.succeeded()
+                return response
             except GoogleCredentialsExpired:
-                # Get fresh credentials, then retry right away.
+                # Get fresh credentials, then retry right away.  Another request turned away with the same credentials
+                # might have already done that, and refreshing again would invalidate the ones it got.
                 logger.debug("Google Drive credentials have expired.  We'll retry with new ones.")
-                await self.refreshToken()
+                if self.creds is used_creds:
+                    await self.refreshToken()
+            except GoogleRateLimitError as e:
+                backoff.backoff(e)
+                # The governor holds back every request to Drive (this one included) until it's time to retry
+                delay = self.governor.rateLimited(backoff.peek(), e.retry_after)
+                logger.error("{0}: we'll retry in {1:.1f} seconds".format(e.message(), delay))
             except KnownTransient as e:
                 backoff.backoff(e)
-                logger.error("{0}: we'll retry in {1} seconds".format(e.message(), backoff.peek()))
-                await self.time.sleepAsync(backoff.peek())
+                delay = self.governor.jitter(backoff.peek())
+                logger.error("{0}: we'll retry in {1:.1f} seconds".format(e.message(), delay))
+                await self.time.sleepAsync(delay)
             except ServerTimeoutError:
                 raise GoogleTimeoutError()
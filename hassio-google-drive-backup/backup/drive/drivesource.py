@@ -1,13 +1,13 @@
 from datetime import datetime
 from io import IOBase
 from asyncio import Event
-from typing import Dict
+from typing import Dict, Optional
 
 from aiohttp import ClientSession
 from aiohttp.client_exceptions import ClientResponseError
 from injector import inject, singleton
 
-from ..util import AsyncHttpGetter, GlobalInfo
+from ..util import AsyncHttpGetter, GlobalInfo, DataCache, TarIndex, KEY_CONTENTS
 from ..config import Config, Setting, CreateOptions
 from ..config.byteformatter import ByteFormatter
 from ..const import SOURCE_GOOGLE_DRIVE
@@ -19,6 +19,7 @@ from ..exceptions import (BackupFolderInaccessible,
 from ..model.backups import (PROP_NOTE, PROP_PROTECTED, PROP_RETAINED, PROP_TYPE, PROP_VERSION)
 from ..time import Time
 from .driverequests import DriveRequests
+from .drivequery import DriveQuery
 from .folderfinder import FolderFinder
 from .thumbnail import THUMBNAIL_IMAGE
 from ..model import BackupDestination, DriveBackup, Backup
@@ -40,7 +41,7 @@ DRIVE_MAX_PROPERTY_LENGTH = 120
 class DriveSource(BackupDestination):
     # SOMEDAY: read backups all in one big batch request, then sort the folder and child addons from that.  Would need to add test verifying the "current" backup directory is used instead of the "latest"
     @inject
-    def __init__(self, config: Config, time: Time, drive_requests: DriveRequests, info: GlobalInfo, session: ClientSession, folderfinder: FolderFinder):
+    def __init__(self, config: Config, time: Time, drive_requests: DriveRequests, info: GlobalInfo, session: ClientSession, folderfinder: FolderFinder, data_cache: DataCache):
         super().__init__()
         self.session = session
         self.config = config
@@ -48,13 +49,14 @@ class DriveSource(BackupDestination):
         self.time = time
         self.folder_finder = folderfinder
         self._info = info
+        self._data_cache = data_cache
         self._uploadedAtLeastOneChunk = False
         self._drive_info = None
         self._cred_trigger = Event()
 
-    def saveCreds(self, creds: Creds) -> None:
+    async def saveCreds(self, creds: Creds) -> None:
         logger.info("Saving new Google Drive credentials")
-        self.drivebackend.saveCredentials(creds)
+        await self.drivebackend.saveCredentials(creds)
         self.trigger()
         self._cred_trigger.set()
 
@@ -127,9 +129,9 @@ class DriveSource(BackupDestination):
             logger.debug("Unable to retrieve Google Drive storage info: " + str(e))
         backups: Dict[str, DriveBackup] = {}
         try:
-            async for child in self.drivebackend.query("'{}' in parents".format(parent)):
+            async for child in self.drivebackend.query(DriveQuery.backupsIn(parent, self.folder_finder.currentDriveId())):
                 properties = child.get('appProperties')
-                if properties and NECESSARY_PROP_KEY_DATE in properties and NECESSARY_PROP_KEY_SLUG in properties and not child['trashed']:
+                if properties and NECESSARY_PROP_KEY_DATE in properties and NECESSARY_PROP_KEY_SLUG in properties:
                     backup = DriveBackup(child)
                     backups[backup.slug()] = backup
         except ClientResponseError as e:
@@ -159,6 +161,8 @@ class DriveSource(BackupDestination):
             logger.info("Trashing '{}' in Google Drive".format(item.name()))
             await self.drivebackend.update(item.id(), {"trashed": True})
         backup.removeSource(self.name())
+        if self._data_cache.backups.get(backup.slug(), {}).pop(KEY_CONTENTS, None) is not None:
+            self._data_cache.makeDirty()
 
     async def save(self, backup: Backup, source: AsyncHttpGetter) -> DriveBackup:
         retain = backup.getOptions() and backup.getOptions().retain_sources.get(self.name(), False)
@@ -256,6 +260,32 @@ class DriveSource(BackupDestination):
         item = self._validateBackup(backup)
         return await self.drivebackend.download(item.id(), item.size())
 
+    def canIndex(self) -> bool:
+        return True
+
+    async def index(self, backup: Backup) -> TarIndex:
+        """Finds what's inside a backup in Google Drive by reading its tar headers, without downloading the rest of it"""
+        item = self._validateBackup(backup)
+        index = self.cachedIndex(backup)
+        if index is not None:
+            return index
+        logger.info("Indexing the contents of '{}' in Google Drive".format(item.name()))
+        stream = await self.read(backup)
+        index = await TarIndex.build(stream.readAt, item.size())
+        self._data_cache.backup(backup.slug())[KEY_CONTENTS] = index.serialize()
+        self._data_cache.makeDirty()
+        await self._data_cache.saveIfDirty()
+        return index
+
+    def cachedIndex(self, backup: Backup) -> Optional[TarIndex]:
+        item: DriveBackup = backup.getSource(self.name())
+        if item is None:
+            return None
+        index = TarIndex.parse(self._data_cache.backups.get(backup.slug(), {}).get(KEY_CONTENTS))
+        if index is None or index.size != item.size():
+            return None
+        return index
+
     async def retain(self, backup: Backup, retain: bool) -> None:
         item = self._validateBackup(backup)
         if item.retained() == retain:
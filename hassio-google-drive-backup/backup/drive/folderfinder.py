@@ -1,6 +1,6 @@
 from datetime import timedelta
-from typing import Any, Dict
-from backup.file import File
+from typing import Any, Dict, Optional
+from backup.file import AsyncStorage
 from aiohttp.client_exceptions import ClientResponseError
 from injector import inject, singleton
 
@@ -9,6 +9,7 @@ from ..exceptions import (BackupFolderInaccessible, BackupFolderMissingError,
                           GoogleDrivePermissionDenied, LogInToGoogleDriveError)
 from ..time import Time
 from .driverequests import DriveRequests
+from .drivequery import DriveQuery
 from ..logger import getLogger
 
 logger = getLogger(__name__)
@@ -21,8 +22,9 @@ FOLDER_CACHE_SECONDS = 60 * 31  # 31 minutes
 @singleton
 class FolderFinder():
     @inject
-    def __init__(self, config: Config, time: Time, drive_requests: DriveRequests):
+    def __init__(self, config: Config, time: Time, drive_requests: DriveRequests, storage: AsyncStorage):
         self.config = config
+        self._storage = storage
         self.drivebackend: DriveRequests = drive_requests
         self.time = time
 
@@ -51,6 +53,12 @@ class FolderFinder():
     def currentIsSharedDrive(self):
         return self._folder_details and self._isSharedDrive(self._folder_details)
 
+    def currentDriveId(self) -> Optional[str]:
+        """The id of the shared drive the backup folder is in, if it's in one and we know which"""
+        if self.currentIsSharedDrive() and self._folder_details.get('id') == self._folderId:
+            return self._folder_details.get('driveId')
+        return None
+
     async def get(self):
         if self._existing_folder and self._use_existing is not None:
             if self._use_existing:
@@ -85,14 +93,14 @@ class FolderFinder():
         else:
             self._folder_details = None
         logger.info("Saving backup folder: " + folder)
-        File.write(self.config.get(Setting.FOLDER_FILE_PATH), folder)
+        await self._storage.write(self.config.get(Setting.FOLDER_FILE_PATH), folder)
         self._folderId = folder
         self._folder_queryied_last = self.time.now()
         self._existing_folder = None
 
-    def reset(self):
-        if File.exists(self.config.get(Setting.FOLDER_FILE_PATH)):
-            File.delete(self.config.get(Setting.FOLDER_FILE_PATH))
+    async def reset(self):
+        if await self._storage.exists(self.config.get(Setting.FOLDER_FILE_PATH)):
+            await self._storage.delete(self.config.get(Setting.FOLDER_FILE_PATH))
         self._folderId = None
         self._folder_queryied_last = None
         self._existing_folder = None
@@ -106,10 +114,10 @@ class FolderFinder():
 
     async def _readFolderId(self) -> str:
         # First, check if we cached the drive folder
-        if not File.exists(self.config.get(Setting.FOLDER_FILE_PATH)):
+        if not await self._storage.exists(self.config.get(Setting.FOLDER_FILE_PATH)):
             raise BackupFolderMissingError()
         else:
-            folder_id: str = File.read(self.config.get(Setting.FOLDER_FILE_PATH)).strip()
+            folder_id: str = (await self._storage.read(self.config.get(Setting.FOLDER_FILE_PATH))).strip()
             if await self._verify(folder_id):
                 return folder_id
             else:
@@ -119,7 +127,7 @@ class FolderFinder():
         folders = []
 
         try:
-            async for child in self.drivebackend.query("mimeType='" + FOLDER_MIME_TYPE + "'"):
+            async for child in self.drivebackend.query(DriveQuery.folders()):
                 if self._isValidFolder(child):
                     folders.append(child)
         except ClientResponseError as e:
@@ -11,7 +11,7 @@ from ..const import (DRIVE_FOLDER_URL_FORMAT, ERROR_BACKUP_FOLDER_INACCESSIBLE,
                      ERROR_NOT_UPLOADABLE, ERROR_PLEASE_WAIT, ERROR_PROTOCOL,
                      ERROR_BACKUP_IN_PROGRESS, ERROR_UPLOAD_FAILED, LOG_IN_TO_DRIVE,
                      SUPERVISOR_PERMISSION, ERROR_GOOGLE_UNEXPECTED, ERROR_SUPERVISOR_TIMEOUT, ERROR_SUPERVISOR_UNEXPECTED, ERROR_SUPERVISOR_FILE_SYSTEM,
-                     UNKONWN_NETWORK_STORAGE, INACTIVE_NETWORK_STORAGE)
+                     UNKONWN_NETWORK_STORAGE, INACTIVE_NETWORK_STORAGE, ERROR_BACKUP_DECRYPT)
 
 
 def ensureKey(key, target, name):
@@ -232,6 +232,10 @@ class GoogleTimeoutError(KnownError):
 
 
 class GoogleRateLimitError(KnownTransient):
+    def __init__(self, retry_after: float = None):
+        # Seconds Google asked us to wait before trying again, if it said
+        self.retry_after = retry_after
+
     def message(self):
         return "The addon has made too many requests to Google Drive, and will back off"
 
@@ -487,3 +491,26 @@ class InactiveNetworkStorageError(KnownError):
         return {
             "storage_name": self.name
         }
+
+
+class BackupDecryptError(KnownError):
+    def __init__(self, name: str, reason: str):
+        self.name = name
+        self.reason = reason
+
+    def message(self):
+        return f"Unable to decrypt '{self.name}' in the backup because {self.reason}."
+
+    def code(self):
+        return ERROR_BACKUP_DECRYPT
+
+    def httpStatus(self):
+        return 400
+
+    def data(self):
+        return {
+            "archive_name": self.name
+        }
+
+    def retrySoon(self):
+        return False
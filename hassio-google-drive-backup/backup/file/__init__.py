@@ -1,2 +1,4 @@
+from .durablefile import DurableFile
 from .jsonfilesaver import JsonFileSaver
-from .file import File
\ No newline at end of file
+from .file import File
+from .asyncstorage import AsyncStorage
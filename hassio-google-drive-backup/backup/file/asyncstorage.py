@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Set
+
+from injector import inject, singleton
+
+from .durablefile import DurableFile
+from .jsonfilesaver import JsonFileSaver
+from ..logger import getLogger
+
+logger = getLogger(__name__)
+
+# How many state files can be read or written at once
+STORAGE_THREADS = 2
+
+
+class _PendingWrite():
+    def __init__(self, write: Callable[[], None], future: asyncio.Future):
+        self.write = write
+        self.future = future
+
+
+@singleton
+class AsyncStorage():
+    """
+    Reads and writes the addon's state files (through DurableFile) on worker threads, so the event loop never waits on
+    the disk.  Writing to a disk that's slow or failing can take seconds, especially since every write is synced.
+
+    Writes to the same file happen in the order they were asked for.  A write asked for while an earlier one to the same
+    file is still waiting its turn replaces it, so many changes in quick succession end up as one or two writes, and
+    everyone who asked gets told when the write with their change in it is on disk.  Reads wait for any write to the
+    same file that's already been asked for.
+    """
+    @inject
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=STORAGE_THREADS, thread_name_prefix="Storage")
+        # Checking free space gets its own thread, since the backup directory may be a network share that hangs
+        self._stats_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Storage stats")
+        self._pending: Dict[str, _PendingWrite] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # The event loop only keeps weak references to tasks, so the writes in progress are kept here until they finish
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def read(self, path: str) -> str:
+        return await self._read(path, DurableFile.read, path)
+
+    async def readJson(self, path: str) -> Any:
+        return await self._read(path, JsonFileSaver.read, path)
+
+    async def exists(self, path: str) -> bool:
+        return await self._read(path, DurableFile.exists, path)
+
+    def write(self, path: str, data: str) -> asyncio.Future:
+        """Writes a file, returning a future that completes once it's on disk"""
+        return self._submit(path, lambda: DurableFile.write(path, data))
+
+    def writeJson(self, path: str, data: Any) -> asyncio.Future:
+        # Serialized now rather than on the worker thread, since whoever owns the data can keep changing it
+        serialized = json.dumps(data, indent=4)
+        return self._submit(path, lambda: DurableFile.write(path, serialized))
+
+    def delete(self, path: str) -> asyncio.Future:
+        return self._submit(path, lambda: DurableFile.delete(path))
+
+    def writeInBackground(self, future: asyncio.Future, description: str):
+        """For writes nobody waits on, logs it if they fail"""
+        def check(done: asyncio.Future):
+            if not done.cancelled() and done.exception() is not None:
+                logger.error("Unable to save " + description)
+                logger.printException(done.exception())
+        future.add_done_callback(check)
+
+    async def statvfs(self, path: str) -> os.statvfs_result:
+        return await asyncio.get_running_loop().run_in_executor(self._stats_executor, os.statvfs, path)
+
+    async def flush(self):
+        """Waits for every write that's been asked for to finish"""
+        while len(self._pending) > 0:
+            await asyncio.gather(*[asyncio.shield(pending.future) for pending in self._pending.values()], return_exceptions=True)
+        for lock in list(self._locks.values()):
+            async with lock:
+                pass
+
+    async def _read(self, path: str, read: Callable, *args):
+        if path in self._pending:
+            await asyncio.gather(asyncio.shield(self._pending[path].future), return_exceptions=True)
+        async with self._lock(path):
+            return await asyncio.get_running_loop().run_in_executor(self._executor, read, *args)
+
+    def _submit(self, path: str, write: Callable[[], None]) -> asyncio.Future:
+        pending = self._pending.get(path)
+        if pending is not None:
+            pending.write = write
+        else:
+            pending = _PendingWrite(write, asyncio.get_running_loop().create_future())
+            self._pending[path] = pending
+            task = asyncio.create_task(self._flush(path, pending), name="Write " + path)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return asyncio.shield(pending.future)
+
+    async def _flush(self, path: str, pending: _PendingWrite):
+        async with self._lock(path):
+            # Any write asked for after this point has to wait for this one
+            del self._pending[path]
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, pending.write)
+                pending.future.set_result(None)
+            except Exception as e:
+                pending.future.set_exception(e)
+
+    def _lock(self, path: str) -> asyncio.Lock:
+        if path not in self._locks:
+            self._locks[path] = asyncio.Lock()
+        return self._locks[path]
@@ -0,0 +1,140 @@
+import os
+import zlib
+from os.path import exists, dirname, abspath
+from typing import Callable, Any
+from backup.logger import getLogger
+
+logger = getLogger(__name__)
+
+RECORD_MAGIC = b"#HGDB1"
+ENCODING = "utf-8"
+
+
+class CorruptRecordError(ValueError):
+    pass
+
+
+class DurableFile:
+    """
+    The envrionment Home Assistant runs in is notorious for disk-related failures, often from running completely out of space and SD card corruption.
+    Both of these can leave the addon in a state where the files it need to run are either corrupted or empty.  This class is the one place the
+    addon's own state files get written, and it mitigates those failures by:
+    - Writing new contents to a temporary file, fsync'ing it and then atomically renaming it over the real path.  A power failure or a full disk
+      leaves either the old or the new contents in place, never a truncated mix of the two.
+    - Keeping the previous generation of the file at path + ".backup".  It gets there by a rename rather than a second write, so we keep two
+      copies on disk for half the write I/O of writing everything twice.  A previous generation that's corrupt gets overwritten instead, so
+      it never replaces a good recovery copy.
+    - Prefixing the contents with a header line holding a crc32 and length, so a file mangled by SD card corruption is detected on read
+      instead of being handed to the caller.
+    Files written by older versions of the addon (no header) are still read as-is, and get converted the next time they're written.  Older
+    versions can't read the header though, see "Downgrading" in DOCS.md.
+    """
+    @classmethod
+    def read(cls, path: str, parse: Callable[[str], Any] = lambda data: data):
+        """
+        Reads the contents of path, falling back to the previous generation in path + ".backup" if the primary copy is missing, fails its
+        checksum or can't be parsed by parse(), which should raise a ValueError for malformed contents.
+        """
+        first_error = None
+        for candidate in [path, DurableFile._backup_path(path)]:
+            try:
+                return parse(DurableFile._decode(DurableFile._readBytes(candidate)))
+            except FileNotFoundError as e:
+                if candidate == path:
+                    logger.error(f"The configuration file {path} was not found.  This could be caused by hard drive corruption or an unstable power event.  We'll attempt to load from a backup file instead.")
+                first_error = first_error or e
+            except ValueError as e:
+                logger.error(f"The configuration file {candidate} had an invalid format.  This could be caused by hard drive corruption or an unstable power event.  We'll attempt to load from a backup file instead.")
+                first_error = first_error or e
+        logger.error("Unable to locate a valid backup path")
+        raise first_error
+
+    @classmethod
+    def write(cls, path: str, data: str):
+        temp = DurableFile._temp_path(path)
+        with open(temp, "wb") as f:
+            f.write(DurableFile._encode(data))
+            f.flush()
+            os.fsync(f.fileno())
+        if DurableFile._verifies(path):
+            # Keep the last good generation around as the recovery copy.
+            os.replace(path, DurableFile._backup_path(path))
+        os.replace(temp, path)
+        DurableFile._syncDirectory(path)
+
+    @classmethod
+    def exists(cls, path: str):
+        if exists(path):
+            return True
+        return exists(DurableFile._backup_path(path))
+
+    @classmethod
+    def delete(cls, path: str):
+        for candidate in [DurableFile._backup_path(path), DurableFile._temp_path(path), path]:
+            if exists(candidate):
+                os.remove(candidate)
+
+    @classmethod
+    def _verifies(cls, path: str) -> bool:
+        """Whether path holds a good copy, since rotating a corrupt one in would push out the recovery copy that's left"""
+        try:
+            DurableFile._decode(DurableFile._readBytes(path))
+            return True
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            logger.error(f"The configuration file {path} had an invalid format, so it's being replaced without becoming the backup copy.")
+            return False
+
+    @classmethod
+    def _readBytes(cls, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @classmethod
+    def _encode(cls, data: str) -> bytes:
+        payload = data.encode(ENCODING)
+        header = RECORD_MAGIC + " {0:08x} {1}\n".format(zlib.crc32(payload), len(payload)).encode(ENCODING)
+        return header + payload
+
+    @classmethod
+    def _decode(cls, raw: bytes) -> str:
+        if len(raw) == 0:
+            raise CorruptRecordError("File is empty")
+        if not raw.startswith(RECORD_MAGIC):
+            # Written by an older version of the addon, so there is no checksum to verify.
+            return raw.decode(ENCODING)
+        header, sep, payload = raw.partition(b"\n")
+        parts = header.split(b" ")
+        if not sep or len(parts) != 3:
+            raise CorruptRecordError("Malformed record header")
+        try:
+            checksum = int(parts[1], 16)
+            length = int(parts[2])
+        except ValueError:
+            raise CorruptRecordError("Malformed record header")
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            raise CorruptRecordError("Record checksum doesn't match its contents")
+        return payload.decode(ENCODING)
+
+    @classmethod
+    def _syncDirectory(cls, path: str):
+        # Make the renames durable too.  Not every platform/filesystem supports opening a directory, so this is best-effort.
+        try:
+            fd = os.open(dirname(abspath(path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    @classmethod
+    def _backup_path(cls, path: str):
+        return path + ".backup"
+
+    @classmethod
+    def _temp_path(cls, path: str):
+        return path + ".tmp"
@@ -1,13 +1,15 @@
 from backup.config import Config, Setting
-from backup.file import JsonFileSaver
+from backup.file import AsyncStorage
 from backup.worker import Worker
 from backup.exceptions import SupervisorFileSystemError
+from backup.util import GlobalInfo
 from .harequests import HaRequests
 from injector import inject, singleton
 from backup.time import Time
 from backup.logger import getLogger
-from datetime import timedelta
-from asyncio import Lock
+from datetime import datetime, timedelta
+from asyncio import Lock, gather
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 LOGGER = getLogger(__name__)
 CHECK_DURATION = timedelta(seconds=60)
@@ -15,32 +17,45 @@ ATTR_STATE = "state"
 ATTR_WATCHDOG = "watchdog"
 ATTR_NAME = "name"
 STATE_STOPPED = "stopped"
+STATE_STARTED = "started"
 
 STATES_STARTED = ["started", "startup"]
 STATES_STOPPED = ["stopped", "unknown", "error"]
 
+# How long to wait for add-ons to finish stopping or starting, altogether, before moving on without them
+STATE_WAIT_TIMEOUT = timedelta(minutes=2)
+STATE_POLL_INTERVAL = timedelta(seconds=1)
+
 
 @singleton
 class AddonStopper(Worker):
     @inject
-    def __init__(self, config: Config, requests: HaRequests, time: Time):
+    def __init__(self, config: Config, requests: HaRequests, time: Time, info: GlobalInfo, storage: AsyncStorage):
         super().__init__("StartandStopTimer", self.check, time, 10)
         self.requests = requests
         self.config = config
         self.time = time
+        self._info = info
+        self._storage = storage
         self.must_start = set()
         self.must_enable_watchdog = set()
         self.stop_start_check_time = time.now()
         self._backing_up = False
         self.allow_run = False
         self.lock = Lock()
+        # Checks take turns, but only hold the lock above while they're making changes, not while waiting on add-ons
+        self._check_lock = Lock()
+        # Add-ons that were started but never came up, which the add-ons depending on them wait for
+        self._not_up: Set[str] = set()
+        self._stopped_at: Dict[str, datetime] = {}
+        self.downtime: Dict[str, float] = {}
 
     async def start(self, schedule=True):
         if schedule:
             await super().start()
         path = self.config.get(Setting.STOP_ADDON_STATE_PATH)
-        if JsonFileSaver.exists(path):
-            data = JsonFileSaver.read(path)
+        if await self._storage.exists(path):
+            data = await self._storage.readJson(path)
             self.must_enable_watchdog = set(data.get("watchdog", []))
             self.must_start = set(data.get("start", []))
 
@@ -58,32 +73,46 @@ class AddonStopper(Worker):
     async def stopAddons(self, self_slug):
         async with self.lock:
             self._backing_up = True
+            slugs = []
             for slug in self.config.get(Setting.STOP_ADDONS).split(','):
                 if slug == self_slug or len(slug) == 0:
                     # Don't ask the supervisor to stop yourself.  That would be BAD.
                     continue
+                slugs.append(slug)
+
+            # Add-ons get stopped after everything that depends on them
+            give_up = self.time.now() + STATE_WAIT_TIMEOUT
+            for group in reversed(self._startOrder(slugs)):
+                await gather(*[self._stopAddon(slug, give_up) for slug in group])
+            await self._save()
+
+    async def _stopAddon(self, slug, give_up: datetime):
+        try:
+            info = await self.requests.getAddonInfo(slug)
+            if info.get(ATTR_STATE, None) in STATES_STARTED:
+                name = info.get(ATTR_NAME, slug)
+                if info.get(ATTR_WATCHDOG, False):
+                    try:
+                        LOGGER.info("Temporarily disabling watchdog for addon '%s'", name)
+                        await self.requests.updateAddonOptions(slug, {ATTR_WATCHDOG: False})
+                        self.must_enable_watchdog.add(slug)
+                    except Exception as e:
+                        LOGGER.error("Unable to disable watchdog for addon {0}".format(name))
+                        LOGGER.printException(e)
                 try:
-                    info = await self.requests.getAddonInfo(slug)
-                    if info.get(ATTR_STATE, None) in STATES_STARTED:
-                        if info.get(ATTR_WATCHDOG, False):
-                            try:
-                                LOGGER.info("Temporarily disabling watchdog for addon '%s'", info.get(ATTR_NAME, slug))
-                                await self.requests.updateAddonOptions(slug, {ATTR_WATCHDOG: False})
-                                self.must_enable_watchdog.add(slug)
-                            except Exception as e:
-                                LOGGER.error("Unable to disable watchdog for addon {0}".format(info.get(ATTR_NAME, slug)))
-                                LOGGER.printException(e)
-                        try:
-                            LOGGER.info("Stopping addon '%s'", info.get(ATTR_NAME, slug))
-                            await self.requests.stopAddon(slug)
-                            self.must_start.add(slug)
-                        except Exception as e:
-                            LOGGER.error("Unable to stop addon '{0}'".format(info.get(ATTR_NAME, slug)))
-                            LOGGER.printException(e)
+                    LOGGER.info("Stopping addon '%s'", name)
+                    self._stopped_at[slug] = self.time.now()
+                    await self.requests.stopAddon(slug)
+                    self.must_start.add(slug)
                 except Exception as e:
-                    LOGGER.error("Unable to lookup info for addon '{0}', please check your configuration".format(slug))
+                    self._stopped_at.pop(slug, None)
+                    LOGGER.error("Unable to stop addon '{0}'".format(name))
                     LOGGER.printException(e)
-            self._save()
+                    return
+                await self._waitForState(slug, name, STATES_STOPPED, give_up)
+        except Exception as e:
+            LOGGER.error("Unable to lookup info for addon '{0}', please check your configuration".format(slug))
+            LOGGER.printException(e)
 
     async def startAddons(self):
         self._backing_up = False
@@ -91,56 +120,168 @@ class AddonStopper(Worker):
         await self.check()
 
     async def check(self):
-        async with self.lock:
-            if self._backing_up:
-                return
-            if not self.allow_run:
-                return
+        async with self._check_lock:
+            give_up = self.time.now() + STATE_WAIT_TIMEOUT
+            async with self.lock:
+                if self._backing_up:
+                    return
+                if not self.allow_run:
+                    return
+                await self._checkNotUp()
+                order = self._startOrder(self.must_start)
+
+            # Add-ons get started once everything they depend on is up and running
             changes = False
-            if len(self.must_start) > 0:
-                for slug in list(self.must_start):
-                    try:
-                        info = await self.requests.getAddonInfo(slug)
-                        state = info.get(ATTR_STATE, None)
-                        if info.get(ATTR_STATE, None) in STATES_STOPPED:
-                            LOGGER.info("Starting addon '%s'", info.get(ATTR_NAME, slug))
-                            await self.requests.startAddon(slug)
-                            self.must_start.remove(slug)
-                            changes = True
-                        elif info.get(ATTR_STATE, None) in STATES_STARTED and self.time.now() > self.stop_start_check_time:
-                            # Give up on restarting it, looks like it was never stopped
-                            self.must_start.remove(slug)
-                            changes = True
+            dependencies = self._dependencies()
+            held: Set[str] = set()
+            for group in order:
+                async with self.lock:
+                    if self._backing_up:
+                        # Add-ons are getting stopped for a backup, which starts them again once it's done
+                        break
+                    ready = []
+                    for slug in group:
+                        missing = dependencies.get(slug, set()).intersection(self._not_up.union(held))
+                        if len(missing) > 0:
+                            LOGGER.debug("Not starting addon '%s' yet, because '%s' it depends on isn't running", slug, "', '".join(sorted(missing)))
+                            held.add(slug)
                         else:
-                            LOGGER.error(f"Addon '{info.get(ATTR_NAME, slug)}' had unrecognized state '{state}'.  The addon will most likely be unable to automatically restart this addon.", )
-                    except Exception as e:
-                        LOGGER.error("Unable to start addon '%s'", slug)
-                        LOGGER.printException(e)
-                        self.must_start.remove(slug)
+                            ready.append(slug)
+                    results = await gather(*[self._startAddon(slug) for slug in ready])
+                if any(done for done, _ in results):
+                    changes = True
+
+                # Waiting on add-ons to come up happens without the lock, so a backup can still stop them meanwhile
+                starting = [(slug, name) for slug, (_, name) in zip(ready, results) if name is not None]
+                started = await gather(*[self._waitForState(slug, name, [STATE_STARTED], give_up) for slug, name in starting])
+                for (slug, name), up in zip(starting, started):
+                    if up:
+                        self._recordDowntime(slug, name)
+                    else:
+                        LOGGER.warning("Addon '%s' didn't come up, so addons that depend on it won't be started until it does", name)
+                        self._not_up.add(slug)
+
+            async with self.lock:
+                if len(self.must_enable_watchdog) > 0 and not self._backing_up:
+                    for slug in list(self.must_enable_watchdog):
+                        if slug in self.must_start:
+                            # Wait until we're done trying to start the addon before re-enabling the watchdog, otherwise the supervisor complains
+                            continue
+                        try:
+                            info = await self.requests.getAddonInfo(slug)
+                            if not info.get(ATTR_WATCHDOG, True):
+                                LOGGER.info("Re-enabling watchdog for addon '%s'", info.get(ATTR_NAME, slug))
+                                await self.requests.updateAddonOptions(slug, {ATTR_WATCHDOG: True})
+                        except Exception as e:
+                            LOGGER.error("Unable to re-enable watchdog for addon '%s'", slug)
+                            LOGGER.printException(e)
+                        self.must_enable_watchdog.remove(slug)
                         changes = True
+                if changes:
+                    await self._save()
 
-            if len(self.must_enable_watchdog) > 0:
-                for slug in list(self.must_enable_watchdog):
-                    if slug in self.must_start:
-                        # Wait until we're done trying to start the addon before re-enabling the watchdog, otherwise the supervisor complains
-                        continue
-                    try:
-                        info = await self.requests.getAddonInfo(slug)
-                        if not info.get(ATTR_WATCHDOG, True):
-                            LOGGER.info("Re-enabling watchdog for addon '%s'", info.get(ATTR_NAME, slug))
-                            await self.requests.updateAddonOptions(slug, {ATTR_WATCHDOG: True})
-                    except Exception as e:
-                        LOGGER.error("Unable to re-enable watchdog for addon '%s'", slug)
-                        LOGGER.printException(e)
-                    self.must_enable_watchdog.remove(slug)
-                    changes = True
-            if changes:
-                self._save()
+    async def _checkNotUp(self):
+        """Looks at whether the add-ons that didn't come up before have since, as long as something is waiting on them"""
+        dependencies = self._dependencies()
+        waiting = set().union(*[dependencies.get(slug, set()) for slug in self.must_start])
+        for slug in list(self._not_up):
+            if slug not in waiting:
+                self._not_up.discard(slug)
+                continue
+            try:
+                info = await self.requests.getAddonInfo(slug)
+            except Exception as e:
+                LOGGER.error("Unable to check the state of addon '%s'", slug)
+                LOGGER.printException(e)
+                continue
+            if info.get(ATTR_STATE, None) == STATE_STARTED:
+                self._not_up.discard(slug)
+                self._recordDowntime(slug, info.get(ATTR_NAME, slug))
+
+    async def _startAddon(self, slug) -> Tuple[bool, Optional[str]]:
+        """
+        Starts the addon if its stopped, returning whether it no longer needs to be started and, if it was just asked
+        to start, its name so it can be waited on.
+        """
+        try:
+            info = await self.requests.getAddonInfo(slug)
+            state = info.get(ATTR_STATE, None)
+            name = info.get(ATTR_NAME, slug)
+            if state in STATES_STOPPED:
+                LOGGER.info("Starting addon '%s'", name)
+                await self.requests.startAddon(slug)
+                self.must_start.discard(slug)
+                return True, name
+            elif state in STATES_STARTED and self.time.now() > self.stop_start_check_time:
+                # Give up on restarting it, looks like it was never stopped
+                self.must_start.discard(slug)
+                self._stopped_at.pop(slug, None)
+                return True, None
+            else:
+                LOGGER.error(f"Addon '{name}' had unrecognized state '{state}'.  The addon will most likely be unable to automatically restart this addon.", )
+                return False, None
+        except Exception as e:
+            LOGGER.error("Unable to start addon '%s'", slug)
+            LOGGER.printException(e)
+            self.must_start.discard(slug)
+            self._stopped_at.pop(slug, None)
+            return True, None
+
+    async def _waitForState(self, slug, name, states: List[str], give_up: datetime) -> bool:
+        """Polls the addon until its in one of the given states, returning False if it didn't get there before give_up"""
+        while True:
+            try:
+                state = (await self.requests.getAddonInfo(slug)).get(ATTR_STATE, None)
+            except Exception as e:
+                LOGGER.error("Unable to check the state of addon '%s'", name)
+                LOGGER.printException(e)
+                return False
+            if state in states:
+                return True
+            if self.time.now() >= give_up:
+                LOGGER.warning("Addon '%s' is still in state '%s' after %d seconds, moving on without it", name, state, STATE_WAIT_TIMEOUT.total_seconds())
+                return False
+            await self.time.sleepAsync(STATE_POLL_INTERVAL.total_seconds())
+
+    def _recordDowntime(self, slug, name):
+        stopped_at = self._stopped_at.pop(slug, None)
+        if stopped_at is None:
+            # Stopped before the addon last restarted, so we don't know for how long
+            return
+        self.downtime[slug] = (self.time.now() - stopped_at).total_seconds()
+        LOGGER.info("Addon '%s' is running again after being stopped for %d seconds", name, self.downtime[slug])
+        self._info.addDebugInfo("addon_downtime_seconds", dict(self.downtime))
+
+    def _dependencies(self) -> Dict[str, Set[str]]:
+        dependencies: Dict[str, Set[str]] = {}
+        for pair in self.config.get(Setting.STOP_ADDON_DEPENDENCIES).split(','):
+            if ':' not in pair:
+                continue
+            addon, dependency = [part.strip() for part in pair.split(':', 1)]
+            dependencies.setdefault(addon, set()).add(dependency)
+        return dependencies
+
+    def _startOrder(self, slugs: Iterable[str]) -> List[List[str]]:
+        """
+        Groups the addons into the order they should be started in, where every addon comes after the ones it depends on
+        and the addons in each group can be started at the same time.  Stopping them goes in the reverse order.
+        """
+        dependencies = self._dependencies()
+        remaining = set(slugs)
+        order = []
+        while len(remaining) > 0:
+            group = sorted(slug for slug in remaining if len(dependencies.get(slug, set()).intersection(remaining)) == 0)
+            if len(group) == 0:
+                LOGGER.warning("The addons in '%s' depend on each other in a cycle, so they'll be handled all at once", Setting.STOP_ADDON_DEPENDENCIES.value)
+                group = sorted(remaining)
+            order.append(group)
+            remaining.difference_update(group)
+        return order
 
-    def _save(self):
+    async def _save(self):
         try:
             path = self.config.get(Setting.STOP_ADDON_STATE_PATH)
             data = {"start": list(self.must_start), "watchdog": list(self.must_enable_watchdog)}
-            JsonFileSaver.write(path, data)
+            await self._storage.writeJson(path, data)
         except OSError:
             raise SupervisorFileSystemError()
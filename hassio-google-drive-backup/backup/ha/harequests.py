@@ -1,5 +1,5 @@
 import os
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from aiohttp import ClientSession, ClientTimeout
 from aiohttp.client_exceptions import ClientResponseError, ClientConnectorError
@@ -122,10 +122,11 @@ class HaRequests():
         await self._postHassioData(url, {})
 
     @supervisor_call
-    async def backup(self, slug):
-        if slug in self.cache:
+    async def backup(self, slug, use_cache=True):
+        if slug in self.cache and use_cache:
             info = self.cache[slug]
         else:
+            self.cache.pop(slug, None)
             info = await self._getHassioData(self.getSupervisorURL().with_path("{1}/{0}/info".format(slug, self._getBackupPath())))
             self.cache[slug] = info
         return HABackup(info, self._data_cache, self.config, self.config.isRetained(slug))
@@ -173,6 +174,10 @@ class HaRequests():
             self._super_version = Version.parse(info['version'])
         return info
 
+    @supervisor_call
+    async def jobs(self) -> Dict[str, Any]:
+        return await self._getHassioData(self.getSupervisorURL().with_path("jobs/info"))
+
     @supervisor_call
     async def mountInfo(self):
         if self.supportsMountInfo:
@@ -193,6 +198,18 @@ class HaRequests():
         else:
             await self._postHassioData(url, {})
 
+    @supervisor_call
+    async def restorePartial(self, slug: str, addons: List[str], folders: List[str], homeassistant: bool, password: str = None) -> None:
+        url = self.getSupervisorURL().with_path("{1}/{0}/restore/partial".format(slug, self._getBackupPath()))
+        data = {
+            'homeassistant': homeassistant,
+            'addons': addons,
+            'folders': folders
+        }
+        if password:
+            data['password'] = password
+        await self._postHassioData(url, data, timeout=ClientTimeout(total=self.config.get(Setting.PENDING_BACKUP_TIMEOUT_SECONDS)))
+
     @supervisor_call
     async def download(self, slug) -> AsyncHttpGetter:
         url = self.getSupervisorURL().with_path("{1}/{0}/download".format(slug, self._getBackupPath()))
@@ -1,17 +1,17 @@
 import asyncio
 import aiohttp
-from datetime import timedelta
+from datetime import datetime, timedelta
 from io import IOBase
 from threading import Lock, Thread
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, Iterable, List, Optional, Any, Union
 
 from aiohttp.client_exceptions import ClientResponseError
 from injector import inject, singleton
 
-from backup.util import AsyncHttpGetter, GlobalInfo, Estimator, DataCache, KEY_NOTE, KEY_LAST_SEEN, KEY_PENDING, KEY_NAME, KEY_CREATED, KEY_I_MADE_THIS, KEY_IGNORE
+from backup.util import AsyncHttpGetter, PartialTar, GlobalInfo, Estimator, DataCache, KEY_NOTE, KEY_LAST_SEEN, KEY_PENDING, KEY_NAME, KEY_CREATED, KEY_I_MADE_THIS, KEY_IGNORE
 from ..config import Config, Setting, CreateOptions, Startable, Version
 from ..const import SOURCE_HA
-from ..model import BackupSource, AbstractBackup, HABackup, Backup
+from ..model import BackupSource, BackupDelta, AbstractBackup, HABackup, Backup
 from ..exceptions import (LogicError, BackupInProgress, UnknownNetworkStorageError, InactiveNetworkStorageError,
                           UploadFailed, ensureKey)
 from .harequests import HaRequests
@@ -24,6 +24,38 @@ from .addon_stopper import LOGGER, AddonStopper
 
 logger: StandardLogger = getLogger(__name__)
 
+# The kinds of supervisor metadata HaSource keeps, and how long each is reused before it gets queried again.  These
+# rarely change, and the cached copies also get dropped when we see something that changes them (config updates,
+# add-ons being stopped or updated, the supervisor updating itself, etc).
+INFO_SELF = "self_info"
+INFO_HOST = "host_info"
+INFO_HA = "ha_info"
+INFO_SUPERVISOR = "super_info"
+INFO_MOUNTS = "mount_info"
+INFO_ADDONS = "addons"
+INFO_TTL = {
+    INFO_SELF: timedelta(hours=1),
+    INFO_HOST: timedelta(minutes=30),
+    INFO_HA: timedelta(hours=1),
+    INFO_SUPERVISOR: timedelta(minutes=10),
+    INFO_MOUNTS: timedelta(minutes=5),
+    INFO_ADDONS: timedelta(minutes=10),
+}
+
+# The supervisor jobs that make backups, and how often to check on their progress while one is pending.
+BACKUP_JOB_NAMES = ["backup_manager_full_backup", "backup_manager_partial_backup"]
+JOB_POLL_INTERVAL = timedelta(seconds=5)
+
+# Each chain is queried concurrently with the others.  Mount info comes after supervisor info because whether it
+# can be queried at all depends on the supervisor's version.
+INFO_CHAINS = [
+    [INFO_SELF],
+    [INFO_HOST],
+    [INFO_HA],
+    [INFO_SUPERVISOR, INFO_MOUNTS],
+    [INFO_ADDONS],
+]
+
 class PendingBackup(AbstractBackup):
     def __init__(self, backupType, protected, options: CreateOptions, request_info, config, time):
         super().__init__(
@@ -52,6 +84,10 @@ class PendingBackup(AbstractBackup):
         self._pending_subverted = False
         self._start_time = time.now()
         self._logs = None
+        self._job_id = None
+        self._job_done = False
+        self._progress = None
+        self._stage = None
 
     def considerForPurge(self) -> bool:
         return False
@@ -92,8 +128,28 @@ class PendingBackup(AbstractBackup):
             return "Created"
         if self._failed:
             return "Failed!"
+        if self._progress is not None:
+            return "Pending {0}%".format(int(self._progress))
         return "Pending"
 
+    def updateJob(self, job_id, progress, stage, done):
+        self._job_id = job_id
+        self._progress = progress
+        self._stage = stage
+        self._job_done = done
+
+    def jobId(self):
+        return self._job_id
+
+    def jobDone(self):
+        return self._job_done
+
+    def progress(self):
+        return self._progress
+
+    def stage(self):
+        return self._stage
+
     def raiseIfNeeded(self):
         if self.isFailed():
             raise self._exception
@@ -156,11 +212,18 @@ class HaSource(BackupSource[HABackup], Startable):
         self.estimator = estimator
         self._addons = {}
         self._changes_from_last_query = False
+        self._listed_backups: Optional[Dict[str, HABackup]] = None
+        self._info_fetched: Dict[str, datetime] = {}
+        self._applying_options = False
+        self.config.subscribe(self._configUpdated)
 
         # This lock should be used for _ANYTHING_ that interacts with self._pending_backup
         self._pending_backup_lock = asyncio.Lock()
         self.pending_backup: Optional[PendingBackup] = None
         self._pending_backup_task = None
+        self._job_task = None
+        self._next_job_poll = time.now()
+        self._jobs_supported = True
         self._initialized = False
 
     def isInitialized(self):
@@ -170,8 +233,59 @@ class HaSource(BackupSource[HABackup], Startable):
         pending = self.pending_backup
         if pending and pending.isStale():
             self.trigger()
+        if pending and self._shouldPollJob(pending):
+            self._next_job_poll = self.time.now() + JOB_POLL_INTERVAL
+            self._job_task = asyncio.create_task(self._pollJob(pending), name="Backup job poller")
         return await super().check()
 
+    def _shouldPollJob(self, pending: PendingBackup):
+        if not self._jobs_supported or pending.isComplete() or pending.isFailed() or pending.jobDone():
+            return False
+        if self._job_task is not None and not self._job_task.done():
+            return False
+        return self.time.now() >= self._next_job_poll
+
+    async def _pollJob(self, pending: PendingBackup):
+        """
+        Follows the supervisor's job for the pending backup, to report its progress and sync as soon as its done
+        rather than waiting for the backup request to return (which it never will if someone else requested it).
+        """
+        try:
+            jobs = ensureKey("jobs", await self.harequests.jobs(), "supervisor's job info")
+        except ClientResponseError as e:
+            if e.status in [400, 404]:
+                logger.debug("The supervisor doesn't have a jobs API, so backup progress won't be reported")
+                self._jobs_supported = False
+            return
+        except Exception as e:
+            logger.debug("Unable to query the supervisor's jobs")
+            logger.debug(logger.formatException(e))
+            return
+
+        job = self._findBackupJob(jobs, pending.jobId())
+        if job is None:
+            if pending.jobId() is not None:
+                # The job we were following is gone, so the backup must have finished.
+                pending.updateJob(pending.jobId(), pending.progress(), pending.stage(), True)
+                self.trigger()
+            return
+        pending.updateJob(job.get('uuid'), job.get('progress'), job.get('stage'), job.get('done', False))
+        if pending.jobDone():
+            if len(job.get('errors', [])) > 0:
+                logger.warning("The supervisor reported errors while making the backup: {0}".format(job.get('errors')))
+            else:
+                logger.info("The supervisor finished making the backup")
+            self.trigger()
+
+    def _findBackupJob(self, jobs: List[Dict[str, Any]], job_id) -> Optional[Dict[str, Any]]:
+        for job in jobs:
+            if job_id is not None:
+                if job.get('uuid') == job_id:
+                    return job
+            elif job.get('name') in BACKUP_JOB_NAMES and not job.get('done', False):
+                return job
+        return None
+
     def icon(self) -> str:
         return "home-assistant"
 
@@ -199,8 +313,14 @@ class HaSource(BackupSource[HABackup], Startable):
             options.name_template = self.config.get(Setting.BACKUP_NAME)
 
         # Build the backup request json, get type, etc
-        request, type_name, protected = self._buildBackupInfo(
-            options)
+        try:
+            request, type_name, protected = self._buildBackupInfo(
+                options)
+        except (InactiveNetworkStorageError, UnknownNetworkStorageError):
+            # Mounts come and go more often than the rest, so make sure the cached copy isn't what's wrong.
+            await self._refreshInfo([INFO_MOUNTS], force=True)
+            request, type_name, protected = self._buildBackupInfo(
+                options)
 
         async with self._pending_backup_lock:
             # Check if a backup is already in progress
@@ -250,9 +370,10 @@ class HaSource(BackupSource[HABackup], Startable):
             pass
 
     async def stop(self):
-        if self._pending_backup_task:
-            self._pending_backup_task.cancel()
-            await asyncio.wait([self._pending_backup_task])
+        for task in [self._pending_backup_task, self._job_task]:
+            if task:
+                task.cancel()
+                await asyncio.wait([task])
 
     @property
     def needsSpaceCheck(self):
@@ -272,8 +393,8 @@ class HaSource(BackupSource[HABackup], Startable):
         if not self._initialized:
             await self.init()
         else:
-            # Always ensure the supervisor version is fresh before makign any other requests
-            self.super_info = await self.harequests.supervisorInfo()
+            # Always ensure the supervisor version is reasonably fresh before making any other requests
+            await self._refreshInfo([INFO_SUPERVISOR])
         slugs = set()
         retained = []
         backups: Dict[str, AbstractBackup] = {}
@@ -325,8 +446,44 @@ class HaSource(BackupSource[HABackup], Startable):
                 self.config.setRetained(slug, False)
         self._changes_from_last_query = self.last_slugs != slugs
         self.last_slugs = slugs
+        self._listed_backups = {slug: backups[slug] for slug in slugs}
         return backups
 
+    async def refreshSlugs(self, slugs: Iterable[str]) -> Optional[BackupDelta]:
+        """
+        Re-queries only the given slugs from the supervisor, instead of listing every backup like get() does.  Returns
+        the backups that were added or removed, or None if the slugs can't be resolved without a full listing (eg the
+        source hasn't been listed yet or a slug is unknown to both us and the supervisor).
+        """
+        if not self._initialized or self._listed_backups is None:
+            return None
+        delta = BackupDelta(self.name())
+        for slug in slugs:
+            try:
+                item = await self.harequests.backup(slug, use_cache=False)
+            except ClientResponseError as e:
+                if e.status not in [400, 404]:
+                    raise
+                if slug not in self._listed_backups:
+                    # Not a backup we know of, so we can't tell what changed.
+                    return None
+                delta.removed.add(slug)
+                continue
+            if slug in self.pending_options:
+                item.setOptions(self.pending_options[slug])
+            self.setDataCacheInfo(item)
+            if slug in self._listed_backups:
+                # Backups don't change once created, so there is nothing new to report.
+                self._listed_backups[slug] = item
+            else:
+                delta.added[slug] = item
+
+        # Note that last_slugs is left alone, since get() relies on it to notice backups created outside the addon.
+        for slug in delta.removed:
+            del self._listed_backups[slug]
+        self._listed_backups.update(delta.added)
+        return delta
+
     def setDataCacheInfo(self, backup: HABackup):
         if backup.slug() not in self._data_cache.backups:
             # its a new backup, so we need to create a record for it
@@ -403,59 +560,157 @@ class HaSource(BackupSource[HABackup], Startable):
         item = self._validateBackup(backup)
         return await self.harequests.download(item.slug())
 
+    async def restorePartial(self, backup: Backup, addons: List[str], folders: List[str], homeassistant: bool) -> None:
+        item = self._validateBackup(backup)
+        logger.info("Restoring part of '{0}'".format(backup.name()))
+        await self.harequests.restorePartial(item.slug(), addons, folders, homeassistant, self._restorePassword(backup))
+
+    async def restorePartialFrom(self, backup: Backup, tar: PartialTar) -> None:
+        """Loads a backup made from part of another into Home Assistant, restores all of it, then removes it again"""
+        slug = tar.slug()
+        logger.info("Loading the parts of '{0}' being restored into Home Assistant".format(backup.name()))
+        # Keep the temporary backup from being uploaded or counted against the backups kept while it's around
+        self._data_cache.backup(slug)[KEY_IGNORE] = True
+        self._data_cache.makeDirty()
+        try:
+            with aiohttp.MultipartWriter('mixed') as mpwriter:
+                mpwriter.append(tar.generator(), {'CONTENT-TYPE': 'application/tar'})  # type: ignore
+                resp = await self.harequests.upload(mpwriter)
+            if not resp or resp.get('slug') != slug:
+                raise UploadFailed()
+            try:
+                logger.info("Restoring part of '{0}'".format(backup.name()))
+                await self.harequests.restorePartial(slug, tar.addons, tar.folders, tar.homeassistant, self._restorePassword(backup))
+            finally:
+                await self.harequests.delete(slug)
+        finally:
+            self._data_cache.backups.pop(slug, None)
+            self._data_cache.makeDirty()
+            self.trigger()
+
+    def _restorePassword(self, backup: Backup) -> Optional[str]:
+        if not backup.protected():
+            return None
+        return Password(self.config).resolve()
+
     async def retain(self, backup: Backup, retain: bool) -> None:
         item: HABackup = self._validateBackup(backup)
-        item._retained = retain
+        item.setRetained(retain)
         self.config.setRetained(backup.slug(), retain)
 
     async def init(self):
-        await self._refreshInfo()
+        await self._refreshInfo(force=True)
         self._initialized = True
 
     async def refresh(self):
-        await self._refreshInfo()
+        await self._refreshInfo(force=True)
+
+    def invalidateInfo(self, *kinds: str) -> None:
+        """
+        Drops the cached copies of the given kinds of supervisor metadata (or all of them when none are given) so
+        they get queried again the next time they're needed.
+        """
+        for kind in (kinds or list(INFO_TTL.keys())):
+            self._info_fetched.pop(kind, None)
+
+    def _isInfoFresh(self, kind: str) -> bool:
+        fetched = self._info_fetched.get(kind)
+        return fetched is not None and self.time.now() < fetched + INFO_TTL[kind]
+
+    def _configUpdated(self):
+        if not self._applying_options:
+            # The addon's options were changed by something other than the supervisor's copy of them (eg the UI).
+            self.invalidateInfo(INFO_SELF)
+
+    async def _queryInfoChain(self, chain: List[str], stale: List[str], fetched: Dict[str, Any]) -> None:
+        queries = {
+            INFO_SELF: self.harequests.selfInfo,
+            INFO_HOST: self.harequests.info,
+            INFO_HA: self.harequests.haInfo,
+            INFO_SUPERVISOR: self.harequests.supervisorInfo,
+            INFO_MOUNTS: self.harequests.mountInfo,
+            INFO_ADDONS: self.harequests.getAddons,
+        }
+        for kind in chain:
+            if kind in stale:
+                fetched[kind] = await queries[kind]()
 
-    async def _refreshInfo(self) -> None:
+    async def _refreshInfo(self, kinds: Iterable[str] = INFO_TTL.keys(), force: bool = False) -> None:
         try:
-            self.self_info = await self.harequests.selfInfo()
-            self.host_info = await self.harequests.info()
-            self.ha_info = await self.harequests.haInfo()
-            self.super_info = await self.harequests.supervisorInfo()
-            self.mount_info = await self.harequests.mountInfo()
-
-            addon_info = ensureKey("addons", await self.harequests.getAddons(), "Supervisor Metadata")
-            self.config.update(
-                ensureKey("options", self.self_info, "addon metdata"))
-            if self.config.mustSaveUpgradeChanges():
-                LOGGER.info("The configuration format has changed in this version of the addon and your configuration will be automatically updated")
-                options = {}
-                for option in self.config.getAllConfig().keys():
-                    options[option.value] = self.config.get(option)
-                await self.harequests.updateConfig(options)
-                self.config.persistedChanges()
-
-            self._info.ha_port = ensureKey(
-                "port", self.ha_info, "Home Assistant metadata")
-            self._info.ha_ssl = ensureKey(
-                "ssl", self.ha_info, "Home Assistant metadata")
-            self._info.addons = addon_info
-            self._info.slug = ensureKey(
-                "slug", self.self_info, "addon metdata")
-            self._info.url = self.getAddonUrl()
-
-            self._addons = {}
-            for addon in addon_info:
-                self._addons[addon.get('slug', "default")] = addon
-
-            self._info.addDebugInfo("self_info", self.self_info)
-            self._info.addDebugInfo("host_info", self.host_info)
-            self._info.addDebugInfo("ha_info", self.ha_info)
-            self._info.addDebugInfo("super_info", self.super_info)
+            if force:
+                self.invalidateInfo(*kinds)
+            stale = [kind for kind in kinds if not self._isInfoFresh(kind)]
+            if len(stale) == 0:
+                return
+            fetched: Dict[str, Any] = {}
+            await asyncio.gather(*[self._queryInfoChain(chain, stale, fetched) for chain in INFO_CHAINS if set(chain).intersection(stale)])
+
+            if INFO_SUPERVISOR in fetched:
+                self._checkSupervisorChanges(self.super_info, fetched[INFO_SUPERVISOR], fetched)
+                self.super_info = fetched[INFO_SUPERVISOR]
+                self._info.addDebugInfo("super_info", self.super_info)
+            if INFO_MOUNTS in fetched:
+                self.mount_info = fetched[INFO_MOUNTS]
+            if INFO_HOST in fetched:
+                self.host_info = fetched[INFO_HOST]
+                self._info.addDebugInfo("host_info", self.host_info)
+            if INFO_HA in fetched:
+                self.ha_info = fetched[INFO_HA]
+                self._info.ha_port = ensureKey(
+                    "port", self.ha_info, "Home Assistant metadata")
+                self._info.ha_ssl = ensureKey(
+                    "ssl", self.ha_info, "Home Assistant metadata")
+                self._info.addDebugInfo("ha_info", self.ha_info)
+            if INFO_ADDONS in fetched:
+                addon_info = ensureKey("addons", fetched[INFO_ADDONS], "Supervisor Metadata")
+                self._info.addons = addon_info
+                self._addons = {}
+                for addon in addon_info:
+                    self._addons[addon.get('slug', "default")] = addon
+            if INFO_SELF in fetched:
+                self.self_info = fetched[INFO_SELF]
+                await self._applyOptions(ensureKey("options", self.self_info, "addon metdata"))
+                self._info.slug = ensureKey(
+                    "slug", self.self_info, "addon metdata")
+                self._info.url = self.getAddonUrl()
+                self._info.addDebugInfo("self_info", self.self_info)
+
+            now = self.time.now()
+            for kind in fetched.keys():
+                self._info_fetched[kind] = now
         except Exception as e:
             logger.debug("Failed to connect to supervisor")
             logger.debug(logger.formatException(e))
             raise e
 
+    async def _applyOptions(self, options: Dict[str, Any]) -> None:
+        self._applying_options = True
+        try:
+            self.config.update(options)
+        finally:
+            self._applying_options = False
+        if self.config.mustSaveUpgradeChanges():
+            LOGGER.info("The configuration format has changed in this version of the addon and your configuration will be automatically updated")
+            options = {}
+            for option in self.config.getAllConfig().keys():
+                options[option.value] = self.config.get(option)
+            await self.harequests.updateConfig(options)
+            self.config.persistedChanges()
+
+    def _checkSupervisorChanges(self, old: Optional[Dict[str, Any]], new: Dict[str, Any], fetched: Dict[str, Any]) -> None:
+        if old is None:
+            return
+        if old.get('version') != new.get('version'):
+            # The supervisor updated itself, so anything it told us before could be out of date.
+            logger.debug("The supervisor's version changed, refreshing everything it reported")
+            self.invalidateInfo(*[kind for kind in INFO_TTL.keys() if kind not in fetched])
+        elif self._addonVersions(old) != self._addonVersions(new) and INFO_ADDONS not in fetched:
+            # An add-on was installed, removed or updated.
+            self.invalidateInfo(INFO_ADDONS)
+
+    def _addonVersions(self, super_info: Dict[str, Any]) -> Dict[str, Any]:
+        return {addon.get('slug'): addon.get('version') for addon in super_info.get('addons', [])}
+
     def addonHasLogo(self, slug):
         return self._addons.get(slug, {}).get('logo', False)
 
@@ -515,6 +770,8 @@ class HaSource(BackupSource[HABackup], Startable):
                 slug, pending.getOptions().retain_sources.get(self.name(), False))
             logger.info("Backup finished")
         except Exception as e:
+            # The failure could have come from something we had cached being out of date (eg an uninstalled add-on)
+            self.invalidateInfo()
             if self._isHttp400(e):
                 logger.warning("A backup was already in progress")
                 pending.setPendingUnknown()
@@ -529,6 +786,8 @@ class HaSource(BackupSource[HABackup], Startable):
                 logger.printException(e)
         finally:
             await self.stopper.startAddons()
+            # Making a backup stops and starts add-ons, so the states we have cached for them are probably wrong now.
+            self.invalidateInfo(INFO_ADDONS, INFO_SUPERVISOR)
             self.trigger()
 
     def _buildBackupInfo(self, options: CreateOptions):
@@ -136,10 +136,11 @@ class HaUpdater(Worker):
         self._trigger_once = True
 
     def _buildBackupUpdate(self):
-        backups = list(filter(lambda s: not s.ignore(), self._coordinator.backups()))
+        catalog = self._coordinator.catalog()
+        backups = catalog.notIgnored()
         last = "Never"
         if len(backups) > 0:
-            last = max(backups, key=lambda s: s.date()).date().isoformat()
+            last = backups[-1].date().isoformat()
 
         def makeBackupData(backup: Backup):
             return {
@@ -149,12 +150,12 @@ class HaUpdater(Worker):
                 "size": backup.sizeString(),
                 "slug": backup.slug()
             }
-        ha_backups = list(filter(lambda s: s.getSource(SOURCE_HA) is not None, backups))
-        drive_backups = list(filter(lambda s: s.getSource(SOURCE_GOOGLE_DRIVE) is not None, backups))
+        ha_stats = catalog.stats(SOURCE_HA)
+        drive_stats = catalog.stats(SOURCE_GOOGLE_DRIVE)
 
         last_uploaded = "Never"
-        if len(drive_backups) > 0:
-            last_uploaded = max(drive_backups, key=lambda s: s.date()).date().isoformat()
+        if drive_stats.latest_backup is not None:
+            last_uploaded = drive_stats.latest_backup.date().isoformat()
         
         source_metrics = self._coordinator.buildBackupMetrics()
         next = self._coordinator.nextBackupTime()
@@ -165,10 +166,10 @@ class HaUpdater(Worker):
             "last_backup": last,  # type: ignore
             "next_backup": next,
             "last_uploaded": last_uploaded,
-            "backups_in_google_drive": len(drive_backups),
-            "backups_in_home_assistant": len(ha_backups),
-            "size_in_google_drive": Estimator.asSizeString(sum(map(lambda v: v.sizeInt(), drive_backups))),
-            "size_in_home_assistant": Estimator.asSizeString(sum(map(lambda v: v.sizeInt(), ha_backups))),
+            "backups_in_google_drive": drive_stats.backups,
+            "backups_in_home_assistant": ha_stats.backups,
+            "size_in_google_drive": Estimator.asSizeString(drive_stats.size),
+            "size_in_home_assistant": Estimator.asSizeString(ha_stats.size),
             "backups": list(map(makeBackupData, backups))
         }
         if SOURCE_GOOGLE_DRIVE in source_metrics and 'free_space' in source_metrics[SOURCE_GOOGLE_DRIVE]:
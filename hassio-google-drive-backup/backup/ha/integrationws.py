@@ -1,16 +1,100 @@
 """WebSocket server for pushing state updates to Home Assistant integration."""
 import asyncio
 import json
-from typing import Set, Dict, Any
+from typing import Callable, Dict, Any
 from aiohttp import web
 from injector import singleton, inject
 
 from ..time import Time
 from ..config import Config, Setting, Startable
 from ..logger import getLogger
+from ..util import JsonPatch
 
 logger = getLogger(__name__)
 
+# Version 2 of the protocol sends a full "backup_state" snapshot on connect and then "backup_state_patch" deltas
+# to clients that announce support for it with a "hello" message.  Clients that never say hello keep getting full
+# snapshots, like they did with version 1.
+PROTOCOL_VERSION = 2
+MESSAGE_BACKUP_STATE = "backup_state"
+MESSAGE_BACKUP_STATE_PATCH = "backup_state_patch"
+MESSAGE_BACKUP_STALE = "backup_stale"
+MESSAGE_HELLO = "hello"
+MESSAGE_RESYNC = "resync"
+
+# A client that takes longer than this to accept a single message gets disconnected
+MAX_CLIENT_LAG_SECONDS = 30
+
+
+class ClientWriter:
+    """
+    Delivers messages to a single client from its own task, so a slow or half-dead client can't hold up delivery to
+    the others or the caller.  Its queue holds at most one message of each type, since newer state supersedes older
+    state, so a client that falls behind only ever gets sent the latest state rather than working through a backlog.
+    """
+
+    def __init__(self, ws: web.WebSocketResponse, on_drop: Callable[["ClientWriter", str], None], max_lag_seconds: float):
+        self.ws = ws
+        self.wants_patches = False
+        self._on_drop = on_drop
+        self._max_lag_seconds = max_lag_seconds
+        self._state: str | None = None
+        self._stale: str | None = None
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=f"Integration client writer {id(ws)}")
+
+    def sendState(self, snapshot: str, patch: str | None = None) -> None:
+        """Queue a state update, replacing any state update the client hasn't been sent yet."""
+        if self._state is None and patch is not None and self.wants_patches:
+            self._state = patch
+        else:
+            # Either the client doesn't want patches, or an undelivered patch would leave it a version behind, so
+            # send the whole state instead.
+            self._state = snapshot
+        self._wakeup.set()
+
+    def sendStale(self, message: str) -> None:
+        """Queue a stale status update, replacing any the client hasn't been sent yet."""
+        self._stale = message
+        self._wakeup.set()
+
+    async def close(self) -> None:
+        self._task.cancel()
+        await asyncio.wait([self._task])
+        try:
+            await asyncio.wait_for(self.ws.close(), timeout=self._max_lag_seconds)
+        except Exception:
+            # The client is being dropped anyway
+            pass
+
+    def _next(self) -> str | None:
+        if self._state is not None:
+            message, self._state = self._state, None
+            return message
+        if self._stale is not None:
+            message, self._stale = self._stale, None
+            return message
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            message = self._next()
+            while message is not None:
+                if self.ws.closed:
+                    self._on_drop(self, "connection closed")
+                    return
+                try:
+                    await asyncio.wait_for(self.ws.send_str(message), timeout=self._max_lag_seconds)
+                except asyncio.TimeoutError:
+                    self._on_drop(self, f"took longer than {self._max_lag_seconds}s to accept a message")
+                    return
+                except Exception as e:
+                    self._on_drop(self, str(e))
+                    return
+                message = self._next()
+
 
 @singleton
 class IntegrationWebSocketServer(Startable):
@@ -21,31 +105,33 @@ class IntegrationWebSocketServer(Startable):
         """Initialize the WebSocket server."""
         self._config = config
         self._time = time
-        self._clients: Set[web.WebSocketResponse] = set()
+        self._clients: Dict[web.WebSocketResponse, ClientWriter] = {}
         self._app: web.Application | None = None
         self._runner: web.AppRunner | None = None
         self._site: web.TCPSite | None = None
         self._running = False
         self._last_backup_state: Dict[str, Any] | None = None
         self._last_backup_stale: Dict[str, Any] | None = None
+        self._state_seq = 0
+        self._max_lag_seconds = MAX_CLIENT_LAG_SECONDS
 
     async def start(self) -> None:
         """Start the WebSocket server."""
         if self._running:
             return
 
-        port = self._config.get(Setting.INTEGRATION_WS_PORT) 
-        
+        port = self._config.get(Setting.INTEGRATION_WS_PORT)
+
         self._app = web.Application()
         self._app.router.add_get('/ws', self._websocket_handler)
         self._app.router.add_get('/health', self._health_handler)
-        
+
         self._runner = web.AppRunner(self._app)
         await self._runner.setup()
-        
+
         self._site = web.TCPSite(self._runner, '0.0.0.0', port)
         await self._site.start()
-        
+
         self._running = True
         logger.info(f"Integration WebSocket server started on port {port}")
 
@@ -55,16 +141,17 @@ class IntegrationWebSocketServer(Startable):
             return
 
         # Close all client connections
-        for ws in list(self._clients):
-            await ws.close()
+        writers = list(self._clients.values())
         self._clients.clear()
+        for writer in writers:
+            await writer.close()
 
         if self._site:
             await self._site.stop()
-        
+
         if self._runner:
             await self._runner.cleanup()
-        
+
         self._running = False
         logger.info("Integration WebSocket server stopped")
 
@@ -79,88 +166,106 @@ class IntegrationWebSocketServer(Startable):
         """Handle WebSocket connections."""
         ws = web.WebSocketResponse(heartbeat=30)
         await ws.prepare(request)
-        
-        self._clients.add(ws)
+
+        writer = ClientWriter(ws, self._drop, self._max_lag_seconds)
+        self._clients[ws] = writer
         client_id = id(ws)
         remote = request.remote
         logger.info(f"Integration client connected from {remote} (id: {client_id}). Total clients: {len(self._clients)}")
         logger.debug(f"Client connection details - Headers: {dict(request.headers)}")
-        
+
         # Send latest state to the newly connected client
         if self._last_backup_state:
-            try:
-                await ws.send_str(json.dumps(self._last_backup_state))
-                logger.debug(f"Sent latest backup_state to new client {client_id}")
-            except Exception as e:
-                logger.error(f"Error sending latest backup_state to client {client_id}: {e}")
-        
+            writer.sendState(json.dumps(self._last_backup_state))
         if self._last_backup_stale:
-            try:
-                await ws.send_str(json.dumps(self._last_backup_stale))
-                logger.debug(f"Sent latest backup_stale to new client {client_id}")
-            except Exception as e:
-                logger.error(f"Error sending latest backup_stale to client {client_id}: {e}")
-        
+            writer.sendStale(json.dumps(self._last_backup_stale))
+
         try:
             async for msg in ws:
-                # We don't expect messages from the integration, but handle them gracefully
                 if msg.type == web.WSMsgType.TEXT:
                     logger.debug(f"Received message from client {client_id}: {msg.data}")
+                    self._handle_client_message(writer, msg.data)
                 elif msg.type == web.WSMsgType.ERROR:
                     logger.error(f"WebSocket error from client {client_id}: {ws.exception()}")
         except Exception as e:
             logger.error(f"Exception in WebSocket handler for client {client_id}: {e}", exc_info=True)
         finally:
-            self._clients.discard(ws)
+            if self._clients.pop(ws, None) is not None:
+                await writer.close()
             logger.info(f"Integration client disconnected (id: {client_id}). Total clients: {len(self._clients)}")
-        
+
         return ws
 
+    def _drop(self, writer: ClientWriter, reason: str) -> None:
+        """Disconnect a client that can't keep up, without waiting on it."""
+        if self._clients.pop(writer.ws, None) is None:
+            return
+        logger.warning(f"Dropping integration client {id(writer.ws)}: {reason}")
+        asyncio.create_task(writer.close(), name=f"Close integration client {id(writer.ws)}")
+
+    def _handle_client_message(self, writer: ClientWriter, data: str) -> None:
+        """Handle protocol negotiation and resync requests from a client."""
+        try:
+            message = json.loads(data)
+        except json.JSONDecodeError:
+            logger.debug(f"Ignoring malformed message from client {id(writer.ws)}")
+            return
+        msg_type = message.get("type")
+        if msg_type == MESSAGE_HELLO:
+            if message.get("protocol", 1) >= PROTOCOL_VERSION:
+                writer.wants_patches = True
+                logger.debug(f"Client {id(writer.ws)} will receive state patches")
+        elif msg_type == MESSAGE_RESYNC:
+            # The client missed a patch, so send it the whole state again
+            logger.debug(f"Client {id(writer.ws)} requested a resync")
+            if self._last_backup_state:
+                writer.sendState(json.dumps(self._last_backup_state))
+
     async def send_backup_state(self, state: str, attributes: Dict[str, Any]) -> None:
-        """Send backup state update to all connected clients."""
+        """Send backup state update to all connected clients, as a patch to those that support it."""
+        previous = self._last_backup_state
+        self._state_seq += 1
         message = {
-            "type": "backup_state",
+            "type": MESSAGE_BACKUP_STATE,
+            "protocol": PROTOCOL_VERSION,
+            "seq": self._state_seq,
             "state": state,
             "attributes": attributes
         }
         self._last_backup_state = message
-        await self._broadcast(message)
+        if not self._clients:
+            logger.debug(f"No integration clients connected, skipping broadcast of {MESSAGE_BACKUP_STATE}")
+            return
+
+        snapshot_str = json.dumps(message)
+        patch_str = None
+        if previous is not None and any(writer.wants_patches for writer in self._clients.values()):
+            patch_str = json.dumps({
+                "type": MESSAGE_BACKUP_STATE_PATCH,
+                "protocol": PROTOCOL_VERSION,
+                "base_seq": previous["seq"],
+                "seq": self._state_seq,
+                "patch": JsonPatch.diff(
+                    {"state": previous["state"], "attributes": previous["attributes"]},
+                    {"state": state, "attributes": attributes})
+            })
+        logger.debug(f"Broadcasting {MESSAGE_BACKUP_STATE} to {len(self._clients)} clients")
+        for writer in list(self._clients.values()):
+            writer.sendState(snapshot_str, patch_str)
 
     async def send_backup_stale(self, is_stale: bool) -> None:
         """Send backup stale status to all connected clients."""
         message = {
-            "type": "backup_stale",
+            "type": MESSAGE_BACKUP_STALE,
             "is_stale": is_stale
         }
         self._last_backup_stale = message
-        await self._broadcast(message)
-
-    async def _broadcast(self, message: Dict[str, Any]) -> None:
-        """Broadcast a message to all connected clients."""
         if not self._clients:
-            logger.debug(f"No integration clients connected, skipping broadcast of {message.get('type')}")
+            logger.debug(f"No integration clients connected, skipping broadcast of {MESSAGE_BACKUP_STALE}")
             return
-
-        logger.debug(f"Broadcasting {message.get('type')} to {len(self._clients)} clients")
         message_str = json.dumps(message)
-        disconnected = set()
-        
-        for ws in self._clients:
-            try:
-                if ws.closed:
-                    disconnected.add(ws)
-                else:
-                    await ws.send_str(message_str)
-            except Exception as e:
-                logger.error(f"Error sending to client {id(ws)}: {e}")
-                disconnected.add(ws)
-        
-        # Clean up disconnected clients
-        for ws in disconnected:
-            self._clients.discard(ws)
-        
-        if disconnected:
-            logger.debug(f"Removed {len(disconnected)} disconnected clients")
+        for writer in list(self._clients.values()):
+            writer.sendStale(message_str)
 
     @property
     def has_clients(self) -> bool:
@@ -1,7 +1,5 @@
 import os
 
-import yaml
-
 from ..config import Config, Setting
 from ..exceptions import BackupPasswordKeyInvalid
 from ..logger import getLogger
@@ -21,6 +19,8 @@ class Password():
         if password.startswith("!secret "):
             if not os.path.isfile(self.config.get(Setting.SECRETS_FILE_PATH)):
                 raise BackupPasswordKeyInvalid()
+            # Only needed for passwords kept in secrets.yaml, so yaml isn't loaded unless it's used
+            import yaml
             with open(self.config.get(Setting.SECRETS_FILE_PATH)) as f:
                 secrets_yaml = yaml.load(f, Loader=yaml.SafeLoader)
             key = password[len("!secret "):]
@@ -1,7 +1,7 @@
 # flake8: noqa
 from .backupscheme import GenerationalScheme, OldestScheme, GenConfig, BackupScheme
 from .coordinator import Coordinator
-from .model import BackupSource, BackupDestination, Model
+from .model import BackupSource, BackupDestination, BackupDelta, Model
 from .syncer import Scyncer
 from .backups import AbstractBackup, Backup
 from .drivebackup import DriveBackup
@@ -10,4 +10,6 @@ from .dummybackupsource import DummyBackupSource
 from .habackup import HABackup
 from .simulatedsource import SimulatedSource
 from .precache import Precache
+from .sourcecache import SourceCache
+from .catalog import BackupCatalog, SourceStats
 from .destinationprecache import DestinationPrecache
@@ -21,6 +21,10 @@ HA_KEY_TEXT = "Home Assistant's backup metadata"
 
 
 class AbstractBackup():
+    # Thousands of these can be around at once for a long backup history, so they only have room for what they use
+    __slots__ = ('_options', '_name', '_slug', '_source', '_date', '_size', '_retained', '_uploadable', '_details',
+                 '_version', '_backupType', '_protected', '_ignore', '_note', '_pending', '_owner')
+
     def __init__(self, name: str, slug: str, source: str, date: str, size: int, version: str, backupType: str, protected: bool, note=None, retained: bool = False, uploadable: bool = False, details={}, pending=False):
         self._options = None
         self._name = name
@@ -37,6 +41,8 @@ class AbstractBackup():
         self._ignore = False
         self._note = note
         self._pending = pending
+        # The backup this is a source of, which gets told when this changes
+        self._owner: Optional['Backup'] = None
 
     def isPending(self):
         return self._pending
@@ -85,6 +91,7 @@ class AbstractBackup():
 
     def setRetained(self, retained):
         self._retained = retained
+        self._changed()
 
     def uploadable(self) -> bool:
         return self._uploadable
@@ -112,6 +119,14 @@ class AbstractBackup():
 
     def setIgnore(self, ignore):
         self._ignore = ignore
+        self._changed()
+
+    def setOwner(self, owner: Optional['Backup']):
+        self._owner = owner
+
+    def _changed(self):
+        if self._owner is not None:
+            self._owner.changed()
 
 
 class Backup(object):
@@ -119,6 +134,8 @@ class Backup(object):
     Represents a Home Assistant backup stored on Google Drive, locally in
     Home Assistant, or a pending backup we expect to see show up later
     """
+    __slots__ = ('sources', '_purgeNext', '_options', '_status_override', '_status_override_args', '_state_detail',
+                 '_upload_source', '_upload_source_name', '_upload_fail_info', '_catalog')
 
     def __init__(self, backup: Optional[AbstractBackup] = None):
         self.sources: Dict[str, AbstractBackup] = {}
@@ -130,6 +147,7 @@ class Backup(object):
         self._upload_source = None
         self._upload_source_name = None
         self._upload_fail_info = None
+        self._catalog = None
         if backup is not None:
             self.addSource(backup)
 
@@ -144,8 +162,10 @@ class Backup(object):
 
     def addSource(self, backup: AbstractBackup):
         self.sources[backup.source()] = backup
+        backup.setOwner(self)
         if backup.getOptions() and not self.getOptions():
             self.setOptions(backup.getOptions())
+        self.changed()
 
     def getStatusDetail(self):
         return self._state_detail
@@ -158,6 +178,15 @@ class Backup(object):
             del self.sources[source]
         if source in self._purgeNext:
             del self._purgeNext[source]
+        self.changed()
+
+    def setCatalog(self, catalog):
+        self._catalog = catalog
+
+    def changed(self):
+        """Lets the catalog this backup is in know that it changed"""
+        if self._catalog is not None:
+            self._catalog.changed(self)
 
     def getPurges(self):
         return self._purgeNext
@@ -230,6 +259,10 @@ class Backup(object):
         elif self._upload_source is not None:
             ret['progress'] = self._upload_source.progress()
             ret['speed'] = self._upload_source.speed(timedelta(seconds=20))
+            ret['instant_speed'] = self._upload_source.instantSpeed()
+            eta = self._upload_source.eta()
+            if eta is not None:
+                ret['eta'] = time.formatDelta(time.now() + eta)
             ret['total'] = self._upload_source.position()
             ret['started'] = time.formatDelta(self._upload_source.startTime())
         return ret
@@ -0,0 +1,164 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from ..config import Config
+from .backups import Backup
+
+
+@dataclass
+class SourceStats:
+    """Counts and sizes of the backups in one source, as shown in the UI and Home Assistant's sensors"""
+    backups: int = 0
+    retained: int = 0
+    deletable: int = 0
+    ignored: int = 0
+    size: int = 0
+    ignored_size: int = 0
+    latest: Optional[datetime] = None
+    latest_backup: Optional[Backup] = None
+
+
+class BackupCatalog():
+    """
+    Every backup the addon knows about, by slug, like the dict it replaces.  It also keeps the backups sorted by
+    date as they come and go, so listing them in order doesn't need to sort them again.
+
+    Views that depend on whether backups are ignored or retained (which can come from a backup's sources, the data
+    cache or the addon's config) are worked out once and then reused until a backup in the catalog or the config
+    changes.
+    """
+
+    def __init__(self, config: Config):
+        self._config = config
+        self._backups: Dict[str, Backup] = {}
+        # Backups sorted by date, alongside the date each was sorted by
+        self._sorted: List[Backup] = []
+        self._sorted_dates: List[datetime] = []
+        self._slugs: Dict[int, str] = {}
+        self._dates: Dict[int, datetime] = {}
+        self._generation = 0
+        self._views_key = None
+        self._not_ignored: List[Backup] = []
+        self._stats: Dict[str, SourceStats] = {}
+
+    def __getitem__(self, slug: str) -> Backup:
+        return self._backups[slug]
+
+    def __setitem__(self, slug: str, backup: Backup):
+        if slug in self._backups:
+            self._backups[slug].setCatalog(None)
+            self._remove(slug)
+        self._backups[slug] = backup
+        self._insert(slug, backup)
+        backup.setCatalog(self)
+        self._generation += 1
+
+    def __delitem__(self, slug: str):
+        self._backups[slug].setCatalog(None)
+        self._remove(slug)
+        del self._backups[slug]
+        self._generation += 1
+
+    def __contains__(self, slug) -> bool:
+        return slug in self._backups
+
+    def __len__(self) -> int:
+        return len(self._backups)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._backups)
+
+    def get(self, slug: str, default=None) -> Optional[Backup]:
+        return self._backups.get(slug, default)
+
+    def keys(self):
+        return self._backups.keys()
+
+    def values(self):
+        return self._backups.values()
+
+    def items(self):
+        return self._backups.items()
+
+    def changed(self, backup: Optional[Backup] = None):
+        """Called when a backup in the catalog (or anything deciding whether backups are ignored) changes"""
+        self._generation += 1
+        if backup is None:
+            return
+        slug = self._slugs.get(id(backup))
+        if slug is None:
+            return
+        if self._dates[id(backup)] != backup.date():
+            # Its date comes from one of its sources, so it can move when they change
+            self._remove(slug)
+            self._insert(slug, backup)
+
+    def sorted(self) -> List[Backup]:
+        """Every backup, oldest first"""
+        return list(self._sorted)
+
+    def notIgnored(self) -> List[Backup]:
+        """Every backup that isn't ignored, oldest first"""
+        self._refreshViews()
+        return list(self._not_ignored)
+
+    def latest(self, include_pending=True) -> Optional[Backup]:
+        """The newest backup that isn't ignored"""
+        self._refreshViews()
+        for backup in reversed(self._not_ignored):
+            if include_pending or not backup.isPending():
+                return backup
+        return None
+
+    def stats(self, source: str) -> SourceStats:
+        self._refreshViews()
+        return self._stats.get(source, SourceStats())
+
+    def _refreshViews(self):
+        key = (self._generation, self._config.version())
+        if key == self._views_key:
+            return
+        not_ignored = []
+        stats: Dict[str, SourceStats] = {}
+        for backup in self._sorted:
+            ignored = backup.ignore()
+            if not ignored:
+                not_ignored.append(backup)
+            for source, data in backup.sources.items():
+                source_stats = stats.setdefault(source, SourceStats())
+                if ignored:
+                    if data.ignore():
+                        source_stats.ignored += 1
+                    source_stats.ignored_size += backup.size()
+                    continue
+                source_stats.backups += 1
+                if data.retained():
+                    source_stats.retained += 1
+                else:
+                    source_stats.deletable += 1
+                if source_stats.latest is None or data.date() > source_stats.latest:
+                    source_stats.latest = data.date()
+                    source_stats.latest_backup = backup
+                source_stats.size += int(data.sizeInt())
+        self._not_ignored = not_ignored
+        self._stats = stats
+        self._views_key = key
+
+    def _insert(self, slug: str, backup: Backup):
+        date = backup.date()
+        index = bisect_right(self._sorted_dates, date)
+        self._sorted.insert(index, backup)
+        self._sorted_dates.insert(index, date)
+        self._slugs[id(backup)] = slug
+        self._dates[id(backup)] = date
+
+    def _remove(self, slug: str):
+        backup = self._backups[slug]
+        index = bisect_left(self._sorted_dates, self._dates.pop(id(backup)))
+        while self._sorted[index] is not backup:
+            index += 1
+        del self._sorted[index]
+        del self._sorted_dates[index]
+        del self._slugs[id(backup)]
@@ -1,21 +1,22 @@
 from asyncio import CancelledError, Task, create_task, wait, Event
 from datetime import timedelta
-from threading import Lock
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from injector import inject, singleton
 
 from backup.config import Config, Setting, CreateOptions, DurationParser
-from backup.exceptions import (KnownError, LogicError, NoBackup, PleaseWait,
+from backup.exceptions import (KnownError, LogicError, NoBackup,
                                UserCancelledError)
-from backup.util import GlobalInfo, Backoff, Estimator
+from backup.util import GlobalInfo, Backoff, Estimator, TarIndex, PartialTar
 from backup.time import Time
 from backup.worker import Trigger
 from backup.logger import getLogger
 from backup.creds.creds import Creds
-from .precache import Precache
-from .model import BackupSource, Model
-from .backups import AbstractBackup, Backup, SOURCE_HA
+from .sourcecache import SourceCache
+from .operationqueue import OperationQueue
+from .model import BackupSource, BackupDelta, Model
+from .backups import Backup, SOURCE_HA
+from .catalog import BackupCatalog
 from random import Random
 
 logger = getLogger(__name__)
@@ -27,10 +28,9 @@ class Coordinator(Trigger):
     def __init__(self, model: Model, time: Time, config: Config, global_info: GlobalInfo, estimator: Estimator):
         super().__init__()
         self._model = model
-        self._precache: Precache = None
+        self._cache: SourceCache = SourceCache(time)
         self._time = time
         self._config = config
-        self._lock: Lock = Lock()
         self._global_info: GlobalInfo = global_info
         self._sources: Dict[str, BackupSource] = {
             self._model.source.name(): self._model.source,
@@ -38,7 +38,8 @@ class Coordinator(Trigger):
         }
         self._backoff = Backoff(initial=0, base=10, max=config.get(Setting.MAX_BACKOFF_SECONDS))
         self._estimator = estimator
-        self._busy = False
+        # Changes that wait in line together get made in one pass, with the freshness of backups updated once after
+        self._operations = OperationQueue(time, self._updateFreshness)
         self._sync_task: Task = None
         self._sync_start = Event()
         self._sync_wait = Event()
@@ -49,17 +50,17 @@ class Coordinator(Trigger):
         self._global_info.triggerBackupCooldown(timedelta(minutes=self._config.get(Setting.BACKUP_STARTUP_DELAY_MINUTES)))
         self.trigger()
 
-    def saveCreds(self, creds: Creds):
+    async def saveCreds(self, creds: Creds):
         if not self._model.dest.enabled():
             # Since this is the first time saving credentials (eg the addon was just enabled).  Hold off on
             # automatic backups for a few minutes to give the user a little while to figure out whats going on.
             self._global_info.triggerBackupCooldown(timedelta(minutes=self._config.get(Setting.BACKUP_STARTUP_DELAY_MINUTES)))
 
-        self._model.dest.saveCreds(creds)
+        await self._model.dest.saveCreds(creds)
         self._global_info.credsSaved()
 
-    def setPrecache(self, precache: Precache):
-        self._precache = precache
+    def sourceCache(self) -> SourceCache:
+        return self._cache
 
     def name(self):
         return "Coordinator"
@@ -81,7 +82,8 @@ class Coordinator(Trigger):
             return await super().check()
 
     async def sync(self):
-        await self._withSoftLock(lambda: self._sync_wrapper())
+        # A sync requested while another is still waiting to start would do the same thing, so they share one
+        await self._operations.run("sync", "Sync backups", self._sync_wrapper, coalesce=True)
 
     def isSyncing(self):
         task = self._sync_task
@@ -140,43 +142,22 @@ class Coordinator(Trigger):
         info = {}
         for source in self._sources:
             source_class = self._sources[source]
+            stats = self._model.backups.stats(source)
             source_info = {
-                'backups': 0,
-                'retained': 0,
-                'deletable': 0,
+                'backups': stats.backups,
+                'retained': stats.retained,
+                'deletable': stats.deletable,
                 'name': source,
                 'title': source_class.title(),
-                'latest': None,
+                'latest': None if stats.latest is None else self._time.asRfc3339String(stats.latest),
                 'max': source_class.maxCount(),
                 'enabled': source_class.enabled(),
                 'icon': source_class.icon(),
-                'ignored': 0,
-                'detail': source_class.detail()
+                'ignored': stats.ignored,
+                'detail': source_class.detail(),
+                'size': Estimator.asSizeString(stats.size),
+                'ignored_size': Estimator.asSizeString(stats.ignored_size)
             }
-            size = 0
-            ignored_size = 0
-            latest = None
-            for backup in self.backups():
-                data: AbstractBackup = backup.getSource(source)
-                if data is None:
-                    continue
-                if data.ignore() and backup.ignore():
-                    source_info['ignored'] += 1
-                if backup.ignore():
-                    ignored_size += backup.size()
-                    continue
-                source_info['backups'] += 1
-                if data.retained():
-                    source_info['retained'] += 1
-                else:
-                    source_info['deletable'] += 1
-                if latest is None or data.date() > latest:
-                    latest = data.date()
-                size += int(data.sizeInt())
-            if latest is not None:
-                source_info['latest'] = self._time.asRfc3339String(latest)
-            source_info['size'] = Estimator.asSizeString(size)
-            source_info['ignored_size'] = Estimator.asSizeString(ignored_size)
             free_space = source_class.freeSpace()
             if free_space is not None and source_class.needsSpaceCheck:
                 source_info['free_space'] = Estimator.asSizeString(free_space)
@@ -194,7 +175,7 @@ class Coordinator(Trigger):
             await self._sync_wait.wait()
             logger.info("Syncing Backups")
             self._global_info.sync()
-            self._estimator.refresh()
+            await self._estimator.refresh()
             await self._buildModel().sync(self._time.now())
             self._next_sync_offset = self._random.random()
             self._global_info.success()
@@ -203,10 +184,9 @@ class Coordinator(Trigger):
         except BaseException as e:
             self.handleError(e)
         finally:
-            if self._precache:
-                # Any sync should invalidate the precache regardless of the outcome
-                # so the next sync uses fresh data
-                self.clearCaches()
+            # Any sync should make the cached listings stale regardless of the outcome
+            # so the next sync uses fresh data
+            self.clearCaches()
             self._updateFreshness()
 
     def handleError(self, e):
@@ -227,16 +207,48 @@ class Coordinator(Trigger):
         text = DurationParser().format(timedelta(seconds=self._backoff.peek()))
         logger.info("I'll try again in {0}".format(text))
 
+    def applyDelta(self, delta: BackupDelta):
+        """
+        Folds backups added to or removed from a single source into the model without re-listing every source.  Returns
+        False if the delta couldn't be applied because a sync is running.
+
+        The source's listing is up to date afterward, so it gets used by the next sync instead of listing the source
+        again.  Listings go stale after any sync though, so the one after that still asks the source.
+        """
+        if self.isSyncing():
+            return False
+        for slug, item in delta.added.items():
+            self._cache.update(delta.source, item)
+            if slug in self._model.backups:
+                self._model.backups[slug].addSource(item)
+            else:
+                self._model.backups[slug] = Backup(item)
+        for slug in delta.removed:
+            self._cache.remove(delta.source, slug)
+            backup = self._model.backups.get(slug)
+            if backup is None:
+                continue
+            backup.removeSource(delta.source)
+            if backup.isDeleted():
+                del self._model.backups[slug]
+        self._cache.markFresh(delta.source, self.nextSyncAttempt() + timedelta(minutes=1))
+        self._updateFreshness()
+        return True
+
+    def needsSync(self) -> bool:
+        """Whether there's anything for a sync to do with the backups as they are now, like uploading one"""
+        return self._buildModel().needsSync()
+
     def backups(self) -> List[Backup]:
-        ret = list(self._model.backups.values())
-        ret.sort(key=lambda s: s.date())
-        return ret
+        return self._model.backups.sorted()
+
+    def catalog(self) -> BackupCatalog:
+        return self._model.backups
 
     async def uploadBackups(self, slug):
-        await self._withSoftLock(lambda: self._uploadBackup(slug))
+        await self._operations.run("upload", "Load '{0}' into Home Assistant".format(self._describe(slug)), lambda: self._uploadBackup(slug))
 
     async def _uploadBackup(self, slug):
-        self.clearCaches()
         backup = self._ensureBackup(self._model.dest.name(), slug)
         backup_dest = backup.getSource(self._model.dest.name())
         backup_source = backup.getSource(self._model.source.name())
@@ -247,29 +259,47 @@ class Coordinator(Trigger):
             raise LogicError("This backup isn't in Google Drive")
         created = await self._model.source.save(backup, await self._model.dest.read(backup))
         backup.addSource(created)
+        self._cache.update(self._model.source.name(), created)
         self._updateFreshness()
 
+    async def restorePartial(self, slug, addons: List[str], folders: List[str], homeassistant: bool):
+        await self._operations.run("restore", "Restore part of '{0}'".format(self._describe(slug)), lambda: self._restorePartial(slug, addons, folders, homeassistant))
+
+    async def _restorePartial(self, slug, addons: List[str], folders: List[str], homeassistant: bool):
+        backup = self._ensureBackup(None, slug)
+        if backup.getSource(self._model.source.name()):
+            await self._model.source.restorePartial(backup, addons, folders, homeassistant)
+            return
+        dest = self._model.dest
+        if not dest.enabled() or not dest.canIndex() or not backup.getSource(dest.name()):
+            raise NoBackup()
+        # Only the parts being restored get copied into Home Assistant, instead of the whole backup
+        index = await self.index(slug)
+        tar = await PartialTar.build(await dest.read(backup), index, addons, folders, homeassistant,
+                                     self._time.now().timestamp(), self._config.get(Setting.DEFAULT_CHUNK_SIZE))
+        logger.info("Copying {0} of '{1}' into Home Assistant to restore it".format(self._estimator.asSizeString(tar.size()), backup.name()))
+        await self._model.source.restorePartialFrom(backup, tar)
+
     async def startBackup(self, options: CreateOptions):
-        return await self._withSoftLock(lambda: self._startBackup(options))
+        return await self._operations.run("backup", "Create a new backup", lambda: self._startBackup(options))
 
     async def _startBackup(self, options: CreateOptions):
-        self.clearCaches()
         model = self._buildModel()
-        self._estimator.refresh()
+        await self._estimator.refresh()
         if model.source.needsSpaceCheck:
             self._estimator.checkSpace(self.backups())
         created = await self._buildModel().source.create(options)
         backup = Backup(created)
         self._model.backups[backup.slug()] = backup
+        self._cache.update(self._model.source.name(), created)
         self._updateFreshness()
-        self._estimator.refresh()
+        await self._estimator.refresh()
         return backup
 
     def getBackup(self, slug):
         return self._ensureBackup(None, slug)
 
     async def download(self, slug):
-        self.clearCaches()
         backup = self._ensureBackup(None, slug)
         for source in self._sources.values():
             if not source.enabled():
@@ -278,38 +308,75 @@ class Coordinator(Trigger):
                 return await source.read(backup)
         raise NoBackup()
 
+    async def index(self, slug) -> TarIndex:
+        backup = self._ensureBackup(None, slug)
+        index = self.cachedIndex(backup)
+        if index is not None:
+            return index
+        for source in self._sources.values():
+            if source.enabled() and source.canIndex() and backup.getSource(source.name()):
+                return await source.index(backup)
+        raise NoBackup()
+
+    def cachedIndex(self, backup: Backup) -> Optional[TarIndex]:
+        for source in self._sources.values():
+            if source.enabled() and backup.getSource(source.name()):
+                index = source.cachedIndex(backup)
+                if index is not None:
+                    return index
+        return None
+
+    def canIndex(self, backup: Backup) -> bool:
+        for source in self._sources.values():
+            if source.enabled() and source.canIndex() and backup.getSource(source.name()):
+                return True
+        return False
+
     async def retain(self, sources: Dict[str, bool], slug: str):
-        self.clearCaches()
+        await self._operations.run("retain", "Change whether '{0}' is kept".format(self._describe(slug)), lambda: self._retain(sources, slug), concurrent=True)
+
+    async def _retain(self, sources: Dict[str, bool], slug: str):
         for source in sources:
             backup = self._ensureBackup(source, slug)
             await self._ensureSource(source).retain(backup, sources[source])
-        self._updateFreshness()
+            self._cache.update(source, backup.getSource(source))
 
     async def note(self, note: str, slug: str):
-        self.clearCaches()
+        await self._operations.run("note", "Change the note on '{0}'".format(self._describe(slug)), lambda: self._note(note, slug), concurrent=True)
+
+    async def _note(self, note: str, slug: str):
         backup = self._ensureBackup(None, slug)
         for source in backup.sources.keys():
             await self._ensureSource(source).note(backup, note)
+            self._cache.update(source, backup.getSource(source))
 
     async def delete(self, sources, slug):
-        await self._withSoftLock(lambda: self._delete(sources, slug))
+        await self._operations.run("delete", "Delete '{0}'".format(self._describe(slug)), lambda: self._delete(sources, slug), mergeable=True)
 
     async def ignore(self, slug: str, ignore: bool):
-        await self._withSoftLock(lambda: self._ignore(slug, ignore))
+        await self._operations.run("ignore", "Change whether '{0}' is ignored".format(self._describe(slug)), lambda: self._ignore(slug, ignore), mergeable=True)
+
+    def operations(self):
+        """What's been asked of the coordinator recently, and whether each one is waiting, running, done or failed"""
+        return self._operations.operations()
+
+    def isBusy(self) -> bool:
+        return self._operations.isBusy()
 
     async def _delete(self, sources, slug):
-        self.clearCaches()
         for source in sources:
             backup = self._ensureBackup(source, slug)
             await self._ensureSource(source).delete(backup)
+            self._cache.remove(source, slug)
             if backup.isDeleted():
                 del self._model.backups[slug]
-        self._updateFreshness()
 
     async def _ignore(self, slug: str, ignore: bool):
-        self.clearCaches()
         backup = self._ensureBackup(SOURCE_HA, slug)
         await self._ensureSource(SOURCE_HA).ignore(backup, ignore)
+        # Whether it's ignored is kept outside the backup, so it can't tell the catalog itself
+        backup.changed()
+        self._cache.update(SOURCE_HA, backup.getSource(SOURCE_HA))
 
     def _ensureBackup(self, source: str = None, slug=None) -> Backup:
         backup = self._buildModel().backups.get(slug)
@@ -323,6 +390,12 @@ class Coordinator(Trigger):
             raise NoBackup()
         return backup
 
+    def _describe(self, slug) -> str:
+        backup = self._model.backups.get(slug)
+        if backup is None:
+            return str(slug)
+        return backup.name()
+
     def _ensureSource(self, source):
         ret = self._sources.get(source)
         if ret and ret.enabled():
@@ -330,7 +403,7 @@ class Coordinator(Trigger):
         raise LogicError()
 
     def _buildModel(self) -> Model:
-        self._model.reinitialize(self._precache)
+        self._model.reinitialize(self._cache)
         return self._model
 
     def _updateFreshness(self):
@@ -341,16 +414,5 @@ class Coordinator(Trigger):
                     backup.updatePurge(source, backup == purges[source])
 
     def clearCaches(self):
-        if self._precache:
-            self._precache.clear()
-
-    async def _withSoftLock(self, callable):
-        with self._lock:
-            if self._busy:
-                raise PleaseWait()
-            self._busy = True
-        try:
-            return await callable()
-        finally:
-            with self._lock:
-                self._busy = False
+        """Makes every cached listing stale, so the next sync asks each source for its backups again"""
+        self._cache.expire()
@@ -4,24 +4,16 @@ from injector import inject, singleton
 from backup.time import Time
 from backup.logger import getLogger
 from backup.config import Config, Setting
-from .model import BackupDestination
+from .model import BackupDestination, BackupSource
 from .precache import Precache
 from random import Random
 from datetime import datetime, timedelta
-from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any
 from logging import DEBUG
 
 logger = getLogger(__name__)
 
 
-@dataclass
-class CacheItem:
-    """Class for keeping track of an item in inventory."""
-    valid_until: datetime
-    data: Any
-
-
 @singleton
 class DestinationPrecache(Worker, Precache):
     @inject
@@ -31,15 +23,16 @@ class DestinationPrecache(Worker, Precache):
         self._coord = coord
         self._dest = dest
         self._offset = Random().random()
-        self._cache: Dict[str, CacheItem] = {}
         self._last_error: datetime = None
 
+    def dependsOn(self):
+        return [BackupSource]
+
     async def checkForSmoothing(self):
         if self._config.get(Setting.CACHE_WARMUP_MAX_SECONDS) == 0:
             # disable cache warmup
             return
         try:
-            self._coord.setPrecache(self)
             nextSync = self._coord.nextSyncAttempt()
             now = self._time.now()
             if nextSync <= now:
@@ -51,9 +44,8 @@ class DestinationPrecache(Worker, Precache):
             if now >= self.getNextWarmDate():
                 # Warm the cache
                 logger.debug("Preemptively retrieving and caching info from the backup destination to avoid peak demand")
-                data = await self._dest.get()
                 validity = nextSync + timedelta(minutes=1)
-                self._cache[self._dest.name()] = CacheItem(validity, data)
+                await self._coord.sourceCache().refresh(self._dest.name(), self._dest.get, validity)
                 self._offset = Random().random()
         except Exception as e:
             # Any error should make us avoid precaching for a solid day.
@@ -70,12 +62,9 @@ class DestinationPrecache(Worker, Precache):
         return warm_date
 
     def cached(self, source: str, date: datetime) -> Any:
-        cached = self._cache.get(source)
-        if cached and cached.valid_until >= date:
-            return cached.data
-        return None
+        return self._coord.sourceCache().cached(source, date)
 
     def clear(self):
-        """Clears any precached data"""
-        self._cache = {}
+        """Makes any precached data stale"""
+        self._coord.clearCaches()
         self._offset = Random().random()
@@ -21,6 +21,8 @@ class DriveBackup(AbstractBackup):
     """
     Represents a Home Assistant backup stored on Google Drive
     """
+    # Only what's needed from Drive's metadata is kept, rather than all of it
+    __slots__ = ('_id', '_can_delete_directly')
 
     def __init__(self, data: Dict[Any, Any]):
         props = ensureKey('appProperties', data, DRIVE_KEY_TEXT)
@@ -44,19 +46,23 @@ class DriveBackup(AbstractBackup):
             details=None,
             note=props.get(PROP_NOTE, None),
             pending=False)
-        self._drive_data = data
         self._id = ensureKey('id', data, DRIVE_KEY_TEXT)
+        self._can_delete_directly = self._checkCanDeleteDirectly(data)
 
     def id(self) -> str:
         return self._id
 
-    def canDeleteDirectly(self) -> str:
-        caps = self._drive_data.get("capabilities", {})
+    def canDeleteDirectly(self) -> bool:
+        return self._can_delete_directly
+
+    @staticmethod
+    def _checkCanDeleteDirectly(data: Dict[Any, Any]) -> bool:
+        caps = data.get("capabilities", {})
         if caps.get('canDelete', False):
             return True
 
         # check if the item is in a shared drive
-        sharedId = self._drive_data.get("driveId")
+        sharedId = data.get("driveId")
         if sharedId and len(sharedId) > 0 and caps.get("canTrash", False):
             # Its in a shared drive and trashable, so trash won't exhaust quota
             return False
@@ -12,11 +12,15 @@ logger = getLogger(__name__)
 
 HA_KEY_TEXT = "Home Assistant's backup metadata"
 
+# What the web UI shows about each addon in a backup
+ADDON_DETAIL_KEYS = ['name', 'slug', 'version', 'size']
+
 
 class HABackup(AbstractBackup):
     """
     Represents a Home Assistant backup stored locally in Home Assistant
     """
+    __slots__ = ('_data_cache', '_config', '_archive_count')
 
     def __init__(self, data: Dict[str, Any], data_cache: DataCache, config: Config, retained=False):
         super().__init__(
@@ -30,10 +34,23 @@ class HABackup(AbstractBackup):
             protected=ensureKey('protected', data, HA_KEY_TEXT),
             retained=retained,
             uploadable=True,
-            details=data,
+            details=self._compactDetails(data),
             pending=False)
         self._data_cache = data_cache
         self._config = config
+        self._archive_count = len(data.get("addons", [])) + len(data.get("folders", []))
+        if data.get("homeassistant", None) is not None:
+            # Supervisor backup query API doesn't quite match the create API, if the HA config folder
+            # is present in a backup then the Home Assistant version is present in its details
+            self._archive_count += 1
+
+    @staticmethod
+    def _compactDetails(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Keeps only the parts of the supervisor's info about a backup that get shown, instead of all of it"""
+        return {
+            'folders': list(data.get("folders", [])),
+            'addons': [{key: addon[key] for key in ADDON_DETAIL_KEYS if key in addon} for addon in data.get("addons", [])],
+        }
 
     def madeByTheAddon(self):
         return self._data_cache.backup(self.slug()).get(KEY_I_MADE_THIS, False)
@@ -53,12 +70,7 @@ class HABackup(AbstractBackup):
             return False
         if self._config.get(Setting.IGNORE_OTHER_BACKUPS):
             return True
-        archive_count = len(self.details().get("addons", [])) + len(self.details().get("folders", []))
-        if self.details().get("homeassistant", None) is not None:
-            # Supervisor backup query API doesn't quite match the create API, if the HA config folder
-            # is present in a backup then the Home Assistant version is present in its details
-            archive_count += 1
-        if archive_count == 1 and self._config.get(Setting.IGNORE_UPGRADE_BACKUPS):
+        if self._archive_count == 1 and self._config.get(Setting.IGNORE_UPGRADE_BACKUPS):
             return True
         return super().ignore()
 
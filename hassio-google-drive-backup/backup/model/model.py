@@ -1,16 +1,18 @@
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, date
 from io import IOBase
-from typing import Dict, Generic, List, Optional, Tuple, TypeVar, Union
+from typing import Dict, Generic, List, Optional, Set, Tuple, TypeVar, Union
 
 from injector import inject, singleton
 
 from .backupscheme import GenerationalScheme, OldestScheme, DeleteAfterUploadScheme
 from backup.config import Config, Setting, CreateOptions
 from backup.exceptions import DeleteMutlipleBackupsError, SimulatedError
-from backup.util import GlobalInfo, Estimator, DataCache
+from backup.util import GlobalInfo, Estimator, DataCache, TarIndex, PartialTar
 from .backups import AbstractBackup, Backup
 from .dummybackup import DummyBackup
-from .precache import Precache
+from .sourcecache import SourceCache
+from .catalog import BackupCatalog
 from backup.time import Time
 from backup.worker import Trigger
 from backup.logger import getLogger
@@ -20,6 +22,17 @@ logger = getLogger(__name__)
 T = TypeVar('T')
 
 
+@dataclass
+class BackupDelta:
+    """Backups added to (or updated in) and removed from a single source since it was last queried"""
+    source: str
+    added: Dict[str, AbstractBackup] = field(default_factory=dict)
+    removed: Set[str] = field(default_factory=set)
+
+    def isEmpty(self) -> bool:
+        return len(self.added) == 0 and len(self.removed) == 0
+
+
 class BackupSource(Trigger, Generic[T]):
     def __init__(self):
         super().__init__()
@@ -68,6 +81,22 @@ class BackupSource(Trigger, Generic[T]):
     async def read(self, backup: T) -> IOBase:
         raise NotImplementedError()
 
+    def canIndex(self) -> bool:
+        """True if the source can find what's inside its backups without reading all of them"""
+        return False
+
+    async def index(self, backup: T) -> TarIndex:
+        raise NotImplementedError()
+
+    def cachedIndex(self, backup: T) -> Optional[TarIndex]:
+        return None
+
+    async def restorePartial(self, backup: T, addons: List[str], folders: List[str], homeassistant: bool) -> None:
+        raise NotImplementedError()
+
+    async def restorePartialFrom(self, backup: AbstractBackup, tar: PartialTar) -> None:
+        raise NotImplementedError()
+
     async def retain(self, backup: T, retain: bool) -> None:
         pass
 
@@ -110,11 +139,11 @@ class Model():
     def __init__(self, config: Config, time: Time, source: BackupSource, dest: BackupDestination, info: GlobalInfo, estimator: Estimator, data_cache: DataCache):
         self.config: Config = config
         self.time = time
-        self.precache: Precache | None = None
+        self.cache: SourceCache | None = None
         self.source: BackupSource = source
         self.dest: BackupDestination = dest
         self.reinitialize()
-        self.backups: Dict[str, Backup] = {}
+        self.backups: BackupCatalog = BackupCatalog(config)
         self.firstSync = True
         self.info = info
         self.simulate_error = None
@@ -133,8 +162,8 @@ class Model():
     def allSources(self):
         return [self.source, self.dest]
 
-    def reinitialize(self, precache: Precache | None = None):
-        self.precache = precache
+    def reinitialize(self, cache: SourceCache | None = None):
+        self.cache = cache
         self._time_of_day: Optional[Tuple[int, int]] = self._parseTimeOfDay(self.config.get(Setting.BACKUP_TIME_OF_DAY))
 
         # SOMEDAY: this should be cached in config and regenerated on config updates, not here
@@ -188,8 +217,7 @@ class Model():
             return next
 
     def nextBackup(self, now: datetime, include_pending=True):
-        latest = max(filter(lambda s: not s.ignore() and (not s.isPending() or include_pending), self.backups.values()),
-                     default=None, key=lambda s: s.date())
+        latest = self.backups.latest(include_pending)
         if latest:
             latest = latest.date()
         return self._nextBackup(now, latest)
@@ -231,20 +259,8 @@ class Model():
             self._handleBackupDetails()
 
         if self.dest.enabled() and self.dest.upload():
-            # get the backups we should upload
-            uploads = []
-            for backup in self.backups.values():
-                if backup.getSource(self.source.name()) is not None and backup.getSource(self.source.name()).uploadable() and backup.getSource(self.dest.name()) is None and not backup.ignore():
-                    uploads.append(backup)
-            uploads.sort(key=lambda s: s.date())
-            uploads.reverse()
-            for upload in uploads:
-                # only upload if doing so won't result in it being deleted next
-                dummy = DummyBackup(
-                    "", upload.date(), self.dest.name(), "dummy_slug_name")
-                proposed = list(self.backups.values())
-                proposed.append(dummy)
-                if self._nextPurge(self.dest, proposed)[1] != dummy:
+            for upload in self._uploads():
+                if self._keepsUpload(upload):
                     if self.config.get(Setting.DELETE_BEFORE_NEW_BACKUP):
                         await self._purge(self.dest, pre_purge=True)
                     upload.addSource(await self.dest.save(upload, await self.source.read(upload)))
@@ -257,16 +273,48 @@ class Model():
         self._handleBackupDetails()
         self.source.postSync()
         self.dest.postSync()
-        self._data_cache.saveIfDirty()
+        await self._data_cache.saveIfDirty()
 
     def isWorkingThroughUpload(self):
         return self.dest.isWorking()
 
+    def needsSync(self) -> bool:
+        """Whether the backups as they are now leave a sync something to do, like uploading or purging a backup"""
+        if self.dest.needsConfiguration():
+            return False
+        for source in self.allSources():
+            if len(self._getPurgeList(source)) > 0:
+                return True
+        if self.dest.enabled() and self.dest.upload():
+            # sync() uploads newest first and stops at the first backup that wouldn't be kept, so whether it uploads
+            # anything comes down to the newest one.
+            uploads = self._uploads()
+            return len(uploads) > 0 and self._keepsUpload(uploads[0])
+        return False
+
+    def _uploads(self) -> List[Backup]:
+        """The backups that could be uploaded to the destination, newest first"""
+        uploads = []
+        for backup in self.backups.values():
+            if backup.getSource(self.source.name()) is not None and backup.getSource(self.source.name()).uploadable() and backup.getSource(self.dest.name()) is None and not backup.ignore():
+                uploads.append(backup)
+        uploads.sort(key=lambda s: s.date())
+        uploads.reverse()
+        return uploads
+
+    def _keepsUpload(self, upload: Backup) -> bool:
+        # only upload if doing so won't result in it being deleted next
+        dummy = DummyBackup(
+            "", upload.date(), self.dest.name(), "dummy_slug_name")
+        proposed = list(self.backups.values())
+        proposed.append(dummy)
+        return self._nextPurge(self.dest, proposed)[1] != dummy
+
     async def createBackup(self, options):
         if not self.source.enabled():
             return
 
-        self.estimator.refresh()
+        await self.estimator.refresh()
         if self.source.needsSpaceCheck:
             self.estimator.checkSpace(list(self.backups.values()))
         created = await self.source.create(options)
@@ -308,11 +356,13 @@ class Model():
     async def _syncBackups(self, sources: List[BackupSource], now: datetime):
         for source in sources:
             if source.enabled():
-                # check if we have the results from this source precached
+                # check if we have fresh results from this source cached
                 from_source: Dict[str, AbstractBackup] = None
-                if self.precache is not None:
-                    from_source = self.precache.cached(source.name(), now)
-                if not from_source:
+                if self.cache is not None:
+                    from_source = self.cache.cached(source.name(), now)
+                    if from_source is None:
+                        from_source = await self.cache.refresh(source.name(), source.get)
+                else:
                     from_source = await source.get()
             else:
                 from_source: Dict[str, AbstractBackup] = {}
@@ -0,0 +1,162 @@
+from asyncio import CancelledError, Future, Task, create_task, get_event_loop, shield
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from collections import deque
+
+from backup.time import Time
+from backup.logger import getLogger
+
+logger = getLogger(__name__)
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+# How many finished operations are kept around so the UI can find out how they went
+FINISHED_HISTORY = 20
+
+
+class Operation():
+    def __init__(self, id: int, kind: str, description: str, run: Callable[[], Awaitable[Any]], mergeable: bool, queued: datetime):
+        self.id = id
+        self.kind = kind
+        self.description = description
+        self.mergeable = mergeable
+        self.state = STATE_QUEUED
+        self.queued = queued
+        self.finished: Optional[datetime] = None
+        self.error: Optional[BaseException] = None
+        self.result: Any = None
+        self._run = run
+        self._future: Future = get_event_loop().create_future()
+
+    async def wait(self) -> Any:
+        # Coalesced callers share an operation, so one of them giving up mustn't cancel it for the rest.  Only the
+        # queue cancels operations.
+        return await shield(self._future)
+
+    def _finish(self):
+        if self._future.done():
+            return
+        if isinstance(self.error, CancelledError):
+            self._future.cancel()
+        elif self.error is not None:
+            self._future.set_exception(self.error)
+        else:
+            self._future.set_result(self.result)
+
+    def serialize(self, time: Time) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'description': self.description,
+            'state': self.state,
+            'queued': time.asRfc3339String(self.queued),
+            'finished': time.asRfc3339String(self.finished) if self.finished else None,
+            'error': None if self.error is None else str(self.error)
+        }
+
+
+class OperationQueue():
+    """
+    Runs operations one at a time in the order they were asked for, instead of turning away anything that comes in
+    while something else is running.
+
+    Mergeable operations (small changes like retaining, noting or deleting a backup) that are waiting next to each
+    other in the queue get run together in a single pass, followed by one call to after_batch, which is where work
+    that only needs to happen once after a group of changes belongs.  Asking for a kind of operation that
+    coalesces (like a sync) while one of that kind is still waiting just waits for that one instead.
+
+    Concurrent operations only change a backup's metadata (like retaining or noting it), which is safe to do while
+    something else is running.  If the queue is busy they don't wait in it, and instead get run in batches of their
+    own alongside whatever is, so someone in the UI isn't left waiting on a long upload to keep a backup.
+    """
+
+    def __init__(self, time: Time, after_batch: Callable[[], None]):
+        self._time = time
+        self._after_batch = after_batch
+        self._queue: Deque[Operation] = deque()
+        self._running: List[Operation] = []
+        self._finished: Deque[Operation] = deque(maxlen=FINISHED_HISTORY)
+        self._worker: Optional[Task] = None
+        # Concurrent operations that came in while the queue was busy, and the batch of them being run
+        self._side_queue: Deque[Operation] = deque()
+        self._side_running: List[Operation] = []
+        self._side_worker: Optional[Task] = None
+        self._next_id = 1
+
+    def isBusy(self) -> bool:
+        return len(self._queue) > 0 or len(self._running) > 0 or len(self._side_queue) > 0 or len(self._side_running) > 0
+
+    def submit(self, kind: str, description: str, run: Callable[[], Awaitable[Any]], mergeable=False, coalesce=False, concurrent=False) -> Operation:
+        if coalesce:
+            for waiting in self._queue:
+                if waiting.kind == kind:
+                    return waiting
+        operation = Operation(self._next_id, kind, description, run, mergeable or concurrent, self._time.now())
+        self._next_id += 1
+        if concurrent and (len(self._queue) > 0 or len(self._running) > 0):
+            self._side_queue.append(operation)
+            if self._side_worker is None or self._side_worker.done():
+                self._side_worker = create_task(self._work(self._side_queue, self._side_running), name="Concurrent operations")
+            return operation
+        self._queue.append(operation)
+        if self._worker is None or self._worker.done():
+            self._worker = create_task(self._work(self._queue, self._running), name="Operation queue")
+        return operation
+
+    async def run(self, kind: str, description: str, run: Callable[[], Awaitable[Any]], mergeable=False, coalesce=False, concurrent=False) -> Any:
+        return await self.submit(kind, description, run, mergeable=mergeable, coalesce=coalesce, concurrent=concurrent).wait()
+
+    def operations(self) -> List[Dict[str, Any]]:
+        """Every operation that's waiting, running or recently finished, oldest first"""
+        running = [operation for operation in self._running + self._side_running if operation.finished is None]
+        return [operation.serialize(self._time) for operation in list(self._finished) + running + list(self._side_queue) + list(self._queue)]
+
+    async def _work(self, queue: Deque[Operation], running: List[Operation]):
+        try:
+            while len(queue) > 0:
+                batch = [queue.popleft()]
+                while batch[0].mergeable and len(queue) > 0 and queue[0].mergeable:
+                    batch.append(queue.popleft())
+                running.extend(batch)
+                if len(batch) > 1:
+                    logger.debug("Running {0} queued changes together".format(len(batch)))
+                for operation in batch:
+                    await self._runOne(operation)
+                if batch[0].mergeable:
+                    try:
+                        self._after_batch()
+                    except Exception as e:
+                        logger.printException(e)
+                # Nothing in a batch is reported as finished until the whole batch is, so whoever asked for it sees
+                # the work done after it too.
+                for operation in batch:
+                    operation._finish()
+                running.clear()
+        finally:
+            # Only matters if the queue itself gets cancelled, in which case nothing left in it is going to run
+            for operation in running + list(queue):
+                if operation.finished is not None:
+                    operation._finish()
+                else:
+                    operation._future.cancel()
+            running.clear()
+            queue.clear()
+
+    async def _runOne(self, operation: Operation):
+        operation.state = STATE_RUNNING
+        try:
+            operation.result = await operation._run()
+            operation.state = STATE_DONE
+        except CancelledError as e:
+            operation.state = STATE_FAILED
+            operation.error = e
+            raise
+        except Exception as e:
+            operation.state = STATE_FAILED
+            operation.error = e
+        finally:
+            operation.finished = self._time.now()
+            self._finished.append(operation)
@@ -0,0 +1,115 @@
+from asyncio import CancelledError, Task, create_task, current_task
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from backup.time import Time
+from .backups import AbstractBackup
+from .precache import Precache
+
+
+@dataclass
+class CachedListing:
+    backups: Dict[str, AbstractBackup]
+    fetched: datetime
+    # The listing can stand in for asking the source again until this time.  None means it's stale.
+    fresh_until: Optional[datetime] = None
+
+    def isFresh(self, date: datetime) -> bool:
+        return self.fresh_until is not None and self.fresh_until >= date
+
+
+class SourceCache(Precache):
+    """
+    The most recent listing of backups from each source.  Changes made through the addon get written into the
+    listing one backup at a time rather than throwing it away, so a listing stays usable until something outside the
+    addon could have changed the source.
+
+    Only fresh listings are handed to a sync, since it decides what to upload and delete from them.  Stale listings
+    are kept so they can still answer questions that don't need to be exact, and anything asking for a source to be
+    listed again shares a refresh that's already in progress rather than starting another one.
+    """
+
+    def __init__(self, time: Time):
+        self._time = time
+        self._listings: Dict[str, CachedListing] = {}
+        self._refreshes: Dict[str, Task] = {}
+        # Counts changes written into each source's listing, to notice ones made while a refresh was running
+        self._changes: Dict[str, int] = {}
+
+    def cached(self, source: str, date: datetime) -> Optional[Dict[str, AbstractBackup]]:
+        listing = self._listings.get(source)
+        if listing is not None and listing.isFresh(date):
+            return dict(listing.backups)
+        return None
+
+    def listing(self, source: str) -> Optional[Dict[str, AbstractBackup]]:
+        """The last listing from a source, whether or not it's fresh"""
+        listing = self._listings.get(source)
+        if listing is None:
+            return None
+        return dict(listing.backups)
+
+    def isFresh(self, source: str, date: datetime) -> bool:
+        listing = self._listings.get(source)
+        return listing is not None and listing.isFresh(date)
+
+    def store(self, source: str, backups: Dict[str, AbstractBackup], fresh_until: Optional[datetime] = None):
+        self._listings[source] = CachedListing(dict(backups), self._time.now(), fresh_until)
+
+    def markFresh(self, source: str, fresh_until: datetime):
+        """Lets a source's listing stand in for listing it again, for when it's known to be up to date"""
+        listing = self._listings.get(source)
+        if listing is not None:
+            listing.fresh_until = fresh_until
+
+    def update(self, source: str, backup: Optional[AbstractBackup]):
+        """Replaces one backup in a source's listing with a version that was just changed"""
+        if backup is None:
+            return
+        self._changed(source)
+        listing = self._listings.get(source)
+        if listing is not None:
+            listing.backups[backup.slug()] = backup
+
+    def remove(self, source: str, slug: str):
+        self._changed(source)
+        listing = self._listings.get(source)
+        if listing is not None:
+            listing.backups.pop(slug, None)
+
+    def expire(self):
+        """Keeps every listing around but makes them stale, so they'll be asked for again before the next sync uses them"""
+        for listing in self._listings.values():
+            listing.fresh_until = None
+
+    def clear(self):
+        self._listings = {}
+
+    async def refresh(self, source: str, fetch: Callable[[], Awaitable[Dict[str, AbstractBackup]]], fresh_until: Optional[datetime] = None) -> Dict[str, AbstractBackup]:
+        """Lists a source's backups with fetch(), joining a refresh of it that's already running instead of starting another"""
+        while True:
+            task = self._refreshes.get(source)
+            if task is None or task.done():
+                task = create_task(self._refresh(source, fetch, fresh_until), name="Refresh backups from {0}".format(source))
+                self._refreshes[source] = task
+            try:
+                return dict(await task)
+            except CancelledError:
+                # Cancelling any caller cancels the refresh it's waiting on (eg cancelling a sync should stop its
+                # requests) so the other callers start a refresh of their own.
+                if current_task().cancelling():
+                    raise
+
+    async def _refresh(self, source: str, fetch: Callable[[], Awaitable[Dict[str, AbstractBackup]]], fresh_until: Optional[datetime]) -> Dict[str, AbstractBackup]:
+        changes = self._changes.get(source, 0)
+        backups = await fetch()
+        if changes != self._changes.get(source, 0):
+            # Something changed while the source was being listed, so the listing might already be out of date
+            backups = await fetch()
+        self.store(source, backups, fresh_until)
+        return backups
+
+    def _changed(self, source: str):
+        self._changes[source] = self._changes.get(source, 0) + 1
+
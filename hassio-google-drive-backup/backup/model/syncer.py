@@ -3,6 +3,7 @@ from typing import List
 from injector import inject, singleton
 
 from .coordinator import Coordinator
+from .model import BackupSource
 from backup.time import Time
 from backup.worker import Worker, Trigger
 from backup.logger import getLogger
@@ -20,6 +21,10 @@ class Scyncer(Worker):
         self.triggers: List[Trigger] = triggers
         self._time = time
 
+    def dependsOn(self):
+        # Syncing needs to know what's going on with the supervisor first
+        return [BackupSource]
+
     async def checkforSync(self):
         try:
             doSync = False
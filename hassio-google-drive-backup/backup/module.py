@@ -17,7 +17,8 @@ from backup.worker import Trigger
 from backup.watcher import Watcher
 from backup.ui import UiServer, Restarter
 from backup.logger import getLogger
-from backup.debug import DebugServer
+from backup.debug import DebugServer, LoopMonitor
+from backup.file import AsyncStorage
 from .debugworker import DebugWorker
 from .tracing_session import TracingSession
 logger = getLogger(__name__)
@@ -54,9 +55,9 @@ class BaseModule(Module):
     @singleton
     def getStartables(self, debug_server: DebugServer, ha_updater: HaUpdater, debugger: DebugWorker, ha_source: HaSource,
                       server: UiServer, restarter: Restarter, syncer: Scyncer, watcher: Watcher, stopper: AddonStopper, 
-                      precache: Precache, integration_ws: IntegrationWebSocketServer) -> List[Startable]:
-        # Order here matters, since its the order in which components of the addon are initialized.
-        return [debug_server, integration_ws, ha_updater, debugger, ha_source, server, restarter, syncer, watcher, stopper, precache]
+                      precache: Precache, integration_ws: IntegrationWebSocketServer, loop_monitor: LoopMonitor) -> List[Startable]:
+        # Each of these starts as soon as the ones it dependsOn() have, which have to come earlier in this list.
+        return [loop_monitor, debug_server, integration_ws, ha_updater, debugger, ha_source, server, restarter, syncer, watcher, stopper, precache]
 
     @provider
     @singleton
@@ -70,7 +71,7 @@ class BaseModule(Module):
 class MainModule(Module):
     @provider
     @singleton
-    def getConfig(self) -> Config:
+    def getConfig(self, storage: AsyncStorage) -> Config:
         alt_config = None
         index = 1
         for arg in sys.argv[1:]:
@@ -86,4 +87,5 @@ class MainModule(Module):
         else:
             config = Config.fromFile(Setting.CONFIG_FILE_PATH.default())
         logger.overrideLevel(config.get(Setting.CONSOLE_LOG_LEVEL), config.get(Setting.LOG_LEVEL))
+        config.useStorage(storage)
         return config
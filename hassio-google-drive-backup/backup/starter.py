@@ -1,7 +1,10 @@
+import asyncio
+import time
 from injector import inject, singleton
-from typing import List
+from typing import Dict, List
 
 from .config import Startable, Config, Setting
+from .exceptions import LogicError
 from .logger import getLogger
 
 logger = getLogger(__name__)
@@ -9,6 +12,11 @@ logger = getLogger(__name__)
 
 @singleton
 class Starter(Startable):
+    """
+    Starts every part of the addon, each as soon as the parts it depends on have started, so something slow to start
+    (like waiting on the supervisor) only holds up what actually needs it.  The web UI in particular doesn't, so it
+    comes up right away.
+    """
     @inject
     def __init__(self, config: Config, startables: List[Startable]):
         self.startables = startables
@@ -16,9 +24,40 @@ class Starter(Startable):
 
     async def start(self):
         logger.overrideLevel(self.config.get(Setting.CONSOLE_LOG_LEVEL), self.config.get(Setting.LOG_LEVEL))
+        began = time.perf_counter()
+        tasks: Dict[Startable, asyncio.Task] = {}
         for startable in self.startables:
-            await startable.start()
+            dependencies = [tasks[other] for other in self._dependencies(startable)]
+            tasks[startable] = asyncio.create_task(self._start(startable, dependencies, began), name="Start " + self._name(startable))
+        # Everything gets its chance to start before any failure is raised
+        for result in await asyncio.gather(*tasks.values(), return_exceptions=True):
+            if isinstance(result, BaseException):
+                raise result
 
     async def stop(self):
         for startable in self.startables:
             await startable.stop()
+
+    def _dependencies(self, startable: Startable) -> List[Startable]:
+        dependencies = []
+        for kind in startable.dependsOn():
+            matches = [other for other in self.startables if other is not startable and isinstance(other, kind)]
+            if len(matches) == 0:
+                raise LogicError("{0} depends on {1}, which isn't started by the addon".format(self._name(startable), kind.__name__))
+            for other in matches:
+                if self.startables.index(other) > self.startables.index(startable):
+                    # Keeping dependencies earlier in the list means they can't form a cycle
+                    raise LogicError("{0} depends on {1}, which has to come before it".format(self._name(startable), self._name(other)))
+            dependencies.extend(matches)
+        return dependencies
+
+    async def _start(self, startable: Startable, dependencies: List[asyncio.Task], began: float):
+        if len(dependencies) > 0:
+            await asyncio.gather(*dependencies)
+        start = time.perf_counter()
+        await startable.start()
+        now = time.perf_counter()
+        logger.debug("Started {0} in {1:.2f}s ({2:.2f}s after starting up)".format(self._name(startable), now - start, now - began))
+
+    def _name(self, startable: Startable) -> str:
+        return type(startable).__name__
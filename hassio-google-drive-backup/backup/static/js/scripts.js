@@ -67,8 +67,8 @@ function test(target) {
   console.log(target);
 }
 
-function downloadBackup(target) {
-  window.location.assign('download?slug=' + encodeURIComponent($(target).data('backup').slug));
+function downloadBackup(target, decrypt = false) {
+  window.location.assign('download?slug=' + encodeURIComponent($(target).data('backup').slug) + (decrypt ? '&decrypt=true' : ''));
 }
 
 function uploadBackup(target) {
@@ -1,5 +1,7 @@
 import asyncio
+import re
 from datetime import datetime, timedelta
+from functools import lru_cache
 from .logger import getLogger
 import pytz
 import os
@@ -11,7 +13,6 @@ from dateutil.tz import tzlocal
 from injector import inject, singleton
 from dateutil.relativedelta import relativedelta
 import collections
-from dateutil.parser import parse
 
 
 # this hack is for dateutil, it imports Callable from the wrong place
@@ -20,8 +21,17 @@ collections.Callable = collections.abc.Callable
 
 logger = getLogger(__name__)
 
+# The shapes of ISO-8601/RFC3339 timestamps the supervisor, Google Drive and the addon itself write, which
+# datetime.fromisoformat() parses the same way dateutil does, only much faster.  Anything else goes to dateutil.
+ISO_8601 = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}(?::?\d{2})?)?)?")
 
+
+@lru_cache(maxsize=None)
 def get_local_tz():
+    """
+    Works out the local timezone the first time its needed.  This can mean reading the system's timezone files, so it
+    shouldn't happen while the addon's modules are being imported.
+    """
     methods = [
         _infer_timezone_from_env,
         _infer_timezone_from_name,
@@ -39,6 +49,8 @@ def get_local_tz():
 
 
 def _infer_timezone_from_offset():
+    # Scanning every timezone is slow, but get_local_tz() caches what it finds so it only happens once.  A named
+    # timezone is needed (rather than a fixed offset) so scheduled backups follow daylight saving changes.
     now = datetime.now()
     desired_offset = tzlocal().utcoffset(now)
     for tz_name in pytz.all_timezones:
@@ -73,10 +85,20 @@ def _infer_timezone_from_env():
 @singleton
 class Time(object):
     @inject
-    def __init__(self, local_tz=get_local_tz()):
-        self.local_tz = local_tz
+    def __init__(self, local_tz=None):
+        self._local_tz = local_tz
         self._offset = timedelta(seconds=0)
 
+    @property
+    def local_tz(self):
+        if self._local_tz is None:
+            self._local_tz = get_local_tz()
+        return self._local_tz
+
+    @local_tz.setter
+    def local_tz(self, tz):
+        self._local_tz = tz
+
     def now(self) -> datetime:
         return datetime.now(pytz.utc) + self._offset
 
@@ -93,7 +115,16 @@ class Time(object):
 
     @classmethod
     def parse(cls, text: str) -> datetime:
-        ret = parse(text)
+        ret = None
+        if ISO_8601.fullmatch(text):
+            try:
+                ret = datetime.fromisoformat(text)
+            except ValueError:
+                # Out of range values, which dateutil reports the way it always has
+                pass
+        if ret is None:
+            from dateutil.parser import parse
+            ret = parse(text)
         if ret.tzinfo is None:
             ret = ret.replace(tzinfo=utc)
         return ret
@@ -5,6 +5,7 @@ from injector import inject, singleton
 from backup.time import Time
 from backup.model import Model, Coordinator
 from backup.logger import getLogger
+from backup.debug import LoopMonitor
 from datetime import timedelta
 
 logger = getLogger(__name__)
@@ -13,8 +14,9 @@ logger = getLogger(__name__)
 @singleton
 class Debug():
     @inject
-    def __init__(self, model: Model, coord: Coordinator, time: Time):
+    def __init__(self, model: Model, coord: Coordinator, time: Time, loop_monitor: LoopMonitor):
         self._model = model
+        self._loop_monitor = loop_monitor
         self._coord = coord
         self._time = time
 
@@ -60,6 +62,9 @@ class Debug():
             resp.append(data)
         return web.json_response(resp)
 
+    async def getLoopLag(self, request):
+        return web.json_response(self._loop_monitor.stats())
+
     async def simerror(self, request: Request):
         error = request.query.get("error", "")
         if len(error) == 0:
@@ -16,8 +16,15 @@ class Restarter(Startable):
         self._old_options = config.getServerOptions()
         self._restarted = Event()
 
+    def dependsOn(self):
+        # Restarting the server only makes sense once it's been started the first time
+        return [UiServer]
+
     async def start(self):
         self._config.subscribe(self.trigger)
+        # Other parts of the addon can update the config while starting up, before there was anything subscribed to
+        # notice, so check for a change that happened in the meantime.
+        self.trigger()
 
     async def check(self):
         if self._old_options == self._config.getServerOptions():
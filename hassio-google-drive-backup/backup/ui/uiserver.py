@@ -15,8 +15,8 @@ from injector import ClassAssistedBuilder, ProviderOf, inject, singleton
 from backup.config import Config, Setting, CreateOptions, BoolValidator, Startable, Version, VERSION
 from backup.const import SOURCE_GOOGLE_DRIVE, SOURCE_HA, GITHUB_BUG_TEMPLATE
 from backup.model import Coordinator, Backup, AbstractBackup
-from backup.exceptions import KnownError, GoogleCredGenerateError, ensureKey
-from backup.util import GlobalInfo, Estimator, DataCache, UpgradeFlags
+from backup.exceptions import KnownError, GoogleCredGenerateError, BackupDecryptError, ensureKey
+from backup.util import GlobalInfo, Estimator, DataCache, UpgradeFlags, TarDecryptor, TarIndex
 from backup.file import File
 from backup.ha import HaSource, PendingBackup, BACKUP_NAME_KEYS, HaRequests, HaUpdater
 from backup.ha import Password
@@ -108,6 +108,7 @@ class UiServer(Trigger, Startable):
             Setting.SEND_ERROR_REPORTS)
         status['warn_ingress_upgrade'] = False
         status['cred_version'] = self._global_info.credVersion
+        status['operations'] = self._coord.operations()
         next = self._coord.nextBackupTime()
         if next is None:
             status['next_backup_text'] = "Disabled"
@@ -125,9 +126,9 @@ class UiServer(Trigger, Startable):
             status['next_backup_machine'] = self._time.asRfc3339String(next)
             status['next_backup_detail'] = self._time.toLocal(
                 next).strftime("%c")
-        not_ignored = list(filter(lambda s: not s.ignore(), self._coord.backups()))
-        if len(not_ignored) > 0:
-            latest = not_ignored[len(not_ignored) - 1].date()
+        latest_backup = self._coord.catalog().latest()
+        if latest_backup is not None:
+            latest = latest_backup.date()
             status['last_backup_text'] = self._time.formatDelta(latest)
             status['last_backup_machine'] = self._time.asRfc3339String(
                 latest)
@@ -200,6 +201,15 @@ class UiServer(Trigger, Startable):
                 'ignored': source.ignore(),
             })
 
+        details = backup.details()
+        folders = details.get("folders", [])
+        addons = self.formatAddons(details)
+        index = self._coord.cachedIndex(backup)
+        if index is not None and len(folders) + len(addons) == 0:
+            # Details only come from Home Assistant, so for backups that aren't there use what was found indexing it
+            folders = index.info.get("folders", [])
+            addons = self.formatIndexedAddons(index)
+
         data = {
             'name': backup.name(),
             'slug': backup.slug(),
@@ -209,9 +219,13 @@ class UiServer(Trigger, Startable):
             'createdAt': self._time.formatDelta(backup.date()),
             'isPending': ha is not None and type(ha) is PendingBackup,
             'protected': backup.protected(),
+            # Only backups that have been indexed are known to use an encryption format that can be undone while downloading
+            'decryptable': backup.protected() and index is not None and index.decryptable(),
             'type': backup.backupType(),
-            'folders': backup.details().get("folders", []),
-            'addons': self.formatAddons(backup.details()),
+            'folders': folders,
+            'addons': addons,
+            'contents': None if index is None else self.formatContents(index),
+            'indexable': index is None and ha is None and self._coord.canIndex(backup),
             'sources': sources,
             'haVersion': False if backup.version() is None else backup.version(),
             'uploadable': backup.getSource(SOURCE_HA) is None and len(backup.sources) > 0,
@@ -224,6 +238,8 @@ class UiServer(Trigger, Startable):
         }
         if isinstance(ha, PendingBackup):
             data["super_logs"] = ha.error_logs()
+            data["progress"] = ha.progress()
+            data["stage"] = ha.stage()
         return data
 
     def formatAddons(self, backup_data):
@@ -238,10 +254,33 @@ class UiServer(Trigger, Startable):
             })
         return addons
 
+    def formatIndexedAddons(self, index: TarIndex):
+        addons = []
+        for content in index.contents():
+            if content['type'] == "addon":
+                addons.append({
+                    'name': content['name'] or "Unknown",
+                    'slug': content['slug'],
+                    'version': content['version'] or "",
+                    'size': self._estimator.asSizeString(content['size']),
+                })
+        return addons
+
+    def formatContents(self, index: TarIndex):
+        contents = []
+        for content in index.contents():
+            contents.append({
+                'type': content['type'],
+                'slug': content['slug'],
+                'name': content['name'],
+                'size': self._estimator.asSizeString(content['size']),
+            })
+        return contents
+
     async def manualCredCheckLoop(self, auth: AuthCodeQuery):
         try:
             creds = await auth.waitForPermission()
-            self._coord.saveCreds(creds)
+            await self._coord.saveCreds(creds)
             self._data_cache.addFlag(UpgradeFlags.NOTIFIED_ABOUT_OOB_FLOW)
         except asyncio.CancelledError:
             # Cancelled, thats fine
@@ -323,6 +362,22 @@ class UiServer(Trigger, Startable):
         await self._coord.retain(data['sources'], slug)
         return web.json_response({'message': "Updated the backup's settings"})
 
+    async def backupContents(self, request: Request):
+        slug = request.query.get("slug", "")
+        index = await self._coord.index(slug)
+        return web.json_response({
+            'message': "Found what's in the backup",
+            'contents': self.formatContents(index)
+        })
+
+    async def restorePartial(self, request: Request):
+        data = await request.json()
+        slug = data['slug']
+
+        self._coord.getBackup(slug)
+        await self._coord.restorePartial(slug, data.get('addons', []), data.get('folders', []), data.get('homeassistant', False))
+        return web.json_response({'message': "Restored the selected parts of the backup"})
+
     async def note(self, request: Request):
         data = await request.json()
         slug = data['slug']
@@ -399,7 +454,7 @@ class UiServer(Trigger, Startable):
         self._global_info.setIngoreErrorsForNow(True)
         creds_deserialized = json.loads(str(base64.b64decode(request.query.get('creds').strip().encode("utf-8")), 'utf-8'))
         creds = Creds.load(self._time, creds_deserialized)
-        self._coord.saveCreds(creds)
+        await self._coord.saveCreds(creds)
 
         # Build the redirect url
         if 'host' in request.query:
@@ -484,7 +539,7 @@ class UiServer(Trigger, Startable):
 
     async def dismiss_remove_stop_addons(self, request: Request):
         self._data_cache.addFlag(UpgradeFlags.NOTIFIED_ABOUT_STOPADDONS)
-        self._data_cache.saveIfDirty()
+        await self._data_cache.saveIfDirty()
         return web.json_response({'message': 'Acknowledged'})
 
 
@@ -495,7 +550,7 @@ class UiServer(Trigger, Startable):
         validated = self.config.validateUpdate({Setting.IGNORE_UPGRADE_BACKUPS: switch})
         await self._updateConfiguration(validated)
         self._data_cache.addFlag(UpgradeFlags.NOTIFIED_ABOUT_IGNORED_BACKUPS)
-        self._data_cache.saveIfDirty()
+        await self._data_cache.saveIfDirty()
         if switch:
             return web.json_response({'message': 'Configuration updated'})
         else:
@@ -573,7 +628,7 @@ class UiServer(Trigger, Startable):
 
     async def aknowledgeooboauth(self, request: Request):
         self._data_cache.addFlag(UpgradeFlags.NOTIFIED_ABOUT_OOB_FLOW)
-        self._data_cache.saveIfDirty()
+        await self._data_cache.saveIfDirty()
         return web.json_response({'message': "Acknowledged"})
 
     async def _updateConfiguration(self, new_config, backup_folder_id=None, trigger=True):
@@ -632,19 +687,31 @@ class UiServer(Trigger, Startable):
     async def download(self, request: Request):
         slug = request.query.get("slug", "")
         backup = self._coord.getBackup(slug)
+        password = None
+        if BoolValidator.strToBool(request.query.get("decrypt", "false")) and backup.protected():
+            password = Password(self.config).resolve()
+            if password is None:
+                raise BackupDecryptError(backup.name(), "no backup password is configured")
         stream = await self._coord.download(slug)
         await stream.setup()
         resp = web.StreamResponse()
         resp.content_type = 'application/tar'
         resp.headers['Content-Disposition'] = 'attachment; filename="{}.tar"'.format(
             backup.name())
-        resp.headers['Content-Length'] = str(stream.size())
+        chunks = stream.generator(self.config.get(Setting.DEFAULT_CHUNK_SIZE))
+        if password is None:
+            resp.headers['Content-Length'] = str(stream.size())
+        else:
+            # The decrypted backup's size isn't known until its been completely decrypted
+            resp.enable_chunked_encoding()
+            decryptor = TarDecryptor(chunks, password)
+            # A backup that can't be decrypted gets an error instead of the start of a download that stops partway
+            await decryptor.verify()
+            chunks = decryptor.generator()
 
         await resp.prepare(request)
 
-        # SOMEDAY: consider re-streaming a decrypted tar file for the sake of convenience
-
-        async for chunk in stream.generator(self.config.get(Setting.DEFAULT_CHUNK_SIZE)):
+        async for chunk in chunks:
             await resp.write(chunk)
 
         await resp.write_eof()
@@ -724,12 +791,15 @@ class UiServer(Trigger, Startable):
 
         self._addRoute(app, self.upload)
         self._addRoute(app, self.download)
+        self._addRoute(app, self.backupContents)
+        self._addRoute(app, self.restorePartial)
         self._addRoute(app, self.deleteSnapshot)
         self._addRoute(app, self.retain)
         self._addRoute(app, self.note)
 
         self._addRoute(app, self._debug.simerror)
         self._addRoute(app, self._debug.getTasks)
+        self._addRoute(app, self._debug.getLoopLag)
         self._addRoute(app, self._debug.timeoffset)
         self._addRoute(app, self.makeanissue)
         self._addRoute(app, self.ignorestartupcooldown)
@@ -5,5 +5,10 @@ from .estimator import Estimator
 from .globalinfo import GlobalInfo
 from .resolver import Resolver
 from .rangelookup import RangeLookup
-from .data_cache import DataCache, KEY_CREATED, KEY_I_MADE_THIS, KEY_PENDING, KEY_NOTE, KEY_IGNORE, KEY_LAST_SEEN, KEY_NAME, CACHE_EXPIRATION_DAYS, UpgradeFlags
+from .data_cache import DataCache, KEY_CONTENTS, KEY_CREATED, KEY_I_MADE_THIS, KEY_PENDING, KEY_NOTE, KEY_IGNORE, KEY_LAST_SEEN, KEY_NAME, CACHE_EXPIRATION_DAYS, UpgradeFlags
 from .token_bucket import TokenBucket
+from .jsonpatch import JsonPatch
+from .rateestimator import RateEstimator
+from .tardecryptor import TarDecryptor
+from .tarindex import TarIndex, TarMember
+from .partialtar import PartialTar
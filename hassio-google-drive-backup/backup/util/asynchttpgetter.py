@@ -5,17 +5,18 @@ from typing import Dict
 from aiohttp import ClientSession
 from aiohttp.client import ClientResponse, ClientPayloadError, ClientOSError
 from asyncio.exceptions import TimeoutError
-from collections import deque
 
 from ..exceptions import LogicError, ensureKey
 from ..logger import getLogger
 from ..time import Time
+from .rateestimator import RateEstimator
 
 logger = getLogger(__name__)
 
 CONTENT_LENGTH_HEADER = "content-length"
 CONTENT_LENGTH_ERROR = "Content size must be provided if the webserver doesn't provide it"
 SERVER_CONTENT_LENGTH_ERROR = "Server returned a content length that didn't match the requested size"
+RANGE_ERROR_MESSAGE = "Server returned the whole file when only part of it was requested"
 POSITION_ERROR_MESSAGE = "AsyncHttpGetter must also be set up at position 0"
 DEFAULT_CHUNK_SIZE = 1024 * 1024
 
@@ -48,8 +49,8 @@ class AsyncHttpGetter:
         # Where the resposne currently starts
         self._responseStart = 0
 
-        self._history = deque()
         self._time = time
+        self._rate = RateEstimator(time)
         self._startTime = self._time.now()
         self.timeoutFactory = timeoutFactory
         self.otherErrorFactory = otherErrorFactory
@@ -66,7 +67,7 @@ class AsyncHttpGetter:
             raise LogicError(
                 CONTENT_LENGTH_ERROR)
 
-        self._history.append([self._time.now(), 0])
+        self._rate.start()
         return self._size
 
     def _ensureSetup(self):
@@ -102,53 +103,17 @@ class AsyncHttpGetter:
 
     # return the estimated speed of the tranfser in bytes/second
     def speed(self, period: timedelta = timedelta(seconds=10)):
-        if len(self._history) < 2:
+        return self._rate.average(period)
+
+    # return the speed of the most recent reads in bytes/second
+    def instantSpeed(self):
+        return self._rate.instant()
+
+    # return the estimated time until the transfer completes
+    def eta(self):
+        if self._size is None:
             return None
-        now = self._time.now()
-        intervals = []
-        current = self._history[0]
-        last_speed = 0
-        for x in range(1, len(self._history)):
-            next = self._history[x]
-            seconds = (next[0] - current[0]).total_seconds()
-            data = next[1] - current[1]
-            if seconds == 0:
-                speed = 0  # avoid div by 0
-            else:
-                speed = data / seconds
-            intervals.append([current[0], next[0], speed])
-            current = next
-            last_speed = speed
-
-        time_since_last = now - current[0]
-        if time_since_last > period:
-            # linear decay the "estimated" rate over the period
-            diff = time_since_last - period
-            if diff > period:
-                return 0
-            else:
-                return last_speed * (1 - diff.total_seconds() / period.total_seconds())
-
-        # behave as though we continued with the pseed form the last interval
-        intervals.append([current[0], now, last_speed])
-
-        # calculate the time-averaged speed over the given period
-        stop = now
-        start = now - period
-        total = 0
-        minimum_time = now
-        for interval in intervals:
-            if start > interval[1]:
-                continue
-            if stop < interval[0]:
-                continue
-            overlap_start = max(start, interval[0])
-            overlap_stop = min(stop, interval[1])
-            if overlap_stop > overlap_start:
-                total += (overlap_stop - overlap_start).total_seconds() * interval[2]
-            if overlap_start < minimum_time:
-                minimum_time = overlap_start
-        return total / (now - minimum_time).total_seconds()
+        return self._rate.eta(self._size - self._position)
 
     def startTime(self):
         return self._startTime
@@ -156,6 +121,34 @@ class AsyncHttpGetter:
     def __format__(self, format_spec: str) -> str:
         return str(int(self.progress()))
 
+    async def readAt(self, position: int, count: int) -> bytes:
+        """
+        Reads up to count bytes starting at position with a request for just those bytes, without disturbing the
+        stream's position or any response it's in the middle of reading.
+        """
+        self._ensureSetup()
+        end = min(position + count, self._size)
+        if end <= position:
+            return b''
+        headers = self._headers.copy()
+        headers['range'] = "bytes=%s-%s" % (position, end - 1)
+        resp = await self._get(headers)
+        try:
+            if resp.status != 206 and position != 0:
+                raise LogicError(RANGE_ERROR_MESSAGE)
+            try:
+                return await resp.content.readexactly(end - position)
+            except TimeoutError:
+                if self.timeoutFactory is not None:
+                    raise self.timeoutFactory()
+                raise
+            except (ClientPayloadError, ClientOSError):
+                if self.otherErrorFactory is not None:
+                    raise self.otherErrorFactory()
+                raise
+        finally:
+            resp.release()
+
     async def _startReadRemoteAt(self, where: int):
         headers = self._headers.copy()
         # request a byte range
@@ -163,6 +156,14 @@ class AsyncHttpGetter:
             headers['range'] = "bytes=%s-%s" % (self._position, self._size - 1)
         if self._response is not None:
             self._response.release()
+        resp = await self._get(headers)
+        if where == 0 and self._size is not None and CONTENT_LENGTH_HEADER in resp.headers and int(resp.headers[CONTENT_LENGTH_HEADER]) != self._size:
+            resp.release()
+            raise LogicError(SERVER_CONTENT_LENGTH_ERROR)
+        self._response = resp
+        self._responseStart = where
+
+    async def _get(self, headers: Dict[str, str]) -> ClientResponse:
         try:
             resp = await self._session.get(self._url, headers=headers, timeout=self.timeout)
         except TimeoutError:
@@ -178,11 +179,7 @@ class AsyncHttpGetter:
                 raise self.otherErrorFactory()
             raise
         resp.raise_for_status()
-        if where == 0 and self._size is not None and CONTENT_LENGTH_HEADER in resp.headers and int(resp.headers[CONTENT_LENGTH_HEADER]) != self._size:
-            resp.release()
-            raise LogicError(SERVER_CONTENT_LENGTH_ERROR)
-        self._response = resp
-        self._responseStart = where
+        return resp
 
     async def read(self, count=DEFAULT_CHUNK_SIZE):
         self._ensureSetup()
@@ -191,7 +188,7 @@ class AsyncHttpGetter:
             return ret
 
         # See if we need to move the stream elsewhere
-        if self._responseStart != self._position:
+        if self._response is None or self._responseStart != self._position:
             # Reset the stream's position
             await self._startReadRemoteAt(self._position)
 
@@ -217,9 +214,7 @@ class AsyncHttpGetter:
         # Keep track of where we are in the stream
         self._responseStart += len(data)
         self._position += len(data)
-        self._history.append([self._time.now(), self._position])
-        if len(self._history) > 50:
-            self._history.popleft()
+        self._rate.record(len(data))
 
         ret.seek(0)
         return ret
@@ -228,8 +223,12 @@ class AsyncHttpGetter:
         await self.setup()
 
     async def __aexit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
         if self._response is not None:
             self._response.release()
+            self._response = None
 
     def __aiter__(self):
         return self
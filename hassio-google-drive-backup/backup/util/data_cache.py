@@ -1,7 +1,7 @@
 from datetime import timedelta
 from enum import Enum, unique
 from backup.config import Config, Setting, VERSION, Version
-from backup.file import JsonFileSaver
+from backup.file import JsonFileSaver, AsyncStorage
 from backup.const import NECESSARY_OLD_BACKUP_PLURAL_NAME
 from injector import inject, singleton
 from ..time import Time
@@ -17,6 +17,8 @@ KEY_LAST_VERSION = "last_verison"
 KEY_UPGRADES = "upgrades"
 KEY_FLAGS = "flags"
 KEY_NOTE = "note"
+KEY_UPLOAD_CHUNKING = "upload_chunking"
+KEY_CONTENTS = "contents"
 
 CACHE_EXPIRATION_DAYS = 30
 
@@ -34,8 +36,9 @@ class UpgradeFlags(Enum):
 @singleton
 class DataCache:
     @inject
-    def __init__(self, config: Config, time: Time):
+    def __init__(self, config: Config, time: Time, storage: AsyncStorage):
         self._config = config
+        self._storage = storage
         self._data = {}
         self._dirty = {}
         self._time = time
@@ -45,6 +48,8 @@ class DataCache:
         self._load()
 
     def _load(self):
+        # This happens once while the addon starts up, before anything else is running, so it reads and writes the
+        # cache directly instead of through AsyncStorage.
         path = self._config.get(Setting.DATA_CACHE_FILE_PATH)
         if not JsonFileSaver.exists(path):
             self._data = {NECESSARY_OLD_BACKUP_PLURAL_NAME: {}}
@@ -76,14 +81,21 @@ class DataCache:
         if self.notifyForIgnoreUpgrades:
             self._config.useLegacyIgnoredBehavior(True)
 
-        self.saveIfDirty()
+        if self._dirty:
+            self._expire()
+            JsonFileSaver.write(path, self._data)
+            self._dirty = False
 
-    def save(self, data=None):
+    async def save(self, data=None):
         if data is None:
             data = self._data
         path = self._config.get(Setting.DATA_CACHE_FILE_PATH)
-        JsonFileSaver.write(path, data)
         self._dirty = False
+        try:
+            await self._storage.writeJson(path, data)
+        except Exception:
+            self._dirty = True
+            raise
 
     def makeDirty(self):
         self._dirty = True
@@ -103,14 +115,24 @@ class DataCache:
             self.backups[slug] = {}
         return self.backups[slug]
 
-    def saveIfDirty(self):
+    def uploadChunking(self) -> Dict[str, Any]:
+        return self._data.get(KEY_UPLOAD_CHUNKING, {})
+
+    def setUploadChunking(self, state: Dict[str, Any]):
+        self._data[KEY_UPLOAD_CHUNKING] = state
+        self.makeDirty()
+
+    async def saveIfDirty(self):
         if self._dirty:
-            # See if we need to remove any old entries
-            for slug in list(self.backups.keys()):
-                data = self.backups[slug].get(KEY_LAST_SEEN)
-                if data is not None and self._time.now() > self._time.parse(data) + timedelta(days=CACHE_EXPIRATION_DAYS):
-                    del self.backups[slug]
-            self.save()
+            self._expire()
+            await self.save()
+
+    def _expire(self):
+        # See if we need to remove any old entries
+        for slug in list(self.backups.keys()):
+            data = self.backups[slug].get(KEY_LAST_SEEN)
+            if data is not None and self._time.now() > self._time.parse(data) + timedelta(days=CACHE_EXPIRATION_DAYS):
+                del self.backups[slug]
 
     @property
     def previousVersion(self):
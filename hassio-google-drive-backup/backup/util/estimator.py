@@ -1,10 +1,10 @@
-import os
 import platform
 
 from injector import inject, singleton
 
 from ..config import Config, Setting
 from ..exceptions import LowSpaceError
+from ..file import AsyncStorage
 from .globalinfo import GlobalInfo
 from ..logger import getLogger
 
@@ -16,15 +16,16 @@ SIZE_SI = ["B", "kB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB"]
 @singleton
 class Estimator():
     @inject
-    def __init__(self, config: Config, global_info: GlobalInfo):
+    def __init__(self, config: Config, global_info: GlobalInfo, storage: AsyncStorage):
         super().__init__()
         self.config = config
+        self._storage = storage
         self._blocksUsed = 0
         self._blocksTotal = 1
         self._blockSize = 0
         self._global_info = global_info
 
-    def refresh(self):
+    async def refresh(self):
         if platform.system() == "Windows":
             # Unsupported on windows
             return self
@@ -32,7 +33,7 @@ class Estimator():
         # except its a bit more conservative, which isn't necessarily
         # correct, but we're aiming for ballpark numbers here so it
         # should be ok.
-        stats = os.statvfs(self.config.get(Setting.BACKUP_DIRECTORY_PATH))
+        stats = await self._storage.statvfs(self.config.get(Setting.BACKUP_DIRECTORY_PATH))
         total = stats.f_blocks
         available = stats.f_bavail
         availableToRoot = stats.f_bfree
@@ -0,0 +1,149 @@
+import copy
+from typing import Any, Dict, List
+
+
+class JsonPatch:
+    """
+    Computes and applies RFC 6902 (JSON patch) style diffs between json-serializable documents, used to send only what
+    changed about the addon's state to the Home Assistant integration.  Lists are diffed by trimming their common prefix
+    and suffix and looking for items shifted off the front, so a backup being added or removed produces a single
+    operation rather than a replace for every later item.
+    """
+    @classmethod
+    def diff(cls, old: Any, new: Any) -> List[Dict[str, Any]]:
+        ops: List[Dict[str, Any]] = []
+        JsonPatch._diff(old, new, "", ops)
+        return ops
+
+    @classmethod
+    def apply(cls, doc: Any, patch: List[Dict[str, Any]]) -> Any:
+        """Returns a patched copy of doc.  Raises ValueError if the patch doesn't fit the document."""
+        doc = copy.deepcopy(doc)
+        for op in patch:
+            path = op.get("path", "")
+            if path == "":
+                if op.get("op") != "replace":
+                    raise ValueError("Only 'replace' can target the document root")
+                doc = copy.deepcopy(op.get("value"))
+                continue
+            parent, key = JsonPatch._resolveParent(doc, path)
+            if op.get("op") == "replace":
+                JsonPatch._checkExists(parent, key, path)
+                parent[key] = copy.deepcopy(op.get("value"))
+            elif op.get("op") == "add":
+                if isinstance(parent, list):
+                    if key == len(parent):
+                        parent.append(copy.deepcopy(op.get("value")))
+                    else:
+                        JsonPatch._checkExists(parent, key, path)
+                        parent.insert(key, copy.deepcopy(op.get("value")))
+                else:
+                    parent[key] = copy.deepcopy(op.get("value"))
+            elif op.get("op") == "remove":
+                JsonPatch._checkExists(parent, key, path)
+                del parent[key]
+            else:
+                raise ValueError("Unsupported patch operation: {0}".format(op.get("op")))
+        return doc
+
+    @classmethod
+    def _diff(cls, old: Any, new: Any, path: str, ops: List[Dict[str, Any]]):
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in old.keys():
+                if key not in new:
+                    ops.append({"op": "remove", "path": JsonPatch._join(path, key)})
+            for key, value in new.items():
+                if key not in old:
+                    ops.append({"op": "add", "path": JsonPatch._join(path, key), "value": value})
+                else:
+                    JsonPatch._diff(old[key], value, JsonPatch._join(path, key), ops)
+        elif isinstance(old, list) and isinstance(new, list):
+            JsonPatch._diffList(old, new, path, ops)
+        elif type(old) != type(new) or old != new:
+            ops.append({"op": "replace", "path": path, "value": new})
+
+    @classmethod
+    def _diffList(cls, old: List[Any], new: List[Any], path: str, ops: List[Dict[str, Any]]):
+        prefix = 0
+        while prefix < len(old) and prefix < len(new) and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < len(old) - prefix and suffix < len(new) - prefix and old[-1 - suffix] == new[-1 - suffix]:
+            suffix += 1
+        old_middle = old[prefix:len(old) - suffix]
+        new_middle = new[prefix:len(new) - suffix]
+
+        # Backups are sorted by date, so the oldest getting purged while a new one is made shows up as the list
+        # shifting over.  Where the new list's first item sits in the old one says how far it shifted, so look for
+        # that before falling back to comparing items by position.
+        shift = JsonPatch._indexOf(old_middle, new_middle[0], 1) if len(new_middle) > 0 else -1
+        overlap = len(old_middle) - shift
+        if shift > 0 and overlap <= len(new_middle) and old_middle[shift:] == new_middle[:overlap]:
+            for index in reversed(range(shift)):
+                ops.append({"op": "remove", "path": JsonPatch._join(path, prefix + index)})
+            for index in range(overlap, len(new_middle)):
+                ops.append({"op": "add", "path": JsonPatch._join(path, prefix + index), "value": new_middle[index]})
+            return
+
+        # Items changed in place get diffed recursively, the rest are removed (back to front so indexes stay valid) or added.
+        common = min(len(old_middle), len(new_middle))
+        for index in range(common):
+            JsonPatch._diff(old_middle[index], new_middle[index], JsonPatch._join(path, prefix + index), ops)
+        for index in reversed(range(common, len(old_middle))):
+            ops.append({"op": "remove", "path": JsonPatch._join(path, prefix + index)})
+        for index in range(common, len(new_middle)):
+            ops.append({"op": "add", "path": JsonPatch._join(path, prefix + index), "value": new_middle[index]})
+
+    @classmethod
+    def _indexOf(cls, items: List[Any], item: Any, start: int) -> int:
+        for index in range(start, len(items)):
+            if items[index] == item:
+                return index
+        return -1
+
+    @classmethod
+    def _join(cls, path: str, key: Any) -> str:
+        return path + "/" + str(key).replace("~", "~0").replace("/", "~1")
+
+    @classmethod
+    def _resolveParent(cls, doc: Any, path: str):
+        if not path.startswith("/"):
+            raise ValueError("Invalid patch path: {0}".format(path))
+        parts = [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+        target = doc
+        for part in parts[:-1]:
+            if not JsonPatch._has(target, part):
+                JsonPatch._missing(path)
+            target = target[JsonPatch._key(target, part, path)]
+        return target, JsonPatch._key(target, parts[-1], path)
+
+    @classmethod
+    def _key(cls, target: Any, part: str, path: str):
+        if isinstance(target, list):
+            if part == "-":
+                return len(target)
+            try:
+                return int(part)
+            except ValueError:
+                raise ValueError("Invalid list index in patch path: {0}".format(path))
+        if isinstance(target, dict):
+            return part
+        raise ValueError("Patch path traverses a value: {0}".format(path))
+
+    @classmethod
+    def _has(cls, target: Any, part: str) -> bool:
+        if isinstance(target, list):
+            return part.isdigit() and int(part) < len(target)
+        return isinstance(target, dict) and part in target
+
+    @classmethod
+    def _checkExists(cls, parent: Any, key: Any, path: str):
+        if isinstance(parent, list):
+            if key >= len(parent):
+                JsonPatch._missing(path)
+        elif key not in parent:
+            JsonPatch._missing(path)
+
+    @classmethod
+    def _missing(cls, path: str):
+        raise ValueError("Patch path doesn't exist: {0}".format(path))
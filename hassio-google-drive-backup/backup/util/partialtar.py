@@ -0,0 +1,90 @@
+import hashlib
+import json
+import tarfile
+from typing import Any, AsyncIterator, Dict, List
+
+from ..exceptions import LogicError
+from .asynchttpgetter import AsyncHttpGetter
+from .tarheader import BLOCK_SIZE, TAR_ENCODING, TAR_ERRORS, paddedSize
+from .tarindex import BACKUP_JSON, HOMEASSISTANT_ARCHIVE, TarIndex, TarMember
+
+
+class PartialTar():
+    """
+    A smaller backup made from some of the parts of a bigger one, which only reads the parts it needs from the bigger
+    backup's stream.  Members get copied along with their original headers so their contents (encrypted or not) are
+    untouched, and backup.json gets rewritten to describe only what was kept.
+    """
+
+    def __init__(self, stream: AsyncHttpGetter, backup_json: Dict[str, Any], backup_json_name: str, members: List[TarMember], mtime: float, chunk_size: int,
+                 addons: List[str], folders: List[str], homeassistant: bool):
+        self.addons = addons
+        self.folders = folders
+        self.homeassistant = homeassistant
+        self._stream = stream
+        self._members = members
+        self._chunk_size = chunk_size
+        self.backup_json = backup_json
+        data = json.dumps(backup_json, indent=2).encode()
+        info = tarfile.TarInfo(backup_json_name)
+        info.size = len(data)
+        info.mtime = int(mtime)
+        info.mode = 0o600
+        self._head = info.tobuf(tarfile.PAX_FORMAT, TAR_ENCODING, TAR_ERRORS) + data + bytes(paddedSize(len(data)) - len(data))
+
+    @classmethod
+    async def build(cls, stream: AsyncHttpGetter, index: TarIndex, addons: List[str], folders: List[str], homeassistant: bool, mtime: float, chunk_size: int) -> 'PartialTar':
+        backup_json_member = index.member(BACKUP_JSON)
+        if backup_json_member is None:
+            raise LogicError("The backup doesn't have a backup.json, so it can't be partially restored")
+        backup_json = json.loads(await stream.readAt(backup_json_member.offset, backup_json_member.size))
+
+        members = []
+        if homeassistant:
+            members.append(cls._archive(index, HOMEASSISTANT_ARCHIVE, "Home Assistant's configuration"))
+        else:
+            backup_json["homeassistant"] = None
+        for folder in folders:
+            members.append(cls._archive(index, folder.replace("/", "_"), "the folder '{0}'".format(folder)))
+        for addon in addons:
+            members.append(cls._archive(index, addon, "the add-on '{0}'".format(addon)))
+
+        # The smaller backup needs its own slug so it can't get mistaken for the one it came from
+        original_slug = backup_json.get("slug", "")
+        backup_json["slug"] = hashlib.sha1("{0}-{1}".format(original_slug, mtime).encode()).hexdigest()[:8]
+        backup_json["name"] = "{0} (partial)".format(backup_json.get("name", original_slug))
+        backup_json["type"] = "partial"
+        backup_json["folders"] = [folder for folder in backup_json.get("folders", []) if folder in folders]
+        backup_json["addons"] = [addon for addon in backup_json.get("addons", []) if addon.get("slug") in addons]
+        return PartialTar(stream, backup_json, backup_json_member.name, members, mtime, chunk_size, addons, folders, homeassistant)
+
+    @classmethod
+    def _archive(cls, index: TarIndex, name: str, description: str) -> TarMember:
+        member = index.archive(name)
+        if member is None:
+            raise LogicError("The backup doesn't have {0} in it".format(description))
+        return member
+
+    def slug(self) -> str:
+        return self.backup_json["slug"]
+
+    def size(self) -> int:
+        return len(self._head) + sum(member.end() - member.header for member in self._members) + BLOCK_SIZE * 2
+
+    async def generator(self) -> AsyncIterator[bytes]:
+        yield self._head
+        try:
+            for member in self._members:
+                # A member's headers, data and padding are all next to each other, so they come from one ranged request
+                self._stream.position(member.header)
+                remaining = member.end() - member.header
+                while remaining > 0:
+                    chunk = await self._stream.read(min(self._chunk_size, remaining))
+                    data = chunk.getbuffer()
+                    if len(data) == 0:
+                        raise EOFError("The backup ended unexpectedly")
+                    remaining -= len(data)
+                    yield bytes(data)
+        finally:
+            self._stream.close()
+        yield bytes(BLOCK_SIZE * 2)
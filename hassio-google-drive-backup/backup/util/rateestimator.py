@@ -0,0 +1,152 @@
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from ..time import Time
+
+# The resolution of windowed averages, and how far back they can look.
+DEFAULT_BUCKET_SECONDS = 0.5
+DEFAULT_BUCKETS = 600
+
+# How long it takes for a measurement's influence on the instantaneous rate to fall by half.
+DEFAULT_HALF_LIFE_SECONDS = 10
+
+# How far back the rate used to estimate time remaining looks.
+ETA_PERIOD = timedelta(seconds=20)
+
+
+class RateEstimator():
+    """
+    Estimates the rate of a transfer in bytes/second using constant time and memory, no matter how long the transfer
+    has been going or how many pieces it arrives in.  Two estimates are kept:
+    - An exponentially weighted moving average of each piece's rate, weighted by how long the piece took, which is
+      the "instantaneous" rate.
+    - A ring of fixed width buckets holding the total bytes transferred as of each bucket boundary, so the average rate
+      over any recent period is the difference of two interpolated totals.  Between recorded pieces the transfer is
+      assumed to have moved at a constant rate.
+    """
+
+    def __init__(self, time: Time, bucket_seconds: float = DEFAULT_BUCKET_SECONDS, buckets: int = DEFAULT_BUCKETS, half_life_seconds: float = DEFAULT_HALF_LIFE_SECONDS):
+        self._time = time
+        self._bucket_seconds = bucket_seconds
+        self._half_life_seconds = half_life_seconds
+        self._ring: List[float] = [0.0] * buckets
+        self._origin: Optional[datetime] = None
+        self._filled = 0
+        self._last = 0.0
+        self._last_rate = 0.0
+        self._total = 0
+        self._records = 0
+        self._ewma: Optional[float] = None
+
+    def start(self):
+        """Marks the start of the transfer, before anything has been transferred"""
+        self._origin = self._time.now()
+
+    def record(self, byte_count: int, seconds: Optional[float] = None):
+        """
+        Records that byte_count more bytes were just transferred.  If given, seconds is how long they took, otherwise
+        they're assumed to have been transferred evenly since the last record.
+        """
+        if self._origin is None:
+            self._origin = self._time.now() - timedelta(seconds=seconds or 0)
+        now = self._elapsed()
+        begin = self._last if seconds is None else max(self._last, now - seconds)
+        duration = now - self._last if seconds is None else seconds
+        rate = byte_count / duration if duration > 0 else 0
+        if duration > 0:
+            weight = 1 - math.pow(0.5, duration / self._half_life_seconds)
+            self._ewma = rate if self._ewma is None else self._ewma + (rate - self._ewma) * weight
+
+        # Nothing moved between the last record and when these bytes started, then they arrived evenly until now.
+        self._fill(self._last, begin, 0, self._total)
+        self._fill(begin, now, byte_count, self._total)
+        self._total += byte_count
+        self._last = max(self._last, now)
+        self._last_rate = rate
+        self._records += 1
+
+    def average(self, period: timedelta = ETA_PERIOD) -> Optional[float]:
+        """The average rate over the most recent period, as though the transfer continued at its last rate until now"""
+        if self._records == 0:
+            return None
+        period_seconds = period.total_seconds()
+        now = self._elapsed()
+        since_last = now - self._last
+        if since_last > period_seconds:
+            # linear decay the "estimated" rate over the period
+            diff = since_last - period_seconds
+            if diff > period_seconds:
+                return 0
+            return self._last_rate * (1 - diff / period_seconds)
+        start = max(now - period_seconds, self._oldest(), 0)
+        if now <= start:
+            return self._last_rate
+        end_total = self._total + self._last_rate * since_last
+        if start >= self._last:
+            start_total = self._total + self._last_rate * (start - self._last)
+        else:
+            start_total = self._totalAt(start)
+        return (end_total - start_total) / (now - start)
+
+    def instant(self) -> Optional[float]:
+        """The smoothed rate of the most recent pieces"""
+        return self._ewma
+
+    def overall(self) -> Optional[float]:
+        """The average rate since the transfer started"""
+        if self._records == 0 or self._last <= 0:
+            return None
+        return self._total / self._last
+
+    def eta(self, remaining_bytes: int) -> Optional[timedelta]:
+        """How long it should take to transfer remaining_bytes more"""
+        rate = self.average(ETA_PERIOD) or self.instant()
+        if not rate:
+            return None
+        return timedelta(seconds=remaining_bytes / rate)
+
+    def total(self) -> int:
+        return self._total
+
+    def seed(self, rate: Optional[float]):
+        """Starts the instantaneous rate from a previous estimate"""
+        self._ewma = rate
+
+    def scale(self, factor: float):
+        if self._ewma is not None:
+            self._ewma = self._ewma * factor
+
+    def _elapsed(self) -> float:
+        if self._origin is None:
+            return 0
+        return (self._time.now() - self._origin).total_seconds()
+
+    def _oldest(self) -> float:
+        return (self._filled - len(self._ring) + 1) * self._bucket_seconds
+
+    def _fill(self, begin: float, end: float, byte_count: int, total_at_begin: float):
+        """Fills in the total at each bucket boundary in (begin, end], for byte_count bytes arriving evenly then"""
+        if end <= begin:
+            return
+        first = math.floor(begin / self._bucket_seconds) + 1
+        last = math.floor(end / self._bucket_seconds)
+        first = max(first, last - len(self._ring) + 1)
+        for boundary in range(first, last + 1):
+            at = boundary * self._bucket_seconds
+            self._ring[boundary % len(self._ring)] = total_at_begin + byte_count * (at - begin) / (end - begin)
+        self._filled = max(self._filled, last)
+
+    def _totalAt(self, when: float) -> float:
+        boundary = math.floor(when / self._bucket_seconds)
+        lower_time = boundary * self._bucket_seconds
+        lower_total = self._ring[boundary % len(self._ring)]
+        if boundary + 1 <= self._filled:
+            upper_time = (boundary + 1) * self._bucket_seconds
+            upper_total = self._ring[(boundary + 1) % len(self._ring)]
+        else:
+            upper_time = self._last
+            upper_total = self._total
+        if upper_time <= lower_time:
+            return lower_total
+        return lower_total + (upper_total - lower_total) * (when - lower_time) / (upper_time - lower_time)
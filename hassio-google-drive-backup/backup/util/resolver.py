@@ -1,5 +1,6 @@
 import socket
-from typing import Any, Dict, List
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
 
 import aiodns
 from aiohttp.resolver import AsyncResolver
@@ -7,19 +8,41 @@ from injector import inject, singleton
 
 from ..config import Config, Setting
 from ..logger import getLogger
+from ..time import Time
+from .globalinfo import GlobalInfo
 
 logger = getLogger(__name__)
 
+# The longest a resolved address gets used before looking it up again, regardless of its TTL.  Its also how long
+# past expiration an address can still be used if DNS stops working.
 TTL_HOURS = 12
 
+# Addresses with a very short TTL (or none, like those from /etc/hosts) are still cached this long, so a burst of
+# new connections doesn't look the same name up over and over.
+MIN_TTL_SECONDS = 30
+
+
+class CachedAddresses():
+    def __init__(self, addresses: List[Dict[str, Any]], expires: datetime):
+        self.addresses = addresses
+        self.expires = expires
+
 
 @singleton
 class Resolver(AsyncResolver):
     @inject
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, time: Time, info: GlobalInfo):
         super().__init__()
         self.config = config
+        self.time = time
         self._original_dns = self._resolver
+        self._cache: Dict[Tuple[str, int, int], CachedAddresses] = {}
+        self.cache_stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0
+        }
+        info.addDebugInfo("dns_cache", self.cache_stats)
         self.setAlternateResolver()
         config.subscribe(self.updateConfig)
 
@@ -35,13 +58,65 @@ class Resolver(AsyncResolver):
                 'host': self.config.get(Setting.DRIVE_IPV4),
                 'hostname': host
             }]
-        addresses = await super().resolve(host, port, family)
-        return addresses
+
+        key = (host, port, family)
+        cached = self._cache.get(key)
+        now = self.time.now()
+        if cached is not None and now < cached.expires:
+            self.cache_stats["hits"] += 1
+            return [dict(address) for address in cached.addresses]
+
+        self.cache_stats["misses"] += 1
+        try:
+            addresses, ttl = await self._lookup(host, port, family)
+        except OSError:
+            if cached is not None and now < cached.expires + timedelta(hours=TTL_HOURS):
+                logger.debug("Unable to resolve {0}, so we'll use the address it had last time".format(host))
+                self.cache_stats["stale"] += 1
+                return [dict(address) for address in cached.addresses]
+            raise
+        ttl = min(max(ttl, MIN_TTL_SECONDS), TTL_HOURS * 60 * 60)
+        self._cache[key] = CachedAddresses(addresses, now + timedelta(seconds=ttl))
+        return [dict(address) for address in addresses]
+
+    async def _lookup(self, host: str, port: int, family: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Looks up host the same way aiohttp's AsyncResolver does, but also returns the TTL of the addresses found"""
+        try:
+            response = await self._resolver.getaddrinfo(host, port=port, type=socket.SOCK_STREAM, family=family, flags=socket.AI_ADDRCONFIG)
+        except aiodns.error.DNSError as e:
+            raise OSError(None, e.args[1] if len(e.args) > 1 else "DNS lookup failed") from e
+        addresses = []
+        for node in response.nodes:
+            if node.family == socket.AF_INET6 and len(node.addr) > 3 and node.addr[3]:
+                # Link-local IPv6 addresses are only usable with their scope id (eg "fe80::1%eth0"), which
+                # getnameinfo() fills in.
+                result = await self._resolver.getnameinfo((node.addr[0].decode("ascii"), *node.addr[1:]), socket.NI_NUMERICHOST | socket.NI_NUMERICSERV)
+                resolved_host = result.node
+            else:
+                resolved_host = node.addr[0].decode("ascii")
+            addresses.append({
+                'hostname': host,
+                'host': resolved_host,
+                'port': node.addr[1],
+                'family': node.family,
+                'proto': 0,
+                'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV
+            })
+        if len(addresses) == 0:
+            raise OSError(None, "DNS lookup failed")
+        return addresses, min(node.ttl for node in response.nodes)
+
+    def expireCache(self):
+        """Looks addresses up again the next time they're needed, but keeps them around in case that doesn't work"""
+        now = self.time.now()
+        for cached in self._cache.values():
+            cached.expires = min(cached.expires, now)
 
     def updateConfig(self):
         if self._alt_ns != self.config.get(Setting.ALTERNATE_DNS_SERVERS):
             self.setAlternateResolver()
             self._resolver = self._alt_dns
+            self.expireCache()
 
     def setAlternateResolver(self):
         if len(self.config.get(Setting.ALTERNATE_DNS_SERVERS)) > 0:
@@ -56,3 +131,5 @@ class Resolver(AsyncResolver):
             self._resolver = self._alt_dns
         else:
             self._resolver = self._original_dns
+        # Connecting failed, which could be because of a bad address, so get it from the other resolver next time.
+        self.expireCache()
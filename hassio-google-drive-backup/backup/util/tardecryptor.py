@@ -0,0 +1,316 @@
+import hashlib
+import hmac
+import json
+import struct
+import tarfile
+from asyncio import get_running_loop
+from typing import AsyncIterator, Dict, List, Optional
+
+import nacl.bindings.crypto_secretstream as secretstream
+import nacl.encoding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from nacl.exceptions import CryptoError
+from nacl.hash import blake2b
+from nacl.pwhash import argon2id
+
+from ..exceptions import BackupDecryptError
+from .tarheader import BLOCK_SIZE, TAR_ENCODING, TAR_ERRORS, ExtendedHeaders
+
+# Home Assistant's SecureTar puts a header in front of each encrypted archive inside a backup: magic, version and
+# reserved bytes, then the plaintext size and more reserved bytes, then whatever that version's cipher starts from.
+# The oldest format (version 1) has no header at all, just the salt used to derive the IV.
+SECURETAR_MAGIC = b"SecureTar"
+SECURETAR_FILE_ID = struct.Struct("!9sB6s")
+SECURETAR_HEADER = struct.Struct("!9sB6sQ8x")
+SECURETAR_LEGACY_VERSION = 1
+
+# Version 2 encrypts with AES-128-CBC, starting from a salt the IV gets derived from
+SECURETAR_V2_SALT_SIZE = 16
+AES_BLOCK_SIZE = 16
+
+# Version 3 derives a root key from the password with argon2id, and encrypts with XChaCha20-Poly1305 in 1MB chunks.  Its
+# header has the salts the keys are derived with, a key derived from the root key that shows whether the password is
+# right, and the secretstream header.
+SECURETAR_V3_INIT = struct.Struct("!{0}s16s32s16s{1}s".format(argon2id.SALTBYTES, secretstream.crypto_secretstream_xchacha20poly1305_HEADERBYTES))
+SECURETAR_V3_PERSON = b"SecureTarv3"
+SECURETAR_V3_OPSLIMIT = 8
+SECURETAR_V3_MEMLIMIT = 16 * 1024 * 1024
+SECURETAR_V3_CHUNK_SIZE = 1024 * 1024
+SECURETAR_V3_ABYTES = secretstream.crypto_secretstream_xchacha20poly1305_ABYTES
+
+# Enough of an archive's first bytes to tell if its gzip or tar data, which is how a good password gets recognized.
+GZIP_MAGIC = b"\x1f\x8b"
+TAR_MAGIC = b"ustar"
+TAR_MAGIC_OFFSET = 257
+SNIFF_SIZE = TAR_MAGIC_OFFSET + len(TAR_MAGIC)
+
+BACKUP_JSON = "backup.json"
+ARCHIVE_SUFFIXES = (".tar.gz", ".tar")
+DECRYPTABLE_VERSIONS = (2, 3)
+
+
+def looksPlain(data: bytes) -> bool:
+    return data.startswith(GZIP_MAGIC) or data[TAR_MAGIC_OFFSET:SNIFF_SIZE] == TAR_MAGIC
+
+
+def secureTarVersion(prefix: bytes) -> Optional[int]:
+    """The SecureTar version an archive starting with prefix was encrypted with, or None if it isn't encrypted"""
+    if prefix.startswith(SECURETAR_MAGIC) and len(prefix) >= SECURETAR_FILE_ID.size:
+        return SECURETAR_FILE_ID.unpack(prefix[:SECURETAR_FILE_ID.size])[1]
+    if looksPlain(prefix):
+        return None
+    return SECURETAR_LEGACY_VERSION
+
+
+class TarDecryptor():
+    """
+    Rewrites a password protected backup as an unprotected one while it streams.  The outer tar gets parsed one header
+    at a time, each encrypted archive inside it gets decrypted as it passes through, and backup.json gets updated to
+    say the backup isn't protected.  Only the chunk being worked on is ever held in memory.
+
+    An archive's size has to be written in its tar header before any of its data, so only the SecureTar formats that
+    record the plaintext size up front (versions 2 and 3) can be decrypted this way.
+    """
+
+    def __init__(self, source: AsyncIterator[bytes], password: str):
+        self._source = source
+        self._password = password
+        self._key = TarDecryptor.passwordToKey(password)
+        # Version 3 root keys, by the salts they were derived with.  Every archive in a backup shares the same ones.
+        self._root_keys: Dict[bytes, bytes] = {}
+        self._buffer = bytearray()
+        self._exhausted = False
+        self._chunks = self._decrypt()
+        self._held: List[bytes] = []
+        self._verified = False
+
+    @classmethod
+    def passwordToKey(cls, password: str) -> bytes:
+        key = password.encode()
+        for _ in range(100):
+            key = hashlib.sha256(key).digest()
+        return key[:16]
+
+    @classmethod
+    def generateIv(cls, key: bytes, salt: bytes) -> bytes:
+        iv = key + salt
+        for _ in range(100):
+            iv = hashlib.sha256(iv).digest()
+        return iv[:16]
+
+    async def verify(self):
+        """
+        Reads ahead until the first archive in the backup has had its format and the password checked, so a backup
+        that can't be decrypted gets an error before anything has been sent.  What gets read is held onto until
+        generator() asks for it.
+        """
+        async for chunk in self._chunks:
+            self._held.append(chunk)
+            if self._verified:
+                return
+
+    async def generator(self) -> AsyncIterator[bytes]:
+        while len(self._held) > 0:
+            yield self._held.pop(0)
+        async for chunk in self._chunks:
+            yield chunk
+
+    async def _decrypt(self) -> AsyncIterator[bytes]:
+        extended = ExtendedHeaders()
+        while True:
+            header = await self._read(BLOCK_SIZE)
+            if len(header) < BLOCK_SIZE or header == bytes(BLOCK_SIZE):
+                self._verified = True
+                yield bytes(BLOCK_SIZE * 2)
+                return
+            info = tarfile.TarInfo.frombuf(header, TAR_ENCODING, TAR_ERRORS)
+            if ExtendedHeaders.isExtended(info):
+                # Extended headers describe the member after them, which gets its header regenerated from them
+                extended.add(info, await self._readMember(info.size))
+                continue
+            extended.apply(info)
+
+            name = info.name.split("/")[-1]
+            if info.isreg() and name == BACKUP_JSON:
+                data = self._unprotect(await self._readMember(info.size))
+                info.size = len(data)
+                yield self._header(info) + data + self._padding(info.size)
+            elif info.isreg() and name.endswith(ARCHIVE_SUFFIXES):
+                async for chunk in self._decryptMember(info):
+                    yield chunk
+            else:
+                self._verified = True
+                yield self._header(info)
+                async for chunk in self._copy(info.size):
+                    yield chunk
+                await self._skipPadding(info.size)
+                yield self._padding(info.size)
+
+    async def _decryptMember(self, info: tarfile.TarInfo) -> AsyncIterator[bytes]:
+        member_size = info.size
+        prefix = await self._read(min(member_size, SNIFF_SIZE))
+        version = secureTarVersion(prefix)
+        if version is None:
+            # Protected backups can still have unencrypted archives in them
+            self._verified = True
+            yield self._header(info)
+            yield prefix
+            async for chunk in self._copy(member_size - len(prefix)):
+                yield chunk
+            await self._skipPadding(member_size)
+            yield self._padding(member_size)
+            return
+        if version == SECURETAR_LEGACY_VERSION:
+            raise BackupDecryptError(info.name, "it was encrypted by an older version of Home Assistant, which can't be decrypted while downloading")
+        if version not in DECRYPTABLE_VERSIONS:
+            raise BackupDecryptError(info.name, f"its encryption format (version {version}) can't be decrypted while downloading")
+        if len(prefix) < SECURETAR_HEADER.size:
+            raise BackupDecryptError(info.name, "its encrypted data is incomplete")
+
+        plaintext_size = SECURETAR_HEADER.unpack(prefix[:SECURETAR_HEADER.size])[3]
+        info.size = plaintext_size
+
+        rest = self._copy(member_size - len(prefix))
+        if version == 2:
+            decrypted = self._decryptV2(info.name, prefix[SECURETAR_HEADER.size:], rest, member_size - SECURETAR_HEADER.size, plaintext_size)
+        else:
+            decrypted = self._decryptV3(info.name, prefix[SECURETAR_HEADER.size:], rest, member_size - SECURETAR_HEADER.size, plaintext_size)
+
+        # Plaintext held back until there is enough of it to check the password was right
+        unchecked = bytearray()
+        checked = False
+        async for plain in decrypted:
+            if checked:
+                if len(plain) > 0:
+                    yield plain
+                continue
+            unchecked.extend(plain)
+            if len(unchecked) >= min(SNIFF_SIZE, plaintext_size):
+                if not looksPlain(unchecked) and plaintext_size > 0:
+                    raise BackupDecryptError(info.name, "the backup password is incorrect")
+                checked = True
+                self._verified = True
+                yield self._header(info)
+                yield bytes(unchecked)
+        await self._skipPadding(member_size)
+        yield self._padding(plaintext_size)
+
+    async def _decryptV2(self, name: str, start: bytes, rest: AsyncIterator[bytes], size: int, plaintext_size: int) -> AsyncIterator[bytes]:
+        """Decrypts AES-CBC data of the given size (salt included) whose first bytes are start"""
+        ciphertext_size = size - SECURETAR_V2_SALT_SIZE
+        if len(start) < SECURETAR_V2_SALT_SIZE or ciphertext_size % AES_BLOCK_SIZE != 0 or plaintext_size > ciphertext_size:
+            raise BackupDecryptError(name, "its encrypted data is incomplete")
+        iv = TarDecryptor.generateIv(self._key, start[:SECURETAR_V2_SALT_SIZE])
+        decryptor = Cipher(algorithms.AES(self._key), modes.CBC(iv)).decryptor()
+        remaining = plaintext_size
+        # CBC decryption keeps partial blocks until the rest arrives, and the PKCS7 padding at the end gets dropped by
+        # stopping at the plaintext size.
+        plain = decryptor.update(start[SECURETAR_V2_SALT_SIZE:])[:remaining]
+        remaining -= len(plain)
+        yield plain
+        async for chunk in rest:
+            plain = decryptor.update(chunk)[:remaining]
+            remaining -= len(plain)
+            yield plain
+        decryptor.finalize()
+
+    async def _decryptV3(self, name: str, start: bytes, rest: AsyncIterator[bytes], size: int, plaintext_size: int) -> AsyncIterator[bytes]:
+        """Checks the password against the secretstream header at the front of start, then decrypts what follows"""
+        # Every chunk, even an empty last one, carries its own authentication tag
+        ciphertext_size = plaintext_size + max(1, -(-plaintext_size // SECURETAR_V3_CHUNK_SIZE)) * SECURETAR_V3_ABYTES
+        if len(start) < SECURETAR_V3_INIT.size or size - SECURETAR_V3_INIT.size < ciphertext_size:
+            raise BackupDecryptError(name, "its encrypted data is incomplete")
+        root_salt, validation_salt, validation_key, stream_salt, stream_header = SECURETAR_V3_INIT.unpack(start[:SECURETAR_V3_INIT.size])
+        root_key = await self._rootKey(name, root_salt, validation_salt, validation_key)
+        state = secretstream.crypto_secretstream_xchacha20poly1305_state()
+        secretstream.crypto_secretstream_xchacha20poly1305_init_pull(state, stream_header, TarDecryptor._subkey(root_key, stream_salt))
+
+        pending = bytearray(start[SECURETAR_V3_INIT.size:])
+        remaining = ciphertext_size
+        async for chunk in self._withFirst(rest):
+            pending.extend(chunk)
+            # Chunks get decrypted whole, so the ciphertext waits until there's all of one
+            while remaining > 0 and len(pending) >= min(remaining, SECURETAR_V3_CHUNK_SIZE + SECURETAR_V3_ABYTES):
+                size = min(remaining, SECURETAR_V3_CHUNK_SIZE + SECURETAR_V3_ABYTES)
+                remaining -= size
+                try:
+                    plain, tag = secretstream.crypto_secretstream_xchacha20poly1305_pull(state, bytes(pending[:size]))
+                except CryptoError:
+                    raise BackupDecryptError(name, "its encrypted data is corrupt")
+                del pending[:size]
+                if (tag == secretstream.crypto_secretstream_xchacha20poly1305_TAG_FINAL) != (remaining == 0):
+                    raise BackupDecryptError(name, "its encrypted data is corrupt")
+                yield plain
+
+    async def _withFirst(self, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Yields an empty chunk before whatever rest does, so data that's already arrived gets a look first"""
+        yield b""
+        async for chunk in rest:
+            yield chunk
+
+    async def _rootKey(self, name: str, root_salt: bytes, validation_salt: bytes, validation_key: bytes) -> bytes:
+        salts = root_salt + validation_salt
+        if salts not in self._root_keys:
+            # Deriving the key takes a lot of memory and CPU on purpose, so it shouldn't hold up everything else
+            root_key = await get_running_loop().run_in_executor(
+                None, lambda: argon2id.kdf(secretstream.crypto_secretstream_xchacha20poly1305_KEYBYTES, self._password.encode(), root_salt,
+                                           opslimit=SECURETAR_V3_OPSLIMIT, memlimit=SECURETAR_V3_MEMLIMIT))
+            if not hmac.compare_digest(TarDecryptor._subkey(root_key, validation_salt), validation_key):
+                raise BackupDecryptError(name, "the backup password is incorrect")
+            self._root_keys[salts] = root_key
+        return self._root_keys[salts]
+
+    @classmethod
+    def _subkey(cls, root_key: bytes, salt: bytes) -> bytes:
+        return blake2b(b"", key=root_key, salt=salt, person=SECURETAR_V3_PERSON, encoder=nacl.encoding.RawEncoder)
+
+    def _unprotect(self, data: bytes) -> bytes:
+        info = json.loads(data.decode())
+        info["protected"] = False
+        info.pop("crypto", None)
+        return json.dumps(info, indent=2).encode()
+
+    def _header(self, info: tarfile.TarInfo) -> bytes:
+        # Anything that doesn't fit in a plain header gets written back out as pax headers
+        return info.tobuf(tarfile.PAX_FORMAT, TAR_ENCODING, TAR_ERRORS)
+
+    def _padding(self, size: int) -> bytes:
+        return bytes(-size % BLOCK_SIZE)
+
+    async def _readMember(self, size: int) -> bytes:
+        data = await self._read(size)
+        if len(data) < size:
+            raise EOFError("The backup ended unexpectedly")
+        await self._skipPadding(size)
+        return data
+
+    async def _skipPadding(self, size: int):
+        await self._read(-size % BLOCK_SIZE)
+
+    async def _copy(self, size: int) -> AsyncIterator[bytes]:
+        """Yields the next size bytes of the source as they arrive"""
+        remaining = size
+        while remaining > 0:
+            if len(self._buffer) == 0 and not await self._fill():
+                raise EOFError("The backup ended unexpectedly")
+            chunk = bytes(self._buffer[:remaining])
+            del self._buffer[:len(chunk)]
+            remaining -= len(chunk)
+            yield chunk
+
+    async def _read(self, size: int) -> bytes:
+        while len(self._buffer) < size and await self._fill():
+            pass
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def _fill(self) -> bool:
+        if self._exhausted:
+            return False
+        try:
+            self._buffer.extend(await self._source.__anext__())
+            return True
+        except StopAsyncIteration:
+            self._exhausted = True
+            return False
@@ -0,0 +1,68 @@
+import tarfile
+from typing import Dict
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+TAR_ENCODING = "utf-8"
+TAR_ERRORS = "surrogateescape"
+EXTENDED_TYPES = (tarfile.XHDTYPE, tarfile.XGLTYPE, tarfile.GNUTYPE_LONGNAME, tarfile.GNUTYPE_LONGLINK)
+
+# Pax header fields that get applied to the member's header, and so need to be recalculated when its rewritten
+PAX_FIELDS = ("path", "linkpath", "size", "mtime", "uid", "gid", "uname", "gname")
+
+
+def paddedSize(size: int) -> int:
+    """The space a member of the given size takes up in a tar, which is always a whole number of blocks"""
+    return size + (-size % BLOCK_SIZE)
+
+
+class ExtendedHeaders():
+    """
+    Collects what pax and GNU extended headers say about the member that follows them, for code that reads a tar one
+    header at a time instead of through tarfile.
+    """
+
+    def __init__(self):
+        self.values: Dict[str, str] = {}
+
+    @classmethod
+    def isExtended(cls, info: tarfile.TarInfo) -> bool:
+        return info.type in EXTENDED_TYPES
+
+    def add(self, info: tarfile.TarInfo, data: bytes):
+        if info.type == tarfile.XHDTYPE:
+            self.values.update(self._parsePax(data))
+        elif info.type == tarfile.GNUTYPE_LONGNAME:
+            self.values["path"] = data.rstrip(b"\0").decode(TAR_ENCODING, TAR_ERRORS)
+        elif info.type == tarfile.GNUTYPE_LONGLINK:
+            self.values["linkpath"] = data.rstrip(b"\0").decode(TAR_ENCODING, TAR_ERRORS)
+
+    def apply(self, info: tarfile.TarInfo):
+        """Updates info with the values from the extended headers before it, then forgets them"""
+        values, self.values = self.values, {}
+        # Fields that don't have a place in a plain header (eg xattrs) get carried over as they are
+        info.pax_headers = {key: value for key, value in values.items() if key not in PAX_FIELDS}
+        if "path" in values:
+            info.name = values["path"]
+        if "linkpath" in values:
+            info.linkname = values["linkpath"]
+        if "size" in values:
+            info.size = int(values["size"])
+        if "mtime" in values:
+            info.mtime = float(values["mtime"])
+        for key in ("uid", "gid"):
+            if key in values:
+                setattr(info, key, int(values[key]))
+        for key in ("uname", "gname"):
+            if key in values:
+                setattr(info, key, values[key])
+
+    def _parsePax(self, data: bytes) -> Dict[str, str]:
+        values = {}
+        position = 0
+        while position < len(data) and data[position] != 0:
+            space = data.index(b" ", position)
+            length = int(data[position:space])
+            key, value = data[space + 1:position + length - 1].split(b"=", 1)
+            values[key.decode(TAR_ENCODING)] = value.decode(TAR_ENCODING, TAR_ERRORS)
+            position += length
+        return values
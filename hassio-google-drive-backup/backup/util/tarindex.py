@@ -0,0 +1,151 @@
+import json
+import tarfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .tardecryptor import ARCHIVE_SUFFIXES, DECRYPTABLE_VERSIONS, SNIFF_SIZE, secureTarVersion
+from .tarheader import BLOCK_SIZE, TAR_ENCODING, TAR_ERRORS, ExtendedHeaders, paddedSize
+
+INDEX_VERSION = 2
+BACKUP_JSON = "backup.json"
+HOMEASSISTANT_ARCHIVE = "homeassistant"
+
+CONTENT_HOMEASSISTANT = "homeassistant"
+CONTENT_ADDON = "addon"
+CONTENT_FOLDER = "folder"
+CONTENT_OTHER = "other"
+
+
+class TarMember():
+    def __init__(self, name: str, header: int, offset: int, size: int):
+        self.name = name
+        # Where the member's first header block starts, including any extended headers in front of it
+        self.header = header
+        # Where the member's data starts
+        self.offset = offset
+        self.size = size
+
+    def archiveName(self) -> str:
+        return self.name.split("/")[-1]
+
+    def end(self) -> int:
+        return self.offset + paddedSize(self.size)
+
+    def serialize(self) -> List[Any]:
+        return [self.name, self.header, self.offset, self.size]
+
+    @classmethod
+    def parse(cls, data: List[Any]) -> 'TarMember':
+        return TarMember(data[0], data[1], data[2], data[3])
+
+
+class TarIndex():
+    """
+    Where everything is inside a backup's tar file, and what backup.json says about it, built by reading only the
+    tar headers and backup.json.  Everything in a Home Assistant backup is a member of one flat tar (backup.json and
+    a compressed archive for each add-on and folder) so a handful of small ranged reads finds it all.
+    """
+
+    def __init__(self, size: int, members: List[TarMember], info: Dict[str, Any]):
+        self.size = size
+        self.members = members
+        self.info = info
+
+    @classmethod
+    async def build(cls, read: Callable[[int, int], Awaitable[bytes]], size: int) -> 'TarIndex':
+        """Indexes a tar of the given size, where read(position, count) returns count bytes from position"""
+        members: List[TarMember] = []
+        info: Dict[str, Any] = {}
+        extended = ExtendedHeaders()
+        position = 0
+        header_start = None
+        while position + BLOCK_SIZE <= size:
+            header = await read(position, BLOCK_SIZE)
+            if len(header) < BLOCK_SIZE or header == bytes(BLOCK_SIZE):
+                break
+            tar_info = tarfile.TarInfo.frombuf(header, TAR_ENCODING, TAR_ERRORS)
+            offset = position + BLOCK_SIZE
+            if header_start is None:
+                header_start = position
+            if ExtendedHeaders.isExtended(tar_info):
+                extended.add(tar_info, await read(offset, tar_info.size))
+                position = offset + paddedSize(tar_info.size)
+                continue
+            extended.apply(tar_info)
+            member = TarMember(tar_info.name, header_start, offset, tar_info.size)
+            header_start = None
+            if tar_info.isreg():
+                members.append(member)
+                if member.archiveName() == BACKUP_JSON:
+                    info = cls._summarize(json.loads(await read(offset, tar_info.size)))
+            position = member.end()
+        if info.get("protected"):
+            # Which SecureTar version the archives were encrypted with decides if the backup can be decrypted while it downloads
+            archive = next((member for member in members if member.archiveName().endswith(ARCHIVE_SUFFIXES)), None)
+            if archive is not None:
+                info["securetar"] = secureTarVersion(await read(archive.offset, min(archive.size, SNIFF_SIZE)))
+        return TarIndex(size, members, info)
+
+    @classmethod
+    def _summarize(cls, backup_json: Dict[str, Any]) -> Dict[str, Any]:
+        homeassistant = backup_json.get("homeassistant")
+        if isinstance(homeassistant, dict):
+            homeassistant = homeassistant.get("version")
+        return {
+            "homeassistant": homeassistant,
+            "folders": list(backup_json.get("folders", [])),
+            "addons": [{
+                "slug": addon.get("slug"),
+                "name": addon.get("name"),
+                "version": addon.get("version")
+            } for addon in backup_json.get("addons", [])],
+            "protected": backup_json.get("protected", False),
+        }
+
+    def decryptable(self) -> bool:
+        """Whether the backup is protected with a SecureTar version TarDecryptor can decrypt while it downloads"""
+        return self.info.get("securetar") in DECRYPTABLE_VERSIONS
+
+    def member(self, archive_name: str) -> Optional[TarMember]:
+        for member in self.members:
+            if member.archiveName() == archive_name:
+                return member
+        return None
+
+    def archive(self, name: str) -> Optional[TarMember]:
+        """The member holding the archive with the given name, whether or not it's compressed"""
+        return self.member(name + ".tar.gz") or self.member(name + ".tar")
+
+    def contents(self) -> List[Dict[str, Any]]:
+        """Describes each part of the backup and how much space it takes up"""
+        contents = []
+        if self.info.get("homeassistant") is not None:
+            contents.append(self._content(CONTENT_HOMEASSISTANT, HOMEASSISTANT_ARCHIVE, "Home Assistant", self.info["homeassistant"]))
+        for folder in self.info.get("folders", []):
+            contents.append(self._content(CONTENT_FOLDER, folder.replace("/", "_"), folder, None, slug=folder))
+        for addon in self.info.get("addons", []):
+            contents.append(self._content(CONTENT_ADDON, addon["slug"], addon["name"], addon["version"]))
+        return contents
+
+    def _content(self, type: str, archive: str, name: str, version: Optional[str], slug=None) -> Dict[str, Any]:
+        member = self.archive(archive)
+        return {
+            "type": type,
+            "slug": slug or archive,
+            "name": name,
+            "version": version,
+            "size": 0 if member is None else member.size
+        }
+
+    def serialize(self) -> Dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
+            "size": self.size,
+            "members": [member.serialize() for member in self.members],
+            "info": self.info
+        }
+
+    @classmethod
+    def parse(cls, data: Optional[Dict[str, Any]]) -> Optional['TarIndex']:
+        if not data or data.get("version") != INDEX_VERSION:
+            return None
+        return TarIndex(data["size"], [TarMember.parse(member) for member in data["members"]], data["info"])
@@ -1,35 +1,71 @@
+import json
+import tarfile
 from datetime import timedelta
 from threading import Lock
-from asyncio import Event
+from asyncio import Event, get_running_loop
+from typing import Dict, Iterable, Optional, Set
 
 from injector import inject, singleton
 from watchdog.events import FileSystemEvent, FileSystemEventHandler
-from watchdog.observers import Observer
 
 from backup.config import Config, Setting, Startable
 from backup.time import Time
 from backup.worker import Trigger
 from backup.logger import getLogger
 from backup.ha import HaSource
+from backup.model import Coordinator
 from asyncio import get_event_loop
-from os.path import join, abspath
+from os import listdir
+from os.path import join, abspath, basename, dirname
 
 logger = getLogger(__name__)
 
 REPORT_DELAY_SECONDS = 5
 LOG_INTERVAL = timedelta(seconds=30)
 CHANGES_CHECK_DELAY = timedelta(seconds=10)
+BACKUP_FILE_EXTENSION = ".tar"
+BACKUP_JSON = "backup.json"
+
+
+def readBackupSlug(path: str) -> Optional[str]:
+    """The slug backup.json gives inside a backup's tar file, or None if the file isn't a backup that can be read"""
+    try:
+        with tarfile.open(path, "r:") as tar:
+            for member in tar:
+                if member.isreg() and basename(member.name) == BACKUP_JSON:
+                    return json.load(tar.extractfile(member)).get("slug")
+    except (OSError, tarfile.TarError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def readBackupSlugs(directory: str) -> Dict[str, str]:
+    """The slug of the backup in each backup file in a directory, by file name"""
+    slugs = {}
+    for name in listdir(directory):
+        if name.endswith(BACKUP_FILE_EXTENSION):
+            slug = readBackupSlug(join(directory, name))
+            if slug is not None:
+                slugs[name] = slug
+    return slugs
 
 
 @singleton
 class Watcher(Trigger, FileSystemEventHandler, Startable):
     @inject
-    def __init__(self, time: Time, config: Config, source: HaSource):
+    def __init__(self, time: Time, config: Config, source: HaSource, coord: Coordinator):
         super().__init__()
         self.time = time
         self.config: Config = config
-        self.observer: Observer = Observer()
+        # Created when the watcher starts, since loading watchdog's observers takes a while and isn't needed when
+        # watching the backup directory is turned off
+        self.observer = None
         self._source = source
+        self._coord = coord
+        self._changed_files = set()
+        # The slug of the backup in each file in the backup directory, so a file that gets deleted can still be mapped
+        # to the backup that was in it
+        self._file_slugs: Dict[str, str] = {}
         self.lock: Lock = Lock()
         self.noticed_change_signal = Event()
         self._changes_have_happened = False
@@ -38,9 +74,20 @@ class Watcher(Trigger, FileSystemEventHandler, Startable):
         self._last_notified_time = None
         self._loop = get_event_loop()
 
+    def dependsOn(self):
+        # Changes in the backup directory mean nothing until the supervisor can be asked about them
+        return [HaSource]
+
     async def start(self):
         if not self.config.get(Setting.WATCH_BACKUP_DIRECTORY):
             return
+        from watchdog.observers import Observer
+        try:
+            self._file_slugs = await get_running_loop().run_in_executor(None, readBackupSlugs, self.config.get(Setting.BACKUP_DIRECTORY_PATH))
+        except OSError as e:
+            logger.debug("Unable to read the backups in the backup directory")
+            logger.printException(e)
+        self.observer = Observer()
         self.observer.schedule(self, self.config.get(
             Setting.BACKUP_DIRECTORY_PATH), recursive=False)
         self.observer.start()
@@ -58,6 +105,9 @@ class Watcher(Trigger, FileSystemEventHandler, Startable):
         with self.lock:
             self._last_change_time = self.time.now()
             self._changes_have_happened = True
+            self._changed_files.add(event.src_path)
+            if event.event_type == 'moved':
+                self._changed_files.add(event.dest_path)
 
             # Provide periodic log messages to indicate we'll backup soon.
             if not self._last_log_time:
@@ -82,15 +132,53 @@ class Watcher(Trigger, FileSystemEventHandler, Startable):
                 self._last_change_time = None
                 self._changes_have_happened = False
                 self._last_log_time = None
+                changed_files = self._changed_files
+                self._changed_files = set()
         if check_backup_source:
             logger.debug("Checking backup source for changes...")
-            await self._source.get()
-            if self._source.query_had_changes:
-                self.trigger()
+            delta = None
+            if self._source.pending_backup is None:
+                # A pending backup only gets matched up with the backup it turned into by listing everything
+                delta = await self._source.refreshSlugs(await self._slugsFor(changed_files))
+            if delta is None:
+                # Couldn't map the changes onto known backups, so fall back to listing everything
+                await self._source.get()
+                if self._source.query_had_changes:
+                    self.trigger()
+            elif not delta.isEmpty():
+                # Syncing only when there's something to do, since the model is already up to date
+                if not self._coord.applyDelta(delta) or self._coord.needsSync():
+                    self.trigger()
         return await super().check()
 
+    async def _slugsFor(self, paths: Iterable[str]) -> Set[str]:
+        """
+        Maps changed files to the slugs of the backups in them.  The supervisor names backup files after the backup's
+        name (older versions used its slug), so the slug gets read from the backup.json inside the file, or remembered
+        from when the file was last seen if it's gone.  Anything else (eg files in subdirectories) doesn't represent a
+        backup and gets ignored.
+        """
+        directory = abspath(self.config.get(Setting.BACKUP_DIRECTORY_PATH))
+        slugs = set()
+        for path in paths:
+            name = basename(path)
+            if abspath(dirname(path)) != directory or not name.endswith(BACKUP_FILE_EXTENSION):
+                continue
+            slug = await get_running_loop().run_in_executor(None, readBackupSlug, path)
+            if slug is not None:
+                self._file_slugs[name] = slug
+            else:
+                slug = self._file_slugs.pop(name, None)
+            if slug is None:
+                # Never seen a backup in this file, so it can only be a guess that it's named like older supervisors
+                # name them.  If it isn't, the supervisor won't know the slug and everything gets listed instead.
+                slug = name[:-len(BACKUP_FILE_EXTENSION)]
+            slugs.add(slug)
+        return slugs
+
     async def stop(self):
-        if not self.config.get(Setting.WATCH_BACKUP_DIRECTORY):
+        if self.observer is None:
             return
         self.observer.stop()
         self.observer.join()
+        self.observer = None
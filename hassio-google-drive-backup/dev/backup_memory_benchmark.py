@@ -0,0 +1,127 @@
+"""
+Measures how much memory a large catalog of backups takes, like the one the addon keeps for someone with a long
+generational backup history in Google Drive.  The metadata Drive and the supervisor return for each backup is built the
+same way they return it, then turned into backups, and the memory those backups hold onto once the metadata is gone
+is reported alongside how big the metadata itself was.
+
+Run from the addon's directory with:
+    python -m dev.backup_memory_benchmark
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from backup.config import Config
+from backup.const import SOURCE_GOOGLE_DRIVE, SOURCE_HA, NECESSARY_PROP_KEY_SLUG, NECESSARY_PROP_KEY_DATE, NECESSARY_PROP_KEY_NAME
+from backup.model import Backup, BackupCatalog, DriveBackup, HABackup
+
+# Drive returns every one of these when asked for a file's capabilities
+DRIVE_CAPABILITIES = ["canAcceptOwnership", "canAddChildren", "canAddMyDriveParent", "canChangeCopyRequiresWriterPermission",
+                      "canChangeSecurityUpdateEnabled", "canChangeViewersCanCopyContent", "canComment", "canCopy", "canDelete",
+                      "canDownload", "canEdit", "canListChildren", "canModifyContent", "canModifyContentRestriction",
+                      "canModifyLabels", "canMoveItemIntoTeamDrive", "canMoveItemOutOfDrive", "canMoveItemWithinDrive",
+                      "canReadLabels", "canReadRevisions", "canRemoveChildren", "canRemoveMyDriveParent", "canRename",
+                      "canShare", "canTrash", "canUntrash"]
+FOLDERS = ["homeassistant", "ssl", "share", "addons/local", "media"]
+
+
+def driveData(rand: random.Random, slug: str, date: datetime) -> Dict[str, Any]:
+    return {
+        'id': "".join(rand.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(33)),
+        'name': "Full Backup {0}.tar".format(date.strftime("%Y-%m-%d %H:%M:%S")),
+        'size': str(rand.randint(100, 5000) * 1024 * 1024),
+        'trashed': False,
+        'mimeType': "application/tar",
+        'modifiedTime': date.isoformat(),
+        'parents': ["1" + "x" * 32],
+        'capabilities': {name: rand.random() > 0.2 for name in DRIVE_CAPABILITIES},
+        'appProperties': {
+            NECESSARY_PROP_KEY_SLUG: slug,
+            NECESSARY_PROP_KEY_DATE: date.isoformat(),
+            NECESSARY_PROP_KEY_NAME: "Full Backup {0}".format(date.strftime("%Y-%m-%d %H:%M:%S")),
+            'type': "full",
+            'version': "2024.1.{0}".format(rand.randint(0, 6)),
+            'protected': "true",
+            'retained': "false",
+        }
+    }
+
+
+def haData(rand: random.Random, slug: str, date: datetime) -> Dict[str, Any]:
+    return {
+        'slug': slug,
+        'name': "Full Backup {0}".format(date.strftime("%Y-%m-%d %H:%M:%S")),
+        'date': date.isoformat(),
+        'type': "full",
+        'size': rand.randint(100, 5000),
+        'protected': True,
+        'compressed': True,
+        'location': None,
+        'homeassistant': "2024.1.{0}".format(rand.randint(0, 6)),
+        'supervisor_version': "2024.01.1",
+        'repositories': ["core", "local", "https://github.com/hassio-addons/repository"],
+        'folders': list(FOLDERS),
+        'addons': [{
+            'slug': "addon_{0}".format(index),
+            'name': "Addon Number {0}".format(index),
+            'version': "1.{0}.0".format(index),
+            'size': rand.random() * 100,
+        } for index in range(rand.randint(5, 25))],
+    }
+
+
+def metadata(count: int, ha_count: int) -> List[Dict[str, Any]]:
+    rand = random.Random(1985)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    items = []
+    for index in range(count):
+        slug = "{0:08x}".format(index)
+        date = start + timedelta(hours=index * 6, microseconds=rand.randint(0, 999999))
+        items.append({'slug': slug, 'drive': driveData(rand, slug, date), 'ha': haData(rand, slug, date) if index >= count - ha_count else None})
+    return items
+
+
+def buildCatalog(items: List[Dict[str, Any]], config: Config) -> BackupCatalog:
+    catalog = BackupCatalog(config)
+    for item in items:
+        backup = Backup(DriveBackup(item['drive']))
+        if item['ha'] is not None:
+            backup.addSource(HABackup(item['ha'], None, config))
+        catalog[item['slug']] = backup
+    return catalog
+
+
+def allocated(build: Callable[[], Any]) -> (Any, int):
+    """Whatever build() returns, and how many bytes it holds onto"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how much memory a large catalog of backups takes")
+    parser.add_argument("--backups", type=int, default=10000, help="How many backups are in Google Drive")
+    parser.add_argument("--local", type=int, default=20, help="How many of those are also in Home Assistant")
+    args = parser.parse_args()
+    config = Config()
+
+    _, metadata_bytes = allocated(lambda: metadata(args.backups, args.local))
+    # The metadata is thrown away once the catalog is built, so whatever is still allocated is what the catalog kept
+    catalog, catalog_bytes = allocated(lambda: buildCatalog(metadata(args.backups, args.local), config))
+
+    print("{0} backups ({1} also in {2}, all in {3})".format(len(catalog), args.local, SOURCE_HA, SOURCE_GOOGLE_DRIVE))
+    print("{0:<24}{1:>10.2f}MB{2:>10.0f} bytes/backup".format("metadata", metadata_bytes / 1024 / 1024, metadata_bytes / args.backups))
+    print("{0:<24}{1:>10.2f}MB{2:>10.0f} bytes/backup".format("catalog", catalog_bytes / 1024 / 1024, catalog_bytes / args.backups))
+
+
+if __name__ == '__main__':
+    main()
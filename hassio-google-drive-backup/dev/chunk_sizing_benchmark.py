@@ -0,0 +1,121 @@
+"""
+Compares the upload chunk size controllers by simulating an upload over a few different kinds of network links.
+
+Run from the addon's directory with:
+    python -m dev.chunk_sizing_benchmark
+"""
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from backup.config import Config, Setting
+from backup.time import Time
+from backup.drive.chunksizer import ChunkSizer, AdaptiveChunkSizer, TargetTimeChunkSizer, BASE_CHUNK_SIZE, CHUNK_UPLOAD_TARGET_SECONDS
+
+MB = 1024 * 1024
+
+
+class LinkProfile():
+    def __init__(self, name, bytes_per_second, rtt_seconds, jitter=0.0, loss=0.0):
+        self.name = name
+        self.bytes_per_second = bytes_per_second
+        self.rtt_seconds = rtt_seconds
+        # How much the available bandwidth varies from chunk to chunk, as a fraction of bytes_per_second
+        self.jitter = jitter
+        # The chance any single chunk fails partway through
+        self.loss = loss
+
+
+PROFILES: List[LinkProfile] = [
+    LinkProfile("fiber", 50 * MB, 0.02),
+    LinkProfile("dsl", 1 * MB, 0.05, jitter=0.2),
+    LinkProfile("satellite", 0.5 * MB, 0.7, jitter=0.3, loss=0.02),
+    LinkProfile("lossy mobile", 0.3 * MB, 0.3, jitter=0.6, loss=0.1),
+]
+
+
+class SimulatedTime(Time):
+    def __init__(self):
+        super().__init__(local_tz=timezone.utc)
+        self._now = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+    def now(self) -> datetime:
+        return self._now
+
+    def advance(self, seconds: float):
+        self._now += timedelta(seconds=seconds)
+
+
+class UploadSimulator():
+    """Uploads a file over a simulated link the way DriveRequests.create() does, keeping track of how it went."""
+
+    def __init__(self, profile: LinkProfile, sizer: ChunkSizer, time: SimulatedTime, seed: int):
+        self.profile = profile
+        self.time = time
+        self.sizer = sizer
+        self.random = random.Random(seed)
+        self.seconds = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.minimum_size_seconds = 0.0
+        self.longest_chunk_seconds = 0.0
+
+    def upload(self, total_bytes: int):
+        position = 0
+        self._roundTrip()
+        size = self.sizer.start()
+        while position < total_bytes:
+            chunk_bytes = min(size * BASE_CHUNK_SIZE, total_bytes - position)
+            bandwidth = self.profile.bytes_per_second * max(0.05, 1 + self.random.uniform(-self.profile.jitter, self.profile.jitter))
+            seconds = self.profile.rtt_seconds + chunk_bytes / bandwidth
+            self.requests += 1
+            if self.random.random() < self.profile.loss:
+                # The chunk dies partway through, then the upload gets resumed after asking where it left off.
+                self._elapse(seconds * self.random.random(), size)
+                self.failures += 1
+                self.sizer.failure()
+                self._roundTrip()
+                size = self.sizer.start()
+                continue
+            self._elapse(seconds, size)
+            position += chunk_bytes
+            size = self.sizer.success(size, seconds)
+
+    def _roundTrip(self):
+        self.requests += 1
+        self.seconds += self.profile.rtt_seconds
+        self.time.advance(self.profile.rtt_seconds)
+        self.sizer.latency(self.profile.rtt_seconds)
+
+    def _elapse(self, seconds, size):
+        self.seconds += seconds
+        self.time.advance(seconds)
+        self.longest_chunk_seconds = max(self.longest_chunk_seconds, seconds)
+        if size == 1:
+            self.minimum_size_seconds += seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare upload chunk size controllers over simulated network links")
+    parser.add_argument("--size-mb", type=int, default=500, help="Size of the simulated backup")
+    parser.add_argument("--uploads", type=int, default=3, help="Consecutive uploads per controller, to show what gets remembered between them")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    config = Config.withOverrides({Setting.MAXIMUM_UPLOAD_CHUNK_BYTES: 100 * MB})
+    print("Target chunk duration is {0}s".format(CHUNK_UPLOAD_TARGET_SECONDS))
+    print("{0:<14}{1:<13}{2:>7}{3:>12}{4:>10}{5:>10}{6:>14}{7:>15}".format(
+        "link", "controller", "upload", "seconds", "requests", "failures", "at minimum", "longest chunk"))
+    for profile in PROFILES:
+        time = SimulatedTime()
+        for name, sizer in [("target_time", TargetTimeChunkSizer(config)), ("adaptive", AdaptiveChunkSizer(config, time))]:
+            for upload in range(args.uploads):
+                sim = UploadSimulator(profile, sizer, time, args.seed + upload)
+                sim.upload(args.size_mb * MB)
+                print("{0:<14}{1:<13}{2:>7}{3:>12.1f}{4:>10}{5:>10}{6:>13.1f}s{7:>14.1f}s".format(
+                    profile.name, name, upload + 1, sim.seconds, sim.requests, sim.failures, sim.minimum_size_seconds, sim.longest_chunk_seconds))
+
+
+if __name__ == '__main__':
+    main()
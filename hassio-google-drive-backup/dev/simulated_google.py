@@ -18,8 +18,9 @@ from backup.creds import Creds
 
 logger = getLogger(__name__)
 
-mimeTypeQueryPattern = re.compile("^mimeType='.*'$")
-parentsQueryPattern = re.compile("^'.*' in parents$")
+mimeTypeQueryPattern = re.compile("^mimeType ?= ?'(.*)'$")
+parentsQueryPattern = re.compile("^'(.*)' in parents$")
+trashedQueryPattern = re.compile("^trashed ?= ?(true|false)$")
 resumeBytesPattern = re.compile("^bytes \\*/\\d+$")
 
 URL_MATCH_DRIVE_API = "^.*drive.*$"
@@ -64,6 +65,9 @@ class SimulatedGoogle(BaseServer):
         self.device_auth_params = {}
         self._device_code_accepted = None
 
+        # One entry for every page of a file listing that's been served, so tests can check what queries cost
+        self.query_log = []
+
     def setDriveSpaceAvailable(self, bytes_available):
         self.space_available = bytes_available
 
@@ -276,24 +280,57 @@ class SimulatedGoogle(BaseServer):
         else:
             raise HTTPUnauthorized()
 
-    def filter_fields(self, item: Dict[str, Any], fields) -> Dict[str, Any]:
+    def filter_fields(self, item: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
         ret = {}
-        for field in fields:
-            if field in item:
+        for field, subfields in fields.items():
+            if field not in item:
+                continue
+            if subfields is not None and isinstance(item[field], dict):
+                ret[field] = self.filter_fields(item[field], subfields)
+            else:
                 ret[field] = item[field]
         return ret
 
-    def parseFields(self, source: str):
-        fields = []
-        for field in source.split(","):
-            if field.startswith("files("):
-                fields.append(field[6:])
-            elif field.endswith(")"):
-                fields.append(field[:-1])
-            else:
-                fields.append(field)
+    def parseFields(self, source: str) -> Dict[str, Any]:
+        """Parses a field mask like "id,capabilities(canTrash,canDelete)" into {'id': None, 'capabilities': {'canTrash': None, 'canDelete': None}}"""
+        fields, end = self._parseFieldList(source, 0)
+        if end != len(source):
+            raise HTTPBadRequest()
         return fields
 
+    def _parseFieldList(self, source: str, start: int):
+        fields = {}
+        position = start
+        while position < len(source):
+            end = position
+            while end < len(source) and source[end] not in ",()":
+                end += 1
+            name = source[position:end].strip()
+            subfields = None
+            if end < len(source) and source[end] == "(":
+                subfields, end = self._parseFieldList(source, end + 1)
+                if end >= len(source) or source[end] != ")":
+                    raise HTTPBadRequest()
+                end += 1
+            if len(name) > 0:
+                fields[name] = subfields
+            if end < len(source) and source[end] == ")":
+                return fields, end
+            position = end + 1
+        return fields, len(source)
+
+    def _matchesQuery(self, item: Dict[str, Any], conditions) -> bool:
+        for kind, value in conditions:
+            if kind == "mimeType" and item.get('mimeType', '') != value:
+                return False
+            elif kind == "parent" and value not in item.get('parents', []):
+                return False
+            elif kind == "trashed" and item.get('trashed', False) != value:
+                return False
+            elif kind == "driveId" and item.get('driveId') != value:
+                return False
+        return True
+
     def formatItem(self, base, id):
         caps = base.get('capabilites', {})
         if 'capabilities' not in base:
@@ -340,7 +377,7 @@ class SimulatedGoogle(BaseServer):
                 raise HTTPBadRequest()
             return self.serve_bytes(request, item['bytes'], include_length=False)
         else:
-            fields = request.query.get("fields", "id").split(",")
+            fields = self.parseFields(request.query.get("fields", "id"))
             return json_response(self.filter_fields(self.items[id], fields))
 
     async def _update(self, request: Request):
@@ -379,34 +416,50 @@ class SimulatedGoogle(BaseServer):
         await self._checkDriveHeaders(request)
         query: str = request.query.get("q", "")
         fields = self.parseFields(request.query.get('fields', 'id'))
-        if mimeTypeQueryPattern.match(query):
-            ret = []
-            mimeType = query[len("mimeType='"):-1]
-            for item in self.items.values():
-                if item.get('mimeType', '') == mimeType:
-                    ret.append(self.filter_fields(item, fields))
-            return json_response({'files': ret})
-        elif parentsQueryPattern.match(query):
-            ret = []
-            parent = query[1:-len("' in parents")]
-            if parent not in self.items:
-                raise HTTPNotFound()
-            if parent in self.lostPermission:
-                return Response(
-                    status=403,
-                    content_type="application/json",
-                    text='{"error": {"errors": [{"reason": "forbidden"}]}}')
-            for item in self.items.values():
-                if parent in item.get('parents', []):
-                    ret.append(self.filter_fields(item, fields))
-            return json_response({'files': ret})
-        elif len(query) == 0:
-            ret = []
-            for item in self.items.values():
-                ret.append(self.filter_fields(item, fields))
-            return json_response({'files': ret})
-        else:
-            raise HTTPBadRequest
+        file_fields = fields.get('files') or fields
+        conditions = []
+        for condition in query.split(" and ") if len(query) > 0 else []:
+            condition = condition.strip()
+            if mimeTypeQueryPattern.match(condition):
+                conditions.append(("mimeType", mimeTypeQueryPattern.match(condition).group(1)))
+            elif parentsQueryPattern.match(condition):
+                parent = parentsQueryPattern.match(condition).group(1)
+                if parent not in self.items:
+                    raise HTTPNotFound()
+                if parent in self.lostPermission:
+                    return Response(
+                        status=403,
+                        content_type="application/json",
+                        text='{"error": {"errors": [{"reason": "forbidden"}]}}')
+                conditions.append(("parent", parent))
+            elif trashedQueryPattern.match(condition):
+                conditions.append(("trashed", trashedQueryPattern.match(condition).group(1) == "true"))
+            else:
+                raise HTTPBadRequest()
+        if request.query.get("corpora", "allDrives") == "drive":
+            conditions.append(("driveId", request.query.get("driveId")))
+
+        matches = [item for item in self.items.values() if self._matchesQuery(item, conditions)]
+        page_size = int(request.query.get("pageSize", "100"))
+        start = int(request.query.get("pageToken", "0"))
+        data = {'files': [self.filter_fields(item, file_fields) for item in matches[start:start + page_size]]}
+        if start + page_size < len(matches):
+            data['nextPageToken'] = str(start + page_size)
+        response = json_response(data)
+        # Like Drive, only compress for clients that ask for it in their user agent as well as Accept-Encoding
+        gzip = "gzip" in request.headers.get("User-Agent", "") and "gzip" in request.headers.get("Accept-Encoding", "")
+        if gzip:
+            response.enable_compression()
+        self.query_log.append({
+            'q': query,
+            'fields': request.query.get('fields', 'id'),
+            'corpora': request.query.get("corpora", "allDrives"),
+            'page_size': page_size,
+            'files': len(data['files']),
+            'bytes': len(response.body),
+            'gzip': gzip,
+        })
+        return response
 
     async def _create(self, request: Request):
         await self._checkDriveHeaders(request)
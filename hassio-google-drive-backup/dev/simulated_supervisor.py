@@ -4,6 +4,7 @@ from datetime import timedelta
 import random
 import string
 import io
+import tarfile
 
 from backup.config import Config, Version
 from backup.time import Time
@@ -13,18 +14,20 @@ from aiohttp.web import (HTTPBadRequest, HTTPNotFound,
 from injector import inject, singleton
 from .base_server import BaseServer
 from .ports import Ports
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 from tests.helpers import all_addons, createBackupTar, parseBackupInfo
 
 URL_MATCH_BACKUP_FULL = "^/backups/new/full$"
 URL_MATCH_BACKUP_DELETE = "^/backups/.*$"
 URL_MATCH_BACKUP_DOWNLOAD = "^/backups/.*/download$"
 URL_MATCH_MISC_INFO = "^/info$"
+URL_MATCH_CORE_INFO = "^/core/info$"
 URL_MATCH_CORE_API = "^/core/api.*$"
 URL_MATCH_START_ADDON = "^/addons/.*/start$"
 URL_MATCH_STOP_ADDON = "^/addons/.*/stop$"
 URL_MATCH_ADDON_INFO = "^/addons/.*/info$"
 URL_MATCH_SELF_OPTIONS = "^/addons/self/options$"
+URL_MATCH_SELF_INFO = "^/addons/self/info$"
 
 URL_MATCH_SNAPSHOT = "^/snapshots.*$"
 URL_MATCH_BACKUPS = "^/backups.*$"
@@ -54,6 +57,10 @@ class SimulatedSupervisor(BaseServer):
         self._username = "user"
         self._password = "pass"
         self._addons = all_addons.copy()
+        self._addon_startup_checks: Dict[str, int] = {}
+        self._jobs: List[Dict[str, Any]] = []
+        self._restores: List[Dict[str, Any]] = []
+        self._external_job: Optional[Dict[str, Any]] = None
         self._super_version = Version(2023, 7)
         self._mounts = {
             'default_backup_mount': None,
@@ -110,6 +117,7 @@ class SimulatedSupervisor(BaseServer):
             get('/core/info', self._coreInfo),
             get('/supervisor/info', self._supervisorInfo),
             get('/supervisor/logs', self._supervisorLogs),
+            get('/jobs/info', self._jobsInfo),
             get('/core/logs', self._coreLogs),
             get('/debug/insert/backup', self._debug_insert_backup),
             get('/debug/info', self._debugInfo),
@@ -124,6 +132,7 @@ class SimulatedSupervisor(BaseServer):
             get('/backups/new/full', self._newbackup),
             get('/backups/{slug}/download', self._backupDownload),
             get('/backups/{slug}/info', self._backupDetail),
+            post('/backups/{slug}/restore/partial', self._restorePartial),
             get('/debug/backups/lock', self._lock_backups),
 
             # TODO: remove once the api path is fully deprecated
@@ -167,8 +176,43 @@ class SimulatedSupervisor(BaseServer):
     async def toggleBlockBackup(self):
         if self._backup_lock.locked():
             self._backup_lock.release()
+            if self._external_job:
+                self._finishJob(self._external_job)
+                self._external_job = None
         else:
             await self._backup_lock.acquire()
+            # Looks like a backup someone else requested
+            self._external_job = self._startJob("backup_manager_full_backup")
+
+    def backupJob(self) -> Optional[Dict[str, Any]]:
+        """The job for the backup currently being made, if there is one"""
+        for job in self._jobs:
+            if job["name"].startswith("backup_manager") and not job["done"]:
+                return job
+        return None
+
+    def _startJob(self, name) -> Dict[str, Any]:
+        job = {
+            "name": name,
+            "reference": None,
+            "uuid": self.generateId(32),
+            "progress": 0,
+            "stage": None,
+            "done": False,
+            "child_jobs": [],
+            "errors": []
+        }
+        self._jobs.append(job)
+        return job
+
+    def _finishJob(self, job: Dict[str, Any], reference=None, error=None):
+        job["done"] = True
+        job["reference"] = reference
+        if error:
+            job["errors"].append({"type": "BackupError", "message": error})
+        else:
+            job["progress"] = 100
+            job["stage"] = "finishing_file"
 
     async def _verifyHeader(self, request) -> bool:
         if request.headers.get("Authorization", None) == "Bearer " + self._auth_token:
@@ -213,7 +257,11 @@ class SimulatedSupervisor(BaseServer):
         for addon in self._addons:
             if addon.get("slug", "") == slug:
                 if addon.get("state") != "started":
-                    addon["state"] = "started"
+                    if self._addon_startup_checks.get(slug, 0) > 0:
+                        addon["state"] = "startup"
+                        addon["startup_checks_left"] = self._addon_startup_checks[slug]
+                    else:
+                        addon["state"] = "started"
                     return self._formatDataResponse({})
         raise HTTPBadRequest()
 
@@ -222,6 +270,11 @@ class SimulatedSupervisor(BaseServer):
         slug = request.match_info.get('slug')
         for addon in self._addons:
             if addon.get("slug", "") == slug:
+                if addon.get("state") == "startup":
+                    # Finishes starting up after being asked about it a few times
+                    addon["startup_checks_left"] = addon.get("startup_checks_left", 0) - 1
+                    if addon["startup_checks_left"] <= 0:
+                        addon["state"] = "started"
                 return self._formatDataResponse({
                     'boot': addon.get("boot"),
                     'watchdog': addon.get("watchdog"),
@@ -245,6 +298,13 @@ class SimulatedSupervisor(BaseServer):
             }
         )
 
+    async def _jobsInfo(self, request: Request):
+        await self._verifyHeader(request)
+        return self._formatDataResponse({
+            "ignore_conditions": [],
+            "jobs": self._jobs
+        })
+
     async def _supervisorLogs(self, request: Request):
         await self._verifyHeader(request)
         return Response(body=self.generate_random_text(20, 10, 20))
@@ -285,25 +345,35 @@ class SimulatedSupervisor(BaseServer):
 
     async def _internalNewBackup(self, request: Request, input_json, date=None, verify_header=True) -> str:
         async with self._backup_lock:
-            async with self._backup_inner_lock:
-                if 'wait' in input_json:
-                    await sleep(input_json['wait'])
-                if verify_header:
-                    await self._verifyHeader(request)
-                slug = self.generateId(8)
-                password = input_json.get('password', None)
-                data = createBackupTar(
-                    slug,
-                    input_json.get('name', "Default name"),
-                    date=date or self._time.now(),
-                    padSize=int(random.uniform(self._min_backup_size, self._max_backup_size)),
-                    included_folders=input_json.get('folders', None),
-                    included_addons=input_json.get('addons', None),
-                    password=password)
-                backup_info = parseBackupInfo(data)
-                self._backups[slug] = backup_info
-                self._backup_data[slug] = bytearray(data.getbuffer())
+            job = self._startJob("backup_manager_partial_backup" if 'folders' in input_json or 'addons' in input_json else "backup_manager_full_backup")
+            try:
+                slug = await self._makeBackup(request, input_json, date, verify_header)
+                self._finishJob(job, reference=slug)
                 return slug
+            except Exception as e:
+                self._finishJob(job, error=str(e))
+                raise
+
+    async def _makeBackup(self, request: Request, input_json, date, verify_header) -> str:
+        async with self._backup_inner_lock:
+            if 'wait' in input_json:
+                await sleep(input_json['wait'])
+            if verify_header:
+                await self._verifyHeader(request)
+            slug = self.generateId(8)
+            password = input_json.get('password', None)
+            data = createBackupTar(
+                slug,
+                input_json.get('name', "Default name"),
+                date=date or self._time.now(),
+                padSize=int(random.uniform(self._min_backup_size, self._max_backup_size)),
+                included_folders=input_json.get('folders', None),
+                included_addons=input_json.get('addons', None),
+                password=password)
+            backup_info = parseBackupInfo(data)
+            self._backups[slug] = backup_info
+            self._backup_data[slug] = bytearray(data.getbuffer())
+            return slug
 
     async def createBackup(self, input_json, date=None):
         return await self._internalNewBackup(None, input_json, date=date, verify_header=False)
@@ -354,6 +424,24 @@ class SimulatedSupervisor(BaseServer):
             raise HTTPNotFound()
         return self._formatDataResponse(self._backups[slug])
 
+    async def _restorePartial(self, request: Request):
+        await self._verifyHeader(request)
+        slug = request.match_info.get('slug')
+        if slug not in self._backups:
+            raise HTTPNotFound()
+        with tarfile.open(fileobj=io.BytesIO(self._backup_data[slug]), mode="r:") as tar:
+            members = {member.name: tar.extractfile(member).read() for member in tar.getmembers() if member.isreg()}
+        self._restores.append({
+            "slug": slug,
+            "request": await request.json(),
+            "backup": self._backups[slug],
+            "members": members
+        })
+        return self._formatDataResponse({})
+
+    def getRestores(self) -> List[Dict[str, Any]]:
+        return self._restores
+
     async def _backupDownload(self, request: Request):
         await self._verifyHeader(request)
         slug = request.match_info.get('slug')
@@ -406,6 +494,10 @@ class SimulatedSupervisor(BaseServer):
             "state": "started" if started else "stopped"
         })
 
+    def setAddonStartupChecks(self, slug, checks):
+        """Makes the addon report its state as 'startup' for this many info requests after being started"""
+        self._addon_startup_checks[slug] = checks
+
     async def _authenticate(self, request: Request):
         await self._verifyHeader(request)
         input_json = await request.json()
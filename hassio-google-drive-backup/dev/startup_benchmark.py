@@ -0,0 +1,136 @@
+"""
+Measures how long the addon takes to start: how long importing it takes, and how long it takes from launching the
+addon until its web UI answers a request.  Each is measured in a fresh interpreter, like after a Home Assistant
+update, and the median of several runs is reported.
+
+Run from the addon's directory with:
+    python -m dev.startup_benchmark
+
+The addon is pointed at a supervisor that isn't there, so this also shows whether waiting on the supervisor holds up
+the web UI.  Use --importtime to see which modules are slowest to import.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+ADDON_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def freePort() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def timeCommand(command: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, cwd=ADDON_DIRECTORY, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def importSeconds() -> float:
+    """How much longer starting python takes when it imports the addon, than when it doesn't"""
+    baseline = timeCommand([sys.executable, "-c", "pass"])
+    return timeCommand([sys.executable, "-c", "import backup.module"]) - baseline
+
+
+def writeOptions(directory: str) -> str:
+    data = os.path.join(directory, "data")
+    backups = os.path.join(directory, "backup")
+    os.mkdir(data)
+    os.mkdir(backups)
+    options = {
+        "supervisor_url": "http://127.0.0.1:{0}/".format(freePort()),
+        "hassio_header": "benchmark",
+        "backup_directory_path": backups,
+        "retained_file_path": os.path.join(data, "retained.json"),
+        "data_cache_file_path": os.path.join(data, "data_cache.json"),
+        "secrets_file_path": os.path.join(data, "secrets.yaml"),
+        "credentials_file_path": os.path.join(data, "credentials.dat"),
+        "folder_file_path": os.path.join(data, "folder.dat"),
+        "id_file_path": os.path.join(data, "id.json"),
+        "stop_addon_state_path": os.path.join(data, "stop_addon_state.json"),
+        "ingress_token_file_path": os.path.join(data, "ingress.dat"),
+        "ingress_port": freePort(),
+        "port": freePort(),
+        "integration_ws_port": freePort(),
+        "expose_extra_server": False,
+        "console_log_level": "CRITICAL",
+        "log_level": "CRITICAL"
+    }
+    path = os.path.join(directory, "options.json")
+    with open(path, "w") as f:
+        json.dump(options, f)
+    return path
+
+
+def firstResponseSeconds(timeout: float) -> float:
+    """How long from launching the addon until its web UI answers a request, whatever the answer is"""
+    with tempfile.TemporaryDirectory() as directory:
+        options = writeOptions(directory)
+        with open(options) as f:
+            url = "http://127.0.0.1:{0}/".format(json.load(f)["ingress_port"])
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-m", "backup", "--config", options], cwd=ADDON_DIRECTORY,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while time.perf_counter() - start < timeout:
+                if process.poll() is not None:
+                    raise Exception("The addon exited with code {0} before answering".format(process.returncode))
+                try:
+                    urlopen(url, timeout=1).close()
+                    return time.perf_counter() - start
+                except HTTPError:
+                    # Any response counts, its only how long the server takes to come up that matters
+                    return time.perf_counter() - start
+                except (URLError, ConnectionError):
+                    time.sleep(0.01)
+            raise Exception("The addon didn't answer within {0} seconds".format(timeout))
+        finally:
+            # Shutting down cleanly isn't being measured, so there's no need to wait for it
+            process.kill()
+            process.wait()
+
+
+def printSlowestImports(count: int):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import backup.module"], cwd=ADDON_DIRECTORY,
+                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1].strip()), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    print("Slowest imports (cumulative):")
+    for micros, name in rows[:count]:
+        print("{0:>10.1f}ms {1}".format(micros / 1000, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long the addon takes to start")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure each with, the median is reported")
+    parser.add_argument("--timeout", type=float, default=60, help="How long to wait for the web UI to answer")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="Also list the N slowest imports")
+    args = parser.parse_args()
+
+    imports = [importSeconds() for _ in range(args.runs)]
+    responses = [firstResponseSeconds(args.timeout) for _ in range(args.runs)]
+    print("{0:<24}{1:>10}{2:>10}{3:>10}".format("", "median", "min", "max"))
+    for name, results in [("import", imports), ("first response", responses)]:
+        print("{0:<24}{1:>9.3f}s{2:>9.3f}s{3:>9.3f}s".format(name, statistics.median(results), min(results), max(results)))
+    if args.importtime > 0:
+        printSlowestImports(args.importtime)
+
+
+if __name__ == '__main__':
+    main()
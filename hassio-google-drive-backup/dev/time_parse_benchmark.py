@@ -0,0 +1,76 @@
+"""
+Compares how long Time.parse and dateutil take to parse the timestamps in a large listing of backups, in the formats
+the supervisor, Google Drive and the addon's own data cache use for them.
+
+Run from the addon's directory with:
+    python -m dev.time_parse_benchmark
+"""
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+
+from dateutil.parser import parse
+
+from backup.time import Time
+
+
+def supervisorDate(when: datetime) -> str:
+    return when.isoformat()
+
+
+def driveDate(when: datetime) -> str:
+    return when.strftime("%Y-%m-%dT%H:%M:%S.") + "{0:03d}Z".format(when.microsecond // 1000)
+
+
+def cacheDate(when: datetime) -> str:
+    return when.astimezone(timezone(timedelta(hours=-8))).isoformat()
+
+
+FORMATS = [supervisorDate, driveDate, cacheDate]
+
+
+def listing(count: int) -> List[str]:
+    rand = random.Random(1985)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    dates = []
+    for _ in range(count):
+        when = start + timedelta(seconds=rand.randint(0, 5 * 365 * 24 * 60 * 60), microseconds=rand.randint(0, 999999))
+        dates.append(rand.choice(FORMATS)(when))
+    return dates
+
+
+def dateutilParse(text: str) -> datetime:
+    ret = parse(text)
+    if ret.tzinfo is None:
+        ret = ret.replace(tzinfo=timezone.utc)
+    return ret
+
+
+def perItemMicros(method: Callable[[str], datetime], dates: List[str], repeat: int) -> float:
+    seconds = min(timeit.repeat(lambda: [method(date) for date in dates], number=1, repeat=repeat))
+    return seconds * 1000000 / len(dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long parsing backup timestamps takes")
+    parser.add_argument("--items", type=int, default=5000, help="How many timestamps are in the listing")
+    parser.add_argument("--repeat", type=int, default=5, help="Times to parse the listing, the fastest is reported")
+    args = parser.parse_args()
+
+    dates = listing(args.items)
+    for date in dates:
+        if Time.parse(date) != dateutilParse(date):
+            raise Exception("Time.parse and dateutil disagree about " + date)
+
+    fast = perItemMicros(Time.parse, dates, args.repeat)
+    slow = perItemMicros(dateutilParse, dates, args.repeat)
+    print("{0} timestamps".format(len(dates)))
+    print("{0:<12}{1:>10.2f}us/item{2:>10.1f}ms total".format("Time.parse", fast, fast * len(dates) / 1000))
+    print("{0:<12}{1:>10.2f}us/item{2:>10.1f}ms total".format("dateutil", slow, slow * len(dates) / 1000))
+    print("{0:.1f}x faster".format(slow / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -26,8 +26,10 @@ from backup.debugworker import DebugWorker
 from backup.creds import Creds, DriveRequester
 from backup.server import ErrorStore
 from backup.ha import AddonStopper
+from backup.ha.integrationws import IntegrationWebSocketServer
 from backup.ui import UiServer
 from backup.watcher import Watcher
+from backup.file import AsyncStorage
 from .faketime import FakeTime
 from .helpers import Uploader, createBackupTar
 from dev.ports import Ports
@@ -127,7 +129,8 @@ class TestModule(Module):
 
     @provider
     @singleton
-    def getConfig(self) -> Config:
+    def getConfig(self, storage: AsyncStorage) -> Config:
+        self.config.useStorage(storage)
         return self.config
 
 
@@ -237,6 +240,11 @@ async def data_cache(injector):
     return injector.get(DataCache)
 
 
+@pytest.fixture
+async def storage(injector):
+    return injector.get(AsyncStorage)
+
+
 @pytest.fixture
 async def session(injector):
     async with injector.get(ClientSession) as session:
@@ -328,6 +336,15 @@ async def updater(injector):
     return injector.get(HaUpdater)
 
 
+@pytest.fixture
+async def integration_ws(injector, config: Config, unused_tcp_port_factory):
+    config.override(Setting.INTEGRATION_WS_PORT, unused_tcp_port_factory())
+    server = injector.get(IntegrationWebSocketServer)
+    await server.start()
+    yield server
+    await server.stop()
+
+
 @pytest.fixture()
 async def cleandir():
     newpath = tempfile.mkdtemp()
@@ -390,7 +407,7 @@ async def resolver(injector):
 
 @pytest.fixture
 async def client_identifier(injector):
-    return injector.get(Config).clientIdentifier()
+    return await injector.get(Config).clientIdentifier()
 
 
 @pytest.fixture
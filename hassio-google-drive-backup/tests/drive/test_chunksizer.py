@@ -0,0 +1,83 @@
+import pytest
+
+from backup.config import Config, Setting
+from backup.drive.chunksizer import AdaptiveChunkSizer, BASE_CHUNK_SIZE, CHUNK_UPLOAD_TARGET_SECONDS
+from backup.util import DataCache
+from backup.file import AsyncStorage
+from ..faketime import FakeTime
+
+MEGABYTE_UNITS = 4
+
+
+def test_adaptive_starts_small(config: Config, time: FakeTime, data_cache: DataCache):
+    sizer = AdaptiveChunkSizer(config, time, data_cache)
+    assert sizer.start() == 1
+
+
+def test_adaptive_grows_then_backs_off(config: Config, time: FakeTime):
+    config.override(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES, BASE_CHUNK_SIZE * 1000)
+    sizer = AdaptiveChunkSizer(config, time)
+
+    # 1 MB/s should settle on chunks of 10 MB, but growth is limited to doubling each chunk
+    assert sizer.success(1, 0.25) == 2
+    assert sizer.success(2, 0.5) == 4
+    assert sizer.success(4, 1) == 8
+    assert sizer.success(8, 2) == 16
+    assert sizer.success(16, 4) == 32
+    assert sizer.success(32, 8) == CHUNK_UPLOAD_TARGET_SECONDS * MEGABYTE_UNITS
+
+    # A failure halves the size, then it only grows one step at a time
+    sizer.failure()
+    assert sizer.start() == CHUNK_UPLOAD_TARGET_SECONDS * MEGABYTE_UNITS / 2
+    assert sizer.success(20, 5) == 21
+    assert sizer.success(21, 5.25) == 22
+
+
+def test_adaptive_smooths_throughput(config: Config, time: FakeTime):
+    config.override(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES, BASE_CHUNK_SIZE * 1000)
+    sizer = AdaptiveChunkSizer(config, time)
+    for _ in range(10):
+        size = sizer.success(40, 10)
+    assert size == 40
+
+    # One chunk at half the speed doesn't halve the size of the next one
+    assert sizer.success(40, 20) == 30
+
+
+def test_adaptive_accounts_for_latency(config: Config, time: FakeTime):
+    config.override(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES, BASE_CHUNK_SIZE * 1000)
+    sizer = AdaptiveChunkSizer(config, time)
+    sizer.latency(2)
+    for _ in range(10):
+        size = sizer.success(40, 12)
+
+    # 2 seconds of each chunk is the round trip, so 1 MB/s fills the remaining 8 seconds
+    assert size == 8 * MEGABYTE_UNITS
+
+
+def test_adaptive_respects_maximum(config: Config, time: FakeTime):
+    sizer = AdaptiveChunkSizer(config, time)
+    maximum = config.get(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES) / BASE_CHUNK_SIZE
+    assert sizer.success(1, 0) == maximum
+    config.override(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES, BASE_CHUNK_SIZE * 3)
+    assert sizer.start() == 3
+    assert sizer.success(3, 0.001) == 3
+
+    for _ in range(10):
+        sizer.failure()
+    assert sizer.start() == 1
+
+
+@pytest.mark.asyncio
+async def test_adaptive_remembered(config: Config, time: FakeTime, data_cache: DataCache, storage: AsyncStorage):
+    config.override(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES, BASE_CHUNK_SIZE * 1000)
+    sizer = AdaptiveChunkSizer(config, time, data_cache)
+    sizer.success(1, 0.25)
+    sizer.success(2, 0.5)
+    sizer.failure()
+    assert data_cache.dirty
+    await data_cache.saveIfDirty()
+
+    remembered = AdaptiveChunkSizer(config, time, DataCache(config, time, storage))
+    assert remembered.start() == 2
+    assert remembered.success(2, 0.5) == 3
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from aiohttp.web import Response
+
+from backup.drive import DriveSource
+from backup.drive.drivegovernor import DriveGovernor, MAX_CONCURRENT_REQUESTS, MAX_REQUESTS_PER_SECOND, REQUEST_BURST
+from dev.request_interceptor import RequestInterceptor
+from dev.simulated_google import URL_MATCH_FILE
+from ..faketime import FakeTime
+
+
+@pytest.mark.asyncio
+async def test_honors_retry_after(drive: DriveSource, time: FakeTime, interceptor: RequestInterceptor, injector):
+    await drive.getFolderId()
+    match = interceptor.setError(URL_MATCH_FILE, fail_for=1)
+    match.addResponse(Response(status=429, headers={'Retry-After': "30"}))
+    time.clearSleeps()
+
+    await drive.get()
+    assert time.sleeps == [30]
+
+    governor = injector.get(DriveGovernor)
+    assert governor.concurrency() == MAX_CONCURRENT_REQUESTS / 2
+    assert governor.rate() < MAX_REQUESTS_PER_SECOND
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_pauses_every_request(time: FakeTime):
+    governor = DriveGovernor(time)
+    assert governor.rateLimited(4, 30) == 30
+
+    # Requests that weren't the one rate limited wait too
+    async with governor.request():
+        pass
+    assert time.sleeps == [30]
+    assert governor.pausedUntil() is None
+
+
+@pytest.mark.asyncio
+async def test_backoff_is_jittered(time: FakeTime):
+    governor = DriveGovernor(time)
+    delays = [governor.rateLimited(8) for _ in range(20)]
+    assert all(0 <= delay <= 8 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+@pytest.mark.asyncio
+async def test_recovers_after_successes(time: FakeTime):
+    governor = DriveGovernor(time)
+    governor.rateLimited(1)
+    governor.rateLimited(1)
+    assert governor.concurrency() == MAX_CONCURRENT_REQUESTS / 4
+    assert governor.rate() == MAX_REQUESTS_PER_SECOND / 4
+
+    for _ in range(100):
+        governor.succeeded()
+    assert governor.concurrency() == MAX_CONCURRENT_REQUESTS
+    assert governor.rate() == MAX_REQUESTS_PER_SECOND
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit(time: FakeTime):
+    governor = DriveGovernor(time)
+    for _ in range(3):
+        governor.rateLimited(0)
+    assert governor.concurrency() == 1
+
+    first_started = asyncio.Event()
+    finish_first = asyncio.Event()
+    second_started = asyncio.Event()
+
+    async def first():
+        async with governor.request():
+            first_started.set()
+            await finish_first.wait()
+
+    async def second():
+        await first_started.wait()
+        async with governor.request():
+            second_started.set()
+
+    tasks = [asyncio.create_task(first()), asyncio.create_task(second())]
+    await first_started.wait()
+    await asyncio.sleep(0.1)
+    assert not second_started.is_set()
+
+    finish_first.set()
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+    assert second_started.is_set()
+
+
+@pytest.mark.asyncio
+async def test_request_rate(time: FakeTime):
+    governor = DriveGovernor(time)
+    for _ in range(REQUEST_BURST):
+        async with governor.request():
+            pass
+    assert time.sleeps == []
+
+    # Past the burst, requests get spaced out to the rate limit
+    async with governor.request():
+        pass
+    assert time.sleeps == [1 / MAX_REQUESTS_PER_SECOND]
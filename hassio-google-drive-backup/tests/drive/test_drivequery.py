@@ -0,0 +1,131 @@
+import pytest
+
+from backup.config import Config, Setting
+from backup.drive import DriveSource, FolderFinder, DriveRequests
+from backup.drive.drivequery import DriveQuery, QueryPlanner, BACKUP_FIELDS, MAX_PAGE_SIZE
+from backup.drive.drivesource import FOLDER_MIME_TYPE
+from backup.const import NECESSARY_PROP_KEY_DATE, NECESSARY_PROP_KEY_SLUG
+from dev.simulated_google import SimulatedGoogle
+
+# The fields every listing asked for before listings were built for what they're used for
+OLD_FIELDS = "id,name,appProperties,size,trashed,mimeType,modifiedTime,capabilities,parents,driveId"
+
+
+def addBackups(google: SimulatedGoogle, parent: str, count: int):
+    ids = []
+    for i in range(count):
+        id = "backup{0}".format(i)
+        google.items[id] = google.formatItem({
+            'name': "Backup {0}.tar".format(i),
+            'parents': [parent],
+            'size': 1000,
+            'mimeType': "application/tar",
+            'appProperties': {
+                NECESSARY_PROP_KEY_SLUG: "slug{0}".format(i),
+                NECESSARY_PROP_KEY_DATE: "2021-01-01T00:00:00+00:00",
+            }
+        }, id)
+        ids.append(id)
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_backup_listing_payload(drive: DriveSource, drive_requests: DriveRequests, google: SimulatedGoogle):
+    parent = await drive.getFolderId()
+    addBackups(google, parent, 20)
+
+    google.query_log.clear()
+    assert len(await drive.get()) == 20
+    assert len(google.query_log) == 1
+    trimmed = google.query_log[0]
+    assert trimmed['fields'] == "nextPageToken,files({0})".format(BACKUP_FIELDS)
+    assert trimmed['q'] == "'{0}' in parents and trashed = false".format(parent)
+
+    # The same listing with every field the add-on used to ask for
+    google.query_log.clear()
+    query = DriveQuery.backupsIn(parent)
+    query.fields = OLD_FIELDS
+    assert len([item async for item in drive_requests.query(query)]) == 20
+    assert trimmed['bytes'] < google.query_log[0]['bytes'] * 0.6
+
+
+@pytest.mark.asyncio
+async def test_trashed_filtered_by_server(drive: DriveSource, google: SimulatedGoogle):
+    parent = await drive.getFolderId()
+    ids = addBackups(google, parent, 5)
+    google.items[ids[0]]['trashed'] = True
+
+    google.query_log.clear()
+    assert len(await drive.get()) == 4
+    assert google.query_log[0]['files'] == 4
+
+
+@pytest.mark.asyncio
+async def test_folder_search_filters_trashed(folder_finder: FolderFinder, drive_requests: DriveRequests, google: SimulatedGoogle):
+    folder = await drive_requests.createFolder({'name': "Trashed", 'mimeType': FOLDER_MIME_TYPE})
+    google.items[folder['id']]['trashed'] = True
+
+    google.query_log.clear()
+    # The trashed folder isn't found, so a new one gets made instead
+    assert await folder_finder.get() != folder['id']
+    assert folder_finder.getExisting() is None
+    assert google.query_log[0]['q'] == "mimeType = '{0}' and trashed = false".format(FOLDER_MIME_TYPE)
+    assert google.query_log[0]['files'] == 0
+
+
+@pytest.mark.asyncio
+async def test_page_size_learned(drive: DriveSource, google: SimulatedGoogle):
+    parent = await drive.getFolderId()
+    addBackups(google, parent, 150)
+
+    google.query_log.clear()
+    assert len(await drive.get()) == 150
+    assert [page['page_size'] for page in google.query_log] == [100, 100]
+
+    # The next listing asks for enough to get everything in one page
+    google.query_log.clear()
+    assert len(await drive.get()) == 150
+    assert [page['page_size'] for page in google.query_log] == [188]
+
+
+@pytest.mark.asyncio
+async def test_page_size_limits(config: Config):
+    planner = QueryPlanner(config)
+    query = DriveQuery.backupsIn("parent")
+    assert planner.pageSize(query) == 100
+
+    planner.observe(query, 10)
+    assert planner.pageSize(query) == 100
+
+    planner.observe(query, 10000)
+    assert planner.pageSize(query) == MAX_PAGE_SIZE
+
+    # Other kinds of listings keep their own history
+    assert planner.pageSize(DriveQuery.folders()) == 100
+
+    # A page size the user chose is always used
+    config.update({Setting.GOOGLE_DRIVE_PAGE_SIZE: 50})
+    assert planner.pageSize(query) == 50
+
+
+@pytest.mark.asyncio
+async def test_listing_uses_gzip(drive: DriveSource, google: SimulatedGoogle):
+    await drive.getFolderId()
+    google.query_log.clear()
+    await drive.get()
+    assert google.query_log[0]['gzip']
+
+
+@pytest.mark.asyncio
+async def test_shared_drive_corpus(drive: DriveSource, folder_finder: FolderFinder, drive_requests: DriveRequests, google: SimulatedGoogle):
+    folder = await drive_requests.createFolder({
+        'name': "Shared Drive",
+        'mimeType': FOLDER_MIME_TYPE,
+        'driveId': "test_shared_drive_id",
+    })
+    await folder_finder.save(await drive_requests.get(folder['id']))
+    addBackups(google, folder['id'], 3)
+
+    google.query_log.clear()
+    assert len(await drive.get()) == 3
+    assert google.query_log[0]['corpora'] == "drive"
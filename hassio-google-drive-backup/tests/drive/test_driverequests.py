@@ -11,7 +11,7 @@ from dev.simulationserver import SimulationServer
 from dev.simulated_google import SimulatedGoogle, URL_MATCH_UPLOAD_PROGRESS, URL_MATCH_FILE
 from dev.request_interceptor import RequestInterceptor
 from backup.drive import DriveSource, FolderFinder, DriveRequests, RETRY_SESSION_ATTEMPTS, UPLOAD_SESSION_EXPIRATION_DURATION, URL_START_UPLOAD
-from backup.drive.driverequests import (BASE_CHUNK_SIZE, CHUNK_UPLOAD_TARGET_SECONDS)
+from backup.drive.chunksizer import BASE_CHUNK_SIZE
 from backup.drive.drivesource import FOLDER_MIME_TYPE
 from backup.exceptions import (BackupFolderInaccessible, BackupFolderMissingError,
                                DriveQuotaExceeded, ExistingBackupFolderError,
@@ -69,3 +69,37 @@ async def test_higher_speed_limit(drive_requests: DriveRequests, time: FakeTime,
             assert time.sleeps[-1] == 0.5
     assert len(time.sleeps) == 11
 
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_newer_credentials(drive_requests: DriveRequests, time: FakeTime):
+    refresh = drive_requests.exchanger.refresh
+    saved = Creds(time, "new_id", time.now(), "new_access_token", "new_refresh_token")
+
+    async def refreshWhileSaving(creds):
+        refreshed = await refresh(creds)
+        # The user re-authorizes while the refresh is in flight
+        await drive_requests.saveCredentials(saved)
+        return refreshed
+    drive_requests.exchanger.refresh = refreshWhileSaving
+
+    token = await drive_requests.getToken(refresh=True)
+    assert token != "new_access_token"
+    assert drive_requests.creds.id == "new_id"
+    assert drive_requests.creds.access_token == "new_access_token"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refreshes_are_shared(drive_requests: DriveRequests):
+    refresh = drive_requests.exchanger.refresh
+    calls = []
+
+    async def countRefreshes(creds):
+        calls.append(creds)
+        return await refresh(creds)
+    drive_requests.exchanger.refresh = countRefreshes
+
+    # Google only honors the newest token, so refreshing once for each caller would leave all but one with a bad token
+    tokens = await asyncio.gather(*[drive_requests.getToken(refresh=True) for _ in range(3)])
+    assert len(calls) == 1
+    assert tokens == [drive_requests.creds.access_token] * 3
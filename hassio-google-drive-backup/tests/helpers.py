@@ -60,7 +60,7 @@ def skipForRoot():
         pytest.skip("This test can't be run as root")
 
 
-def createBackupTar(slug: str, name: str, date: datetime, padSize: int, included_folders=None, included_addons=None, password=None) -> BytesIO:
+def createBackupTar(slug: str, name: str, date: datetime, padSize: int, included_folders=None, included_addons=None, password=None, archives=None) -> BytesIO:
     backup_type = "full"
     haVersion = None
     if included_folders is not None:
@@ -100,6 +100,8 @@ def createBackupTar(slug: str, name: str, date: datetime, padSize: int, included
     tar = tarfile.open(fileobj=stream, mode="w")
     add(tar, "backup.json", BytesIO(json.dumps(backup_info).encode()))
     add(tar, "padding.dat", getTestStream(padSize))
+    for archive, size in (archives or {}).items():
+        add(tar, archive + ".tar.gz", getTestStream(size))
     tar.close()
     stream.seek(0)
     stream.size = lambda: len(stream.getbuffer())
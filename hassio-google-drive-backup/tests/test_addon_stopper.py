@@ -1,3 +1,4 @@
+import asyncio
 import json
 import pytest
 import os
@@ -5,7 +6,9 @@ import os
 from stat import S_IREAD
 from backup.config import Config, Setting
 from backup.ha import AddonStopper
+from backup.file import JsonFileSaver
 from backup.exceptions import SupervisorFileSystemError
+from backup.util import GlobalInfo
 from .faketime import FakeTime
 from dev.simulated_supervisor import SimulatedSupervisor, URL_MATCH_START_ADDON, URL_MATCH_STOP_ADDON, URL_MATCH_ADDON_INFO
 from dev.request_interceptor import RequestInterceptor
@@ -13,9 +16,8 @@ from .helpers import skipForRoot
 
 
 def getSaved(config: Config):
-    with open(config.get(Setting.STOP_ADDON_STATE_PATH)) as f:
-        data = json.load(f)
-        return set(data["start"]), set(data["watchdog"])
+    data = JsonFileSaver.read(config.get(Setting.STOP_ADDON_STATE_PATH))
+    return set(data["start"]), set(data["watchdog"])
 
 
 def save(config: Config, to_start, to_watchdog_enable):
@@ -353,3 +355,182 @@ async def test_read_only_fs(supervisor: SimulatedSupervisor, addon_stopper: Addo
     # verify we raise a known error when trying to save.
     with pytest.raises(SupervisorFileSystemError):
         await addon_stopper.startAddons()
+
+
+def calledAddons(interceptor: RequestInterceptor, action: str):
+    return [path.split("/")[2] for path in interceptor._history if path.startswith("/addons/") and path.endswith("/" + action)]
+
+
+@pytest.mark.asyncio
+async def test_stop_and_start_concurrently(supervisor: SimulatedSupervisor, addon_stopper: AddonStopper, config: Config, interceptor: RequestInterceptor) -> None:
+    slug1 = "test_slug_1"
+    supervisor.installAddon(slug1, "Test decription")
+    slug2 = "test_slug_2"
+    supervisor.installAddon(slug2, "Test decription")
+    config.override(Setting.STOP_ADDONS, ",".join([slug1, slug2]))
+    addon_stopper.allowRun()
+    addon_stopper.must_start = set()
+
+    # Both addons are asked to stop before either one finishes stopping
+    stop1 = interceptor.setWaiter("^/addons/test_slug_1/stop$")
+    stop2 = interceptor.setWaiter("^/addons/test_slug_2/stop$")
+    stopping = asyncio.create_task(addon_stopper.stopAddons("ignore"))
+    await asyncio.wait_for(stop1.waitForCall(), timeout=5)
+    await asyncio.wait_for(stop2.waitForCall(), timeout=5)
+    stop1.clear()
+    stop2.clear()
+    await stopping
+    assert supervisor.addon(slug1)["state"] == "stopped"
+    assert supervisor.addon(slug2)["state"] == "stopped"
+
+    start1 = interceptor.setWaiter("^/addons/test_slug_1/start$")
+    start2 = interceptor.setWaiter("^/addons/test_slug_2/start$")
+    starting = asyncio.create_task(addon_stopper.startAddons())
+    await asyncio.wait_for(start1.waitForCall(), timeout=5)
+    await asyncio.wait_for(start2.waitForCall(), timeout=5)
+    start1.clear()
+    start2.clear()
+    await starting
+    assert supervisor.addon(slug1)["state"] == "started"
+    assert supervisor.addon(slug2)["state"] == "started"
+    assert getSaved(config) == (set(), set())
+
+
+@pytest.mark.asyncio
+async def test_dependency_order(supervisor: SimulatedSupervisor, addon_stopper: AddonStopper, config: Config, interceptor: RequestInterceptor, time: FakeTime) -> None:
+    database = "test_database"
+    supervisor.installAddon(database, "Test decription")
+    client1 = "test_client_1"
+    supervisor.installAddon(client1, "Test decription")
+    client2 = "test_client_2"
+    supervisor.installAddon(client2, "Test decription")
+    config.override(Setting.STOP_ADDONS, ",".join([database, client1, client2]))
+    config.override(Setting.STOP_ADDON_DEPENDENCIES, f"{client1}:{database}, {client2}:{database}")
+    addon_stopper.allowRun()
+    addon_stopper.must_start = set()
+
+    await addon_stopper.stopAddons("ignore")
+    stopped = calledAddons(interceptor, "stop")
+    assert set(stopped[:2]) == {client1, client2}
+    assert stopped[2:] == [database]
+
+    # The database takes a few seconds to come up, and its clients should wait for it.
+    supervisor.setAddonStartupChecks(database, 3)
+    time.clearSleeps()
+    await addon_stopper.startAddons()
+    started = calledAddons(interceptor, "start")
+    assert started[:1] == [database]
+    assert set(started[1:]) == {client1, client2}
+    assert time.sleeps == [1, 1]
+    for slug in [database, client1, client2]:
+        assert supervisor.addon(slug)["state"] == "started"
+    assert getSaved(config) == (set(), set())
+
+
+@pytest.mark.asyncio
+async def test_dependency_cycle(supervisor: SimulatedSupervisor, addon_stopper: AddonStopper, config: Config, interceptor: RequestInterceptor) -> None:
+    slug1 = "test_slug_1"
+    supervisor.installAddon(slug1, "Test decription")
+    slug2 = "test_slug_2"
+    supervisor.installAddon(slug2, "Test decription")
+    config.override(Setting.STOP_ADDONS, ",".join([slug1, slug2]))
+    config.override(Setting.STOP_ADDON_DEPENDENCIES, f"{slug1}:{slug2},{slug2}:{slug1}")
+    addon_stopper.allowRun()
+    addon_stopper.must_start = set()
+
+    await addon_stopper.stopAddons("ignore")
+    assert supervisor.addon(slug1)["state"] == "stopped"
+    assert supervisor.addon(slug2)["state"] == "stopped"
+    await addon_stopper.startAddons()
+    assert supervisor.addon(slug1)["state"] == "started"
+    assert supervisor.addon(slug2)["state"] == "started"
+
+
+@pytest.mark.asyncio
+async def test_start_gives_up_waiting(supervisor: SimulatedSupervisor, addon_stopper: AddonStopper, config: Config, time: FakeTime) -> None:
+    slug1 = "test_slug_1"
+    supervisor.installAddon(slug1, "Test decription")
+    config.override(Setting.STOP_ADDONS, slug1)
+    addon_stopper.allowRun()
+    addon_stopper.must_start = set()
+
+    await addon_stopper.stopAddons("ignore")
+    supervisor.setAddonStartupChecks(slug1, 1000)
+    time.clearSleeps()
+    await addon_stopper.startAddons()
+    assert supervisor.addon(slug1)["state"] == "startup"
+    assert sum(time.sleeps) == 120
+    assert slug1 not in addon_stopper.downtime
+    assert getSaved(config) == (set(), set())
+
+
+@pytest.mark.asyncio
+async def test_downtime_recorded(supervisor: SimulatedSupervisor, addon_stopper: AddonStopper, config: Config, time: FakeTime, global_info: GlobalInfo) -> None:
+    slug1 = "test_slug_1"
+    supervisor.installAddon(slug1, "Test decription")
+    config.override(Setting.STOP_ADDONS, slug1)
+    addon_stopper.allowRun()
+    addon_stopper.must_start = set()
+
+    await addon_stopper.stopAddons("ignore")
+    time.advance(minutes=5)
+    await addon_stopper.startAddons()
+    assert addon_stopper.downtime == {slug1: 300}
+    assert global_info.debug["addon_downtime_seconds"] == {slug1: 300}
+
+
+@pytest.mark.asyncio
+async def test_stop_while_waiting_for_start(supervisor: SimulatedSupervisor, addon_stopper: AddonStopper, config: Config, interceptor: RequestInterceptor, time: FakeTime) -> None:
+    slug1 = "test_slug_1"
+    supervisor.installAddon(slug1, "Test decription")
+    config.override(Setting.STOP_ADDONS, slug1)
+    addon_stopper.allowRun()
+    addon_stopper.must_start = set()
+
+    await addon_stopper.stopAddons("ignore")
+    supervisor.setAddonStartupChecks(slug1, 1000)
+    time.clearSleeps()
+    starting = asyncio.create_task(addon_stopper.startAddons())
+    while len(time.sleeps) == 0:
+        await asyncio.sleep(0.01)
+
+    # Waiting on the addon to come up doesn't keep a backup from stopping it again
+    assert not addon_stopper.lock.locked()
+    interceptor.clear()
+    await asyncio.wait_for(addon_stopper.stopAddons("ignore"), timeout=5)
+    assert interceptor.urlWasCalled(URL_MATCH_STOP_ADDON)
+    assert not starting.done()
+    await starting
+
+
+@pytest.mark.asyncio
+async def test_dependents_wait_for_failed_dependency(supervisor: SimulatedSupervisor, addon_stopper: AddonStopper, config: Config, interceptor: RequestInterceptor, time: FakeTime) -> None:
+    database = "test_database"
+    supervisor.installAddon(database, "Test decription")
+    client = "test_client"
+    supervisor.installAddon(client, "Test decription")
+    other = "test_other"
+    supervisor.installAddon(other, "Test decription")
+    config.override(Setting.STOP_ADDONS, ",".join([database, client, other]))
+    config.override(Setting.STOP_ADDON_DEPENDENCIES, f"{client}:{database}")
+    addon_stopper.allowRun()
+    addon_stopper.must_start = set()
+    await addon_stopper.stopAddons("ignore")
+
+    # The database never comes up, so its client stays stopped but everything else gets started
+    supervisor.setAddonStartupChecks(database, 1000)
+    await addon_stopper.startAddons()
+    assert supervisor.addon(database)["state"] == "startup"
+    assert supervisor.addon(client)["state"] == "stopped"
+    assert supervisor.addon(other)["state"] == "started"
+    assert getSaved(config) == ({client}, set())
+
+    # Still waiting on the database
+    await addon_stopper.check()
+    assert supervisor.addon(client)["state"] == "stopped"
+
+    # Once it's up, the client follows
+    supervisor.addon(database)["state"] = "started"
+    await addon_stopper.check()
+    assert supervisor.addon(client)["state"] == "started"
+    assert getSaved(config) == (set(), set())
@@ -32,6 +32,21 @@ async def test_basics(uploader: Uploader, server, session: ClientSession):
     assert (await getter.read(3)).read() == bytearray([])
     assert (await getter.read(3)).read() == bytearray([])
 
+@pytest.mark.asyncio
+async def test_read_at(uploader: Uploader, server):
+    getter = await uploader.upload(bytearray([0, 1, 2, 3, 4, 5, 6, 7]))
+    await getter.setup()
+    assert (await getter.read(2)).read() == bytearray([0, 1])
+
+    # Reading elsewhere shouldn't affect the stream
+    assert await getter.readAt(5, 2) == bytearray([5, 6])
+    assert await getter.readAt(0, 3) == bytearray([0, 1, 2])
+    assert await getter.readAt(6, 100) == bytearray([6, 7])
+    assert await getter.readAt(8, 1) == bytearray([])
+    assert getter.position() == 2
+    assert (await getter.read(3)).read() == bytearray([2, 3, 4])
+
+
 @pytest.mark.asyncio
 async def test_position_error(uploader: Uploader, server):
     getter = await uploader.upload(bytearray([0, 1, 2, 3, 4, 5, 6, 7]))
@@ -115,3 +130,16 @@ async def test_speed(uploader: Uploader, server, time: FakeTime):
     assert getter.speed(period=timedelta(seconds=10)) == 2
     time.advance(seconds=5)
     assert getter.speed(period=timedelta(seconds=10)) == 1
+
+
+@pytest.mark.asyncio
+async def test_eta(uploader: Uploader, server, time: FakeTime):
+    getter = await uploader.upload(bytearray(x for x in range(0, 100)))
+    await getter.setup()
+    assert getter.eta() is None
+    assert getter.instantSpeed() is None
+    for x in range(5):
+        time.advance(seconds=1)
+        await getter.read(10)
+    assert getter.instantSpeed() == 10
+    assert getter.eta() == timedelta(seconds=5)
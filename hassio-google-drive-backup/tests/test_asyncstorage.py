@@ -0,0 +1,111 @@
+import asyncio
+import os
+import threading
+from os.path import join
+
+import pytest
+
+from backup.config import Config, Setting
+from backup.file import AsyncStorage, DurableFile, JsonFileSaver
+from .helpers import skipForWindows
+
+
+@pytest.mark.asyncio
+async def test_read_and_write(tmpdir: str):
+    storage = AsyncStorage()
+    path = join(tmpdir, "test.json")
+    assert not await storage.exists(path)
+    await storage.writeJson(path, {'some': "data"})
+    assert await storage.exists(path)
+    assert await storage.readJson(path) == {'some': "data"}
+    assert JsonFileSaver.read(path) == {'some': "data"}
+
+    await storage.write(path, "plain text")
+    assert await storage.read(path) == "plain text"
+
+    await storage.delete(path)
+    assert not await storage.exists(path)
+
+
+@pytest.mark.asyncio
+async def test_writes_coalesce(tmpdir: str, monkeypatch):
+    storage = AsyncStorage()
+    path = join(tmpdir, "test.json")
+    writes = []
+    original = DurableFile.write
+
+    def record(path, data):
+        writes.append(data)
+        original(path, data)
+    monkeypatch.setattr(DurableFile, "write", record)
+
+    data = {'count': 0}
+    futures = []
+    for count in range(1, 11):
+        data['count'] = count
+        futures.append(storage.writeJson(path, data))
+    await asyncio.gather(*futures)
+
+    # Everything asked for before the first write got a turn collapses into it, with only the newest data written
+    assert len(writes) == 1
+    assert JsonFileSaver.read(path) == {'count': 10}
+    await storage.flush()
+    assert len(storage._tasks) == 0
+
+
+@pytest.mark.asyncio
+async def test_read_sees_pending_write(tmpdir: str):
+    storage = AsyncStorage()
+    path = join(tmpdir, "test.json")
+    storage.writeJson(path, {'first': True})
+    assert await storage.readJson(path) == {'first': True}
+    storage.writeJson(path, {'second': True})
+    assert await storage.readJson(path) == {'second': True}
+
+
+@pytest.mark.asyncio
+async def test_write_errors(tmpdir: str):
+    storage = AsyncStorage()
+    with pytest.raises(OSError):
+        await storage.write(join(tmpdir, "missing", "test.json"), "data")
+
+
+@pytest.mark.asyncio
+async def test_config_saves_in_background(config: Config, storage: AsyncStorage):
+    config.setRetained("slug", True)
+    await storage.flush()
+    assert JsonFileSaver.read(config.get(Setting.RETAINED_FILE_PATH)) == {'retained': ["slug"]}
+
+    config.setRetained("slug", False)
+    config.setRetained("other", True)
+    await storage.flush()
+    assert JsonFileSaver.read(config.get(Setting.RETAINED_FILE_PATH)) == {'retained': ["other"]}
+
+
+@pytest.mark.asyncio
+async def test_client_identifier_through_storage(config: Config, storage: AsyncStorage, monkeypatch):
+    identifier = await config.clientIdentifier()
+    await storage.flush()
+    assert JsonFileSaver.read(config.get(Setting.ID_FILE_PATH)) == {'id': identifier}
+    assert await config.clientIdentifier() == identifier
+
+    # A new config picks up the same one from the file, without reading it on the event loop
+    other = Config()
+    other.override(Setting.ID_FILE_PATH, config.get(Setting.ID_FILE_PATH))
+    other.useStorage(storage)
+    threads = []
+    original = JsonFileSaver.read
+
+    def record(path):
+        threads.append(threading.current_thread())
+        return original(path)
+    monkeypatch.setattr(JsonFileSaver, "read", record)
+    assert await other.clientIdentifier() == identifier
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+
+@pytest.mark.asyncio
+async def test_statvfs(tmpdir: str):
+    skipForWindows()
+    storage = AsyncStorage()
+    assert (await storage.statvfs(tmpdir)).f_blocks == os.statvfs(tmpdir).f_blocks
@@ -0,0 +1,113 @@
+import pytest
+
+from backup.config import Config, Setting
+from backup.model import Backup, BackupCatalog, DummyBackupSource
+from .faketime import FakeTime
+
+
+def makeBackup(time: FakeTime, slug: str, day: int, *sources: str) -> Backup:
+    backup = Backup()
+    for source in sources:
+        backup.addSource(DummyBackupSource(slug, time.local(1985, 12, day), source, slug))
+    return backup
+
+
+@pytest.mark.asyncio
+async def test_sorted_as_backups_come_and_go(time: FakeTime, config: Config):
+    catalog = BackupCatalog(config)
+    catalog["b"] = makeBackup(time, "b", 2, "ha")
+    catalog["c"] = makeBackup(time, "c", 3, "ha")
+    catalog["a"] = makeBackup(time, "a", 1, "ha")
+    assert [backup.slug() for backup in catalog.sorted()] == ["a", "b", "c"]
+    assert list(catalog.keys()) == ["b", "c", "a"]
+
+    del catalog["b"]
+    assert [backup.slug() for backup in catalog.sorted()] == ["a", "c"]
+    assert "b" not in catalog
+    assert len(catalog) == 2
+
+    # Replacing a backup replaces it in the sorted order too
+    catalog["a"] = makeBackup(time, "a", 4, "ha")
+    assert [backup.slug() for backup in catalog.sorted()] == ["c", "a"]
+
+
+@pytest.mark.asyncio
+async def test_resorted_when_sources_change(time: FakeTime, config: Config):
+    catalog = BackupCatalog(config)
+    catalog["a"] = makeBackup(time, "a", 1, "ha")
+    catalog["b"] = makeBackup(time, "b", 2, "ha")
+
+    # A backup's date comes from its sources, so a new source can move it
+    catalog["a"].removeSource("ha")
+    catalog["a"].addSource(DummyBackupSource("a", time.local(1985, 12, 3), "drive", "a"))
+    assert [backup.slug() for backup in catalog.sorted()] == ["b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_stats(time: FakeTime, config: Config):
+    catalog = BackupCatalog(config)
+    catalog["a"] = makeBackup(time, "a", 1, "ha", "drive")
+    catalog["b"] = makeBackup(time, "b", 2, "ha")
+    catalog["c"] = makeBackup(time, "c", 3, "drive")
+
+    ha = catalog.stats("ha")
+    assert (ha.backups, ha.retained, ha.deletable, ha.ignored) == (2, 0, 2, 0)
+    assert ha.latest == time.local(1985, 12, 2)
+    assert catalog.stats("drive").latest_backup is catalog["c"]
+    assert catalog.stats("nowhere").backups == 0
+
+    # Changes made to a backup's sources show up without telling the catalog
+    catalog["a"].getSource("ha").setRetained(True)
+    ha = catalog.stats("ha")
+    assert (ha.backups, ha.retained, ha.deletable) == (2, 1, 1)
+
+    catalog["b"].getSource("ha").setIgnore(True)
+    ha = catalog.stats("ha")
+    assert (ha.backups, ha.ignored) == (1, 1)
+    assert ha.latest == time.local(1985, 12, 1)
+
+    del catalog["c"]
+    assert catalog.stats("drive").latest_backup is catalog["a"]
+
+
+@pytest.mark.asyncio
+async def test_latest(time: FakeTime, config: Config):
+    catalog = BackupCatalog(config)
+    assert catalog.latest() is None
+
+    catalog["a"] = makeBackup(time, "a", 1, "ha")
+    catalog["b"] = makeBackup(time, "b", 2, "ha")
+    assert catalog.latest() is catalog["b"]
+
+    catalog["b"].getSource("ha").setIgnore(True)
+    assert catalog.latest() is catalog["a"]
+    assert catalog.notIgnored() == [catalog["a"]]
+
+    catalog["b"].getSource("ha").setIgnore(False)
+    catalog["b"].getSource("ha")._pending = True
+    catalog["b"].changed()
+    assert catalog.latest() is catalog["b"]
+    assert catalog.latest(include_pending=False) is catalog["a"]
+
+
+@pytest.mark.asyncio
+async def test_views_reused_until_changed(time: FakeTime, config: Config, monkeypatch):
+    catalog = BackupCatalog(config)
+    catalog["a"] = makeBackup(time, "a", 1, "ha")
+    calls = []
+    original = Backup.ignore
+
+    def ignore(self):
+        calls.append(1)
+        return original(self)
+    monkeypatch.setattr(Backup, "ignore", ignore)
+
+    catalog.stats("ha")
+    catalog.latest()
+    catalog.notIgnored()
+    assert len(calls) == 1
+
+    # Anything in the config could change whether backups are ignored
+    config.override(Setting.IGNORE_OTHER_BACKUPS, True)
+    catalog.stats("ha")
+    assert len(calls) == 2
@@ -5,7 +5,7 @@ import pytest
 from pytest import raises
 
 from backup.config import Config, Setting, CreateOptions
-from backup.exceptions import LogicError, LowSpaceError, NoBackup, PleaseWait, UserCancelledError
+from backup.exceptions import LogicError, LowSpaceError, NoBackup, UserCancelledError
 from backup.util import GlobalInfo, DataCache
 from backup.model import Coordinator, Model, Backup, DestinationPrecache
 from .conftest import FsFaker
@@ -63,23 +63,37 @@ async def test_sync(coord: Coordinator, global_info: GlobalInfo, time: FakeTime)
 
 
 @pytest.mark.asyncio
-async def test_blocking(coord: Coordinator):
-    # This just makes sure the wait thread is blocked while we do stuff
+async def test_blocking(coord: Coordinator, backup, source, dest, global_info: GlobalInfo):
+    # This just makes sure operations wait in line while we do stuff
     event_start = asyncio.Event()
     event_end = asyncio.Event()
-    asyncio.create_task(coord._withSoftLock(lambda: sleepHelper(event_start, event_end)))
+    blocker = asyncio.create_task(coord._operations.run("test", "Block", lambda: sleepHelper(event_start, event_end)))
     await event_start.wait()
 
-    # Make sure PleaseWait gets called on these
-    with raises(PleaseWait):
-        await coord.delete(None, None)
-    with raises(PleaseWait):
-        await coord.sync()
-    with raises(PleaseWait):
-        await coord.uploadBackups(None)
-    with raises(PleaseWait):
-        await coord.startBackup(None)
+    retain = asyncio.create_task(coord.retain({source.name(): True}, backup.slug()))
+    note = asyncio.create_task(coord.note("note", backup.slug()))
+    sync = asyncio.create_task(coord.sync())
+    another_sync = asyncio.create_task(coord.sync())
+    missing = asyncio.create_task(coord.delete([source.name()], "missing"))
+    await asyncio.sleep(0)
+    assert not retain.done()
+    assert not sync.done()
+
+    # The second sync waits on the first one instead of getting in line, and changes to a backup's metadata don't
+    # wait in line at all.
+    assert [(operation['kind'], operation['state']) for operation in coord.operations()] == [
+        ("sync", "done"), ("test", "running"), ("retain", "queued"), ("note", "queued"), ("sync", "queued"), ("delete", "queued")]
+    await asyncio.wait([retain, note])
+    assert backup.getSource(source.name()).retained()
+    assert retain.exception() is None
+    assert not sync.done()
+
     event_end.set()
+    await asyncio.wait([blocker, sync, another_sync, missing])
+    assert global_info._syncs == 2
+    assert isinstance(missing.exception(), NoBackup)
+    assert coord.operations()[-1]['state'] == "failed"
+    assert not coord.isBusy()
 
 
 async def sleepHelper(event_start: asyncio.Event, event_end: asyncio.Event):
@@ -550,3 +564,24 @@ async def test_precaching(coord: Coordinator, precache: DestinationPrecache, des
     assert dest.query_count == 1
     assert precache.cached(dest.name(), time.now()) is None
     assert global_info._last_error is None
+
+
+@pytest.mark.asyncio
+async def test_precache_survives_changes(coord: Coordinator, precache: DestinationPrecache, dest: HelperTestSource, time: FakeTime):
+    await coord.sync()
+    backup = coord.backups()[0]
+    dest.reset()
+
+    time.setNow(precache.getNextWarmDate())
+    await precache.checkForSmoothing()
+    assert dest.query_count == 1
+
+    # Changing a backup updates it in the cached listing instead of throwing the listing away
+    await coord.retain({dest.name(): True}, backup.slug())
+    cached = precache.cached(dest.name(), time.now())
+    assert cached[backup.slug()].retained()
+
+    time.setNow(coord.nextSyncAttempt())
+    await coord.sync()
+    assert dest.query_count == 1
+    assert coord.getBackup(backup.slug()).getSource(dest.name()).retained()
@@ -6,36 +6,37 @@ from datetime import timedelta
 from backup.config import Config, Setting, VERSION, Version
 from backup.util import DataCache, UpgradeFlags, KEY_CREATED, KEY_LAST_SEEN, CACHE_EXPIRATION_DAYS
 from backup.time import Time
+from backup.file import JsonFileSaver, AsyncStorage
 from os.path import join
 
 
 @pytest.mark.asyncio
-async def test_read_and_write(config: Config, time: Time) -> None:
-    cache = DataCache(config, time)
+async def test_read_and_write(config: Config, time: Time, storage: AsyncStorage) -> None:
+    cache = DataCache(config, time, storage)
     assert len(cache.backups) == 0
 
     cache.backup("test")[KEY_CREATED] = time.now().isoformat()
     assert not cache._dirty
     cache.makeDirty()
     assert cache._dirty
-    cache.saveIfDirty()
+    await cache.saveIfDirty()
     assert not cache._dirty
 
-    cache = DataCache(config, time)
+    cache = DataCache(config, time, storage)
     assert cache.backup("test")[KEY_CREATED] == time.now().isoformat()
     assert not cache._dirty
 
 
 @pytest.mark.asyncio
-async def test_backup_expiration(config: Config, time: Time) -> None:
-    cache = DataCache(config, time)
+async def test_backup_expiration(config: Config, time: Time, storage: AsyncStorage) -> None:
+    cache = DataCache(config, time, storage)
     assert len(cache.backups) == 0
 
     cache.backup("new")[KEY_LAST_SEEN] = time.now().isoformat()
     cache.backup("old")[KEY_LAST_SEEN] = (
         time.now() - timedelta(days=CACHE_EXPIRATION_DAYS + 1)) .isoformat()
     cache.makeDirty()
-    cache.saveIfDirty()
+    await cache.saveIfDirty()
 
     assert len(cache.backups) == 1
     assert "new" in cache.backups
@@ -43,7 +44,7 @@ async def test_backup_expiration(config: Config, time: Time) -> None:
 
 
 @pytest.mark.asyncio
-async def test_version_upgrades(time: Time, injector: Injector, config: Config) -> None:
+async def test_version_upgrades(time: Time, injector: Injector, config: Config, storage: AsyncStorage) -> None:
     # Simluate upgrading from an un-tracked version
     assert not os.path.exists(config.get(Setting.DATA_CACHE_FILE_PATH))
     cache = injector.get(DataCache)
@@ -52,35 +53,33 @@ async def test_version_upgrades(time: Time, injector: Injector, config: Config)
     assert cache.currentVersion == Version.parse(VERSION)
 
     assert os.path.exists(config.get(Setting.DATA_CACHE_FILE_PATH))
-    with open(config.get(Setting.DATA_CACHE_FILE_PATH)) as f:
-        data = json.load(f)
-        assert data["upgrades"] == [{
-            "prev_version": str(Version.default()),
-            "new_version": VERSION,
-            "date": upgrade_time.isoformat()
-        }]
+    data = JsonFileSaver.read(config.get(Setting.DATA_CACHE_FILE_PATH))
+    assert data["upgrades"] == [{
+        "prev_version": str(Version.default()),
+        "new_version": VERSION,
+        "date": upgrade_time.isoformat()
+    }]
 
     # Reload the data cache, verify there is no upgrade.
     time.advance(days=1)
-    cache = DataCache(config, time)
+    cache = DataCache(config, time, storage)
     assert cache.previousVersion == Version.parse(VERSION)
     assert cache.currentVersion == Version.parse(VERSION)
     assert os.path.exists(config.get(Setting.DATA_CACHE_FILE_PATH))
 
-    with open(config.get(Setting.DATA_CACHE_FILE_PATH)) as f:
-        data = json.load(f)
-        assert data["upgrades"] == [{
-            "prev_version": str(Version.default()),
-            "new_version": VERSION,
-            "date": upgrade_time.isoformat()
-        }]
+    data = JsonFileSaver.read(config.get(Setting.DATA_CACHE_FILE_PATH))
+    assert data["upgrades"] == [{
+        "prev_version": str(Version.default()),
+        "new_version": VERSION,
+        "date": upgrade_time.isoformat()
+    }]
 
     # simulate upgrading to a new version, verify an upgrade gets identified.
     upgrade_version = Version.parse("200")
 
     class UpgradeCache(DataCache):
         def __init__(self):
-            super().__init__(config, time)
+            super().__init__(config, time, storage)
 
         @property
         def currentVersion(self):
@@ -91,20 +90,19 @@ async def test_version_upgrades(time: Time, injector: Injector, config: Config)
     assert cache.currentVersion == upgrade_version
     assert os.path.exists(config.get(Setting.DATA_CACHE_FILE_PATH))
 
-    with open(config.get(Setting.DATA_CACHE_FILE_PATH)) as f:
-        data = json.load(f)
-        assert data["upgrades"] == [
-            {
-                "prev_version": str(Version.default()),
-                "new_version": VERSION,
-                "date": upgrade_time.isoformat()
-            },
-            {
-                "prev_version": VERSION,
-                "new_version": str(upgrade_version),
-                "date": time.now().isoformat()
-            }
-        ]
+    data = JsonFileSaver.read(config.get(Setting.DATA_CACHE_FILE_PATH))
+    assert data["upgrades"] == [
+        {
+            "prev_version": str(Version.default()),
+            "new_version": VERSION,
+            "date": upgrade_time.isoformat()
+        },
+        {
+            "prev_version": VERSION,
+            "new_version": str(upgrade_version),
+            "date": time.now().isoformat()
+        }
+    ]
 
     next_upgrade_time = time.now()
     time.advance(days=1)
@@ -118,30 +116,30 @@ async def test_version_upgrades(time: Time, injector: Injector, config: Config)
 
 
 @pytest.mark.asyncio
-async def test_flag(config: Config, time: Time):
-    cache = DataCache(config, time)
+async def test_flag(config: Config, time: Time, storage: AsyncStorage):
+    cache = DataCache(config, time, storage)
     assert not cache.checkFlag(UpgradeFlags.TESTING_FLAG)
     assert not cache.dirty
 
     cache.addFlag(UpgradeFlags.TESTING_FLAG)
     assert cache.dirty
     assert cache.checkFlag(UpgradeFlags.TESTING_FLAG)
-    cache.saveIfDirty()
+    await cache.saveIfDirty()
 
-    cache = DataCache(config, time)
+    cache = DataCache(config, time, storage)
     assert cache.checkFlag(UpgradeFlags.TESTING_FLAG)
 
 
 @pytest.mark.asyncio
-async def test_warn_upgrade_new_install(config: Config, time: Time):
+async def test_warn_upgrade_new_install(config: Config, time: Time, storage: AsyncStorage):
     """A fresh install of the addon should never warn about upgrade snapshots"""
-    cache = DataCache(config, time)
+    cache = DataCache(config, time, storage)
     assert not cache.notifyForIgnoreUpgrades
     assert cache._config.get(Setting.IGNORE_UPGRADE_BACKUPS)
 
 
 @pytest.mark.asyncio
-async def test_warn_upgrade_old_install(config: Config, time: Time):
+async def test_warn_upgrade_old_install(config: Config, time: Time, storage: AsyncStorage):
     """An old install of the addon warn about upgrade snapshots"""
     with open(config.get(Setting.DATA_CACHE_FILE_PATH), "w") as f:
         data = {
@@ -154,13 +152,13 @@ async def test_warn_upgrade_old_install(config: Config, time: Time):
             ]
         }
         json.dump(data, f)
-    cache = DataCache(config, time)
+    cache = DataCache(config, time, storage)
     assert cache.notifyForIgnoreUpgrades
     assert not cache._config.get(Setting.IGNORE_UPGRADE_BACKUPS)
 
 
 @pytest.mark.asyncio
-async def test_warn_upgrade_old_install_explicit_ignore_upgrades(config: Config, time: Time, cleandir: str):
+async def test_warn_upgrade_old_install_explicit_ignore_upgrades(config: Config, time: Time, cleandir: str, storage: AsyncStorage):
     """An old install of the addon should not warn about upgrade snapshots if it explicitly ignores them"""
     with open(config.get(Setting.DATA_CACHE_FILE_PATH), "w") as f:
         data = {
@@ -180,13 +178,13 @@ async def test_warn_upgrade_old_install_explicit_ignore_upgrades(config: Config,
             Setting.DATA_CACHE_FILE_PATH.value: config.get(Setting.DATA_CACHE_FILE_PATH)
         }
         json.dump(data, f)
-    cache = DataCache(Config.fromFile(config_path), time)
+    cache = DataCache(Config.fromFile(config_path), time, storage)
     assert not cache.notifyForIgnoreUpgrades
     assert cache._config.get(Setting.IGNORE_UPGRADE_BACKUPS)
 
 
 @pytest.mark.asyncio
-async def test_warn_upgrade_old_install_explicit_ignore_others(config: Config, time: Time, cleandir: str):
+async def test_warn_upgrade_old_install_explicit_ignore_others(config: Config, time: Time, cleandir: str, storage: AsyncStorage):
     """An old install of the addon should not warn about upgrade snapshots if it explicitly ignores them"""
     with open(config.get(Setting.DATA_CACHE_FILE_PATH), "w") as f:
         data = {
@@ -206,5 +204,5 @@ async def test_warn_upgrade_old_install_explicit_ignore_others(config: Config, t
             Setting.DATA_CACHE_FILE_PATH.value: config.get(Setting.DATA_CACHE_FILE_PATH)
         }
         json.dump(data, f)
-    cache = DataCache(Config.fromFile(config_path), time)
+    cache = DataCache(Config.fromFile(config_path), time, storage)
     assert not cache.notifyForIgnoreUpgrades
@@ -11,7 +11,8 @@ from dev.simulationserver import SimulationServer
 from dev.simulated_google import SimulatedGoogle, URL_MATCH_UPLOAD_PROGRESS, URL_MATCH_FILE
 from dev.request_interceptor import RequestInterceptor
 from backup.drive import DriveSource, FolderFinder, DriveRequests, RETRY_SESSION_ATTEMPTS, UPLOAD_SESSION_EXPIRATION_DURATION, URL_START_UPLOAD
-from backup.drive.driverequests import (BASE_CHUNK_SIZE, CHUNK_UPLOAD_TARGET_SECONDS)
+from backup.drive.chunksizer import (BASE_CHUNK_SIZE, CHUNK_UPLOAD_TARGET_SECONDS)
+from backup.drive.chunksizer import TargetTimeChunkSizer
 from backup.drive.drivesource import FOLDER_MIME_TYPE
 from backup.exceptions import (BackupFolderInaccessible, BackupFolderMissingError,
                                DriveQuotaExceeded, ExistingBackupFolderError,
@@ -19,6 +20,7 @@ from backup.exceptions import (BackupFolderInaccessible, BackupFolderMissingErro
                                GoogleInternalError, GoogleUnexpectedError,
                                GoogleSessionError, GoogleTimeoutError, CredRefreshMyError, CredRefreshGoogleError)
 from backup.creds import Creds
+from backup.file import JsonFileSaver
 from backup.model import DriveBackup, DummyBackup
 from .faketime import FakeTime
 from .helpers import compareStreams, createBackupTar
@@ -26,6 +28,13 @@ from .helpers import compareStreams, createBackupTar
 RETRY_EXHAUSTION_SLEEPS = [2, 4, 8, 16, 32]
 
 
+def assertRetriesExhausted(sleeps):
+    # Retries wait a random amount up to the backoff, so requests that fail together don't retry together
+    assert len(sleeps) == len(RETRY_EXHAUSTION_SLEEPS)
+    for slept, limit in zip(sleeps, RETRY_EXHAUSTION_SLEEPS):
+        assert 0 <= slept <= limit
+
+
 class BackupHelper():
     def __init__(self, uploader, time):
         self.time = time
@@ -93,6 +102,31 @@ async def test_CRUD(backup_helper, drive, time, session) -> None:
     assert len(backups) == 0
 
 
+@pytest.mark.asyncio
+async def test_index(drive: DriveSource, backup_helper, time, interceptor: RequestInterceptor, data_cache) -> None:
+    from_backup = DummyBackup("Test Name", time.toUtc(time.local(1985, 12, 6)), "fake source", "testslug")
+    archives = {"homeassistant": 1024 * 1024 * 3, "share": 1024 * 5, "sexy_robots": 1024 * 1024}
+    data = await backup_helper.uploader.upload(createBackupTar("testslug", "Test Name", time.now(), 1024, included_folders=["homeassistant", "share"], included_addons=["sexy_robots"], archives=archives))
+    from_backup.addSource(await drive.save(from_backup, data))
+    assert drive.cachedIndex(from_backup) is None
+
+    downloads = interceptor.setError(URL_MATCH_FILE)
+    index = await drive.index(from_backup)
+    assert {content["slug"]: content["size"] for content in index.contents()} == archives
+    # One request for each header, backup.json and the end of the archive
+    assert downloads.callCount() == len(index.members) + 2
+
+    # The index should be cached for next time
+    assert drive.cachedIndex(from_backup).serialize() == index.serialize()
+    assert (await drive.index(from_backup)).serialize() == index.serialize()
+    assert downloads.callCount() == len(index.members) + 2
+    assert not data_cache.dirty
+
+    # And forgotten when the backup is deleted
+    await drive.delete(from_backup)
+    assert "contents" not in data_cache.backup("testslug")
+
+
 @pytest.mark.asyncio
 async def test_folder_creation(drive, time, config):
     assert len(await drive.get()) == 0
@@ -221,47 +255,48 @@ async def test_upload_resume(drive: DriveSource, time, backup_helper: BackupHelp
     # Verify we uploaded one chunk
     assert google.chunks == [BASE_CHUNK_SIZE]
 
-    # Retry the upload, which shoudl now pass
+    # Retry the upload, which shoudl now pass.  It resumes with the chunk size that was working before.
     interceptor.clear()
     data.position(0)
     drive_backup = await drive.save(from_backup, data)
     from_backup.addSource(drive_backup)
-    assert google.chunks == [BASE_CHUNK_SIZE,
-                             BASE_CHUNK_SIZE, (data.size()) - BASE_CHUNK_SIZE * 2]
+    assert google.chunks == [BASE_CHUNK_SIZE, (data.size()) - BASE_CHUNK_SIZE]
 
     # Verify the data is correct
     data.position(0)
     await compareStreams(data, await drive.read(from_backup))
 
 
-def test_chunk_size(drive: DriveSource, config: Config):
+def test_chunk_size(config: Config):
+    sizer = TargetTimeChunkSizer(config)
     max = config.get(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES) / BASE_CHUNK_SIZE
-    assert drive.drivebackend._getNextChunkSize(
+    assert sizer.success(
         1000000000, 0) == max
-    assert drive.drivebackend._getNextChunkSize(
+    assert sizer.success(
         1, CHUNK_UPLOAD_TARGET_SECONDS) == 1
-    assert drive.drivebackend._getNextChunkSize(
+    assert sizer.success(
         1000000000, CHUNK_UPLOAD_TARGET_SECONDS) == max
-    assert drive.drivebackend._getNextChunkSize(
+    assert sizer.success(
         1, CHUNK_UPLOAD_TARGET_SECONDS) == 1
-    assert drive.drivebackend._getNextChunkSize(
+    assert sizer.success(
         1, 1) == CHUNK_UPLOAD_TARGET_SECONDS
-    assert drive.drivebackend._getNextChunkSize(
+    assert sizer.success(
         1, 1.01) == CHUNK_UPLOAD_TARGET_SECONDS - 1
 
 
-def test_chunk_size_limits(drive: DriveSource, config: Config):
+def test_chunk_size_limits(config: Config):
+    sizer = TargetTimeChunkSizer(config)
     config.override(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES, 1)
-    assert drive.drivebackend._getNextChunkSize(1000000000, 0) == 1
-    assert drive.drivebackend._getNextChunkSize(1, 1000000) == 1
+    assert sizer.success(1000000000, 0) == 1
+    assert sizer.success(1, 1000000) == 1
 
     config.override(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES, BASE_CHUNK_SIZE * 1.5)
-    assert drive.drivebackend._getNextChunkSize(1000000000, 0) == 1
-    assert drive.drivebackend._getNextChunkSize(1, 1000000) == 1
+    assert sizer.success(1000000000, 0) == 1
+    assert sizer.success(1, 1000000) == 1
 
     config.override(Setting.MAXIMUM_UPLOAD_CHUNK_BYTES, BASE_CHUNK_SIZE * 3.5)
-    assert drive.drivebackend._getNextChunkSize(1000000000, 0) == 3
-    assert drive.drivebackend._getNextChunkSize(1, 1000000) == 1
+    assert sizer.success(1000000000, 0) == 3
+    assert sizer.success(1, 1000000) == 1
 
 
 @pytest.mark.asyncio
@@ -339,20 +374,20 @@ async def test_google_internal_error(drive, server, time: FakeTime, interceptor:
     interceptor.setError(URL_MATCH_FILE, 500)
     with pytest.raises(GoogleInternalError):
         await drive.get()
-    assert time.sleeps == RETRY_EXHAUSTION_SLEEPS
+    assertRetriesExhausted(time.sleeps)
     time.clearSleeps()
 
     interceptor.clear()
     interceptor.setError(URL_MATCH_FILE, 500)
     with pytest.raises(GoogleInternalError):
         await drive.get()
-    assert time.sleeps == RETRY_EXHAUSTION_SLEEPS
+    assertRetriesExhausted(time.sleeps)
 
 
 @pytest.mark.asyncio
 async def test_check_time(drive: DriveSource, drive_creds: Creds):
     assert not await drive.check()
-    drive.saveCreds(drive_creds)
+    await drive.saveCreds(drive_creds)
     assert await drive.check()
 
 
@@ -468,7 +503,8 @@ async def test_resume_session_reused_on_http5XX(time, drive: DriveSource, config
 
 @pytest.mark.asyncio
 async def test_resume_session_reused_abonded_after_retries(time, drive: DriveSource, config: Config, server: SimulationServer, backup_helper, interceptor: RequestInterceptor):
-    from_backup, data = await backup_helper.createFile()
+    # Big enough that it takes more than one chunk even after the chunk size is cut by a failure
+    from_backup, data = await backup_helper.createFile(size=1024 * 1024 * 12)
 
     # Configure the upload to fail after the first upload chunk
     interceptor.setError(URL_MATCH_UPLOAD_PROGRESS, 501, 1)
@@ -710,7 +746,7 @@ async def test_existing_folder_already_exists(time, drive: DriveSource, config:
     drive.checkBeforeChanges()
 
     # Reset folder, try again
-    folder_finder.reset()
+    await folder_finder.reset()
     await drive.get()
     with pytest.raises(ExistingBackupFolderError):
         drive.checkBeforeChanges()
@@ -724,7 +760,7 @@ async def test_existing_resolved_use_existing(time, drive: DriveSource, config:
     folder_id = await drive.getFolderId()
 
     # Reset folder, try again
-    folder_finder.reset()
+    await folder_finder.reset()
     await drive.get()
     with pytest.raises(ExistingBackupFolderError):
         drive.checkBeforeChanges()
@@ -743,7 +779,7 @@ async def test_existing_resolved_create_new(time, drive: DriveSource, config: Co
     folder_id = await drive.getFolderId()
 
     # Reset folder, try again
-    folder_finder.reset()
+    await folder_finder.reset()
     await drive.get()
     with pytest.raises(ExistingBackupFolderError):
         drive.checkBeforeChanges()
@@ -775,13 +811,12 @@ async def test_cred_refresh_with_secret(drive: DriveSource, google: SimulatedGoo
     assert old_creds.access_token != drive.drivebackend.creds.access_token
 
     # verify the client_secret is kept
-    with open(config.get(Setting.CREDENTIALS_FILE_PATH)) as f:
-        assert "client_secret" in json.load(f)
+    assert "client_secret" in JsonFileSaver.read(config.get(Setting.CREDENTIALS_FILE_PATH))
 
 
 @pytest.mark.asyncio
 async def test_cred_refresh_no_secret(drive: DriveSource, google: SimulatedGoogle, time: FakeTime, config: Config):
-    drive.saveCreds(google.creds())
+    await drive.saveCreds(google.creds())
     await drive.get()
     old_creds = drive.drivebackend.creds
     await drive.get()
@@ -789,8 +824,7 @@ async def test_cred_refresh_no_secret(drive: DriveSource, google: SimulatedGoogl
     time.advanceDay()
     await drive.get()
     assert old_creds.access_token != drive.drivebackend.creds.access_token
-    with open(config.get(Setting.CREDENTIALS_FILE_PATH)) as f:
-        assert "client_secret" not in json.load(f)
+    assert "client_secret" not in JsonFileSaver.read(config.get(Setting.CREDENTIALS_FILE_PATH))
 
 
 @pytest.mark.asyncio
@@ -808,9 +842,8 @@ async def test_cred_refresh_upgrade_default_client(drive: DriveSource, server: S
     drive.drivebackend.tryLoadCredentials()
 
     # Verify the "client secret" was removed
-    with open(config.get(Setting.CREDENTIALS_FILE_PATH)) as f:
-        saved_creds = json.load(f)
-        assert saved_creds == creds.serialize()
+    saved_creds = JsonFileSaver.read(config.get(Setting.CREDENTIALS_FILE_PATH))
+    assert saved_creds == creds.serialize()
 
     await drive.get()
     old_creds = drive.drivebackend.cred_bearer
@@ -1046,3 +1079,16 @@ async def test_note_creation(drive: DriveSource, time: FakeTime, folder_finder:
     from_backup, data = await backup_helper.createFile(note="test")
     backup = await drive.save(from_backup, data)
     assert backup.note() == "test"
+
+
+def test_drive_backup_delete_capabilities():
+    data = {
+        'id': "id",
+        'name': "name.tar",
+        'size': "1",
+        'appProperties': {'snapshot_slug': "slug", 'snapshot_date': "1985-12-06T00:00:00Z"},
+    }
+    assert DriveBackup(dict(data, capabilities={'canDelete': True})).canDeleteDirectly()
+    assert DriveBackup(dict(data, capabilities={'canTrash': True})).canDeleteDirectly()
+    assert not DriveBackup(dict(data, capabilities={'canTrash': True}, driveId="shared")).canDeleteDirectly()
+    assert DriveBackup(dict(data, capabilities={}, driveId="shared")).canDeleteDirectly()
@@ -5,7 +5,7 @@ from backup.exceptions import LowSpaceError
 
 @pytest.mark.asyncio
 async def test_check_space(estimator: Estimator, coord, config: Config):
-    estimator.refresh()
+    await estimator.refresh()
     estimator.checkSpace(coord.backups())
 
     config.override(Setting.LOW_SPACE_THRESHOLD, estimator.getBytesFree() + 1)
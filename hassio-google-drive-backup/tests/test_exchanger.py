@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 
 from dev.simulationserver import SimulationServer, RequestInterceptor
@@ -9,6 +10,11 @@ from backup.tracing_session import TracingSession
 from yarl import URL
 
 
+def refreshHosts(session: TracingSession):
+    # The simulated token server makes requests of its own through the same session
+    return [URL(record['url']).host for record in session._records if URL(record['url']).path == "/drive/refresh"]
+
+
 @pytest.mark.asyncio
 async def test_correct_host(time: Time, session: TracingSession, config: Config, server: SimulationServer, drive_requests: DriveRequests, server_url, interceptor: RequestInterceptor):
     # Verify the correct endpoitns get called for a successful request
@@ -184,3 +190,40 @@ async def test_anything_else_through(time: Time, session: TracingSession, config
     # Verify both hosts were checked
     session._records[0]['url'] == server_url.with_path("/drive/refresh")
     session._records[1]['url'] == server_url.with_path("/drive/refresh")
+
+
+@pytest.mark.asyncio
+async def test_hedge_slow_host(time: Time, session: TracingSession, config: Config, server: SimulationServer, drive_requests: DriveRequests, interceptor: RequestInterceptor, server_url: URL):
+    session.record = True
+    slow_host = server_url
+    fast_host = server_url.with_host("127.0.0.1")
+    config.override(Setting.EXCHANGER_TIMEOUT_SECONDS, 20)
+    config.override(Setting.TOKEN_SERVER_HOSTS, str(slow_host) + "," + str(fast_host))
+
+    # The first host usually answers quickly, but this time it's stuck
+    for _ in range(5):
+        drive_requests.exchanger.token_servers.recordLatency(slow_host, 0.01)
+    stuck = interceptor.setSleep("^/drive/refresh$", sleep=20, wait_for=1)
+
+    try:
+        await asyncio.wait_for(drive_requests.exchanger.refresh(drive_requests.creds), timeout=5)
+    finally:
+        stuck.stop()
+
+    # Both hosts were asked, and the second one answered
+    assert refreshHosts(session) == ["localhost", "127.0.0.1"]
+
+
+@pytest.mark.asyncio
+async def test_failed_host_tried_last(time: Time, session: TracingSession, config: Config, server: SimulationServer, drive_requests: DriveRequests, interceptor: RequestInterceptor, server_url: URL):
+    session.record = True
+    config.override(Setting.EXCHANGER_TIMEOUT_SECONDS, 1)
+    config.override(Setting.TOKEN_SERVER_HOSTS, "https://this.goes.nowhere.info," + str(server_url))
+
+    await drive_requests.exchanger.refresh(drive_requests.creds)
+    assert refreshHosts(session) == ["this.goes.nowhere.info", "localhost"]
+
+    # The host that failed goes to the back of the line
+    session._records.clear()
+    await drive_requests.exchanger.refresh(drive_requests.creds)
+    assert refreshHosts(session) == ["localhost"]
@@ -1,12 +1,10 @@
-
-
 from backup.file import File
 from os.path import exists, join
 from os import remove
 import pytest
-import json
 
 TEST_DATA = "when you press my special key I play a little melody"
+NEW_DATA = "and when I press your special key, you play a little melody"
 
 
 def readfile(path):
@@ -22,10 +20,15 @@ async def test_basic(tmpdir: str) -> None:
     assert not File.exists(path)
     File.write(path, TEST_DATA)
     assert File.exists(path)
-    assert readfile(path) == TEST_DATA
-    assert readfile(backup_path) == TEST_DATA
+    assert readfile(path).endswith(TEST_DATA)
+    assert not exists(backup_path)
     assert File.read(path) == TEST_DATA
 
+    # The previous generation gets kept as the backup
+    File.write(path, NEW_DATA)
+    assert File.read(path) == NEW_DATA
+    assert readfile(backup_path).endswith(TEST_DATA)
+
     File.delete(path)
     assert not exists(path)
     assert not exists(backup_path)
@@ -36,6 +39,7 @@ async def test_basic(tmpdir: str) -> None:
 async def test_file_deleted(tmpdir: str) -> None:
     path = join(tmpdir, "test.json")
     File.write(path, TEST_DATA)
+    File.write(path, NEW_DATA)
     remove(path)
     assert File.read(path) == TEST_DATA
 
@@ -45,16 +49,77 @@ async def test_backup_deleted(tmpdir: str) -> None:
     path = join(tmpdir, "test.json")
     backup_path = join(tmpdir, "test.json.backup")
     File.write(path, TEST_DATA)
+    File.write(path, NEW_DATA)
     remove(backup_path)
-    assert File.read(path) == TEST_DATA
+    assert File.read(path) == NEW_DATA
+
 
 @pytest.mark.asyncio
 async def test_decode_error(tmpdir: str) -> None:
     path = join(tmpdir, "test.json")
     File.write(path, TEST_DATA)
+    File.write(path, NEW_DATA)
     with open(path, "w"):
         # emptys the file contents
         pass
     with open(path) as f:
         assert len(f.read()) == 0
     assert File.read(path) == TEST_DATA
+
+
+@pytest.mark.asyncio
+async def test_checksum_error(tmpdir: str) -> None:
+    path = join(tmpdir, "test.json")
+    File.write(path, TEST_DATA)
+    File.write(path, NEW_DATA)
+    with open(path, "r+b") as f:
+        # flip the last byte of the payload
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+    assert File.read(path) == TEST_DATA
+
+
+@pytest.mark.asyncio
+async def test_no_valid_copy(tmpdir: str) -> None:
+    path = join(tmpdir, "test.json")
+    with open(path, "w"):
+        pass
+    with pytest.raises(ValueError):
+        File.read(path)
+    with pytest.raises(FileNotFoundError):
+        File.read(join(tmpdir, "missing.json"))
+
+
+@pytest.mark.asyncio
+async def test_legacy_migration(tmpdir: str) -> None:
+    path = join(tmpdir, "test.json")
+    backup_path = join(tmpdir, "test.json.backup")
+
+    # Files written by older versions are plain text and written twice
+    with open(path, "w") as f:
+        f.write(TEST_DATA)
+    with open(backup_path, "w") as f:
+        f.write(TEST_DATA)
+    assert File.read(path) == TEST_DATA
+
+    File.write(path, NEW_DATA)
+    assert File.read(path) == NEW_DATA
+    assert readfile(backup_path) == TEST_DATA
+    assert not exists(join(tmpdir, "test.json.tmp"))
+
+
+@pytest.mark.asyncio
+async def test_corrupt_primary_keeps_backup(tmpdir: str) -> None:
+    path = join(tmpdir, "test.json")
+    backup_path = join(tmpdir, "test.json.backup")
+    File.write(path, TEST_DATA)
+    File.write(path, NEW_DATA)
+    with open(path, "w"):
+        pass
+
+    # The empty primary gets replaced, but the good copy in the backup stays
+    File.write(path, "third")
+    assert File.read(path) == "third"
+    assert readfile(backup_path).endswith(TEST_DATA)
@@ -15,7 +15,7 @@ from backup.model import DummyBackup
 from dev.simulationserver import SimulationServer
 from .faketime import FakeTime
 from .helpers import all_addons, all_folders, createBackupTar, getTestStream
-from dev.simulated_supervisor import SimulatedSupervisor, URL_MATCH_SELF_OPTIONS, URL_MATCH_START_ADDON, URL_MATCH_STOP_ADDON, URL_MATCH_BACKUP_FULL, URL_MATCH_BACKUP_DELETE, URL_MATCH_MISC_INFO, URL_MATCH_BACKUP_DOWNLOAD, URL_MATCH_BACKUPS, URL_MATCH_SNAPSHOT, URL_MATCH_MOUNT
+from dev.simulated_supervisor import SimulatedSupervisor, URL_MATCH_SELF_OPTIONS, URL_MATCH_SELF_INFO, URL_MATCH_CORE_INFO, URL_MATCH_START_ADDON, URL_MATCH_STOP_ADDON, URL_MATCH_BACKUP_FULL, URL_MATCH_BACKUP_DELETE, URL_MATCH_MISC_INFO, URL_MATCH_BACKUP_DOWNLOAD, URL_MATCH_BACKUPS, URL_MATCH_SNAPSHOT, URL_MATCH_MOUNT
 from dev.request_interceptor import RequestInterceptor
 from backup.model import Model
 from backup.time import Time
@@ -1159,3 +1159,152 @@ async def test_exclude_database(ha: HaSource, time, config: Config, supervisor:
         backup = await ha.create(CreateOptions(time.now(), "Test Name"))
         assert isinstance(backup, PendingBackup)
         assert backup._request_info['homeassistant_exclude_database']
+
+
+@pytest.mark.asyncio
+async def test_supervisor_info_cached(ha: HaSource, time: FakeTime, interceptor: RequestInterceptor):
+    await ha.init()
+    misc_info = interceptor.setError(URL_MATCH_MISC_INFO)
+    self_info = interceptor.setError(URL_MATCH_SELF_INFO)
+    await ha.get()
+    await ha.create(CreateOptions(time.now(), "Test Name"))
+    assert misc_info.callCount() == 0
+    assert self_info.callCount() == 0
+
+    # Host info expires well before the addon's own info
+    time.advance(minutes=31)
+    await ha.create(CreateOptions(time.now(), "Test Name"))
+    assert misc_info.callCount() == 1
+    assert self_info.callCount() == 0
+
+
+@pytest.mark.asyncio
+async def test_refresh_ignores_cached_info(ha: HaSource, interceptor: RequestInterceptor):
+    await ha.init()
+    misc_info = interceptor.setError(URL_MATCH_MISC_INFO)
+    await ha.refresh()
+    assert misc_info.callCount() == 1
+
+
+@pytest.mark.asyncio
+async def test_supervisor_info_queried_concurrently(ha: HaSource, interceptor: RequestInterceptor):
+    misc_info = interceptor.setWaiter(URL_MATCH_MISC_INFO)
+    core_info = interceptor.setWaiter(URL_MATCH_CORE_INFO)
+    init = asyncio.create_task(ha.init())
+
+    # Both requests are in flight at the same time
+    await asyncio.wait_for(misc_info.waitForCall(), timeout=5)
+    await asyncio.wait_for(core_info.waitForCall(), timeout=5)
+    misc_info.clear()
+    core_info.clear()
+    await init
+    assert ha.isInitialized()
+
+
+@pytest.mark.asyncio
+async def test_config_change_invalidates_self_info(ha: HaSource, time: FakeTime, config: Config, interceptor: RequestInterceptor):
+    await ha.init()
+    self_info = interceptor.setError(URL_MATCH_SELF_INFO)
+    config.update(config.validateUpdate({Setting.BACKUP_NAME: "Changed name"}))
+    await ha.create(CreateOptions(time.now(), "Test Name"))
+    assert self_info.callCount() == 1
+
+
+@pytest.mark.asyncio
+async def test_supervisor_update_invalidates_info(ha: HaSource, time: FakeTime, supervisor: SimulatedSupervisor, interceptor: RequestInterceptor):
+    await ha.init()
+    misc_info = interceptor.setError(URL_MATCH_MISC_INFO)
+    supervisor._super_version = Version.parse("2099.1")
+    time.advance(minutes=11)
+    await ha.get()
+    assert misc_info.callCount() == 0
+
+    await ha.create(CreateOptions(time.now(), "Test Name"))
+    assert misc_info.callCount() == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_inactive_mount_rechecked(ha: HaSource, time: FakeTime, config: Config, supervisor: SimulatedSupervisor):
+    config.override(Setting.BACKUP_STORAGE, "my_backup_share")
+    supervisor._mounts["mounts"][1]["state"] = "starting"
+    await ha.init()
+
+    supervisor._mounts["mounts"][1]["state"] = "active"
+    backup = await ha.create(CreateOptions(time.now(), "Test Name"))
+    assert not isinstance(backup, PendingBackup)
+
+
+@pytest.mark.asyncio
+async def test_pending_backup_reports_job_progress(ha: HaSource, time: FakeTime, config: Config, supervisor: SimulatedSupervisor):
+    config.override(Setting.NEW_BACKUP_TIMEOUT_SECONDS, 0.001)
+    async with supervisor._backup_inner_lock:
+        pending = await ha.create(CreateOptions(time.now(), "Test Name"))
+        assert isinstance(pending, PendingBackup)
+        assert pending.status() == "Pending"
+
+        supervisor.backupJob()["progress"] = 42
+        supervisor.backupJob()["stage"] = "addons"
+        await ha.check()
+        await ha._job_task
+        assert pending.status() == "Pending 42%"
+        assert pending.stage() == "addons"
+        assert pending.jobId() == supervisor.backupJob()["uuid"]
+
+        # Polls wait for the poll interval
+        job_task = ha._job_task
+        await ha.check()
+        assert ha._job_task is job_task
+    await ha._pending_backup_task
+
+
+@pytest.mark.asyncio
+async def test_external_backup_job_finishing_triggers_sync(ha: HaSource, time: FakeTime, config: Config, supervisor: SimulatedSupervisor):
+    await ha.create(CreateOptions(time.now(), "Test Name"))
+    config.override(Setting.NEW_BACKUP_TIMEOUT_SECONDS, 100)
+    await supervisor.toggleBlockBackup()
+    with pytest.raises(BackupInProgress):
+        await ha.create(CreateOptions(time.now(), "Test Name"))
+    pending = ha.pending_backup
+    ha.reset()
+
+    await ha.check()
+    await ha._job_task
+    assert not pending.jobDone()
+    assert not ha.triggered()
+
+    await supervisor.toggleBlockBackup()
+    time.advance(seconds=5)
+    await ha.check()
+    await ha._job_task
+    assert pending.jobDone()
+    assert ha.triggered()
+
+
+@pytest.mark.asyncio
+async def test_jobs_api_unsupported(ha: HaSource, time: FakeTime, config: Config, supervisor: SimulatedSupervisor, interceptor: RequestInterceptor):
+    interceptor.setError("^/jobs/info$", 404)
+    config.override(Setting.NEW_BACKUP_TIMEOUT_SECONDS, 0.001)
+    async with supervisor._backup_inner_lock:
+        pending = await ha.create(CreateOptions(time.now(), "Test Name"))
+        await ha.check()
+        await ha._job_task
+        assert not ha._jobs_supported
+        assert pending.status() == "Pending"
+
+        job_task = ha._job_task
+        time.advance(seconds=5)
+        await ha.check()
+        assert ha._job_task is job_task
+    await ha._pending_backup_task
+
+
+@pytest.mark.asyncio
+async def test_backup_details_are_compact(ha: HaSource, time: Time, config: Config):
+    backup: HABackup = await ha.create(CreateOptions(time.now(), "Test Name"))
+    details = backup.details()
+    assert set(details.keys()) == {'folders', 'addons'}
+    assert details['folders'] == all_folders
+    for addon in details['addons']:
+        assert set(addon.keys()) <= {'name', 'slug', 'version', 'size'}
+    assert [addon['slug'] for addon in details['addons']] == [addon['slug'] for addon in all_addons]
+    assert not hasattr(backup, "__dict__")
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import pytest
+from aiohttp import ClientSession, WSMsgType
+from backup.config import Config, Setting
+from backup.ha.integrationws import IntegrationWebSocketServer, PROTOCOL_VERSION
+from backup.util import JsonPatch
+
+
+def wsUrl(config: Config):
+    return "http://localhost:{0}/ws".format(config.get(Setting.INTEGRATION_WS_PORT))
+
+
+async def receive(ws):
+    msg = await asyncio.wait_for(ws.receive(), timeout=5)
+    assert msg.type == WSMsgType.TEXT
+    return json.loads(msg.data)
+
+
+def patchClients(server: IntegrationWebSocketServer):
+    return len([writer for writer in server._clients.values() if writer.wants_patches])
+
+
+async def waitFor(predicate):
+    for x in range(100):
+        if predicate():
+            return
+        await asyncio.sleep(0.05)
+    assert predicate()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_then_patches(integration_ws: IntegrationWebSocketServer, config: Config, session: ClientSession):
+    await integration_ws.send_backup_state("waiting", {"backups": [{"slug": "a"}]})
+    async with session.ws_connect(wsUrl(config)) as ws:
+        snapshot = await receive(ws)
+        assert snapshot["type"] == "backup_state"
+        assert snapshot["protocol"] == PROTOCOL_VERSION
+        assert snapshot["attributes"] == {"backups": [{"slug": "a"}]}
+
+        await ws.send_str(json.dumps({"type": "hello", "protocol": PROTOCOL_VERSION}))
+        await waitFor(lambda: patchClients(integration_ws) == 1)
+
+        await integration_ws.send_backup_state("backed_up", {"backups": [{"slug": "a"}, {"slug": "b"}]})
+        patch = await receive(ws)
+        assert patch["type"] == "backup_state_patch"
+        assert patch["base_seq"] == snapshot["seq"]
+        assert patch["seq"] == snapshot["seq"] + 1
+        assert patch["patch"] == [
+            {"op": "replace", "path": "/state", "value": "backed_up"},
+            {"op": "add", "path": "/attributes/backups/1", "value": {"slug": "b"}},
+        ]
+        state = JsonPatch.apply({"state": snapshot["state"], "attributes": snapshot["attributes"]}, patch["patch"])
+        assert state == {"state": "backed_up", "attributes": {"backups": [{"slug": "a"}, {"slug": "b"}]}}
+
+        # A client that detects a gap can ask for the whole state again
+        await ws.send_str(json.dumps({"type": "resync"}))
+        resync = await receive(ws)
+        assert resync["type"] == "backup_state"
+        assert resync["seq"] == patch["seq"]
+        assert resync["attributes"] == state["attributes"]
+
+
+@pytest.mark.asyncio
+async def test_legacy_clients_get_snapshots(integration_ws: IntegrationWebSocketServer, config: Config, session: ClientSession):
+    await integration_ws.send_backup_state("waiting", {"backups": []})
+    async with session.ws_connect(wsUrl(config)) as legacy:
+        async with session.ws_connect(wsUrl(config)) as patched:
+            assert (await receive(legacy))["type"] == "backup_state"
+            assert (await receive(patched))["type"] == "backup_state"
+            await patched.send_str(json.dumps({"type": "hello", "protocol": PROTOCOL_VERSION}))
+            await waitFor(lambda: patchClients(integration_ws) == 1)
+
+            await integration_ws.send_backup_state("backed_up", {"backups": []})
+            full = await receive(legacy)
+            assert full["type"] == "backup_state"
+            assert full["state"] == "backed_up"
+            assert (await receive(patched))["type"] == "backup_state_patch"
+
+
+@pytest.mark.asyncio
+async def test_slow_client_doesnt_block_others(integration_ws: IntegrationWebSocketServer, config: Config, session: ClientSession):
+    integration_ws._max_lag_seconds = 1
+    async with session.ws_connect(wsUrl(config)) as slow:
+        await waitFor(lambda: integration_ws.client_count == 1)
+        slow_writer = list(integration_ws._clients.values())[0]
+        sent_to_slow = []
+
+        async def stall(data):
+            sent_to_slow.append(data)
+            await asyncio.sleep(60)
+        slow_writer.ws.send_str = stall
+
+        async with session.ws_connect(wsUrl(config)) as fast:
+            await waitFor(lambda: integration_ws.client_count == 2)
+            for x in range(10):
+                # Broadcasting never waits on clients
+                await asyncio.wait_for(integration_ws.send_backup_state("backed_up", {"count": x}), timeout=0.5)
+                await asyncio.wait_for(integration_ws.send_backup_stale(x % 2 == 0), timeout=0.5)
+
+            # The fast client gets the latest state promptly, even though the slow client is stuck
+            state = await receive(fast)
+            while state["type"] != "backup_state" or state["attributes"] != {"count": 9}:
+                state = await receive(fast)
+
+            # The slow client only ever had the first message in flight, the rest were coalesced, and it gets dropped
+            # once it lags too far behind.
+            await waitFor(lambda: integration_ws.client_count == 1)
+            assert len(sent_to_slow) == 1
+            assert slow.closed or (await slow.receive()).type in [WSMsgType.CLOSE, WSMsgType.CLOSED, WSMsgType.CLOSING]
+
+            # The fast client keeps working
+            await integration_ws.send_backup_state("error", {"count": 10})
+            state = await receive(fast)
+            while state["type"] != "backup_state":
+                state = await receive(fast)
+            assert state["state"] == "error"
@@ -1,5 +1,3 @@
-
-
 from backup.file import JsonFileSaver
 from os.path import exists, join
 from os import remove
@@ -11,10 +9,10 @@ TEST_DATA = {
     'some': 3
 }
 
-
-def readfile(path):
-    with open(path) as f:
-        return json.load(f)
+NEW_DATA = {
+    'info': "and a new value",
+    'some': 4
+}
 
 
 @pytest.mark.asyncio
@@ -25,10 +23,13 @@ async def test_basic(tmpdir: str) -> None:
     assert not JsonFileSaver.exists(path)
     JsonFileSaver.write(path, TEST_DATA)
     assert JsonFileSaver.exists(path)
-    assert readfile(path) == TEST_DATA
-    assert readfile(backup_path) == TEST_DATA
+    assert not exists(backup_path)
     assert JsonFileSaver.read(path) == TEST_DATA
 
+    JsonFileSaver.write(path, NEW_DATA)
+    assert JsonFileSaver.read(path) == NEW_DATA
+    assert JsonFileSaver.read(backup_path) == TEST_DATA
+
     JsonFileSaver.delete(path)
     assert not exists(path)
     assert not exists(backup_path)
@@ -39,6 +40,7 @@ async def test_basic(tmpdir: str) -> None:
 async def test_file_deleted(tmpdir: str) -> None:
     path = join(tmpdir, "test.json")
     JsonFileSaver.write(path, TEST_DATA)
+    JsonFileSaver.write(path, NEW_DATA)
     remove(path)
     assert JsonFileSaver.read(path) == TEST_DATA
 
@@ -48,16 +50,30 @@ async def test_backup_deleted(tmpdir: str) -> None:
     path = join(tmpdir, "test.json")
     backup_path = join(tmpdir, "test.json.backup")
     JsonFileSaver.write(path, TEST_DATA)
+    JsonFileSaver.write(path, NEW_DATA)
     remove(backup_path)
-    assert JsonFileSaver.read(path) == TEST_DATA
+    assert JsonFileSaver.read(path) == NEW_DATA
+
 
 @pytest.mark.asyncio
 async def test_decode_error(tmpdir: str) -> None:
     path = join(tmpdir, "test.json")
     JsonFileSaver.write(path, TEST_DATA)
+    JsonFileSaver.write(path, NEW_DATA)
     with open(path, "w"):
         # emptys the file contents
         pass
     with open(path) as f:
         assert len(f.read()) == 0
     assert JsonFileSaver.read(path) == TEST_DATA
+
+
+@pytest.mark.asyncio
+async def test_legacy_decode_error(tmpdir: str) -> None:
+    path = join(tmpdir, "test.json")
+    backup_path = join(tmpdir, "test.json.backup")
+    with open(path, "w") as f:
+        f.write("{ not valid json")
+    with open(backup_path, "w") as f:
+        json.dump(TEST_DATA, f)
+    assert JsonFileSaver.read(path) == TEST_DATA
@@ -0,0 +1,75 @@
+import asyncio
+import time as pytime
+
+import pytest
+
+from backup.config import Config, Setting
+from backup.debug import LoopMonitor
+from .faketime import FakeTime
+
+
+def blocking_work():
+    pytime.sleep(0.6)
+
+
+@pytest.mark.asyncio
+async def test_records_lag(config: Config, time: FakeTime):
+    monitor = LoopMonitor(config, time)
+    monitor._interval = 0.01
+    await monitor.start()
+    try:
+        await asyncio.sleep(0.2)
+    finally:
+        await monitor.stop()
+    stats = monitor.stats()
+    assert stats['samples'] > 0
+    assert sum(bucket['count'] for bucket in stats['histogram']) == stats['samples']
+    assert stats['stalls'] == []
+
+
+@pytest.mark.asyncio
+async def test_captures_blocking_stack(config: Config, time: FakeTime):
+    config.override(Setting.LOOP_STALL_THRESHOLD_SECONDS, 0.2)
+    monitor = LoopMonitor(config, time)
+    monitor._interval = 0.01
+    await monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        blocking_work()
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+    stats = monitor.stats()
+    assert len(stats['stalls']) == 1
+    stall = stats['stalls'][0]
+    assert stall['lag_ms'] >= 500
+    assert "blocking_work" in "".join(stall['stack'])
+    assert stats['max_ms'] >= 500
+    assert stats['histogram'][-3]['count'] + stats['histogram'][-2]['count'] >= 1
+
+
+@pytest.mark.asyncio
+async def test_disabled(config: Config, time: FakeTime):
+    config.override(Setting.LOOP_STALL_THRESHOLD_SECONDS, 0)
+    monitor = LoopMonitor(config, time)
+    monitor._interval = 0.01
+    await monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        blocking_work()
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+    assert monitor.stats()['stalls'] == []
+
+
+def test_histogram_buckets(config: Config, time: FakeTime):
+    monitor = LoopMonitor(config, time)
+    monitor.record(0.0005)
+    monitor.record(0.003)
+    monitor.record(10)
+    counts = [bucket['count'] for bucket in monitor.stats()['histogram']]
+    assert counts[0] == 1
+    assert counts[1] == 1
+    assert counts[-1] == 1
+    assert monitor.stats()['max_ms'] == 10000
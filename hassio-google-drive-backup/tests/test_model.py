@@ -6,7 +6,7 @@ from dateutil.tz import gettz
 from backup.config import Config, Setting, CreateOptions
 from backup.exceptions import DeleteMutlipleBackupsError
 from backup.util import GlobalInfo, DataCache
-from backup.model import Model, BackupSource
+from backup.model import Backup, Model, BackupSource
 from .faketime import FakeTime
 from .helpers import HelperTestSource, IntentionalFailure
 
@@ -416,6 +416,32 @@ async def test_dont_upload_deletable(time, model: Model, source, dest):
     assertBackup(model, [old])
 
 
+@pytest.mark.asyncio
+async def test_needs_sync_matches_sync(time, model: Model, source, dest):
+    now = time.now()
+    dest.setMax(1)
+    current = dest.insert("current", now, "current")
+    old = source.insert("old", now - timedelta(days=1), "old")
+    source.insert("older", now - timedelta(days=2), "older")
+
+    # The newest backup that could be uploaded would get deleted right away, so a sync has nothing to do
+    await model.sync(now)
+    source.assertUnchanged()
+    dest.assertUnchanged()
+    assert not model.needsSync()
+
+    # A backup newer than what's in Drive would get uploaded, once the model knows about it (like the watcher tells it)
+    newer = source.insert("newer", now + timedelta(hours=1), "newer")
+    model.backups[newer.slug()] = Backup(newer)
+    assert model.needsSync()
+    await model.sync(now)
+    dest.assertThat(saved=1, deleted=1, current=1)
+    assertBackup(model, [old])
+    assertBackup(model, [newer, dest.saved[0]])
+    assert not model.needsSync()
+    assert current.slug() not in model.backups
+
+
 @pytest.mark.asyncio
 async def test_dont_upload_when_disabled(time, model: Model, source, dest):
     now = time.now()
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from backup.model.operationqueue import OperationQueue, STATE_DONE, STATE_FAILED
+from .faketime import FakeTime
+
+
+class Recorder():
+    def __init__(self):
+        self.calls = []
+        self.batches = 0
+
+    def afterBatch(self):
+        self.calls.append("batch")
+        self.batches += 1
+
+    def op(self, name, error=None):
+        async def run():
+            self.calls.append(name)
+            if error:
+                raise error
+            return name
+        return run
+
+
+@pytest.mark.asyncio
+async def test_runs_in_order(time: FakeTime):
+    recorder = Recorder()
+    queue = OperationQueue(time, recorder.afterBatch)
+    results = await asyncio.gather(
+        queue.run("a", "A", recorder.op("a")),
+        queue.run("b", "B", recorder.op("b")))
+    assert results == ["a", "b"]
+    assert recorder.calls == ["a", "b"]
+    assert recorder.batches == 0
+    assert not queue.isBusy()
+
+
+@pytest.mark.asyncio
+async def test_merges_waiting_changes(time: FakeTime):
+    recorder = Recorder()
+    queue = OperationQueue(time, recorder.afterBatch)
+    operations = [
+        queue.submit("sync", "Sync", recorder.op("sync")),
+        queue.submit("retain", "Retain 1", recorder.op("retain 1"), mergeable=True),
+        queue.submit("retain", "Retain 2", recorder.op("retain 2", error=Exception("boom")), mergeable=True),
+        queue.submit("note", "Note", recorder.op("note"), mergeable=True),
+        queue.submit("backup", "Backup", recorder.op("backup")),
+        queue.submit("delete", "Delete", recorder.op("delete"), mergeable=True),
+    ]
+    results = await asyncio.gather(*[operation.wait() for operation in operations], return_exceptions=True)
+
+    # One failure doesn't stop the rest of its batch, and each batch gets followed by a single after_batch
+    assert recorder.calls == ["sync", "retain 1", "retain 2", "note", "batch", "backup", "delete", "batch"]
+    assert results[2].args == ("boom",)
+    assert [result for index, result in enumerate(results) if index != 2] == ["sync", "retain 1", "note", "backup", "delete"]
+    assert [operation['state'] for operation in queue.operations()] == [STATE_DONE, STATE_DONE, STATE_FAILED, STATE_DONE, STATE_DONE, STATE_DONE]
+    assert queue.operations()[2]['error'] == "boom"
+
+
+@pytest.mark.asyncio
+async def test_coalesce_waiting(time: FakeTime):
+    recorder = Recorder()
+    queue = OperationQueue(time, recorder.afterBatch)
+    running = queue.submit("sync", "Sync", recorder.op("sync 1"), coalesce=True)
+    await asyncio.sleep(0)
+
+    # A sync that's already running doesn't absorb new ones, but one that's waiting does
+    waiting = queue.submit("sync", "Sync", recorder.op("sync 2"), coalesce=True)
+    assert waiting is not running
+    assert queue.submit("sync", "Sync", recorder.op("sync 3"), coalesce=True) is waiting
+    await waiting.wait()
+    assert recorder.calls == ["sync 1", "sync 2"]
+
+
+@pytest.mark.asyncio
+async def test_cancel_one_coalesced_waiter(time: FakeTime):
+    recorder = Recorder()
+    queue = OperationQueue(time, recorder.afterBatch)
+    finish_sync = asyncio.Event()
+
+    async def sync():
+        await finish_sync.wait()
+        return "synced"
+    queue.submit("sync", "Sync", sync)
+    first = asyncio.create_task(queue.run("sync", "Sync", recorder.op("sync"), coalesce=True))
+    second = asyncio.create_task(queue.run("sync", "Sync", recorder.op("sync"), coalesce=True))
+    await asyncio.sleep(0)
+
+    # Whoever is still waiting on the sync gets its result when another caller gives up on it
+    first.cancel()
+    await asyncio.sleep(0)
+    finish_sync.set()
+    assert await second == "sync"
+    assert first.cancelled()
+    assert recorder.calls == ["sync"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_dont_wait(time: FakeTime):
+    recorder = Recorder()
+    queue = OperationQueue(time, recorder.afterBatch)
+    finish_sync = asyncio.Event()
+
+    async def sync():
+        recorder.calls.append("sync")
+        await finish_sync.wait()
+    syncing = queue.submit("sync", "Sync", sync)
+    waiting = queue.submit("backup", "Backup", recorder.op("backup"))
+    await asyncio.sleep(0)
+
+    # Metadata changes get run alongside the sync instead of behind it, batched together like anything else
+    await asyncio.gather(queue.run("retain", "Retain", recorder.op("retain"), concurrent=True),
+                         queue.run("note", "Note", recorder.op("note"), concurrent=True))
+    assert recorder.calls == ["sync", "retain", "note", "batch"]
+    assert not syncing._future.done() and not waiting._future.done()
+    assert queue.isBusy()
+
+    finish_sync.set()
+    await waiting.wait()
+    assert recorder.calls == ["sync", "retain", "note", "batch", "backup"]
+
+    # With nothing else going on they just get queued
+    operation = queue.submit("note", "Note", recorder.op("idle note"), concurrent=True)
+    assert operation in queue._queue
+    await operation.wait()
+    assert not queue.isBusy()
+
+
+@pytest.mark.asyncio
+async def test_history_is_limited(time: FakeTime):
+    recorder = Recorder()
+    queue = OperationQueue(time, recorder.afterBatch)
+    for index in range(30):
+        await queue.run("note", "Note", recorder.op(index))
+    assert [operation['id'] for operation in queue.operations()] == list(range(11, 31))
@@ -1,8 +1,11 @@
 import pytest
 import socket
 
+import aiodns
 from backup.config import Config, Setting
-from backup.util import Resolver
+from backup.util import Resolver, GlobalInfo
+from backup.util.resolver import TTL_HOURS, MIN_TTL_SECONDS
+from .faketime import FakeTime
 
 
 @pytest.mark.asyncio
@@ -44,3 +47,135 @@ async def test_hard_resolve(resolver: Resolver, config: Config):
     assert await resolver.resolve("www.googleapis.com", 1234, 0) == expected
     resolver.toggle()
     assert await resolver.resolve("www.googleapis.com", 1234, 0) == expected
+
+
+class FakeNode():
+    def __init__(self, host, port, ttl, family=socket.AF_INET, scope_id=0):
+        self.addr = (host.encode("ascii"), port) if family == socket.AF_INET else (host.encode("ascii"), port, 0, scope_id)
+        self.family = family
+        self.ttl = ttl
+
+
+class FakeDns():
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.host = "1.2.3.4"
+        self.family = socket.AF_INET
+        self.scope_id = 0
+        self.lookups = 0
+        self.error = None
+
+    async def getaddrinfo(self, host, port, type, family, flags):
+        self.lookups += 1
+        if self.error:
+            raise self.error
+        return FakeResponse([FakeNode(self.host, port, self.ttl, self.family, self.scope_id)])
+
+    async def getnameinfo(self, sockaddr, flags):
+        return FakeNameInfo("{0}%eth{1}".format(sockaddr[0], sockaddr[3]), str(sockaddr[1]))
+
+
+class FakeNameInfo():
+    def __init__(self, node, service):
+        self.node = node
+        self.service = service
+
+
+class FakeResponse():
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+
+@pytest.fixture
+def fake_dns(resolver: Resolver):
+    dns = FakeDns()
+    resolver._resolver = dns
+    resolver._original_dns = dns
+    resolver._alt_dns = dns
+    return dns
+
+
+@pytest.mark.asyncio
+async def test_cache_honors_ttl(resolver: Resolver, fake_dns: FakeDns, time: FakeTime, global_info: GlobalInfo):
+    addresses = await resolver.resolve("example.com", 443)
+    assert addresses[0]['host'] == "1.2.3.4"
+    assert addresses[0]['port'] == 443
+    assert await resolver.resolve("example.com", 443) == addresses
+    assert fake_dns.lookups == 1
+    assert global_info.debug["dns_cache"] == {"hits": 1, "misses": 1, "stale": 0}
+
+    fake_dns.host = "5.6.7.8"
+    time.advance(seconds=299)
+    assert (await resolver.resolve("example.com", 443))[0]['host'] == "1.2.3.4"
+    time.advance(seconds=1)
+    assert (await resolver.resolve("example.com", 443))[0]['host'] == "5.6.7.8"
+    assert fake_dns.lookups == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_ttl_limits(resolver: Resolver, fake_dns: FakeDns, time: FakeTime):
+    fake_dns.ttl = 0
+    await resolver.resolve("example.com", 443)
+    time.advance(seconds=MIN_TTL_SECONDS - 1)
+    await resolver.resolve("example.com", 443)
+    assert fake_dns.lookups == 1
+    time.advance(seconds=1)
+    await resolver.resolve("example.com", 443)
+    assert fake_dns.lookups == 2
+
+    fake_dns.ttl = 60 * 60 * 24 * 7
+    await resolver.resolve("example.org", 443)
+    time.advance(hours=TTL_HOURS)
+    await resolver.resolve("example.org", 443)
+    assert fake_dns.lookups == 4
+
+
+@pytest.mark.asyncio
+async def test_cache_serves_stale(resolver: Resolver, fake_dns: FakeDns, time: FakeTime):
+    await resolver.resolve("example.com", 443)
+    fake_dns.error = aiodns.error.DNSError(11, "Could not contact DNS servers")
+    time.advance(seconds=300)
+    assert (await resolver.resolve("example.com", 443))[0]['host'] == "1.2.3.4"
+    assert resolver.cache_stats["stale"] == 1
+
+    # Only for so long though
+    time.advance(hours=TTL_HOURS)
+    with pytest.raises(OSError):
+        await resolver.resolve("example.com", 443)
+
+    # Names that were never resolved fail like usual
+    with pytest.raises(OSError):
+        await resolver.resolve("example.org", 443)
+
+
+@pytest.mark.asyncio
+async def test_toggle_expires_cache(resolver: Resolver, fake_dns: FakeDns, time: FakeTime):
+    await resolver.resolve("example.com", 443)
+    resolver.toggle()
+    fake_dns.host = "5.6.7.8"
+    assert (await resolver.resolve("example.com", 443))[0]['host'] == "5.6.7.8"
+    assert fake_dns.lookups == 2
+
+
+@pytest.mark.asyncio
+async def test_hard_resolve_bypasses_cache(resolver: Resolver, fake_dns: FakeDns, config: Config):
+    config.override(Setting.DRIVE_IPV4, "1.2.3.4")
+    await resolver.resolve("www.googleapis.com", 1234, 0)
+    assert fake_dns.lookups == 0
+    assert resolver.cache_stats["misses"] == 0
+
+
+@pytest.mark.asyncio
+async def test_link_local_scope(resolver: Resolver, fake_dns: FakeDns):
+    fake_dns.family = socket.AF_INET6
+    fake_dns.host = "2001:db8::1"
+    addresses = await resolver.resolve("example.com", 443, socket.AF_INET6)
+    assert addresses[0]['host'] == "2001:db8::1"
+
+    # Link-local addresses need their scope id to be connected to
+    fake_dns.host = "fe80::1"
+    fake_dns.scope_id = 2
+    addresses = await resolver.resolve("example.org", 443, socket.AF_INET6)
+    assert addresses[0]['host'] == "fe80::1%eth2"
+    assert addresses[0]['port'] == 443
+    assert addresses[0]['family'] == socket.AF_INET6
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from backup.model import SourceCache
+from backup.model.dummybackupsource import DummyBackupSource
+from .faketime import FakeTime
+
+
+def backup(slug: str, time: FakeTime) -> DummyBackupSource:
+    return DummyBackupSource(slug, time.now(), "dest", slug)
+
+
+@pytest.mark.asyncio
+async def test_fresh_and_stale(time: FakeTime):
+    cache = SourceCache(time)
+    assert cache.cached("dest", time.now()) is None
+    assert cache.listing("dest") is None
+
+    cache.store("dest", {"a": backup("a", time)}, time.now() + timedelta(minutes=1))
+    assert list(cache.cached("dest", time.now()).keys()) == ["a"]
+
+    time.advance(minutes=2)
+    assert cache.cached("dest", time.now()) is None
+    assert list(cache.listing("dest").keys()) == ["a"]
+
+    cache.store("dest", {"a": backup("a", time)}, time.now() + timedelta(minutes=1))
+    cache.expire()
+    assert cache.cached("dest", time.now()) is None
+    assert list(cache.listing("dest").keys()) == ["a"]
+
+    cache.clear()
+    assert cache.listing("dest") is None
+
+
+@pytest.mark.asyncio
+async def test_update_in_place(time: FakeTime):
+    cache = SourceCache(time)
+    cache.store("dest", {"a": backup("a", time), "b": backup("b", time)}, time.now() + timedelta(minutes=1))
+
+    changed = backup("a", time)
+    cache.update("dest", changed)
+    cache.update("dest", backup("c", time))
+    cache.remove("dest", "b")
+    cached = cache.cached("dest", time.now())
+    assert list(cached.keys()) == ["a", "c"]
+    assert cached["a"] is changed
+
+    # Changes to other sources don't matter
+    cache.remove("source", "a")
+    assert list(cache.cached("dest", time.now()).keys()) == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_shared(time: FakeTime):
+    cache = SourceCache(time)
+    calls = 0
+    release = asyncio.Event()
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"a": backup("a", time)}
+
+    first = asyncio.create_task(cache.refresh("dest", fetch))
+    second = asyncio.create_task(cache.refresh("dest", fetch))
+    await asyncio.sleep(0)
+    release.set()
+    assert list((await first).keys()) == ["a"]
+    assert list((await second).keys()) == ["a"]
+    assert calls == 1
+
+    # Without a freshness date the refreshed listing is only good for stale answers
+    assert cache.cached("dest", time.now()) is None
+    assert list(cache.listing("dest").keys()) == ["a"]
+
+    await cache.refresh("dest", fetch, time.now() + timedelta(minutes=1))
+    assert calls == 2
+    assert cache.cached("dest", time.now()) is not None
+
+
+@pytest.mark.asyncio
+async def test_refresh_again_after_change(time: FakeTime):
+    cache = SourceCache(time)
+    listings = [{"a": backup("a", time)}, {}]
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fetch():
+        listing = listings.pop(0)
+        started.set()
+        await release.wait()
+        return listing
+
+    refresh = asyncio.create_task(cache.refresh("dest", fetch, time.now() + timedelta(minutes=1)))
+    await started.wait()
+    # "a" gets deleted while the first listing is on its way back, so that listing can't be trusted
+    cache.remove("dest", "a")
+    release.set()
+    assert await refresh == {}
+    assert cache.cached("dest", time.now()) == {}
+
+
+@pytest.mark.asyncio
+async def test_refresh_failure(time: FakeTime):
+    cache = SourceCache(time)
+    cache.store("dest", {"a": backup("a", time)})
+
+    async def fetch():
+        raise Exception("failed")
+
+    with pytest.raises(Exception):
+        await cache.refresh("dest", fetch)
+    assert list(cache.listing("dest").keys()) == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_cancelled(time: FakeTime):
+    cache = SourceCache(time)
+    calls = 0
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await release.wait()
+        return {"a": backup("a", time)}
+
+    cancelled = asyncio.create_task(cache.refresh("dest", fetch))
+    await started.wait()
+    other = asyncio.create_task(cache.refresh("dest", fetch))
+    await asyncio.sleep(0)
+
+    # Cancelling one caller stops the request, and the other caller starts its own
+    cancelled.cancel()
+    await asyncio.wait([cancelled])
+    release.set()
+    assert list((await other).keys()) == ["a"]
+    assert calls == 2
@@ -1,8 +1,10 @@
+import asyncio
 import pytest
 import os
 from backup.module import MainModule, BaseModule
 from backup.starter import Starter
-from backup.config import Config, Setting
+from backup.config import Config, Setting, Startable
+from backup.exceptions import LogicError
 from injector import Injector
 
 
@@ -20,3 +22,67 @@ async def test_start_and_stop(injector):
     starter = injector.get(Starter)
     await starter.start()
     await starter.stop()
+
+
+class FakeStartable(Startable):
+    def __init__(self, events, name, delay=0, depends=[]):
+        self.events = events
+        self.name = name
+        self.delay = delay
+        self.depends = depends
+
+    def dependsOn(self):
+        return self.depends
+
+    async def start(self):
+        self.events.append("start " + self.name)
+        await asyncio.sleep(self.delay)
+        self.events.append("started " + self.name)
+
+
+class SlowSource(FakeStartable):
+    pass
+
+
+class Server(FakeStartable):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_start_concurrently(config: Config):
+    events = []
+    source = SlowSource(events, "source", delay=0.1)
+    server = Server(events, "server")
+    syncer = FakeStartable(events, "syncer", depends=[SlowSource])
+    restarter = FakeStartable(events, "restarter", depends=[Server])
+    await Starter(config, [source, server, syncer, restarter]).start()
+
+    # The server doesn't wait on the slow source, but the syncer does
+    assert events.index("started server") < events.index("started source")
+    assert events.index("started restarter") < events.index("started source")
+    assert events.index("start syncer") > events.index("started source")
+    assert len(events) == 8
+
+
+@pytest.mark.asyncio
+async def test_dependency_failure(config: Config):
+    events = []
+
+    class BrokenSource(SlowSource):
+        async def start(self):
+            raise Exception("broken")
+
+    syncer = FakeStartable(events, "syncer", depends=[SlowSource])
+    with pytest.raises(Exception, match="broken"):
+        await Starter(config, [BrokenSource(events, "source"), syncer]).start()
+    assert "start syncer" not in events
+
+
+@pytest.mark.asyncio
+async def test_dependency_order(config: Config):
+    events = []
+    with pytest.raises(LogicError):
+        await Starter(config, [FakeStartable(events, "syncer", depends=[SlowSource]), SlowSource(events, "source")]).start()
+    with pytest.raises(LogicError):
+        await Starter(config, [FakeStartable(events, "syncer", depends=[SlowSource])]).start()
+    assert events == []
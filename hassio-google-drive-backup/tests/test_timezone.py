@@ -1,6 +1,8 @@
 import datetime
+import pytest
+import pytz
 import os
-from backup.time import Time, _infer_timezone_from_env, _infer_timezone_from_name, _infer_timezone_from_offset, _infer_timezone_from_system
+from backup.time import Time, get_local_tz, _infer_timezone_from_env, _infer_timezone_from_name, _infer_timezone_from_offset, _infer_timezone_from_system
 from .faketime import FakeTime
 
 
@@ -62,3 +64,54 @@ def test_common_timezones(time: FakeTime):
 def test_system_timezone(time: FakeTime):
     tz = _infer_timezone_from_system()
     assert tz.tzname(time.now()) == "UTC"
+
+
+def test_local_timezone_resolved_lazily(monkeypatch) -> None:
+    calls = []
+
+    def resolve():
+        calls.append(1)
+        return get_local_tz()
+    monkeypatch.setattr("backup.time.get_local_tz", resolve)
+    time = Time()
+    assert len(calls) == 0
+    assert time.local_tz is not None
+    time.nowLocal()
+    assert len(calls) == 1
+
+
+def test_offset_timezone_is_named(monkeypatch) -> None:
+    class FakeLocal():
+        def utcoffset(self, dt):
+            return datetime.timedelta(hours=-7)
+    monkeypatch.setattr("backup.time.tzlocal", FakeLocal)
+    tz = _infer_timezone_from_offset()
+    # A named timezone keeps following daylight saving changes, which a fixed offset wouldn't
+    assert tz.zone in pytz.all_timezones
+    assert tz.utcoffset(datetime.datetime.now()) == datetime.timedelta(hours=-7)
+
+
+def test_parse_matches_dateutil() -> None:
+    from dateutil.parser import parse
+    for text in ["2023-01-15T10:00:00.123456+00:00",
+                 "2023-01-15T10:00:00.000Z",
+                 "2023-01-15T10:00:00Z",
+                 "2023-01-15T10:00:00.123456789Z",
+                 "2023-01-15T10:00:00+0530",
+                 "2023-01-15T10:00:00-08:00",
+                 "2023-01-15 10:00:00",
+                 "2023-01-15T10:00",
+                 "2023-01-15",
+                 "Sun, 15 Jan 2023 10:00:00 GMT"]:
+        expected = parse(text)
+        if expected.tzinfo is None:
+            expected = expected.replace(tzinfo=datetime.timezone.utc)
+        parsed = Time.parse(text)
+        assert parsed == expected
+        assert parsed.utcoffset() == expected.utcoffset()
+
+
+def test_parse_invalid() -> None:
+    for text in ["2023-13-45", "2023-01-15T24:00:00Z", "not a date", ""]:
+        with pytest.raises(ValueError):
+            Time.parse(text)
@@ -0,0 +1,52 @@
+from yarl import URL
+
+from backup.creds.tokenservers import TokenServers, DEFAULT_HEDGE_SECONDS, MIN_HEDGE_SECONDS, FAILURE_MEMORY
+from .faketime import FakeTime
+
+FIRST = URL("https://token1.example.com/drive/refresh")
+SECOND = URL("https://token2.example.com/drive/refresh")
+THIRD = URL("https://token3.example.com/drive/refresh")
+
+
+def test_keeps_configured_order(time: FakeTime):
+    servers = TokenServers(time)
+    assert servers.rank([FIRST, SECOND, THIRD]) == [FIRST, SECOND, THIRD]
+
+
+def test_fastest_first(time: FakeTime):
+    servers = TokenServers(time)
+    servers.recordLatency(FIRST, 2)
+    servers.recordLatency(SECOND, 0.5)
+
+    # Servers that haven't been heard from go after the ones that have
+    assert servers.rank([FIRST, SECOND, THIRD]) == [SECOND, FIRST, THIRD]
+
+
+def test_failures_go_last(time: FakeTime):
+    servers = TokenServers(time)
+    servers.recordLatency(FIRST, 0.1)
+    servers.recordFailure(FIRST)
+    assert servers.rank([FIRST, SECOND, THIRD]) == [SECOND, THIRD, FIRST]
+
+    # Failures are forgotten after a while...
+    time.advance(duration=FAILURE_MEMORY)
+    assert servers.rank([FIRST, SECOND, THIRD]) == [FIRST, SECOND, THIRD]
+
+    # ...or once the server answers again
+    servers.recordFailure(FIRST)
+    servers.recordLatency(FIRST, 0.1)
+    assert servers.rank([FIRST, SECOND, THIRD]) == [FIRST, SECOND, THIRD]
+
+
+def test_hedge_delay(time: FakeTime):
+    servers = TokenServers(time)
+    assert servers.hedgeDelay(FIRST, 10) == DEFAULT_HEDGE_SECONDS
+    assert servers.hedgeDelay(FIRST, 1) == 1
+
+    for latency in range(1, 21):
+        servers.recordLatency(FIRST, latency / 10)
+    assert servers.hedgeDelay(FIRST, 10) == 1.9
+
+    # Very quick servers still get a little while to answer
+    servers.recordLatency(SECOND, 0.01)
+    assert servers.hedgeDelay(SECOND, 10) == MIN_HEDGE_SECONDS
@@ -9,6 +9,8 @@ import aiohttp
 import pytest
 import asyncio
 import base64
+import tarfile
+from io import BytesIO
 from aiohttp import BasicAuth
 from aiohttp.client import ClientSession
 
@@ -17,22 +19,23 @@ from backup.util import AsyncHttpGetter, GlobalInfo, DataCache, UpgradeFlags
 from backup.ui import UiServer, Restarter
 from backup.config import Config, Setting, CreateOptions
 from backup.const import (ERROR_CREDS_EXPIRED, ERROR_EXISTING_FOLDER,
-                          ERROR_MULTIPLE_DELETES, ERROR_NO_BACKUP,
+                          ERROR_MULTIPLE_DELETES, ERROR_NO_BACKUP, ERROR_BACKUP_DECRYPT,
                           SOURCE_GOOGLE_DRIVE, SOURCE_HA)
 from backup.creds import Creds
-from backup.model import Coordinator, Backup
+from backup.model import Coordinator, Backup, DummyBackup
 from backup.drive import DriveSource, FolderFinder, OOB_CRED_CUTOFF
 from backup.drive.drivesource import FOLDER_MIME_TYPE, DriveRequests
 from backup.ha import HaSource, HaUpdater
 from backup.config import VERSION
 from .faketime import FakeTime
-from .helpers import compareStreams
+from .helpers import compareStreams, createBackupTar
 from yarl import URL
 from dev.ports import Ports
 from dev.simulated_supervisor import SimulatedSupervisor
 from dev.simulationserver import SimulationServer
 from dev.simulated_google import SimulatedGoogle
 from bs4 import BeautifulSoup
+from securetar import SecureTarArchive
 from .conftest import ReaderHelper
 
 
@@ -86,6 +89,7 @@ async def test_getstatus(reader, config: Config, ha, server, ports: Ports):
     assert data['next_backup_text'] == "right now"
     assert data['backup_name_template'] == config.get(Setting.BACKUP_NAME)
     assert data['warn_ingress_upgrade'] is False
+    assert data['operations'] == []
     assert len(data['backups']) == 0
     assert data['sources'][SOURCE_GOOGLE_DRIVE] == {
         'deletable': 0,
@@ -129,6 +133,7 @@ async def test_getstatus_sync(reader, config: Config, backup: Backup, time: Fake
     assert data['last_error'] is None
     assert data['last_backup_text'] != "Never"
     assert data['next_backup_text'] != "right now"
+    assert [(operation['kind'], operation['state']) for operation in data['operations']] == [("sync", "done")]
     assert len(data['backups']) == 1
     assert data['sources'][SOURCE_GOOGLE_DRIVE] == {
         'deletable': 1,
@@ -590,6 +595,16 @@ async def test_resolve_folder_new(reader, config: Config, backup, time, drive):
     assert old_folder != await drive.getFolderId()
 
 
+@pytest.mark.asyncio
+async def test_restart_for_change_before_start(injector, ui_server: UiServer, config: Config):
+    restarter = injector.get(Restarter)
+    assert ui_server._starts == 1
+    config.override(Setting.EXPOSE_EXTRA_SERVER, True)
+    await restarter.start()
+    await restarter.waitForRestart()
+    assert ui_server._starts == 2
+
+
 @pytest.mark.asyncio
 async def test_ssl_server(reader: ReaderHelper, ui_server: UiServer, config, server, cleandir, restarter):
     ssl_dir = abspath(join(__file__, "..", "..", "dev", "ssl"))
@@ -679,6 +694,148 @@ async def test_download_home_assistant(reader: ReaderHelper, ui_server, backup,
     await compareStreams(from_ha, from_server)
 
 
+@pytest.mark.asyncio
+async def test_backup_contents(reader: ReaderHelper, ui_server, backup, coord: Coordinator, ha: HaSource):
+    status = await reader.getjson("getstatus")
+    assert not status["backups"][0]["indexable"]
+    assert len(status["backups"][0]["addons"]) > 0
+
+    # Once the backup is only in Google Drive, its details have to come from indexing it
+    await ha.delete(backup)
+    await coord.sync()
+    details = (await reader.getjson("getstatus"))["backups"][0]
+    assert details["indexable"]
+    assert details["contents"] is None
+    assert details["addons"] == []
+
+    data = await reader.getjson("backupContents?slug=" + backup.slug())
+    assert [content["type"] for content in data["contents"]] == ["homeassistant", "folder", "folder", "folder", "addon", "addon", "addon"]
+
+    details = (await reader.getjson("getstatus"))["backups"][0]
+    assert not details["indexable"]
+    assert details["contents"] == data["contents"]
+    assert [addon["slug"] for addon in details["addons"]] == ["sexy_robots", "particla_accel", "addon_empty"]
+    assert details["folders"] == ["share", "ssl", "addons/local"]
+
+
+@pytest.mark.asyncio
+async def test_restore_partial(reader: ReaderHelper, ui_server, coord: Coordinator, ha: HaSource, supervisor: SimulatedSupervisor, uploader,
+                               data_cache: DataCache, time: FakeTime):
+    archives = {"homeassistant": 5000, "share": 3000, "ssl": 2000, "sexy_robots": 4000, "particla_accel": 1000}
+    original = createBackupTar("abcd1234", "Big Backup", time.now(), 100000, included_folders=["homeassistant", "share", "ssl"],
+                               included_addons=["sexy_robots", "particla_accel"], archives=archives)
+    with tarfile.open(fileobj=BytesIO(original.getvalue()), mode="r:") as tar:
+        original_members = {member.name: tar.extractfile(member).read() for member in tar.getmembers()}
+    await ha.save(DummyBackup("Big Backup", time.now(), "src", "abcd1234", "dummy"), await uploader.upload(original))
+    await coord.sync()
+    backup = coord.getBackup("abcd1234")
+
+    # Restoring from Google Drive should only copy the selected parts into Home Assistant
+    await ha.delete(backup)
+    await coord.sync()
+    assert await reader.postjson("restorePartial", json={"slug": "abcd1234", "addons": ["sexy_robots"], "folders": ["share"]}) == {
+        'message': "Restored the selected parts of the backup"}
+
+    restores = supervisor.getRestores()
+    assert len(restores) == 1
+    restore = restores[0]
+    assert restore["slug"] != "abcd1234"
+    assert restore["request"] == {"homeassistant": False, "addons": ["sexy_robots"], "folders": ["share"]}
+    assert set(restore["members"].keys()) == {"backup.json", "share.tar.gz", "sexy_robots.tar.gz"}
+    assert restore["members"]["share.tar.gz"] == original_members["share.tar.gz"]
+    assert restore["members"]["sexy_robots.tar.gz"] == original_members["sexy_robots.tar.gz"]
+    backup_json = json.loads(restore["members"]["backup.json"])
+    assert backup_json["slug"] == restore["slug"]
+    assert backup_json["homeassistant"] is None
+    assert backup_json["folders"] == ["share"]
+    assert [addon["slug"] for addon in backup_json["addons"]] == ["sexy_robots"]
+
+    # The backup made for the restore gets cleaned up afterward
+    assert restore["slug"] not in supervisor._backups
+    assert restore["slug"] not in data_cache.backups
+    await coord.sync()
+    assert [item.slug() for item in coord.backups()] == ["abcd1234"]
+
+
+@pytest.mark.asyncio
+async def test_restore_partial_missing_archive(reader: ReaderHelper, ui_server, coord: Coordinator, ha: HaSource, backup: Backup, supervisor: SimulatedSupervisor):
+    # Backups made by the simulated supervisor don't have any archives in them
+    await ha.delete(backup)
+    await coord.sync()
+    await reader.postjson("restorePartial", status=500, json={"slug": backup.slug(), "addons": [], "folders": ["share"]})
+    assert supervisor.getRestores() == []
+
+
+@pytest.mark.asyncio
+async def test_download_decrypted(reader: ReaderHelper, ui_server, coord: Coordinator, config: Config, session, time):
+    config.override(Setting.BACKUP_PASSWORD, "test")
+    await coord.sync()
+    backup = coord.backups()[0]
+    assert backup.protected()
+
+    async with session.get(reader.getUrl() + "download?decrypt=true&slug=" + backup.slug()) as resp:
+        resp.raise_for_status()
+        assert resp.headers.get("Transfer-Encoding") == "chunked"
+        data = await resp.read()
+    with tarfile.open(fileobj=BytesIO(data), mode="r:") as tar:
+        assert not json.loads(tar.extractfile("backup.json").read())["protected"]
+        assert len(tar.extractfile("padding.dat").read()) > 0
+
+
+@pytest.mark.asyncio
+async def test_download_decrypted_without_password(reader: ReaderHelper, ui_server, coord: Coordinator, config: Config):
+    config.override(Setting.BACKUP_PASSWORD, "test")
+    await coord.sync()
+    backup = coord.backups()[0]
+    config.override(Setting.BACKUP_PASSWORD, "")
+
+    data = await reader.getjson("download?decrypt=true&slug=" + backup.slug(), status=400)
+    assert data["error_type"] == ERROR_BACKUP_DECRYPT
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("version", [2, 3])
+async def test_download_decrypted_securetar(reader: ReaderHelper, ui_server, coord: Coordinator, config: Config, session, supervisor: SimulatedSupervisor, version):
+    config.override(Setting.BACKUP_PASSWORD, "test")
+    await coord.sync()
+    backup = coord.backups()[0]
+    plaintext = createBackupTar("inner", "Inner", coord._time.now(), 1000).getvalue()
+    supervisor._backup_data[backup.slug()] = bytearray(secureTarBackup(plaintext, "test", version))
+
+    async with session.get(reader.getUrl() + "download?decrypt=true&slug=" + backup.slug()) as resp:
+        resp.raise_for_status()
+        data = await resp.read()
+    with tarfile.open(fileobj=BytesIO(data), mode="r:") as tar:
+        assert tar.extractfile("./homeassistant.tar").read() == plaintext
+
+
+@pytest.mark.asyncio
+async def test_download_decrypted_wrong_password(reader: ReaderHelper, ui_server, coord: Coordinator, config: Config, supervisor: SimulatedSupervisor):
+    config.override(Setting.BACKUP_PASSWORD, "test")
+    await coord.sync()
+    backup = coord.backups()[0]
+    plaintext = createBackupTar("inner", "Inner", coord._time.now(), 1000).getvalue()
+    supervisor._backup_data[backup.slug()] = bytearray(secureTarBackup(plaintext, "something else", 3))
+
+    # The password gets checked before the download starts, so it fails with an error instead of partway through
+    data = await reader.getjson("download?decrypt=true&slug=" + backup.slug(), status=400)
+    assert data["error_type"] == ERROR_BACKUP_DECRYPT
+    assert "password is incorrect" in data["message"]
+
+
+def secureTarBackup(archive: bytes, password: str, version: int) -> bytes:
+    stream = BytesIO()
+    with SecureTarArchive(fileobj=stream, mode="w", password=password, create_version=version) as outer:
+        backup_json = json.dumps({"slug": "inner", "protected": True}).encode()
+        info = tarfile.TarInfo("./backup.json")
+        info.size = len(backup_json)
+        outer.tar.addfile(info, BytesIO(backup_json))
+        info = tarfile.TarInfo("./homeassistant.tar")
+        info.size = len(archive)
+        outer.import_tar(BytesIO(archive), info)
+    return stream.getvalue()
+
+
 @pytest.mark.asyncio
 async def test_cancel_and_startsync(reader: ReaderHelper, coord: Coordinator):
     coord._sync_wait.set()
@@ -798,7 +955,7 @@ async def test_update_sync_interval(reader, ui_server, config: Config, superviso
 async def test_manual_creds(reader: ReaderHelper, ui_server: UiServer, config: Config, server: SimulationServer, session, drive: DriveSource):
     periodic_check = await reader.getjson("checkManualAuth")
     assert periodic_check['message'] == "No request for authorization is in progress."
-    drive.saveCreds(None)
+    await drive.saveCreds(None)
     assert not drive.enabled()
 
     await setup_manual_creds(reader, server, drive, session)
@@ -810,7 +967,7 @@ async def test_manual_creds(reader: ReaderHelper, ui_server: UiServer, config: C
 
 @pytest.mark.asyncio
 async def test_manual_creds_failure(reader: ReaderHelper, ui_server: UiServer, config: Config, server: SimulationServer, session, drive: DriveSource):
-    drive.saveCreds(None)
+    await drive.saveCreds(None)
     assert not drive.enabled()
 
     # Try with a bad client_id
@@ -885,7 +1042,7 @@ async def test_change_specify_folder_setting(reader: ReaderHelper, server, sessi
 @pytest.mark.asyncio
 async def test_change_specify_folder_setting_with_manual_creds(reader: ReaderHelper, google: SimulatedGoogle, session, coord: Coordinator, folder_finder: FolderFinder, drive: DriveSource, config):
     google.resetDriveAuth()
-    drive.saveCreds(None)
+    await drive.saveCreds(None)
     assert not drive.enabled()
 
     # get the auth url
@@ -1,8 +1,13 @@
-from backup.watcher import Watcher
+from backup.watcher import Watcher, readBackupSlug, readBackupSlugs
+from backup.const import SOURCE_GOOGLE_DRIVE
 from backup.config import Config, Setting, CreateOptions
 from backup.ha import HaSource
+from backup.model import Coordinator
+from dev.simulated_supervisor import SimulatedSupervisor
+from dev.request_interceptor import RequestInterceptor
 from os.path import join
 from .faketime import FakeTime
+from .helpers import createBackupTar
 from asyncio import sleep
 import pytest
 import os
@@ -110,6 +115,57 @@ async def test_subdirs_dont_trigger(server, watcher: Watcher, config: Config, ti
     assert not await watcher.check()
 
 
+@pytest.mark.asyncio
+async def test_watcher_refreshes_only_changed_slugs(server, watcher: Watcher, config: Config, time: FakeTime, ha: HaSource, coord: Coordinator, supervisor: SimulatedSupervisor, interceptor: RequestInterceptor):
+    await coord.sync()
+    # Match up the backup the sync made with its pending backup, which otherwise takes listing everything
+    await ha.get()
+    slug = await supervisor.createBackup({'name': "Test Backup"}, date=time.now())
+
+    # The supervisor writes new backups to a temporary file and then moves them into place, named after the backup
+    temp_file = join(config.get(Setting.BACKUP_DIRECTORY_PATH), "backup.tmp")
+    backup_file = join(config.get(Setting.BACKUP_DIRECTORY_PATH), "Test Backup.tar")
+    with open(temp_file, "wb") as f:
+        f.write(supervisor._backup_data[slug])
+    await watcher.start()
+    interceptor.clear()
+    watcher.noticed_change_signal.clear()
+    os.rename(temp_file, backup_file)
+    await watcher.noticed_change_signal.wait()
+    time.advance(minutes=11)
+
+    # The new backup needs to be uploaded, so a sync gets triggered but doesn't need to list Home Assistant again
+    assert await watcher.check()
+    assert coord.getBackup(slug).getSource(ha.name()) is not None
+    assert not interceptor.urlWasCalled("^/backups$")
+    await coord.sync()
+    assert not interceptor.urlWasCalled("^/backups$")
+    assert coord.getBackup(slug).getSource(SOURCE_GOOGLE_DRIVE) is not None
+
+    # Delete the backup out from under the addon, which leaves nothing for a sync to do
+    await ha.harequests.delete(slug)
+    interceptor.clear()
+    watcher.noticed_change_signal.clear()
+    os.remove(backup_file)
+    await watcher.noticed_change_signal.wait()
+    time.advance(minutes=11)
+    assert not await watcher.check()
+    assert coord.getBackup(slug).getSource(ha.name()) is None
+    assert not interceptor.urlWasCalled("^/backups$")
+
+
+def test_read_backup_slug(tmpdir, time: FakeTime):
+    path = join(tmpdir, "Some Backup.tar")
+    with open(path, "wb") as f:
+        f.write(createBackupTar("slug", "Some Backup", time.now(), 1024).getbuffer())
+    with open(join(tmpdir, "empty.tar"), "w"):
+        pass
+    assert readBackupSlug(path) == "slug"
+    assert readBackupSlug(join(tmpdir, "empty.tar")) is None
+    assert readBackupSlug(join(tmpdir, "missing.tar")) is None
+    assert readBackupSlugs(tmpdir) == {"Some Backup.tar": "slug"}
+
+
 async def simulateBackup(config, file_name, ha, time):
     file = join(config.get(Setting.BACKUP_DIRECTORY_PATH), file_name)
     with open(file, "w"):
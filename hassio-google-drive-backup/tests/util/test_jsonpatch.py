@@ -0,0 +1,88 @@
+from backup.util import JsonPatch
+import pytest
+
+
+def roundtrip(old, new):
+    patch = JsonPatch.diff(old, new)
+    assert JsonPatch.apply(old, patch) == new
+    return patch
+
+
+def test_no_changes():
+    doc = {"state": "backed_up", "attributes": {"backups": [{"slug": "a"}, {"slug": "b"}]}}
+    assert roundtrip(doc, doc) == []
+
+
+def test_dict_changes():
+    old = {"keep": 1, "change": "a", "remove": True}
+    new = {"keep": 1, "change": "b", "add": [1, 2]}
+    assert roundtrip(old, new) == [
+        {"op": "remove", "path": "/remove"},
+        {"op": "replace", "path": "/change", "value": "b"},
+        {"op": "add", "path": "/add", "value": [1, 2]},
+    ]
+
+
+def test_list_append_and_remove_are_single_ops():
+    old = {"backups": [{"slug": str(x)} for x in range(100)]}
+    new = {"backups": [{"slug": str(x)} for x in range(1, 101)]}
+    assert roundtrip(old, new) == [
+        {"op": "remove", "path": "/backups/0"},
+        {"op": "add", "path": "/backups/99", "value": {"slug": "100"}},
+    ]
+
+
+def test_list_shifted_several():
+    old = {"backups": [{"slug": str(x)} for x in range(100)]}
+    new = {"backups": [{"slug": str(x)} for x in range(3, 102)]}
+    assert roundtrip(old, new) == [
+        {"op": "remove", "path": "/backups/2"},
+        {"op": "remove", "path": "/backups/1"},
+        {"op": "remove", "path": "/backups/0"},
+        {"op": "add", "path": "/backups/97", "value": {"slug": "100"}},
+        {"op": "add", "path": "/backups/98", "value": {"slug": "101"}},
+    ]
+    # The new first item showing up more than once in the old list still produces a patch that applies
+    roundtrip([1, 2, 1, 3], [1, 3, 4])
+
+
+def test_list_item_changed_in_place():
+    old = {"backups": [{"slug": "a", "state": "HA Only"}, {"slug": "b", "state": "HA Only"}]}
+    new = {"backups": [{"slug": "a", "state": "HA Only"}, {"slug": "b", "state": "Backed Up"}]}
+    assert roundtrip(old, new) == [{"op": "replace", "path": "/backups/1/state", "value": "Backed Up"}]
+
+
+def test_list_shrink_and_grow():
+    roundtrip([1, 2, 3, 4, 5], [1, 5])
+    roundtrip([1, 5], [1, 2, 3, 4, 5])
+    roundtrip([], [1, 2])
+    roundtrip([1, 2], [])
+    roundtrip([1, 2, 3], [3, 2, 1])
+
+
+def test_type_changes():
+    roundtrip({"a": None}, {"a": "2024-01-01"})
+    roundtrip({"a": 1}, {"a": True})
+    roundtrip({"a": [1]}, {"a": {"b": 1}})
+    assert roundtrip(1, 2) == [{"op": "replace", "path": "", "value": 2}]
+
+
+def test_escaped_keys():
+    roundtrip({"a/b": 1, "c~d": 2}, {"a/b": 3, "c~d": 4})
+
+
+def test_apply_doesnt_modify_input():
+    old = {"a": [1, 2]}
+    JsonPatch.apply(old, [{"op": "add", "path": "/a/-", "value": 3}])
+    assert old == {"a": [1, 2]}
+
+
+def test_apply_bad_patch():
+    with pytest.raises(ValueError):
+        JsonPatch.apply({"a": 1}, [{"op": "replace", "path": "/b", "value": 1}])
+    with pytest.raises(ValueError):
+        JsonPatch.apply({"a": [1]}, [{"op": "remove", "path": "/a/3"}])
+    with pytest.raises(ValueError):
+        JsonPatch.apply({"a": 1}, [{"op": "move", "path": "/a"}])
+    with pytest.raises(ValueError):
+        JsonPatch.apply({"a": 1}, [{"op": "add", "path": "/x/y", "value": 1}])
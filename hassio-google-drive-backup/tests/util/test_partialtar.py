@@ -0,0 +1,78 @@
+import json
+import os
+import tarfile
+from io import BytesIO
+
+import pytest
+
+from backup.exceptions import LogicError
+from backup.util import PartialTar, TarIndex
+
+BACKUP_JSON = {
+    "slug": "abc",
+    "name": "Full Backup",
+    "type": "full",
+    "homeassistant": {"version": "2024.1.0"},
+    "folders": ["share", "addons/local"],
+    "addons": [{"slug": "core_ssh", "name": "Terminal & SSH", "version": "9.8"}, {"slug": "core_mosquitto", "name": "Mosquitto", "version": "6.4"}],
+    "protected": False
+}
+
+
+def createBackup(members) -> bytes:
+    stream = BytesIO()
+    with tarfile.open(fileobj=stream, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        for name, data in [("./backup.json", json.dumps(BACKUP_JSON).encode())] + members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, BytesIO(data))
+    return stream.getvalue()
+
+
+async def assemble(uploader, data: bytes, addons, folders, homeassistant):
+    stream = await uploader.upload(data)
+    await stream.setup()
+    index = await TarIndex.build(stream.readAt, len(data))
+    partial = await PartialTar.build(stream, index, addons, folders, homeassistant, 1000, 1000)
+    output = BytesIO()
+    async for chunk in partial.generator():
+        output.write(chunk)
+    assert len(output.getvalue()) == partial.size()
+    output.seek(0)
+    return partial, tarfile.open(fileobj=output, mode="r:")
+
+
+@pytest.mark.asyncio
+async def test_keeps_only_selected(uploader):
+    archives = {name: os.urandom(size) for name, size in [("./homeassistant.tar.gz", 3000), ("./share.tar.gz", 1500),
+                                                          ("./addons_local.tar.gz", 700), ("./core_ssh.tar.gz", 2500), ("./core_mosquitto.tar.gz", 100)]}
+    partial, tar = await assemble(uploader, createBackup(list(archives.items())), ["core_ssh"], ["addons/local"], False)
+
+    assert tar.getnames() == ["./backup.json", "./addons_local.tar.gz", "./core_ssh.tar.gz"]
+    assert tar.extractfile("./addons_local.tar.gz").read() == archives["./addons_local.tar.gz"]
+    assert tar.extractfile("./core_ssh.tar.gz").read() == archives["./core_ssh.tar.gz"]
+
+    backup_json = json.loads(tar.extractfile("./backup.json").read())
+    assert backup_json["slug"] == partial.slug()
+    assert backup_json["slug"] != "abc"
+    assert backup_json["name"] == "Full Backup (partial)"
+    assert backup_json["type"] == "partial"
+    assert backup_json["homeassistant"] is None
+    assert backup_json["folders"] == ["addons/local"]
+    assert backup_json["addons"] == [BACKUP_JSON["addons"][0]]
+
+
+@pytest.mark.asyncio
+async def test_long_names_and_homeassistant(uploader):
+    # Members with long names have pax headers in front of them, which have to come along too
+    name = "./" + "a" * 150 + "/homeassistant.tar"
+    data = os.urandom(5000)
+    _, tar = await assemble(uploader, createBackup([(name, data)]), [], [], True)
+    assert tar.extractfile(name).read() == data
+    assert json.loads(tar.extractfile("./backup.json").read())["homeassistant"] == BACKUP_JSON["homeassistant"]
+
+
+@pytest.mark.asyncio
+async def test_missing_archive(uploader):
+    with pytest.raises(LogicError):
+        await assemble(uploader, createBackup([("./share.tar.gz", bytes(10))]), ["core_ssh"], [], False)
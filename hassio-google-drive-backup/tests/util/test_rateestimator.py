@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from backup.util import RateEstimator
+from ..faketime import FakeTime
+
+
+def test_no_data(time: FakeTime):
+    rate = RateEstimator(time)
+    rate.start()
+    assert rate.average() is None
+    assert rate.instant() is None
+    assert rate.overall() is None
+    assert rate.eta(100) is None
+
+
+def test_average_over_period(time: FakeTime):
+    rate = RateEstimator(time)
+    rate.start()
+    for x in range(10):
+        time.advance(seconds=1)
+        rate.record(100)
+    for x in range(10):
+        time.advance(seconds=1)
+        rate.record(300)
+    assert rate.average(timedelta(seconds=10)) == 300
+    assert rate.average(timedelta(seconds=20)) == 200
+    assert rate.average(timedelta(seconds=5)) == 300
+    assert rate.overall() == 200
+    assert rate.total() == 4000
+
+    # Periods longer than the transfer only count the time since it started
+    assert rate.average(timedelta(minutes=5)) == 200
+
+
+def test_average_interpolates_within_buckets(time: FakeTime):
+    rate = RateEstimator(time, bucket_seconds=4)
+    rate.start()
+    time.advance(seconds=2)
+    rate.record(200)
+    time.advance(seconds=2)
+    rate.record(600)
+    # Within a bucket, bytes are treated as though they arrived evenly
+    assert rate.average(timedelta(seconds=3)) == 200
+    assert rate.average(timedelta(seconds=2)) == 200
+    assert rate.average(timedelta(seconds=4)) == 200
+
+
+def test_average_limited_to_window(time: FakeTime):
+    rate = RateEstimator(time, bucket_seconds=1, buckets=10)
+    rate.start()
+    for x in range(60):
+        time.advance(seconds=1)
+        rate.record(100 if x < 50 else 200)
+    assert rate.average(timedelta(seconds=60)) == 200
+
+
+def test_long_gap(time: FakeTime):
+    rate = RateEstimator(time, bucket_seconds=1, buckets=10)
+    rate.start()
+    time.advance(seconds=1)
+    rate.record(100)
+    time.advance(minutes=5)
+    rate.record(300)
+    assert rate.average(timedelta(seconds=5)) == 1
+    time.advance(seconds=1)
+    rate.record(100)
+    assert rate.average(timedelta(seconds=2)) == 50.5
+
+
+def test_instant_follows_recent_rate(time: FakeTime):
+    rate = RateEstimator(time, half_life_seconds=1)
+    rate.start()
+    time.advance(seconds=1)
+    rate.record(100)
+    assert rate.instant() == 100
+    time.advance(seconds=1)
+    rate.record(300)
+    assert rate.instant() == 200
+    time.advance(seconds=2)
+    rate.record(600)
+    assert rate.instant() == 275
+
+
+def test_record_with_duration(time: FakeTime):
+    rate = RateEstimator(time)
+    rate.record(100, 2)
+    assert rate.instant() == 50
+    time.advance(seconds=10)
+    rate.record(100, 1)
+    assert rate.instant() > 50
+    # The 7 seconds before the last record were idle
+    assert rate.average(timedelta(seconds=10)) == 10
+
+
+def test_eta(time: FakeTime):
+    rate = RateEstimator(time)
+    rate.start()
+    for x in range(20):
+        time.advance(seconds=1)
+        rate.record(100)
+    assert rate.eta(1000) == timedelta(seconds=10)
+
+
+def test_seed_and_scale(time: FakeTime):
+    rate = RateEstimator(time)
+    rate.seed(1000)
+    assert rate.instant() == 1000
+    rate.scale(0.5)
+    assert rate.instant() == 500
@@ -0,0 +1,190 @@
+import json
+import os
+import tarfile
+from io import BytesIO
+
+import pytest
+from securetar import SecureTarArchive
+
+from backup.exceptions import BackupDecryptError
+from backup.util import TarDecryptor
+from backup.util.tardecryptor import SECURETAR_HEADER, secureTarVersion
+
+PASSWORD = "hunter2"
+
+
+def innerArchive(name: str, size: int) -> bytes:
+    stream = BytesIO()
+    with tarfile.open(fileobj=stream, mode="w:gz") as tar:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        tar.addfile(info, BytesIO(os.urandom(size)))
+    return stream.getvalue()
+
+
+def outerArchive(members, encrypted=None, version=3, password=PASSWORD) -> bytes:
+    """A backup the way Home Assistant makes them, with each of the encrypted members encrypted by SecureTar"""
+    stream = BytesIO()
+    with SecureTarArchive(fileobj=stream, mode="w", password=password, create_version=version) as archive:
+        backup_json = json.dumps({"slug": "abc", "protected": True, "crypto": "aes128"}).encode()
+        info = tarfile.TarInfo("./backup.json")
+        info.size = len(backup_json)
+        archive.tar.addfile(info, BytesIO(backup_json))
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            if encrypted is None or name in encrypted:
+                archive.import_tar(BytesIO(data), info)
+            else:
+                archive.tar.addfile(info, BytesIO(data))
+    return stream.getvalue()
+
+
+def replaceMember(data: bytes, name: str, replace) -> bytes:
+    """Rewrites a backup with one member's data changed by replace"""
+    output = BytesIO()
+    with tarfile.open(fileobj=BytesIO(data), mode="r:") as source, tarfile.open(fileobj=output, mode="w") as dest:
+        for info in source.getmembers():
+            member = source.extractfile(info).read()
+            if info.name == name:
+                member = replace(member)
+                info.size = len(member)
+            dest.addfile(info, BytesIO(member))
+    return output.getvalue()
+
+
+async def chunked(data: bytes, chunk_size: int):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+async def decrypt(data: bytes, chunk_size: int = 1000, password: str = PASSWORD) -> tarfile.TarFile:
+    output = BytesIO()
+    async for chunk in TarDecryptor(chunked(data, chunk_size), password).generator():
+        output.write(chunk)
+    output.seek(0)
+    return tarfile.open(fileobj=output, mode="r:")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("version", [2, 3])
+async def test_decrypt_archives(version):
+    homeassistant = innerArchive("configuration.yaml", 5000)
+    addon = innerArchive("addon.json", 123)
+    tar = await decrypt(outerArchive([("./homeassistant.tar.gz", homeassistant), ("./core_ssh.tar.gz", addon)], version=version))
+
+    backup_json = json.loads(tar.extractfile("./backup.json").read())
+    assert not backup_json["protected"]
+    assert "crypto" not in backup_json
+    assert tar.extractfile("./homeassistant.tar.gz").read() == homeassistant
+    assert tar.extractfile("./core_ssh.tar.gz").read() == addon
+
+    # The decrypted archives should be usable as they are
+    with tarfile.open(fileobj=tar.extractfile("./homeassistant.tar.gz"), mode="r:gz") as inner:
+        assert inner.getnames() == ["configuration.yaml"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("version", [2, 3])
+@pytest.mark.parametrize("chunk_size", [1, 15, 512, 513, 1024 * 1024])
+async def test_decrypt_any_chunk_size(chunk_size, version):
+    homeassistant = innerArchive("configuration.yaml", 3000)
+    tar = await decrypt(outerArchive([("./homeassistant.tar.gz", homeassistant)], version=version), chunk_size=chunk_size)
+    assert tar.extractfile("./homeassistant.tar.gz").read() == homeassistant
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1000, 1024 * 1024 + 17])
+async def test_decrypt_many_secretstream_chunks(chunk_size):
+    # Version 3 encrypts in 1MB chunks, which the network's chunks won't line up with
+    homeassistant = innerArchive("configuration.yaml", 2 * 1024 * 1024 + 100)
+    tar = await decrypt(outerArchive([("./homeassistant.tar.gz", homeassistant)]), chunk_size=chunk_size)
+    assert tar.extractfile("./homeassistant.tar.gz").read() == homeassistant
+
+
+@pytest.mark.asyncio
+async def test_unencrypted_members_pass_through():
+    plain = innerArchive("share.txt", 100)
+    other = os.urandom(777)
+    tar = await decrypt(outerArchive([("./share.tar.gz", plain), ("./something.dat", other)], encrypted=[]))
+    assert tar.extractfile("./share.tar.gz").read() == plain
+    assert tar.extractfile("./something.dat").read() == other
+
+
+@pytest.mark.asyncio
+async def test_long_names():
+    name = "./" + "a" * 150 + ".tar.gz"
+    homeassistant = innerArchive("configuration.yaml", 100)
+    tar = await decrypt(outerArchive([(name, homeassistant)]))
+    assert tar.extractfile(name).read() == homeassistant
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("version", [2, 3])
+async def test_wrong_password(version):
+    data = outerArchive([("./homeassistant.tar.gz", innerArchive("configuration.yaml", 100))], version=version)
+    with pytest.raises(BackupDecryptError) as e:
+        await decrypt(data, password="wrong")
+    assert "password is incorrect" in e.value.message()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("version", [2, 3])
+async def test_verify_before_sending(version):
+    homeassistant = innerArchive("configuration.yaml", 100)
+    data = outerArchive([("./homeassistant.tar.gz", homeassistant)], version=version)
+
+    decryptor = TarDecryptor(chunked(data, 1000), "wrong")
+    with pytest.raises(BackupDecryptError):
+        await decryptor.verify()
+
+    # What got read to verify the password still comes out of the generator
+    decryptor = TarDecryptor(chunked(data, 1000), PASSWORD)
+    await decryptor.verify()
+    output = BytesIO()
+    async for chunk in decryptor.generator():
+        output.write(chunk)
+    output.seek(0)
+    with tarfile.open(fileobj=output, mode="r:") as tar:
+        assert tar.extractfile("./homeassistant.tar.gz").read() == homeassistant
+
+
+@pytest.mark.asyncio
+async def test_unsupported_versions():
+    data = outerArchive([("./homeassistant.tar.gz", innerArchive("configuration.yaml", 100))])
+    future = replaceMember(data, "./homeassistant.tar.gz", lambda member: member[:9] + bytes([4]) + member[10:])
+    with pytest.raises(BackupDecryptError) as e:
+        await decrypt(future)
+    assert "version 4" in e.value.message()
+
+    # The oldest format has no header at all, just the salt and then encrypted data
+    legacy = replaceMember(outerArchive([("./homeassistant.tar.gz", innerArchive("configuration.yaml", 100))], version=2),
+                           "./homeassistant.tar.gz", lambda member: member[SECURETAR_HEADER.size:])
+    with pytest.raises(BackupDecryptError) as e:
+        await decrypt(legacy)
+    assert "older version" in e.value.message()
+
+
+def test_securetar_version():
+    plain = innerArchive("configuration.yaml", 100)
+    assert secureTarVersion(plain) is None
+    for version in [2, 3]:
+        with tarfile.open(fileobj=BytesIO(outerArchive([("./homeassistant.tar.gz", plain)], version=version)), mode="r:") as tar:
+            assert secureTarVersion(tar.extractfile("./homeassistant.tar.gz").read()) == version
+
+
+@pytest.mark.asyncio
+async def test_corrupt_backup():
+    data = outerArchive([("./homeassistant.tar.gz", innerArchive("configuration.yaml", 2000))])
+    corrupt = replaceMember(data, "./homeassistant.tar.gz", lambda member: member[:-10] + bytes(10))
+    with pytest.raises(BackupDecryptError) as e:
+        await decrypt(corrupt)
+    assert "corrupt" in e.value.message()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("version", [2, 3])
+async def test_truncated_backup(version):
+    data = outerArchive([("./homeassistant.tar.gz", innerArchive("configuration.yaml", 2000))], version=version)
+    with pytest.raises(EOFError):
+        await decrypt(data[:3000])
@@ -0,0 +1,114 @@
+import json
+import tarfile
+from io import BytesIO
+
+import pytest
+
+from backup.util import TarIndex
+from backup.util.tardecryptor import SECURETAR_HEADER, SECURETAR_MAGIC
+from backup.util.tarindex import CONTENT_ADDON, CONTENT_FOLDER, CONTENT_HOMEASSISTANT
+
+
+def createTar(members, format=tarfile.PAX_FORMAT) -> bytes:
+    stream = BytesIO()
+    with tarfile.open(fileobj=stream, mode="w", format=format) as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, BytesIO(data))
+    return stream.getvalue()
+
+
+class Reader():
+    def __init__(self, data: bytes):
+        self.data = data
+        self.bytes_read = 0
+
+    async def read(self, position: int, count: int) -> bytes:
+        self.bytes_read += count
+        return self.data[position:position + count]
+
+
+BACKUP_JSON = json.dumps({
+    "slug": "abc",
+    "homeassistant": {"version": "2024.1.0"},
+    "folders": ["share", "addons/local"],
+    "addons": [{"slug": "core_ssh", "name": "Terminal & SSH", "version": "9.8"}],
+    "protected": False
+}).encode()
+
+
+@pytest.mark.asyncio
+async def test_index_members():
+    data = createTar([
+        ("./backup.json", BACKUP_JSON),
+        ("./homeassistant.tar.gz", bytes(100000)),
+        ("./share.tar.gz", bytes(3000)),
+        ("./addons_local.tar.gz", bytes(0)),
+        ("./core_ssh.tar.gz", bytes(512)),
+    ])
+    reader = Reader(data)
+    index = await TarIndex.build(reader.read, len(data))
+
+    assert [member.archiveName() for member in index.members] == ["backup.json", "homeassistant.tar.gz", "share.tar.gz", "addons_local.tar.gz", "core_ssh.tar.gz"]
+    member = index.member("share.tar.gz")
+    assert data[member.offset:member.offset + member.size] == bytes(3000)
+    assert index.archive("core_ssh").size == 512
+
+    assert index.contents() == [
+        {"type": CONTENT_HOMEASSISTANT, "slug": "homeassistant", "name": "Home Assistant", "version": "2024.1.0", "size": 100000},
+        {"type": CONTENT_FOLDER, "slug": "share", "name": "share", "version": None, "size": 3000},
+        {"type": CONTENT_FOLDER, "slug": "addons/local", "name": "addons/local", "version": None, "size": 0},
+        {"type": CONTENT_ADDON, "slug": "core_ssh", "name": "Terminal & SSH", "version": "9.8", "size": 512},
+    ]
+
+    # Only the headers, the end of archive marker and backup.json should have been read
+    assert reader.bytes_read == 512 * 6 + len(BACKUP_JSON)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("format", [tarfile.PAX_FORMAT, tarfile.GNU_FORMAT])
+async def test_long_names(format):
+    name = "./" + "a" * 200 + ".tar.gz"
+    data = createTar([("./backup.json", BACKUP_JSON), (name, bytes(1000)), ("./share.tar.gz", bytes(10))], format=format)
+    index = await TarIndex.build(Reader(data).read, len(data))
+    long_member = index.members[1]
+    assert long_member.name == name
+    assert long_member.size == 1000
+    assert long_member.header < long_member.offset - 512
+    assert data[long_member.offset:long_member.offset + 1000] == bytes(1000)
+    assert index.members[2].header == long_member.end()
+
+
+@pytest.mark.asyncio
+async def test_serialize():
+    data = createTar([("./backup.json", BACKUP_JSON), ("./homeassistant.tar.gz", bytes(100))])
+    index = await TarIndex.build(Reader(data).read, len(data))
+    parsed = TarIndex.parse(json.loads(json.dumps(index.serialize())))
+    assert parsed.size == index.size
+    assert parsed.info == index.info
+    assert [member.serialize() for member in parsed.members] == [member.serialize() for member in index.members]
+    assert parsed.contents() == index.contents()
+
+    assert TarIndex.parse(None) is None
+    assert TarIndex.parse({"version": 0}) is None
+
+
+@pytest.mark.asyncio
+async def test_securetar_version():
+    protected = json.dumps({**json.loads(BACKUP_JSON), "protected": True}).encode()
+    plain = createTar([("./configuration.yaml", bytes(10))])
+    for archive, version, decryptable in [(SECURETAR_HEADER.pack(SECURETAR_MAGIC, 3, bytes(6), 100) + bytes(200), 3, True),
+                                          (SECURETAR_HEADER.pack(SECURETAR_MAGIC, 2, bytes(6), 100) + bytes(200), 2, True),
+                                          (bytes(300), 1, False),
+                                          (plain, None, False)]:
+        data = createTar([("./backup.json", protected), ("./homeassistant.tar.gz", archive)])
+        index = await TarIndex.build(Reader(data).read, len(data))
+        assert index.info["securetar"] == version
+        assert index.decryptable() == decryptable
+
+    # Unprotected backups don't need to be looked into
+    data = createTar([("./backup.json", BACKUP_JSON), ("./homeassistant.tar.gz", plain)])
+    index = await TarIndex.build(Reader(data).read, len(data))
+    assert "securetar" not in index.info
+    assert not index.decryptable()